@@ -12,6 +12,7 @@ class Settings(BaseSettings):
     # Database - SQLite para desarrollo
     database_url: str = "sqlite:///./desguapro.db"
     redis_url: str = "redis://localhost:6379/0"
+    sqlite_busy_timeout: int = 30  # Segundos que espera una escritura si la BD está bloqueada
     
     # Application
     debug: bool = False
@@ -37,7 +38,44 @@ class Settings(BaseSettings):
     # Features
     enable_stock_check: bool = True
     max_workers: int = 5
-    cache_ttl_seconds: int = 3600
+    cache_ttl_seconds: int = 3600  # Validez de los resultados de scraping cacheados
+    cache_backend: str = "memoria"  # "memoria" (LRU por proceso) o "redis" (compartida, usa redis_url)
+    cache_max_entradas: int = 2000  # Tamaño máximo de la caché en memoria
+    stockeo_max_concurrencia: int = 4  # Entornos importados a la vez en el stockeo automático
+    http_max_conexiones: int = 100  # Conexiones del cliente HTTP async compartido por los scrapers
+    http_max_por_host: int = 6  # Peticiones simultáneas como máximo contra un mismo host
+    http_keepalive_segundos: int = 30  # Tiempo que se mantiene abierta una conexión ociosa
+    scraper_peticiones_por_segundo: float = 4.0  # Ritmo sostenido de búsquedas contra un mismo host
+    scraper_rafaga_por_host: int = 10  # Búsquedas seguidas permitidas antes de aplicar el ritmo
+    scraper_espera_maxima_segundos: float = 5.0  # Si hay que esperar más turno, se descarta la búsqueda
+    circuito_fallos_para_abrir: int = 5  # Fallos seguidos de un host que abren su circuito
+    circuito_segundos_abierto: int = 60  # Tiempo sin consultar un host antes de probarlo de nuevo
+    navegador_max_paginas: int = 4  # Páginas de Chromium abiertas a la vez en el pool compartido
+    navegador_max_usos: int = 200  # Páginas servidas antes de reciclar Chromium
+    navegador_segundos_inactivo: int = 300  # Chromium sin uso durante este tiempo se cierra
+    navegador_memoria_max_mb: int = 1024  # Memoria de Chromium a partir de la que se recicla
+    navegador_intervalo_vigilancia_segundos: int = 30  # Cada cuánto se revisan inactividad y memoria
+    navegador_timeout_segundos: int = 90  # Tiempo máximo de una búsqueda con navegador
+    toen_refresco_segundos: int = 1200  # Edad a partir de la que el token TOEN se renueva en segundo plano
+    toen_intervalo_comprobacion_minutos: int = 5  # Cada cuánto se valida el token TOEN
+    toen_espera_arranque_segundos: int = 60  # Espera máxima por el primer token (arranque en frío)
+    toen_espera_tras_fallo_segundos: int = 30  # Sin nuevos intentos de generar el token tras uno fallido
+    threadpool_max_hilos: int = 40  # Hilos para handlers sync y trabajo bloqueante (run_in_threadpool)
+    bucle_intervalo_monitor_segundos: float = 0.5  # Cada cuánto se mide el retraso del event loop
+    bucle_umbral_bloqueo_ms: int = 250  # Retraso del event loop a partir del que se registra un bloqueo
+    cola_verificacion_workers: int = 2  # Verificaciones masivas procesadas a la vez por proceso
+    cola_intervalo_segundos: float = 2.0  # Cada cuánto buscan trabajo los workers de la cola
+    cola_latido_caducado_segundos: int = 300  # Trabajo en curso sin latido: se da por abandonado y se reanuda
+    cola_reintento_segundos: int = 60  # Espera antes de reanudar un trabajo si Ecooparts no está disponible
+    cola_intervalo_eventos_segundos: float = 1.0  # Cada cuánto se envía el progreso por SSE
+    verificar_masivo_max_items: int = 20  # Más items en /stock/verificar-masivo: usar la cola (/stock/trabajos)
+    estudio_trabajos_simultaneos: int = 2  # Estudios de coches buscando precios a la vez
+    estudio_busquedas_simultaneas: int = 4  # Búsquedas de OEM en paralelo dentro de un estudio
+    estudio_cache_segundos: int = 3600  # Un estudio terminado se reutiliza durante este tiempo
+    oem_equiv_ttl_dias: int = 30  # Equivalencias OEM guardadas: a partir de esta edad se revalidan en segundo plano
+    oem_equiv_ttl_negativo_dias: int = 7  # Ídem para "sin equivalencias" o consultas con alguna fuente caída
+    oem_equiv_memoria_max: int = 5000  # Referencias con equivalencias OEM en memoria (LRU)
+    oem_equiv_revalidaciones_simultaneas: int = 2  # Revalidaciones en segundo plano a la vez
     
     # eBay API
     ebay_app_id: str = os.getenv("EBAY_APP_ID", "")  # Client ID
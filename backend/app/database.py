@@ -10,7 +10,7 @@ if "sqlite" in settings.database_url:
     engine = create_engine(
         settings.database_url,
         echo=settings.debug,
-        connect_args={"check_same_thread": False},
+        connect_args={"check_same_thread": False, "timeout": settings.sqlite_busy_timeout},
     )
 else:
     engine = create_engine(
@@ -15,7 +15,7 @@ logger = logging.getLogger(__name__)
 security = HTTPBearer(auto_error=False)  # No lanzar error automático, verificar cookie también
 
 
-async def get_current_user(
+def get_current_user(
     request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
@@ -66,7 +66,7 @@ async def get_current_user(
     return usuario
 
 
-async def get_current_sysowner(
+def get_current_sysowner(
     usuario: Usuario = Depends(get_current_user),
 ) -> Usuario:
     """Verificar que el usuario es SYSOWNER (propietario de sistema)"""
@@ -78,7 +78,7 @@ async def get_current_sysowner(
     return usuario
 
 
-async def get_current_owner(
+def get_current_owner(
     usuario: Usuario = Depends(get_current_user),
 ) -> Usuario:
     """Verificar que el usuario es OWNER o SYSOWNER"""
@@ -90,7 +90,7 @@ async def get_current_owner(
     return usuario
 
 
-async def get_current_admin(
+def get_current_admin(
     usuario: Usuario = Depends(get_current_user),
 ) -> Usuario:
     """Verificar que el usuario es ADMIN, OWNER o SYSOWNER"""
@@ -102,7 +102,7 @@ async def get_current_admin(
     return usuario
 
 
-async def get_current_user_with_workspace(
+def get_current_user_with_workspace(
     usuario: Usuario = Depends(get_current_user),
 ) -> Usuario:
     """Verificar que el usuario tiene un entorno de trabajo asignado"""
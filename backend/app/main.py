@@ -5,11 +5,22 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import anyio.to_thread
 import logging
 
 from app.config import settings
 from app.routers import precios, stock, plataformas, token, auth, desguace, precios_config, referencias, fichadas, ebay, admin, piezas, stockeo, tickets, anuncios, paqueteria, tests, clientes, vehiculos, despiece
 from services.scheduler import iniciar_scheduler, detener_scheduler
+from services.busqueda_texto import instalar_indices_texto
+from services.referencias_index import indexar_entornos_sin_referencias
+from services.cola_verificacion import iniciar_cola_verificacion, detener_cola_verificacion
+from services.estudio_precios import cerrar_gestor_estudios
+from app.services.almacen_oem import cerrar_almacen_equivalencias
+from core.http_async import cerrar_cliente_http
+from core.proteccion_hosts import ABIERTO, estado_hosts
+from core.navegador import cerrar_pool_navegador, get_pool_navegador
+from core.toen import get_gestor_toen
+from utils.monitor_bucle import iniciar_monitor_bucle, detener_monitor_bucle, get_monitor_bucle
 from app.middleware.request_logger import RequestLoggerMiddleware
 from app.database import engine
 from app.models.busqueda import Base
@@ -25,13 +36,30 @@ async def lifespan(app: FastAPI):
     # Startup: crear tablas nuevas si no existen
     logger.info("Verificando tablas de base de datos...")
     Base.metadata.create_all(bind=engine)
+    # Startup: índices de texto (FTS5) de stock y ventas en BDs ya existentes
+    instalar_indices_texto(engine)
+    # Startup: índice de referencias de los entornos que aún no lo tienen
+    indexar_entornos_sin_referencias(engine)
     # Startup: iniciar scheduler de backups
     logger.info("Iniciando scheduler de backups automáticos...")
     iniciar_scheduler()
+    # Startup: threadpool acotado para handlers sync y run_in_threadpool, y
+    # monitor de bloqueos del event loop
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.threadpool_max_hilos
+    iniciar_monitor_bucle()
+    # Startup: workers de la cola de verificaciones masivas (reanudan lo pendiente)
+    iniciar_cola_verificacion()
     yield
-    # Shutdown: detener scheduler
+    await detener_monitor_bucle()
+    # Shutdown: detener scheduler y workers de la cola
     logger.info("Deteniendo scheduler...")
     detener_scheduler()
+    detener_cola_verificacion()
+    cerrar_gestor_estudios()
+    cerrar_almacen_equivalencias()
+    # Shutdown: cerrar conexiones del cliente HTTP de los scrapers y Chromium
+    await cerrar_cliente_http()
+    cerrar_pool_navegador()
 
 
 # Crear aplicación
@@ -107,10 +135,18 @@ app.include_router(ebay.router, prefix="/api/v1", tags=["ebay"])
 @app.get("/api/v1/health")
 async def health_check():
     """Health check endpoint"""
+    circuitos = estado_hosts()
     return {
         "status": "healthy",
         "app": settings.app_name,
         "version": settings.api_version,
+        "scrapers": {
+            "circuitos_abiertos": [host for host, e in circuitos.items() if e["estado"] == ABIERTO],
+            "hosts": circuitos,
+            "navegador": get_pool_navegador().estado(),
+            "toen": get_gestor_toen().estado(),
+        },
+        "event_loop": get_monitor_bucle().estado(),
     }
 
 
@@ -7,6 +7,7 @@ import json
 from datetime import datetime
 from typing import Optional, Callable
 from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.routing import APIRoute
 from starlette.middleware.base import BaseHTTPMiddleware
 from sqlalchemy.orm import Session
@@ -58,7 +59,7 @@ class RequestLoggerMiddleware(BaseHTTPMiddleware):
         # Calcular tiempo de respuesta
         duration_ms = (time.time() - start_time) * 1000
         
-        # Registrar en BD (async para no bloquear)
+        # Registrar en BD (en el threadpool para no bloquear el event loop)
         try:
             await self._log_request(
                 request=request,
@@ -113,32 +114,36 @@ class RequestLoggerMiddleware(BaseHTTPMiddleware):
         duration_ms: float,
         user_info: dict
     ):
-        """Guarda el log de la petición en la BD"""
-        from app.models.busqueda import APIRequestLog
-        
+        """Guarda el log de la petición en la BD (el INSERT va al threadpool)"""
         # Obtener IP del cliente
         client_ip = request.headers.get("X-Forwarded-For", "").split(",")[0].strip()
         if not client_ip:
             client_ip = request.client.host if request.client else "unknown"
         
-        # Crear registro
+        datos = dict(
+            metodo=request.method,
+            ruta=str(request.url.path),
+            query_params=str(request.query_params) if request.query_params else None,
+            status_code=response.status_code,
+            duracion_ms=round(duration_ms, 2),
+            usuario_id=int(user_info["user_id"]) if user_info["user_id"] else None,
+            usuario_email=user_info["email"],
+            entorno_trabajo_id=int(user_info["entorno_id"]) if user_info["entorno_id"] else None,
+            entorno_nombre=user_info["entorno_nombre"],
+            rol=user_info["rol"],
+            ip_address=client_ip,
+            user_agent=request.headers.get("User-Agent", "")[:255]
+        )
+        await run_in_threadpool(self._guardar_log, datos)
+    
+    @staticmethod
+    def _guardar_log(datos: dict):
+        """Crea el registro APIRequestLog (bloqueante)"""
+        from app.models.busqueda import APIRequestLog
+        
         db = SessionLocal()
         try:
-            log_entry = APIRequestLog(
-                metodo=request.method,
-                ruta=str(request.url.path),
-                query_params=str(request.query_params) if request.query_params else None,
-                status_code=response.status_code,
-                duracion_ms=round(duration_ms, 2),
-                usuario_id=int(user_info["user_id"]) if user_info["user_id"] else None,
-                usuario_email=user_info["email"],
-                entorno_trabajo_id=int(user_info["entorno_id"]) if user_info["entorno_id"] else None,
-                entorno_nombre=user_info["entorno_nombre"],
-                rol=user_info["rol"],
-                ip_address=client_ip,
-                user_agent=request.headers.get("User-Agent", "")[:255]
-            )
-            db.add(log_entry)
+            db.add(APIRequestLog(**datos))
             db.commit()
         except Exception as e:
             db.rollback()
@@ -124,6 +124,67 @@ class ResultadoStock(Base):
     fecha_creacion = Column(DateTime, default=now_spain_naive)  # Hora de España
 
 
+class TrabajoVerificacion(Base):
+    """Verificación masiva de stock encolada (la procesan los workers de services.cola_verificacion)"""
+    __tablename__ = "trabajos_verificacion"
+    __table_args__ = (
+        Index('ix_trabajos_verif_estado', 'estado', 'disponible_desde'),
+        Index('ix_trabajos_verif_usuario', 'usuario_id', 'fecha_creacion'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="SET NULL"), nullable=True)
+    entorno_trabajo_id = Column(Integer, ForeignKey("entornos_trabajo.id", ondelete="SET NULL"), nullable=True)
+    
+    # pendiente | en_curso | completado | cancelado | error
+    estado = Column(String(20), default="pendiente", nullable=False)
+    
+    # Parámetros de la verificación
+    umbral_diferencia = Column(Float, default=20.0)
+    piezas_minimas = Column(Integer, default=3)
+    delay = Column(Float, default=0.0)
+    
+    # Progreso
+    total_items = Column(Integer, default=0)
+    items_procesados = Column(Integer, default=0)  # Items ya consultados (con o sin resultado)
+    items_con_resultado = Column(Integer, default=0)
+    items_con_outliers = Column(Integer, default=0)
+    mensaje_error = Column(String(500), nullable=True)
+    
+    # Reparto entre workers: quién lo procesa, último latido y reintento tras un host caído
+    propietario = Column(String(100), nullable=True)
+    latido = Column(DateTime, nullable=True)
+    disponible_desde = Column(DateTime, nullable=True)
+    
+    fecha_creacion = Column(DateTime, default=now_spain_naive)
+    fecha_inicio = Column(DateTime, nullable=True)
+    fecha_fin = Column(DateTime, nullable=True)
+    
+    # Relaciones
+    items = relationship("ItemTrabajoVerificacion", back_populates="trabajo", cascade="all, delete-orphan")
+
+
+class ItemTrabajoVerificacion(Base):
+    """Item de una verificación masiva con su resultado parcial"""
+    __tablename__ = "items_trabajo_verificacion"
+    __table_args__ = (
+        Index('ix_items_trabajo_verif_estado', 'trabajo_id', 'estado', 'posicion'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    trabajo_id = Column(Integer, ForeignKey("trabajos_verificacion.id", ondelete="CASCADE"), nullable=False)
+    posicion = Column(Integer, nullable=False)  # Orden dentro de la lista enviada
+    
+    datos = Column(String(1000), nullable=False)  # JSON del StockMasivoItem
+    # pendiente | procesado (con resultado) | sin_datos
+    estado = Column(String(20), default="pendiente", nullable=False)
+    resultado = Column(String(2000), nullable=True)  # JSON del CheckMasivoResultItem
+    fecha_proceso = Column(DateTime, nullable=True)
+    
+    # Relaciones
+    trabajo = relationship("TrabajoVerificacion", back_populates="items")
+
+
 # ============== TOKENS ==============
 class TokenToen(Base):
     """Modelo para guardar token TOEN de Ecooparts"""
@@ -169,6 +230,9 @@ class BaseDesguace(Base):
 class PiezaDesguace(Base):
     """Modelo para almacenar las piezas del CSV del desguace"""
     __tablename__ = "piezas_desguace"
+    __table_args__ = (
+        Index('ix_piezas_desguace_base_id', 'base_desguace_id'),  # Listado /stock por base e id
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     base_desguace_id = Column(Integer, ForeignKey("bases_desguace.id", ondelete="CASCADE"))
@@ -201,9 +265,44 @@ class PiezaDesguace(Base):
     usuario_fichaje = relationship("Usuario", foreign_keys=[usuario_fichaje_id])
 
 
+class ReferenciaPieza(Base):
+    """
+    Índice de referencias normalizadas (refid/OEM/OE/IAM) de las piezas del desguace.
+    Una fila por token; lo mantienen los importadores (services/referencias_index.py).
+    """
+    __tablename__ = "referencias_piezas"
+    __table_args__ = (
+        Index('ix_referencias_entorno_token', 'entorno_trabajo_id', 'token'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    token = Column(String(100), nullable=False)  # Referencia en mayúsculas, sin espacios/guiones/puntos
+    pieza_id = Column(Integer, ForeignKey("piezas_desguace.id", ondelete="CASCADE"), nullable=False, index=True)
+    entorno_trabajo_id = Column(Integer, ForeignKey("entornos_trabajo.id", ondelete="CASCADE"), nullable=False)
+    campo = Column(String(10), nullable=True)  # refid, oem, oe o iam
+
+
+class EquivalenciaOEM(Base):
+    """
+    OEM equivalentes de una referencia (tarostrade + distri-auto), guardadas para
+    no volver a scrapear. Las mantiene app/services/almacen_oem.py.
+    """
+    __tablename__ = "equivalencias_oem"
+
+    id = Column(Integer, primary_key=True, index=True)
+    clave = Column(String(100), unique=True, index=True, nullable=False)  # Referencia normalizada
+    referencia = Column(String(100), nullable=False)  # Tal como se buscó
+    equivalentes = Column(String(8000), nullable=False, default="[]")  # JSON; "[]" = sin equivalencias
+    completa = Column(Boolean, default=True)  # False si alguna fuente falló al consultarla
+    fecha_actualizacion = Column(DateTime, default=now_spain_naive, index=True)
+
+
 class PiezaVendida(Base):
     """Modelo para almacenar el historial de piezas vendidas (detectadas al actualizar la base)"""
     __tablename__ = "piezas_vendidas"
+    __table_args__ = (
+        Index('ix_piezas_vendidas_entorno_fecha', 'entorno_trabajo_id', 'fecha_venta'),  # Listado /ventas por cursor
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     entorno_trabajo_id = Column(Integer, ForeignKey("entornos_trabajo.id", ondelete="CASCADE"), index=True)
@@ -257,6 +356,7 @@ class ConfiguracionPrecios(Base):
     subido_por_id = Column(Integer, ForeignKey("usuarios.id"))
     fecha_subida = Column(DateTime, default=now_spain_naive)  # Hora de España
     fecha_actualizacion = Column(DateTime, onupdate=now_spain_naive)  # Hora de España
+    sello_actualizacion = Column(String(32), nullable=True)  # Cambia con cada edición de pieza-familia/familia-precios
     
     # Relaciones
     entorno_trabajo = relationship("EntornoTrabajo")
@@ -478,6 +578,11 @@ class ConfiguracionStockeo(Base):
     piezas_importadas = Column(Integer, default=0)
     ventas_detectadas = Column(Integer, default=0)
     
+    # Firma del último CSV importado con éxito (para omitir archivos sin cambios)
+    ultimo_archivo_tamano = Column(Integer, nullable=True)  # Bytes
+    ultimo_archivo_mtime = Column(Float, nullable=True)  # Timestamp de modificación
+    ultimo_archivo_hash = Column(String(64), nullable=True)  # SHA-256 del contenido
+    
     fecha_creacion = Column(DateTime, default=now_spain_naive)
     fecha_actualizacion = Column(DateTime, default=now_spain_naive, onupdate=now_spain_naive)
     
@@ -552,6 +657,7 @@ class APIRequestLog(Base):
         Index('ix_api_logs_entorno', 'entorno_trabajo_id'),
         Index('ix_api_logs_usuario', 'usuario_id'),
         Index('ix_api_logs_ruta', 'ruta'),
+        Index('ix_api_logs_entorno_fecha', 'entorno_trabajo_id', 'fecha'),
     )
     
     id = Column(Integer, primary_key=True, index=True)
@@ -14,6 +14,7 @@ from app.dependencies import get_current_user
 from app.models.busqueda import Usuario, AuditLog, BackupRecord
 from services.audit import AuditService
 from services.backup import BackupService
+from services.paginacion import paginar, huella_filtros, CursorInvalido
 from services.scheduler import obtener_estado_scheduler, forzar_backup_ahora, forzar_importacion_csv_ahora, forzar_limpieza_ventas_ahora
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -65,7 +66,7 @@ class CrearBackupResponse(BaseModel):
 
 # ============== ENDPOINTS AUDITORÍA ==============
 @router.get("/audit-logs", response_model=AuditLogListResponse)
-async def obtener_logs_auditoria(
+def obtener_logs_auditoria(
     pagina: int = Query(1, ge=1),
     por_pagina: int = Query(50, ge=10, le=200),
     accion: Optional[str] = None,
@@ -143,7 +144,7 @@ async def obtener_logs_auditoria(
 
 
 @router.get("/audit-logs/acciones")
-async def obtener_acciones_disponibles(
+def obtener_acciones_disponibles(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -162,7 +163,7 @@ async def obtener_acciones_disponibles(
 
 # ============== ENDPOINTS BACKUP ==============
 @router.get("/backups", response_model=BackupListResponse)
-async def listar_backups(
+def listar_backups(
     limite: int = Query(20, ge=5, le=100),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -184,7 +185,7 @@ async def listar_backups(
 
 
 @router.post("/backups/crear", response_model=CrearBackupResponse)
-async def crear_backup(
+def crear_backup(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -220,7 +221,7 @@ async def crear_backup(
 
 
 @router.post("/backups/restaurar/{backup_id}")
-async def restaurar_backup(
+def restaurar_backup(
     backup_id: int,
     confirmar: bool = False,
     db: Session = Depends(get_db),
@@ -254,7 +255,7 @@ async def restaurar_backup(
 
 
 @router.get("/backups/estadisticas")
-async def estadisticas_backups(
+def estadisticas_backups(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -266,7 +267,7 @@ async def estadisticas_backups(
 
 
 @router.get("/scheduler/estado")
-async def estado_scheduler(
+def estado_scheduler(
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -280,7 +281,7 @@ async def estado_scheduler(
 
 
 @router.post("/scheduler/forzar-backup")
-async def forzar_backup_scheduler(
+def forzar_backup_scheduler(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -308,17 +309,19 @@ async def forzar_backup_scheduler(
 # ============== IMPORTACIÓN AUTOMÁTICA CSV ==============
 @router.post("/importar-csv-motocoche")
 def importar_csv_motocoche_ahora(
+    forzar: bool = True,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
     Forzar importación inmediata del CSV de MotoCoche.
+    Con forzar=false se omite si el archivo no ha cambiado.
     Solo admin+ puede ejecutar.
     """
     if current_user.rol not in ['admin', 'owner', 'sysowner']:
         raise HTTPException(status_code=403, detail="Solo admin puede forzar importación")
     
-    resultado = forzar_importacion_csv_ahora()
+    resultado = forzar_importacion_csv_ahora(forzar=forzar)
     
     AuditService.log(
         db=db,
@@ -360,6 +363,7 @@ def limpiar_ventas_falsas_ahora(
 # ============== API REQUEST LOGS ==============
 from app.models.busqueda import APIRequestLog, EntornoTrabajo
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import asyncio
 import json as json_lib
 
@@ -393,7 +397,7 @@ class APIStatsResponse(BaseModel):
 
 
 @router.get("/api-logs")
-async def obtener_api_logs(
+def obtener_api_logs(
     pagina: int = Query(1, ge=1),
     por_pagina: int = Query(100, ge=10, le=500),
     entorno_id: Optional[int] = None,
@@ -404,12 +408,15 @@ async def obtener_api_logs(
     status_max: Optional[int] = None,
     desde: Optional[str] = None,  # YYYY-MM-DD HH:MM
     hasta: Optional[str] = None,
+    cursor: Optional[str] = None,
+    modo_total: str = Query("exacto", pattern="^(exacto|estimado|ninguno)$"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
     Obtener logs de peticiones API con filtros y paginación.
     Sysowner ve todo, otros solo su entorno.
+    Paginación por página o por cursor (siguiente_cursor de la respuesta anterior).
     """
     if current_user.rol not in ['admin', 'owner', 'sysowner']:
         raise HTTPException(status_code=403, detail="No tienes permisos")
@@ -456,20 +463,31 @@ async def obtener_api_logs(
             except:
                 pass
     
-    total = query.count()
     offset = (pagina - 1) * por_pagina
-    logs = query.order_by(desc(APIRequestLog.fecha)).offset(offset).limit(por_pagina).all()
+    try:
+        resultado = paginar(
+            query, [APIRequestLog.fecha, APIRequestLog.id], por_pagina,
+            offset=offset, cursor=cursor, modo_total=modo_total,
+            huella=huella_filtros(
+                current_user.entorno_trabajo_id if current_user.rol != 'sysowner' else entorno_id,
+                usuario_email, ruta, metodo, status_min, status_max, desde, hasta,
+            ),
+        )
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
-        "logs": [APILogResponse.model_validate(log) for log in logs],
-        "total": total,
+        "logs": [APILogResponse.model_validate(log) for log in resultado.filas],
+        "total": resultado.total,
+        "total_estimado": resultado.total_estimado,
         "pagina": pagina,
-        "por_pagina": por_pagina
+        "por_pagina": por_pagina,
+        "siguiente_cursor": resultado.siguiente_cursor,
     }
 
 
 @router.get("/api-stats")
-async def obtener_api_stats(
+def obtener_api_stats(
     entorno_id: Optional[int] = None,
     horas: int = Query(24, ge=1, le=168),  # Últimas N horas
     db: Session = Depends(get_db),
@@ -633,6 +651,33 @@ async def obtener_api_stats(
     }
 
 
+def _logs_desde(last_id: int) -> list:
+    """Logs de API posteriores a last_id (como mucho 50), ya serializados"""
+    from app.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        new_logs = db.query(APIRequestLog).filter(
+            APIRequestLog.id > last_id
+        ).order_by(APIRequestLog.id.asc()).limit(50).all()
+        return [
+            {
+                "id": log.id,
+                "metodo": log.metodo,
+                "ruta": log.ruta,
+                "status_code": log.status_code,
+                "duracion_ms": log.duracion_ms,
+                "usuario_email": log.usuario_email,
+                "entorno_nombre": log.entorno_nombre,
+                "ip_address": log.ip_address,
+                "fecha": log.fecha.isoformat() if log.fecha else None
+            }
+            for log in new_logs
+        ]
+    finally:
+        db.close()
+
+
 @router.get("/api-logs/stream")
 async def stream_api_logs(
     current_user: Usuario = Depends(get_current_user)
@@ -645,35 +690,17 @@ async def stream_api_logs(
         raise HTTPException(status_code=403, detail="Solo sysowner puede ver logs en tiempo real")
     
     async def event_generator():
-        from app.database import SessionLocal
-        
         last_id = 0
         
         while True:
             try:
-                db = SessionLocal()
-                # Obtener nuevos logs desde el último ID
-                new_logs = db.query(APIRequestLog).filter(
-                    APIRequestLog.id > last_id
-                ).order_by(APIRequestLog.id.asc()).limit(50).all()
+                # La consulta es bloqueante: al threadpool
+                new_logs = await run_in_threadpool(_logs_desde, last_id)
                 
-                for log in new_logs:
-                    last_id = log.id
-                    log_data = {
-                        "id": log.id,
-                        "metodo": log.metodo,
-                        "ruta": log.ruta,
-                        "status_code": log.status_code,
-                        "duracion_ms": log.duracion_ms,
-                        "usuario_email": log.usuario_email,
-                        "entorno_nombre": log.entorno_nombre,
-                        "ip_address": log.ip_address,
-                        "fecha": log.fecha.isoformat() if log.fecha else None
-                    }
+                for log_data in new_logs:
+                    last_id = log_data["id"]
                     yield f"data: {json_lib.dumps(log_data)}\n\n"
                 
-                db.close()
-                
             except Exception as e:
                 yield f"data: {json_lib.dumps({'error': str(e)})}\n\n"
             
@@ -692,7 +719,7 @@ async def stream_api_logs(
 
 
 @router.get("/api-logs/entornos")
-async def obtener_entornos_con_actividad(
+def obtener_entornos_con_actividad(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -710,7 +737,7 @@ async def obtener_entornos_con_actividad(
 
 
 @router.delete("/api-logs/limpiar")
-async def limpiar_api_logs(
+def limpiar_api_logs(
     dias: int = Query(30, ge=1, le=365),
     confirmar: bool = False,
     db: Session = Depends(get_db),
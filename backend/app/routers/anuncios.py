@@ -59,7 +59,7 @@ class AnuncioResponse(BaseModel):
 
 # ============== ENDPOINTS PARA SYSOWNER ==============
 @router.post("/crear", response_model=AnuncioResponse)
-async def crear_anuncio(
+def crear_anuncio(
     anuncio: AnuncioCreate,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_sysowner)
@@ -104,7 +104,7 @@ async def crear_anuncio(
 
 
 @router.put("/{anuncio_id}", response_model=AnuncioResponse)
-async def actualizar_anuncio(
+def actualizar_anuncio(
     anuncio_id: int,
     datos: AnuncioUpdate,
     db: Session = Depends(get_db),
@@ -157,7 +157,7 @@ async def actualizar_anuncio(
 
 
 @router.delete("/{anuncio_id}")
-async def eliminar_anuncio(
+def eliminar_anuncio(
     anuncio_id: int,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_sysowner)
@@ -183,7 +183,7 @@ async def eliminar_anuncio(
 
 
 @router.get("/admin/todos", response_model=List[AnuncioResponse])
-async def listar_todos_anuncios(
+def listar_todos_anuncios(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_sysowner)
 ):
@@ -211,7 +211,7 @@ async def listar_todos_anuncios(
 
 # ============== ENDPOINTS PARA USUARIOS ==============
 @router.get("/no-leidos", response_model=List[AnuncioResponse])
-async def obtener_anuncios_no_leidos(
+def obtener_anuncios_no_leidos(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -251,7 +251,7 @@ async def obtener_anuncios_no_leidos(
 
 
 @router.get("/changelog", response_model=List[AnuncioResponse])
-async def obtener_changelog(
+def obtener_changelog(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -287,7 +287,7 @@ async def obtener_changelog(
 
 
 @router.post("/{anuncio_id}/marcar-leido")
-async def marcar_anuncio_leido(
+def marcar_anuncio_leido(
     anuncio_id: int,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -325,7 +325,7 @@ async def marcar_anuncio_leido(
 
 
 @router.post("/marcar-todos-leidos")
-async def marcar_todos_leidos(
+def marcar_todos_leidos(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
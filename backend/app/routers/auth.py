@@ -30,7 +30,7 @@ router = APIRouter()
 
 # ============== LOGIN ==============
 @router.post("/login", response_model=LoginResponse)
-async def login(request: LoginRequest, req: Request, db: Session = Depends(get_db)):
+def login(request: LoginRequest, req: Request, db: Session = Depends(get_db)):
     """Login de usuario"""
     try:
         # Obtener IP del cliente
@@ -172,7 +172,7 @@ async def login(request: LoginRequest, req: Request, db: Session = Depends(get_d
 
 
 @router.post("/logout")
-async def logout(
+def logout(
     response: Response,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -192,7 +192,7 @@ async def logout(
 
 
 @router.get("/me", response_model=UsuarioResponse)
-async def obtener_usuario_actual(
+def obtener_usuario_actual(
     usuario: Usuario = Depends(get_current_user)
 ):
     """Obtener datos del usuario actual"""
@@ -201,7 +201,7 @@ async def obtener_usuario_actual(
 
 # ============== VER CONTRASEÑA ==============
 @router.get("/usuarios/{usuario_id}/password")
-async def ver_password_usuario(
+def ver_password_usuario(
     usuario_id: int,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_admin)
@@ -232,7 +232,7 @@ async def ver_password_usuario(
 
 # ============== GESTIÓN DE USUARIOS (OWNER/SYSOWNER) ==============
 @router.post("/usuarios", response_model=UsuarioResponse)
-async def crear_usuario(
+def crear_usuario(
     request: UsuarioCreate,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_owner)
@@ -309,7 +309,7 @@ async def crear_usuario(
 
 
 @router.delete("/usuarios/{usuario_id}")
-async def eliminar_usuario(
+def eliminar_usuario(
     usuario_id: int,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_admin)  # Admin o Owner pueden eliminar
@@ -372,7 +372,7 @@ class ActualizarUsuarioBody(BaseModel):
     password: str = None
 
 @router.put("/usuarios/{usuario_id}")
-async def actualizar_usuario(
+def actualizar_usuario(
     usuario_id: int,
     body: ActualizarUsuarioBody = None,
     db: Session = Depends(get_db),
@@ -450,7 +450,7 @@ async def actualizar_usuario(
 
 
 @router.put("/usuarios/{usuario_id}/rol")
-async def cambiar_rol_usuario(
+def cambiar_rol_usuario(
     usuario_id: int,
     nuevo_rol: str,
     db: Session = Depends(get_db),
@@ -513,7 +513,7 @@ async def cambiar_rol_usuario(
 
 
 @router.get("/usuarios", response_model=UsuarioListResponse)
-async def listar_usuarios(
+def listar_usuarios(
     entorno_id: int = None,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_owner)
@@ -542,7 +542,7 @@ async def listar_usuarios(
 
 
 @router.post("/usuarios/{usuario_id}/entorno/{entorno_id}")
-async def asignar_entorno_trabajo(
+def asignar_entorno_trabajo(
     usuario_id: int,
     entorno_id: int,
     db: Session = Depends(get_db),
@@ -587,7 +587,7 @@ async def asignar_entorno_trabajo(
 
 # ============== ENTORNOS DE TRABAJO (SOLO SYSOWNER) ==============
 @router.post("/entornos", response_model=EntornoTrabajoResponse)
-async def crear_entorno(
+def crear_entorno(
     request: EntornoTrabajoCreate,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_sysowner)
@@ -632,7 +632,7 @@ async def crear_entorno(
 
 
 @router.get("/entornos", response_model=list[EntornoTrabajoResponse])
-async def listar_entornos(
+def listar_entornos(
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_sysowner)
 ):
@@ -643,7 +643,7 @@ async def listar_entornos(
 
 
 @router.delete("/entornos/{entorno_id}")
-async def eliminar_entorno(
+def eliminar_entorno(
     entorno_id: int,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_sysowner)
@@ -688,7 +688,7 @@ async def eliminar_entorno(
 
 
 @router.put("/entornos/{entorno_id}/modulos", response_model=EntornoTrabajoResponse)
-async def actualizar_modulos_entorno(
+def actualizar_modulos_entorno(
     entorno_id: int,
     modulos: EntornoModulosUpdate,
     db: Session = Depends(get_db),
@@ -751,7 +751,7 @@ async def actualizar_modulos_entorno(
 
 
 @router.get("/usuarios-admin", response_model=UsuarioListResponse)
-async def listar_usuarios_admin(
+def listar_usuarios_admin(
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_admin)
 ):
@@ -770,7 +770,7 @@ async def listar_usuarios_admin(
 
 
 @router.post("/usuarios-admin", response_model=UsuarioResponse)
-async def crear_usuario_admin(
+def crear_usuario_admin(
     request: UsuarioCreate,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_admin)
@@ -828,7 +828,7 @@ async def crear_usuario_admin(
 
 # ============== INFORMES DE USUARIO ==============
 @router.get("/usuarios/{usuario_id}/informe")
-async def obtener_informe_usuario(
+def obtener_informe_usuario(
     usuario_id: int,
     dias: int = Query(default=30, ge=1, le=365),
     fecha_inicio: Optional[str] = Query(default=None, description="Fecha inicio YYYY-MM-DD"),
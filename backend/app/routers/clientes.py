@@ -40,7 +40,7 @@ def _build_response(c, db) -> ClienteInteresadoResponse:
 
 
 @router.get("", response_model=list[ClienteInteresadoResponse])
-async def listar_clientes(
+def listar_clientes(
     estado: Optional[str] = Query(None, description="Filtrar por estado"),
     buscar: Optional[str] = Query(None, description="Buscar por nombre/teléfono/pieza"),
     entorno_id: Optional[int] = Query(None),
@@ -71,7 +71,7 @@ async def listar_clientes(
 
 
 @router.get("/verificar-duplicados")
-async def verificar_duplicados(
+def verificar_duplicados(
     nombre: Optional[str] = Query(None),
     telefono: Optional[str] = Query(None),
     email: Optional[str] = Query(None),
@@ -122,7 +122,7 @@ async def verificar_duplicados(
 
 
 @router.post("", response_model=ClienteInteresadoResponse)
-async def crear_cliente(
+def crear_cliente(
     datos: ClienteInteresadoCreate,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -152,7 +152,7 @@ async def crear_cliente(
 
 
 @router.put("/{cliente_id}", response_model=ClienteInteresadoResponse)
-async def editar_cliente(
+def editar_cliente(
     cliente_id: int,
     datos: ClienteInteresadoUpdate,
     db: Session = Depends(get_db),
@@ -178,7 +178,7 @@ async def editar_cliente(
 
 
 @router.delete("/{cliente_id}")
-async def borrar_cliente(
+def borrar_cliente(
     cliente_id: int,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
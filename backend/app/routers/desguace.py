@@ -1,20 +1,36 @@
 """
 Router para gestionar la base de datos de piezas del desguace
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, Integer
 from typing import Optional
 from datetime import datetime, timedelta, timezone
+import asyncio
 import csv
 import io
+import os
 import json
+import time
 import logging
+from itertools import chain
 
 from app.database import get_db
-from app.models.busqueda import Usuario, EntornoTrabajo, BaseDesguace, PiezaDesguace, PiezaVendida, FichadaPieza, VerificacionFichada
+from app.models.busqueda import Usuario, EntornoTrabajo, BaseDesguace, PiezaDesguace, PiezaVendida, FichadaPieza, VerificacionFichada, ReferenciaPieza
 from app.routers.auth import get_current_user
+from app.services.precios_plataformas import scrape_platform
+from app.config import settings
 from utils.timezone import now_spain_naive
+from services.busqueda_texto import aplicar_busqueda_texto
+from services.paginacion import paginar, huella_filtros, CursorInvalido
+from services.referencias_index import select_piezas_por_referencia
+from services.estudio_precios import (
+    get_gestor_estudios, TrabajoEstudio,
+    COMPLETADO as ESTUDIO_COMPLETADO, ERROR as ESTUDIO_ERROR,
+)
+from services.pricing import summarize
+from services.desguace_upload import guardar_upload_en_disco, detectar_encoding, detectar_delimitador, procesar_csv_desguace
 
 logger = logging.getLogger(__name__)
 
@@ -119,13 +135,13 @@ def get_current_admin_or_higher(
 
 
 @router.get("/campos")
-async def obtener_campos_disponibles():
+def obtener_campos_disponibles():
     """Obtener la lista de campos disponibles para mapear"""
     return {"campos": CAMPOS_DISPONIBLES}
 
 
 @router.post("/analizar")
-async def analizar_csv(
+def analizar_csv(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_admin_or_higher)
@@ -143,7 +159,7 @@ async def analizar_csv(
             )
         
         # Leer el contenido del archivo
-        content = await file.read()
+        content = file.file.read()
         
         # Intentar decodificar con diferentes encodings
         decoded_content = None
@@ -217,7 +233,7 @@ async def analizar_csv(
 
 
 @router.post("/upload")
-async def subir_base_desguace(
+def subir_base_desguace(
     file: UploadFile = File(...),
     mapeo: str = Form(...),  # JSON con el mapeo de columnas
     entorno_id: Optional[int] = Form(None),
@@ -235,7 +251,11 @@ async def subir_base_desguace(
     - Parte 1 -> OEM
     - Parte 2 -> OE
     - Parte 3 -> IAM (puede contener comas para múltiples referencias)
+    
+    El archivo se vuelca a disco y se procesa en streaming por lotes, así que
+    el tamaño del CSV no limita la memoria del worker.
     """
+    ruta_temporal = None
     try:
         # Parsear mapeo
         try:
@@ -282,351 +302,103 @@ async def subir_base_desguace(
                 detail="Solo se permiten archivos CSV",
             )
         
-        # Leer el contenido del archivo
-        content = await file.read()
+        # Volcar la subida a disco por bloques (no se carga el archivo en memoria)
+        inicio = time.perf_counter()
+        ruta_temporal, tamano_bytes = guardar_upload_en_disco(file.file)
         
-        # Intentar decodificar con diferentes encodings
-        decoded_content = None
-        for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-            try:
-                decoded_content = content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-        
-        if decoded_content is None:
+        # Detectar encoding (se valida el archivo entero, por bloques)
+        encoding = detectar_encoding(ruta_temporal)
+        if encoding is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No se pudo leer el archivo. Encoding no soportado.",
             )
         
         # Detectar delimitador
-        primera_linea = decoded_content.split('\n')[0]
-        delimitador = ';' if ';' in primera_linea else ','
-        
-        # Parsear CSV
-        csv_reader = csv.DictReader(io.StringIO(decoded_content), delimiter=delimitador)
-        columnas = csv_reader.fieldnames
-        
-        if not columnas:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No se pudieron detectar las columnas del CSV",
-            )
+        delimitador = detectar_delimitador(ruta_temporal, encoding)
         
-        # Leer todas las filas
-        filas = list(csv_reader)
-        
-        if len(filas) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="El CSV está vacío",
-            )
-        
-        # Obtener piezas anteriores para comparar
-        base_anterior = db.query(BaseDesguace).filter(
-            BaseDesguace.entorno_trabajo_id == target_entorno_id
-        ).first()
-        
-        piezas_anteriores = {}
-        fichajes_anteriores = {}  # Guardar fechas de fichaje para preservarlas
-        archivo_origen = None
-        if base_anterior:
-            archivo_origen = base_anterior.nombre_archivo
-            # Guardar piezas anteriores indexadas por refid (o combinación única)
-            for p in base_anterior.piezas:
-                # Usar refid como clave principal, o combinación si no hay refid
-                clave = p.refid or f"{p.oem}_{p.articulo}_{p.marca}_{p.modelo}"
-                if clave:
-                    piezas_anteriores[clave] = p
-                    # Guardar fecha de fichaje si existe
-                    if p.fecha_fichaje or p.usuario_fichaje_id:
-                        fichajes_anteriores[clave] = {
-                            "fecha_fichaje": p.fecha_fichaje,
-                            "usuario_fichaje_id": p.usuario_fichaje_id
-                        }
-        
-        # Crear set de referencias del nuevo CSV
-        nuevas_referencias = set()
-        for fila in filas:
-            # Obtener la referencia según el mapeo
-            ref_columna = mapeo_dict.get("refid", "")
-            if ref_columna and ref_columna in fila:
-                ref_valor = fila[ref_columna].strip() if fila[ref_columna] else None
-                if ref_valor:
-                    nuevas_referencias.add(ref_valor)
+        # Sin errors='replace': el encoding ya se validó con el archivo completo
+        with open(ruta_temporal, 'r', encoding=encoding, newline='') as f:
+            # Parsear CSV en streaming
+            csv_reader = csv.DictReader(f, delimiter=delimitador)
+            columnas = csv_reader.fieldnames
+            
+            if not columnas:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="No se pudieron detectar las columnas del CSV",
+                )
+            
+            primera_fila = next(csv_reader, None)
+            if primera_fila is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="El CSV está vacío",
+                )
+            
+            base_anterior = db.query(BaseDesguace).filter(
+                BaseDesguace.entorno_trabajo_id == target_entorno_id
+            ).first()
+            
+            # Crear/actualizar base de datos
+            if base_anterior:
+                archivo_origen = base_anterior.nombre_archivo
+                base_desguace = base_anterior
             else:
-                # Si se usa formato combinado, extraer OEM de la columna combinada
-                if usar_formato_combinado and columna_combinada in fila:
-                    valor_combinado = fila[columna_combinada].strip() if fila[columna_combinada] else ""
-                    if valor_combinado:
-                        partes = valor_combinado.split("/")
-                        oem = partes[0].strip() if len(partes) >= 1 else ""
-                        art_col = mapeo_dict.get("articulo", "")
-                        marca_col = mapeo_dict.get("marca", "")
-                        modelo_col = mapeo_dict.get("modelo", "")
-                        
-                        art = fila.get(art_col, "").strip() if art_col else ""
-                        marca = fila.get(marca_col, "").strip() if marca_col else ""
-                        modelo = fila.get(modelo_col, "").strip() if modelo_col else ""
-                        
-                        clave = f"{oem}_{art}_{marca}_{modelo}"
-                        if clave != "___":
-                            nuevas_referencias.add(clave)
-                else:
-                    # Si no hay refid ni formato combinado, usar combinación normal
-                    oem_col = mapeo_dict.get("oem", "")
-                    art_col = mapeo_dict.get("articulo", "")
-                    marca_col = mapeo_dict.get("marca", "")
-                    modelo_col = mapeo_dict.get("modelo", "")
-                    
-                    oem = fila.get(oem_col, "").strip() if oem_col else ""
-                    art = fila.get(art_col, "").strip() if art_col else ""
-                    marca = fila.get(marca_col, "").strip() if marca_col else ""
-                    modelo = fila.get(modelo_col, "").strip() if modelo_col else ""
-                    
-                    clave = f"{oem}_{art}_{marca}_{modelo}"
-                    if clave != "___":
-                        nuevas_referencias.add(clave)
-        
-        # Detectar piezas vendidas (estaban antes, ya no están)
-        piezas_vendidas_count = 0
-        for clave, pieza in piezas_anteriores.items():
-            if clave not in nuevas_referencias:
-                # Esta pieza se vendió - guardar en historial
-                pieza_vendida = PiezaVendida(
+                archivo_origen = None
+                base_desguace = BaseDesguace(
                     entorno_trabajo_id=target_entorno_id,
-                    refid=pieza.refid,
-                    oem=pieza.oem,
-                    oe=pieza.oe,
-                    iam=pieza.iam,
-                    precio=pieza.precio,
-                    ubicacion=pieza.ubicacion,
-                    observaciones=pieza.observaciones,
-                    articulo=pieza.articulo,
-                    marca=pieza.marca,
-                    modelo=pieza.modelo,
-                    version=pieza.version,
-                    imagen=pieza.imagen,
-                    archivo_origen=archivo_origen,
-                    fecha_fichaje=pieza.fecha_fichaje,
-                    usuario_fichaje_id=pieza.usuario_fichaje_id,
-                    operario_desmontaje=pieza.operario_desmontaje,
+                    subido_por_id=usuario_actual.id,
                 )
-                db.add(pieza_vendida)
-                piezas_vendidas_count += 1
-        
-        # ============ LÓGICA DE UPSERT: Actualizar existentes o insertar nuevas ============
-        # Crear/actualizar base de datos
-        if base_anterior:
-            # Actualizar metadata de la base existente
-            base_anterior.nombre_archivo = file.filename
-            base_anterior.total_piezas = len(filas)
-            base_anterior.columnas = ",".join(columnas)
-            base_anterior.mapeo_columnas = json.dumps(mapeo_dict)
-            base_anterior.subido_por_id = usuario_actual.id
-            base_anterior.fecha_subida = datetime.now(timezone.utc)
-            base_desguace = base_anterior
+                db.add(base_desguace)
+                db.flush()  # Obtener ID
             
-            # Crear diccionario de piezas anteriores por refid para búsqueda rápida
-            piezas_por_refid = {}
-            for p in base_anterior.piezas:
-                if p.refid:
-                    piezas_por_refid[p.refid.strip().upper()] = p
-        else:
-            # Crear nueva base de datos
-            base_desguace = BaseDesguace(
-                entorno_trabajo_id=target_entorno_id,
-                nombre_archivo=file.filename,
-                total_piezas=len(filas),
-                columnas=",".join(columnas),
-                mapeo_columnas=json.dumps(mapeo_dict),
-                subido_por_id=usuario_actual.id,
+            # Insertar/actualizar por lotes y mover a vendidas lo que ya no está
+            resultado = procesar_csv_desguace(
+                db,
+                base_desguace.id,
+                target_entorno_id,
+                chain([primera_fila], csv_reader),
+                mapeo_dict,
+                columna_combinada if usar_formato_combinado else None,
+                archivo_origen,
             )
-            db.add(base_desguace)
-            db.flush()  # Obtener ID
-            piezas_por_refid = {}
         
-        # Procesar piezas: actualizar existentes o insertar nuevas
-        piezas_insertadas = 0
-        piezas_actualizadas = 0
-        refids_procesados = set()  # Para eliminar piezas que ya no están
-        
-        for fila in filas:
-            try:
-                pieza_data = {}
-                
-                # Si se usa formato combinado, procesar primero la columna combinada
-                if usar_formato_combinado and columna_combinada in fila:
-                    valor_combinado = fila[columna_combinada].strip() if fila[columna_combinada] else ""
-                    if valor_combinado:
-                        # Separar por "/" para obtener OEM/OE/IAM
-                        partes = valor_combinado.split("/")
-                        if len(partes) >= 1:
-                            pieza_data["oem"] = partes[0].strip() if partes[0].strip() else None
-                        if len(partes) >= 2:
-                            pieza_data["oe"] = partes[1].strip() if partes[1].strip() else None
-                        if len(partes) >= 3:
-                            # IAM puede tener múltiples valores separados por coma o más "/"
-                            # Unimos todo lo que queda después del segundo "/"
-                            iam_completo = "/".join(partes[2:]).strip()
-                            pieza_data["iam"] = iam_completo if iam_completo else None
-                
-                # Aplicar mapeo normal para los demás campos
-                for campo, columna_csv in mapeo_dict.items():
-                    # Si usamos formato combinado, NO sobrescribir oem, oe, iam
-                    if usar_formato_combinado and campo in ["oem", "oe", "iam"]:
-                        continue
-                    
-                    if columna_csv and columna_csv in fila:
-                        valor = fila[columna_csv].strip() if fila[columna_csv] else None
-                        
-                        # Convertir precio a float
-                        if campo == "precio" and valor:
-                            try:
-                                valor = float(valor.replace(',', '.').replace('€', '').replace('$', '').strip())
-                            except:
-                                valor = None
-                        
-                        pieza_data[campo] = valor
-                
-                # Obtener refid para buscar si existe
-                refid = pieza_data.get("refid")
-                if not refid:
-                    # Sin refid, no podemos hacer upsert - insertar como nueva
-                    pieza_data["base_desguace_id"] = base_desguace.id
-                    # Preservar fichaje si existe
-                    clave_pieza = f"{pieza_data.get('oem', '')}_{pieza_data.get('articulo', '')}_{pieza_data.get('marca', '')}_{pieza_data.get('modelo', '')}"
-                    if clave_pieza in fichajes_anteriores:
-                        pieza_data["fecha_fichaje"] = fichajes_anteriores[clave_pieza]["fecha_fichaje"]
-                        pieza_data["usuario_fichaje_id"] = fichajes_anteriores[clave_pieza]["usuario_fichaje_id"]
-                    pieza = PiezaDesguace(**pieza_data)
-                    db.add(pieza)
-                    piezas_insertadas += 1
-                    continue
-                
-                refid_upper = refid.strip().upper()
-                refids_procesados.add(refid_upper)
-                
-                # Buscar si ya existe
-                pieza_existente = piezas_por_refid.get(refid_upper)
-                
-                if pieza_existente:
-                    # ACTUALIZAR pieza existente - solo campos que cambiaron
-                    campos_actualizables = ["oem", "oe", "iam", "precio", "ubicacion", 
-                                           "observaciones", "articulo", "marca", "modelo", 
-                                           "version", "imagen"]
-                    hubo_cambios = False
-                    for campo in campos_actualizables:
-                        nuevo_valor = pieza_data.get(campo)
-                        valor_actual = getattr(pieza_existente, campo, None)
-                        if nuevo_valor != valor_actual:
-                            setattr(pieza_existente, campo, nuevo_valor)
-                            hubo_cambios = True
-                    
-                    if hubo_cambios:
-                        piezas_actualizadas += 1
-                else:
-                    # INSERTAR nueva pieza
-                    pieza_data["base_desguace_id"] = base_desguace.id
-                    # Preservar fichaje si existe
-                    if refid in fichajes_anteriores:
-                        pieza_data["fecha_fichaje"] = fichajes_anteriores[refid]["fecha_fichaje"]
-                        pieza_data["usuario_fichaje_id"] = fichajes_anteriores[refid]["usuario_fichaje_id"]
-                    pieza = PiezaDesguace(**pieza_data)
-                    db.add(pieza)
-                    piezas_insertadas += 1
-                
-            except Exception as e:
-                logger.warning(f"Error procesando fila: {e}")
-                continue
-        
-        # Eliminar piezas que ya no están en el CSV (ya fueron movidas a vendidas arriba)
+        # Actualizar metadata de la base
+        base_desguace.nombre_archivo = file.filename
+        base_desguace.total_piezas = resultado["filas"]
+        base_desguace.columnas = ",".join(columnas)
+        base_desguace.mapeo_columnas = json.dumps(mapeo_dict)
+        base_desguace.subido_por_id = usuario_actual.id
         if base_anterior:
-            for clave, pieza in piezas_anteriores.items():
-                if clave not in nuevas_referencias:
-                    db.delete(pieza)
-        
-        # ============ VERIFICAR FICHADAS Y GUARDAR EN TABLA SEPARADA ============
-        # Buscar TODAS las fichadas de este entorno (no solo las pendientes)
-        todas_fichadas = db.query(FichadaPieza).filter(
-            FichadaPieza.entorno_trabajo_id == target_entorno_id
-        ).all()
-        
-        # Crear set de REFIDS reales de las piezas recién cargadas para verificación
-        # (En lugar de usar nuevas_referencias que puede tener claves compuestas)
-        refids_en_stock = set()
-        for pieza in db.query(PiezaDesguace).filter(PiezaDesguace.base_desguace_id == base_desguace.id).all():
-            if pieza.refid:
-                refids_en_stock.add(pieza.refid.strip().upper())
-        
-        # Crear set de REFIDS de piezas que alguna vez existieron (vendidas)
-        refids_vendidas = set()
-        for vendida in db.query(PiezaVendida).filter(PiezaVendida.entorno_trabajo_id == target_entorno_id).all():
-            if vendida.refid:
-                refids_vendidas.add(vendida.refid.strip().upper())
-        
-        # Crear diccionario de fichadas por refid para actualizar piezas
-        fichadas_por_refid = {}
-        for fichada in todas_fichadas:
-            refid_upper = fichada.id_pieza.strip().upper()
-            # Guardar la fichada más reciente si hay múltiples
-            if refid_upper not in fichadas_por_refid or fichada.fecha_fichada > fichadas_por_refid[refid_upper].fecha_fichada:
-                fichadas_por_refid[refid_upper] = fichada
-        
-        fichadas_verificadas = 0
-        fichadas_encontradas = 0
-        
-        for fichada in todas_fichadas:
-            refid_fichada = fichada.id_pieza.strip().upper()
-            # Buscar si la pieza está en stock ACTUAL o si alguna vez estuvo (vendida)
-            # Si alguna vez estuvo en la base, se considera "encontrada"
-            pieza_encontrada = refid_fichada in refids_en_stock or refid_fichada in refids_vendidas
-            
-            # Crear registro de verificación en tabla separada
-            verificacion = VerificacionFichada(
-                fichada_id=fichada.id,
-                usuario_id=fichada.usuario_id,
-                entorno_trabajo_id=fichada.entorno_trabajo_id,
-                id_pieza=fichada.id_pieza,
-                hora_fichada=fichada.fecha_fichada,
-                en_stock=pieza_encontrada,
-            )
-            db.add(verificacion)
-            
-            fichadas_verificadas += 1
-            if pieza_encontrada:
-                fichadas_encontradas += 1
-        
-        # ============ ACTUALIZAR PIEZAS CON DATOS DE FICHAJE ============
-        # Buscar piezas que coincidan con fichadas y actualizar fecha_fichaje y usuario_fichaje_id
-        piezas_actualizadas_fichaje = 0
-        for pieza in db.query(PiezaDesguace).filter(PiezaDesguace.base_desguace_id == base_desguace.id).all():
-            if pieza.refid:
-                refid_upper = pieza.refid.strip().upper()
-                if refid_upper in fichadas_por_refid:
-                    fichada = fichadas_por_refid[refid_upper]
-                    pieza.fecha_fichaje = fichada.fecha_fichada
-                    pieza.usuario_fichaje_id = fichada.usuario_id
-                    piezas_actualizadas_fichaje += 1
+            base_desguace.fecha_subida = datetime.now(timezone.utc)
         
         db.commit()
         
-        logger.info(f"Base de desguace subida: {file.filename} ({piezas_insertadas} nuevas, {piezas_actualizadas} actualizadas, {piezas_vendidas_count} vendidas, {fichadas_verificadas} fichadas verificadas, {fichadas_encontradas} encontradas, {piezas_actualizadas_fichaje} con datos de fichaje) por {usuario_actual.email}" + (f" [Formato combinado: {columna_combinada}]" if usar_formato_combinado else ""))
+        duracion = time.perf_counter() - inicio
+        filas_por_segundo = round(resultado["filas"] / duracion) if duracion > 0 else None
+        
+        logger.info(f"Base de desguace subida: {file.filename} ({resultado['filas']} filas en {duracion:.1f}s, {resultado['insertadas']} nuevas, {resultado['actualizadas']} actualizadas, {resultado['vendidas']} vendidas, {resultado['fichadas_verificadas']} fichadas verificadas, {resultado['fichadas_encontradas']} encontradas, {resultado['piezas_con_fichaje']} con datos de fichaje) por {usuario_actual.email}" + (f" [Formato combinado: {columna_combinada}]" if usar_formato_combinado else ""))
         
         return {
             "message": "Base de datos subida correctamente",
             "archivo": file.filename,
-            "piezas_insertadas": piezas_insertadas,
-            "piezas_actualizadas": piezas_actualizadas,
-            "piezas_vendidas": piezas_vendidas_count,
-            "fichadas_verificadas": fichadas_verificadas,
-            "fichadas_encontradas": fichadas_encontradas,
+            "piezas_insertadas": resultado["insertadas"],
+            "piezas_actualizadas": resultado["actualizadas"],
+            "piezas_sin_cambios": resultado["sin_cambios"],
+            "piezas_vendidas": resultado["vendidas"],
+            "fichadas_verificadas": resultado["fichadas_verificadas"],
+            "fichadas_encontradas": resultado["fichadas_encontradas"],
             "columnas_csv": list(columnas),
             "mapeo_aplicado": mapeo_dict,
             "formato_combinado": usar_formato_combinado,
             "columna_combinada": columna_combinada if usar_formato_combinado else None,
             "entorno": entorno.nombre,
+            "filas_procesadas": resultado["filas"],
+            "tamano_mb": round(tamano_bytes / 1024 / 1024, 2),
+            "encoding": encoding,
+            "duracion_segundos": round(duracion, 2),
+            "filas_por_segundo": filas_por_segundo,
         }
         
     except HTTPException:
@@ -638,10 +410,13 @@ async def subir_base_desguace(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al procesar el archivo: {str(e)}",
         )
+    finally:
+        if ruta_temporal and os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
 
 
 @router.get("/info")
-async def obtener_info_base(
+def obtener_info_base(
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
@@ -696,7 +471,7 @@ async def obtener_info_base(
 
 
 @router.delete("/eliminar")
-async def eliminar_base_desguace(
+def eliminar_base_desguace(
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_admin_or_higher)
@@ -726,6 +501,9 @@ async def eliminar_base_desguace(
             )
         
         nombre = base.nombre_archivo
+        db.query(ReferenciaPieza).filter(
+            ReferenciaPieza.entorno_trabajo_id == target_entorno_id
+        ).delete(synchronize_session=False)
         db.delete(base)
         db.commit()
         
@@ -745,7 +523,7 @@ async def eliminar_base_desguace(
 
 
 @router.get("/buscar")
-async def buscar_pieza(
+def buscar_pieza(
     referencia: str,
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -770,13 +548,10 @@ async def buscar_pieza(
         if not base:
             return {"encontrado": False, "mensaje": "No hay base de datos cargada"}
         
-        # Buscar pieza por refid, oem, oe o iam
+        # Buscar pieza por refid, oem, oe o iam (índice de referencias: igualdad o prefijo)
         piezas = db.query(PiezaDesguace).filter(
             PiezaDesguace.base_desguace_id == base.id,
-            (PiezaDesguace.refid.ilike(f"%{referencia}%")) |
-            (PiezaDesguace.oem.ilike(f"%{referencia}%")) |
-            (PiezaDesguace.oe.ilike(f"%{referencia}%")) |
-            (PiezaDesguace.iam.ilike(f"%{referencia}%"))
+            PiezaDesguace.id.in_(select_piezas_por_referencia(referencia, target_entorno_id, prefijo=True))
         ).limit(50).all()
         
         if not piezas:
@@ -818,17 +593,23 @@ async def buscar_pieza(
 # ============== HISTORIAL DE VENTAS ==============
 
 @router.get("/ventas")
-async def obtener_ventas(
+def obtener_ventas(
     entorno_id: Optional[int] = None,
     busqueda: Optional[str] = None,
     fecha_desde: Optional[str] = None,
     fecha_hasta: Optional[str] = None,
-    limit: int = 100,
-    offset: int = 0,
+    limit: int = Query(100, ge=1),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    modo_total: str = Query("exacto", pattern="^(exacto|estimado|ninguno)$"),
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
 ):
-    """Obtener historial de piezas vendidas con búsqueda opcional"""
+    """
+    Obtener historial de piezas vendidas con búsqueda opcional.
+    Paginación por offset (clientes antiguos) o por cursor: pasar el
+    siguiente_cursor de la respuesta anterior.
+    """
     try:
         from datetime import datetime
         from sqlalchemy import or_
@@ -847,8 +628,14 @@ async def obtener_ventas(
             PiezaVendida.entorno_trabajo_id == target_entorno_id
         )
         
-        # Filtro por búsqueda (refid, oem, oe, iam, articulo)
-        if busqueda and busqueda.strip():
+        # Filtro por búsqueda (refid, oem, oe, iam, articulo, marca, modelo)
+        orden = None
+        busqueda_texto = aplicar_busqueda_texto(db, query, PiezaVendida, busqueda) if busqueda and busqueda.strip() else None
+        if busqueda_texto:
+            # Índice de texto: filtra y ordena por relevancia
+            query, orden = busqueda_texto
+            orden.insert(-1, PiezaVendida.fecha_venta.desc())
+        elif busqueda and busqueda.strip():
             termino = f"%{busqueda.strip()}%"
             query = query.filter(
                 or_(
@@ -880,17 +667,21 @@ async def obtener_ventas(
             except:
                 pass
         
-        # Contar total y sumar valor
-        total = query.count()
-        
         # Calcular valor total de todas las piezas filtradas (no solo la página)
-        from sqlalchemy import func
-        valor_total = db.query(func.sum(PiezaVendida.precio)).filter(
-            PiezaVendida.id.in_(query.with_entities(PiezaVendida.id).subquery())
-        ).scalar() or 0
-        
-        # Ordenar por fecha de venta (más recientes primero) y paginar
-        ventas = query.order_by(PiezaVendida.fecha_venta.desc()).offset(offset).limit(limit).all()
+        def valor_filtrado():
+            valor = db.query(func.sum(PiezaVendida.precio)).filter(
+                PiezaVendida.id.in_(query.with_entities(PiezaVendida.id).subquery())
+            ).scalar() or 0
+            return {"valor_total": float(valor)}
+        
+        # Más recientes primero; total y valor se calculan solo en la primera página
+        pagina = paginar(
+            query, [PiezaVendida.fecha_venta, PiezaVendida.id], limit,
+            offset=offset, cursor=cursor, orden=orden, modo_total=modo_total,
+            huella=huella_filtros(target_entorno_id, busqueda, fecha_desde, fecha_hasta),
+            calcular_extras=valor_filtrado,
+        )
+        ventas = pagina.filas
         
         # Obtener información de usuarios que ficharon
         usuarios_fichaje = {}
@@ -933,12 +724,16 @@ async def obtener_ventas(
         
         return {
             "ventas": resultados,
-            "total": total,
-            "valor_total": float(valor_total) if valor_total else 0,
+            "total": pagina.total,
+            "total_estimado": pagina.total_estimado,
+            "valor_total": pagina.extras.get("valor_total", 0),
             "limit": limit,
             "offset": offset,
+            "siguiente_cursor": pagina.siguiente_cursor,
         }
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error obteniendo ventas: {e}")
         raise HTTPException(
@@ -948,7 +743,7 @@ async def obtener_ventas(
 
 
 @router.get("/ventas/resumen")
-async def resumen_ventas(
+def resumen_ventas(
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
@@ -1025,7 +820,7 @@ async def resumen_ventas(
 
 
 @router.delete("/ventas/{venta_id}")
-async def eliminar_venta(
+def eliminar_venta(
     venta_id: int,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_admin_or_higher)
@@ -1066,15 +861,21 @@ async def eliminar_venta(
 # ============== STOCK (PIEZAS EN INVENTARIO) ==============
 
 @router.get("/stock")
-async def obtener_stock(
+def obtener_stock(
     entorno_id: Optional[int] = None,
     busqueda: Optional[str] = None,
-    limit: int = 100,
-    offset: int = 0,
+    limit: int = Query(100, ge=1),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    modo_total: str = Query("exacto", pattern="^(exacto|estimado|ninguno)$"),
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
 ):
-    """Obtener piezas en stock con búsqueda opcional"""
+    """
+    Obtener piezas en stock con búsqueda opcional.
+    Paginación por offset (clientes antiguos) o por cursor: pasar el
+    siguiente_cursor de la respuesta anterior.
+    """
     try:
         from sqlalchemy import or_
         
@@ -1106,8 +907,22 @@ async def obtener_stock(
         )
         
         # Filtro por búsqueda (refid, oem, oe, iam, articulo, marca, modelo, usuario_fichaje)
+        orden = None
+        busqueda_texto = None
         if busqueda and busqueda.strip():
             termino = f"%{busqueda.strip()}%"
+            # Usuarios cuyo nombre/email coincide (tabla pequeña): sus fichajes también cuentan
+            ids_usuarios = [u.id for u in db.query(Usuario.id).filter(
+                or_(Usuario.nombre.ilike(termino), Usuario.email.ilike(termino))
+            )]
+            busqueda_texto = aplicar_busqueda_texto(
+                db, query, PiezaDesguace, busqueda,
+                alternativas=(PiezaDesguace.usuario_fichaje_id.in_(ids_usuarios),) if ids_usuarios else (),
+            )
+        if busqueda_texto:
+            # Índice de texto: filtra y ordena por relevancia
+            query, orden = busqueda_texto
+        elif busqueda and busqueda.strip():
             query = query.filter(
                 or_(
                     PiezaDesguace.refid.ilike(termino),
@@ -1122,11 +937,13 @@ async def obtener_stock(
                 )
             )
         
-        # Contar total
-        total = query.count()
-        
-        # Ordenar y paginar
-        piezas = query.order_by(PiezaDesguace.id.desc()).offset(offset).limit(limit).all()
+        # Más recientes primero (o por relevancia); el total solo en la primera página
+        pagina = paginar(
+            query, [PiezaDesguace.id], limit,
+            offset=offset, cursor=cursor, orden=orden, modo_total=modo_total,
+            huella=huella_filtros(base.id, busqueda),
+        )
+        piezas = pagina.filas
         
         # Obtener información de usuarios que ficharon
         usuarios_fichaje = {}
@@ -1159,11 +976,15 @@ async def obtener_stock(
         
         return {
             "piezas": resultados,
-            "total": total,
+            "total": pagina.total,
+            "total_estimado": pagina.total_estimado,
             "limit": limit,
             "offset": offset,
+            "siguiente_cursor": pagina.siguiente_cursor,
         }
         
+    except CursorInvalido as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error obteniendo stock: {e}")
         raise HTTPException(
@@ -1173,7 +994,7 @@ async def obtener_stock(
 
 
 @router.get("/stock/buscar-pieza/{refid}")
-async def buscar_pieza_por_refid(
+def buscar_pieza_por_refid(
     refid: str,
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -1279,7 +1100,7 @@ async def buscar_pieza_por_refid(
 
 
 @router.get("/stock/resumen")
-async def resumen_stock(
+def resumen_stock(
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
@@ -1364,7 +1185,7 @@ async def resumen_stock(
 # ============== ESTUDIO COCHES ==============
 
 @router.get("/estudio-coches")
-async def obtener_estudio_coches(
+def obtener_estudio_coches(
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
@@ -1498,7 +1319,7 @@ async def obtener_estudio_coches(
         )
 
 @router.get("/estudio-coches/marcas")
-async def obtener_marcas_estudio(
+def obtener_marcas_estudio(
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
@@ -1526,7 +1347,7 @@ async def obtener_marcas_estudio(
 
 
 @router.get("/estudio-coches/modelos")
-async def obtener_modelos_estudio(
+def obtener_modelos_estudio(
     marca: str,
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -1556,7 +1377,7 @@ async def obtener_modelos_estudio(
 
 
 @router.get("/estudio-coches/versiones")
-async def obtener_versiones_estudio(
+def obtener_versiones_estudio(
     marca: str,
     modelo: str,
     entorno_id: Optional[int] = None,
@@ -1588,7 +1409,7 @@ async def obtener_versiones_estudio(
 
 
 @router.get("/estudio-coches/piezas")
-async def obtener_piezas_estudio(
+def obtener_piezas_estudio(
     marca: str,
     modelo: str,
     version: Optional[str] = None,
@@ -1794,16 +1615,48 @@ async def obtener_piezas_estudio(
     return {"piezas": piezas, "resumen": resumen}
 
 
+# Precios por OEM pedidos a Ecooparts (misma cantidad que /precios/buscar: comparten caché)
+ESTUDIO_CANTIDAD_PRECIOS = 20
+
+
+def _precio_mercado_oem(oem: str) -> Optional[float]:
+    """Precio medio de mercado de un OEM en Ecooparts (capa de scraping compartida)"""
+    resultado = scrape_platform("ecooparts", oem, ESTUDIO_CANTIDAD_PRECIOS)
+    if resultado.get("error"):
+        raise RuntimeError(resultado["error"])
+    if not resultado["precios"]:
+        return None
+    resumen = summarize(resultado["precios"], remove_outliers=True)
+    return resumen.get('media') or None
+
+
+def _obtener_estudio(trabajo_id: str, usuario_actual: Usuario) -> TrabajoEstudio:
+    if usuario_actual.rol not in ['admin', 'owner', 'sysowner']:
+        raise HTTPException(status_code=403, detail="Sin permisos")
+    trabajo = get_gestor_estudios().obtener(trabajo_id)
+    if not trabajo or (usuario_actual.rol != "sysowner" and trabajo.entorno_id != usuario_actual.entorno_trabajo_id):
+        raise HTTPException(status_code=404, detail="Estudio no encontrado o caducado")
+    return trabajo
+
+
 @router.post("/estudio-coches/buscar-precios")
-async def buscar_precios_mercado(
+def buscar_precios_mercado(
     marca: str,
     modelo: str,
     version: Optional[str] = None,
     entorno_id: Optional[int] = None,
+    forzar: bool = Query(False, description="Volver a buscar todos los OEM aunque haya un estudio reciente"),
     db: Session = Depends(get_db),
     usuario_actual: Usuario = Depends(get_current_user)
 ):
-    """Buscar precios en internet para las piezas de un vehículo."""
+    """
+    Buscar precios en internet para las piezas de un vehículo.
+    
+    Lanza la búsqueda en segundo plano y devuelve el estado del trabajo con las
+    piezas (trabajo_id, estado, piezas, resumen, piezas_actualizadas). Si el
+    modelo se estudió hace poco vuelve ya completado. El progreso se sigue en
+    /estudio-coches/trabajos/{trabajo_id} o en .../eventos (SSE).
+    """
     if usuario_actual.rol not in ['admin', 'owner', 'sysowner']:
         raise HTTPException(status_code=403, detail="Sin permisos")
     
@@ -1815,8 +1668,6 @@ async def buscar_precios_mercado(
     if not base:
         return {"piezas": [], "resumen": None, "piezas_actualizadas": 0}
     
-    from sqlalchemy import func
-    
     # Query de piezas
     query = db.query(PiezaDesguace).filter(
         PiezaDesguace.base_desguace_id == base.id,
@@ -1839,96 +1690,95 @@ async def buscar_precios_mercado(
     
     vendidas_refids = set([v[0] for v in query_vendidas.all()])
     
-    # Intentar buscar precios en internet usando los scrapers
-    piezas_actualizadas = 0
     piezas = []
     valor_stock = 0.0
-    valor_mercado = 0.0
     piezas_fichadas = 0
     piezas_con_precio = 0
     
-    try:
-        from core.scraper_factory import ScraperFactory
-        factory = ScraperFactory()
-        scraper = factory.get_scraper("ecooparts")  # Usar ecooparts por defecto
+    for p in piezas_db:
+        precio_val = None
+        if p.precio:
+            try:
+                precio_val = float(p.precio)
+                valor_stock += precio_val
+                piezas_con_precio += 1
+            except:
+                pass
         
-        for p in piezas_db:
-            precio_val = None
-            precio_mercado_val = None
-            
-            if p.precio:
-                try:
-                    precio_val = float(p.precio)
-                    valor_stock += precio_val
-                    piezas_con_precio += 1
-                except:
-                    pass
-            
-            fichada = p.fecha_fichaje is not None
-            if fichada:
-                piezas_fichadas += 1
-            
-            # Buscar precio de mercado si tiene OEM
-            if p.oem and scraper:
-                try:
-                    resultados = scraper.search(p.oem)
-                    if resultados and len(resultados) > 0:
-                        # Tomar el precio promedio de los primeros 5 resultados
-                        precios = [r.get('precio', 0) for r in resultados[:5] if r.get('precio')]
-                        if precios:
-                            precio_mercado_val = sum(precios) / len(precios)
-                            valor_mercado += precio_mercado_val
-                            piezas_actualizadas += 1
-                except Exception as e:
-                    logger.debug(f"Error buscando precio para OEM {p.oem}: {e}")
-            
-            piezas.append({
-                "id": p.id,
-                "refid": p.refid,
-                "oem": p.oem,
-                "articulo": p.articulo,
-                "precio": precio_val,
-                "precio_mercado": round(precio_mercado_val, 2) if precio_mercado_val else None,
-                "imagen": p.imagen,
-                "ubicacion": p.ubicacion,
-                "fichada": fichada
-            })
-    except Exception as e:
-        logger.error(f"Error buscando precios de mercado: {e}")
-        # Si falla el scraper, devolver las piezas sin precios de mercado
-        for p in piezas_db:
-            precio_val = None
-            if p.precio:
-                try:
-                    precio_val = float(p.precio)
-                    valor_stock += precio_val
-                    piezas_con_precio += 1
-                except:
-                    pass
-            
-            fichada = p.fecha_fichaje is not None
-            if fichada:
-                piezas_fichadas += 1
-            
-            piezas.append({
-                "id": p.id,
-                "refid": p.refid,
-                "oem": p.oem,
-                "articulo": p.articulo,
-                "precio": precio_val,
-                "precio_mercado": None,
-                "imagen": p.imagen,
-                "ubicacion": p.ubicacion,
-                "fichada": fichada
-            })
+        fichada = p.fecha_fichaje is not None
+        if fichada:
+            piezas_fichadas += 1
+        
+        piezas.append({
+            "id": p.id,
+            "refid": p.refid,
+            "oem": p.oem,
+            "articulo": p.articulo,
+            "precio": precio_val,
+            "precio_mercado": None,
+            "imagen": p.imagen,
+            "ubicacion": p.ubicacion,
+            "fichada": fichada
+        })
     
-    resumen = {
+    resumen_base = {
         "total_piezas": len(piezas_db),
         "piezas_con_precio": piezas_con_precio,
         "piezas_fichadas": piezas_fichadas,
         "piezas_vendidas": len(vendidas_refids),
         "valor_stock": round(valor_stock, 2),
-        "valor_mercado": round(valor_mercado, 2) if valor_mercado > 0 else None
     }
     
-    return {"piezas": piezas, "resumen": resumen, "piezas_actualizadas": piezas_actualizadas}
\ No newline at end of file
+    trabajo = get_gestor_estudios().iniciar(
+        (target_entorno_id, marca, modelo, version or None),
+        piezas, resumen_base, _precio_mercado_oem, forzar=forzar,
+    )
+    return trabajo.resultado()
+
+
+@router.get("/estudio-coches/trabajos/{trabajo_id}")
+def obtener_estudio_precios(
+    trabajo_id: str,
+    usuario_actual: Usuario = Depends(get_current_user)
+):
+    """Estado de una búsqueda de precios del estudio con las piezas y precios obtenidos hasta ahora."""
+    return _obtener_estudio(trabajo_id, usuario_actual).resultado()
+
+
+@router.get("/estudio-coches/trabajos/{trabajo_id}/eventos")
+def eventos_estudio_precios(
+    trabajo_id: str,
+    request: Request,
+    usuario_actual: Usuario = Depends(get_current_user)
+):
+    """
+    Progreso de una búsqueda de precios del estudio por Server-Sent Events.
+    Eventos: "progreso" (búsquedas hechas y piezas con precio nuevo) y "fin"
+    con el resultado completo.
+    """
+    trabajo = _obtener_estudio(trabajo_id, usuario_actual)
+    
+    async def generar():
+        desde = 0
+        visto = None
+        while True:
+            progreso, desde = trabajo.progreso(desde)
+            if progreso["piezas"] or (progreso["estado"], progreso["busquedas_hechas"]) != visto:
+                visto = (progreso["estado"], progreso["busquedas_hechas"])
+                yield f"event: progreso\ndata: {json.dumps(progreso, ensure_ascii=False)}\n\n"
+            if progreso["estado"] in (ESTUDIO_COMPLETADO, ESTUDIO_ERROR):
+                yield f"event: fin\ndata: {json.dumps(trabajo.resultado(), ensure_ascii=False)}\n\n"
+                return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(settings.cola_intervalo_eventos_segundos)
+    
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -238,7 +238,7 @@ def _get_datos_pieza(db: Session, entorno_id: int, id_pieza: str) -> dict:
 # ============== ENDPOINTS ==============
 
 @router.get("/resumen-equipo", response_model=ResumenEquipoResponse)
-async def obtener_resumen_equipo(
+def obtener_resumen_equipo(
     fecha: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -282,7 +282,7 @@ async def obtener_resumen_equipo(
 
 
 @router.post("/registrar", response_model=DespieceResponse)
-async def registrar_despiece(
+def registrar_despiece(
     datos: DespieceCreate,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -325,7 +325,7 @@ async def registrar_despiece(
 
 
 @router.get("/resumen-dia", response_model=ResumenDiaResponse)
-async def obtener_resumen_dia(
+def obtener_resumen_dia(
     fecha: Optional[str] = None,
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -382,7 +382,7 @@ async def obtener_resumen_dia(
 
 
 @router.get("/detalle-usuario/{usuario_id}", response_model=DetalleUsuarioResponse)
-async def obtener_detalle_usuario(
+def obtener_detalle_usuario(
     usuario_id: int,
     fecha: Optional[str] = None,
     entorno_id: Optional[int] = None,
@@ -480,7 +480,7 @@ async def obtener_detalle_usuario(
 
 
 @router.get("/mis-registros", response_model=List[DespieceResponse])
-async def obtener_mis_registros(
+def obtener_mis_registros(
     fecha: Optional[str] = None,
     limite: int = 5000,
     db: Session = Depends(get_db),
@@ -529,7 +529,7 @@ async def obtener_mis_registros(
 
 
 @router.delete("/borrar/{registro_id}", response_model=DeleteResponse)
-async def borrar_registro(
+def borrar_registro(
     registro_id: int,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -565,7 +565,7 @@ async def borrar_registro(
 
 
 @router.patch("/comentario/{registro_id}", response_model=ActualizarComentarioResponse)
-async def actualizar_comentario(
+def actualizar_comentario(
     registro_id: int,
     datos: ActualizarComentarioRequest,
     db: Session = Depends(get_db),
@@ -599,7 +599,7 @@ async def actualizar_comentario(
 
 
 @router.patch("/descripcion/{registro_id}", response_model=ActualizarDescripcionResponse)
-async def actualizar_descripcion(
+def actualizar_descripcion(
     registro_id: int,
     datos: ActualizarDescripcionRequest,
     db: Session = Depends(get_db),
@@ -633,7 +633,7 @@ async def actualizar_descripcion(
 
 
 @router.get("/informe-rendimiento/{usuario_id}", response_model=InformeRendimiento)
-async def obtener_informe_rendimiento(
+def obtener_informe_rendimiento(
     usuario_id: int,
     tipo: str = "semana",
     cantidad: int = 8,
@@ -762,7 +762,7 @@ async def obtener_informe_rendimiento(
 
 
 @router.get("/semanas-disponibles/{usuario_id}", response_model=SemanasDisponibles)
-async def obtener_semanas_disponibles(
+def obtener_semanas_disponibles(
     usuario_id: int,
     cantidad: int = 12,
     entorno_id: Optional[int] = None,
@@ -795,7 +795,7 @@ async def obtener_semanas_disponibles(
 
 
 @router.get("/detalle-semana/{usuario_id}", response_model=DetalleSemana)
-async def obtener_detalle_semana(
+def obtener_detalle_semana(
     usuario_id: int,
     semana: str,
     entorno_id: Optional[int] = None,
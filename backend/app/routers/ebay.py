@@ -17,7 +17,7 @@ VERIFICATION_TOKEN = "desguapro_ebay_verify_2026_for_delivery_method"
 
 
 @router.get("/account-deletion")
-async def ebay_account_deletion_challenge(
+def ebay_account_deletion_challenge(
     challenge_code: Optional[str] = None
 ):
     """
@@ -87,7 +87,7 @@ class ResumenEquipoResponse(BaseModel):
 
 # ============== ENDPOINTS ==============
 @router.get("/resumen-equipo", response_model=ResumenEquipoResponse)
-async def obtener_resumen_equipo(
+def obtener_resumen_equipo(
     fecha: Optional[str] = None,  # Formato: YYYY-MM-DD
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -138,7 +138,7 @@ async def obtener_resumen_equipo(
 
 
 @router.post("/registrar", response_model=FichadaResponse)
-async def registrar_fichada(
+def registrar_fichada(
     fichada: FichadaCreate,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -207,7 +207,7 @@ async def registrar_fichada(
 
 
 @router.get("/resumen-dia", response_model=ResumenDiaResponse)
-async def obtener_resumen_dia(
+def obtener_resumen_dia(
     fecha: Optional[str] = None,  # Formato: YYYY-MM-DD
     entorno_id: Optional[int] = None,  # Solo sysowner puede usar otro entorno
     db: Session = Depends(get_db),
@@ -294,7 +294,7 @@ def calcular_color_tiempo(minutos: Optional[int]) -> str:
 
 
 @router.get("/detalle-usuario/{usuario_id}", response_model=DetalleFichadasUsuario)
-async def obtener_detalle_usuario(
+def obtener_detalle_usuario(
     usuario_id: int,
     fecha: Optional[str] = None,
     entorno_id: Optional[int] = None,  # Solo sysowner puede usar otro entorno
@@ -456,7 +456,7 @@ async def obtener_detalle_usuario(
 
 
 @router.get("/mis-fichadas", response_model=List[FichadaResponse])
-async def obtener_mis_fichadas(
+def obtener_mis_fichadas(
     fecha: Optional[str] = None,
     limite: int = 5000,
     db: Session = Depends(get_db),
@@ -530,7 +530,7 @@ class DeleteFichadaResponse(BaseModel):
 
 
 @router.delete("/borrar/{fichada_id}", response_model=DeleteFichadaResponse)
-async def borrar_fichada(
+def borrar_fichada(
     fichada_id: int,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -602,7 +602,7 @@ class ActualizarDescripcionResponse(BaseModel):
 
 
 @router.patch("/descripcion/{fichada_id}", response_model=ActualizarDescripcionResponse)
-async def actualizar_descripcion(
+def actualizar_descripcion(
     fichada_id: int,
     datos: ActualizarDescripcionRequest,
     db: Session = Depends(get_db),
@@ -660,7 +660,7 @@ class ActualizarComentarioResponse(BaseModel):
 
 
 @router.patch("/comentario/{fichada_id}", response_model=ActualizarComentarioResponse)
-async def actualizar_comentario(
+def actualizar_comentario(
     fichada_id: int,
     datos: ActualizarComentarioRequest,
     db: Session = Depends(get_db),
@@ -728,7 +728,7 @@ class HistorialVerificacionesUsuario(BaseModel):
 
 
 @router.get("/verificaciones/{usuario_id}", response_model=HistorialVerificacionesUsuario)
-async def obtener_verificaciones_usuario(
+def obtener_verificaciones_usuario(
     usuario_id: int,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -797,7 +797,7 @@ class InformeRendimiento(BaseModel):
 
 
 @router.get("/informe-rendimiento/{usuario_id}", response_model=InformeRendimiento)
-async def obtener_informe_rendimiento(
+def obtener_informe_rendimiento(
     usuario_id: int,
     tipo: str = "semana",  # "semana" o "mes"
     cantidad: int = 8,      # últimas N semanas/meses
@@ -993,7 +993,7 @@ class SemanasDisponibles(BaseModel):
 
 
 @router.get("/semanas-disponibles/{usuario_id}", response_model=SemanasDisponibles)
-async def obtener_semanas_disponibles(
+def obtener_semanas_disponibles(
     usuario_id: int,
     cantidad: int = 12,
     entorno_id: Optional[int] = None,
@@ -1025,7 +1025,7 @@ async def obtener_semanas_disponibles(
 
 
 @router.get("/detalle-semana/{usuario_id}", response_model=DetalleSemana)
-async def obtener_detalle_semana(
+def obtener_detalle_semana(
     usuario_id: int,
     semana: str,  # Formato: "2026-W04" o fecha "2026-01-20"
     entorno_id: Optional[int] = None,
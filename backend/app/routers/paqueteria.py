@@ -80,7 +80,7 @@ def _get_or_create_stock_sucursal(db: Session, tipo_caja_id: int, sucursal_id: i
 # ============== SUCURSALES CRUD ==============
 
 @router.get("/sucursales", response_model=list[SucursalPaqueteriaResponse])
-async def listar_sucursales(
+def listar_sucursales(
     entorno_id: Optional[int] = Query(None),
     incluir_legacy: bool = Query(False, description="Incluir sucursal Legacy"),
     db: Session = Depends(get_db),
@@ -101,7 +101,7 @@ async def listar_sucursales(
 
 
 @router.post("/sucursales", response_model=SucursalPaqueteriaResponse)
-async def crear_sucursal(
+def crear_sucursal(
     datos: SucursalPaqueteriaCreate,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -137,7 +137,7 @@ async def crear_sucursal(
 
 
 @router.put("/sucursales/{sucursal_id}", response_model=SucursalPaqueteriaResponse)
-async def editar_sucursal(
+def editar_sucursal(
     sucursal_id: int,
     datos: SucursalPaqueteriaUpdate,
     db: Session = Depends(get_db),
@@ -171,7 +171,7 @@ async def editar_sucursal(
 
 
 @router.delete("/sucursales/{sucursal_id}")
-async def borrar_sucursal(
+def borrar_sucursal(
     sucursal_id: int,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -206,7 +206,7 @@ async def borrar_sucursal(
 # ============== REGISTRAR (como fichaje) ==============
 
 @router.post("/registrar", response_model=RegistroPaqueteResponse)
-async def registrar_paquete(
+def registrar_paquete(
     datos: RegistroPaqueteCreate,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -347,7 +347,7 @@ async def registrar_paquete(
 
 
 @router.post("/registrar-lote", response_model=list[RegistroPaqueteResponse])
-async def registrar_paquete_lote(
+def registrar_paquete_lote(
     datos: RegistroPaqueteLoteCreate,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -446,7 +446,7 @@ async def registrar_paquete_lote(
 # ============== RANKING DEL DÍA ==============
 
 @router.get("/ranking", response_model=RankingResponse)
-async def ranking_paqueteria(
+def ranking_paqueteria(
     fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD (default hoy)"),
     entorno_id: Optional[int] = Query(None, description="ID entorno (solo sysowner)"),
     sucursal_id: Optional[int] = Query(None, description="Filtrar por sucursal"),
@@ -523,7 +523,7 @@ async def ranking_paqueteria(
 # ============== MIS REGISTROS DEL DÍA ==============
 
 @router.get("/mis-registros", response_model=list[MisRegistrosResponse])
-async def mis_registros(
+def mis_registros(
     fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD (default hoy)"),
     sucursal_id: Optional[int] = Query(None, description="Filtrar por sucursal"),
     limite: int = Query(500, ge=1, le=5000),
@@ -572,7 +572,7 @@ async def mis_registros(
 # ============== DETALLE POR USUARIO (admin) ==============
 
 @router.get("/detalle-usuario/{usuario_id}", response_model=list[MisRegistrosResponse])
-async def detalle_usuario(
+def detalle_usuario(
     usuario_id: int,
     fecha: Optional[str] = Query(None),
     entorno_id: Optional[int] = Query(None),
@@ -633,7 +633,7 @@ async def detalle_usuario(
 # ============== TODOS LOS REGISTROS DEL DÍA (admin) ==============
 
 @router.get("/todos-registros", response_model=list[MisRegistrosResponse])
-async def todos_registros(
+def todos_registros(
     fecha: Optional[str] = Query(None, description="Fecha YYYY-MM-DD (default hoy)"),
     entorno_id: Optional[int] = Query(None, description="ID entorno (solo sysowner)"),
     sucursal_id: Optional[int] = Query(None, description="Filtrar por sucursal"),
@@ -703,7 +703,7 @@ async def todos_registros(
 # ============== BORRAR REGISTRO ==============
 
 @router.delete("/borrar/{registro_id}")
-async def borrar_registro(
+def borrar_registro(
     registro_id: int,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -766,7 +766,7 @@ async def borrar_registro(
 # ============== EDITAR REGISTRO ==============
 
 @router.put("/editar/{registro_id}", response_model=RegistroPaqueteResponse)
-async def editar_registro(
+def editar_registro(
     registro_id: int,
     datos: RegistroPaqueteUpdate,
     db: Session = Depends(get_db),
@@ -858,7 +858,7 @@ async def editar_registro(
 # ============== TIPOS DE CAJA ==============
 
 @router.get("/tipos-caja", response_model=list[TipoCajaResponse])
-async def listar_tipos_caja(
+def listar_tipos_caja(
     entorno_id: Optional[int] = Query(None),
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -879,7 +879,7 @@ async def listar_tipos_caja(
 
 
 @router.post("/tipos-caja", response_model=TipoCajaResponse)
-async def crear_tipo_caja(
+def crear_tipo_caja(
     datos: TipoCajaCreate,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -920,7 +920,7 @@ async def crear_tipo_caja(
 
 
 @router.put("/tipos-caja/{tipo_id}", response_model=TipoCajaResponse)
-async def editar_tipo_caja(
+def editar_tipo_caja(
     tipo_id: int,
     datos: TipoCajaUpdate,
     db: Session = Depends(get_db),
@@ -958,7 +958,7 @@ async def editar_tipo_caja(
 
 
 @router.delete("/tipos-caja/{tipo_id}")
-async def borrar_tipo_caja(
+def borrar_tipo_caja(
     tipo_id: int,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -986,7 +986,7 @@ async def borrar_tipo_caja(
 # ============== STOCK / INVENTARIO DE CAJAS ==============
 
 @router.post("/tipos-caja/{tipo_id}/movimiento", response_model=MovimientoCajaResponse)
-async def registrar_movimiento_caja(
+def registrar_movimiento_caja(
     tipo_id: int,
     datos: MovimientoCajaCreate,
     db: Session = Depends(get_db),
@@ -1073,7 +1073,7 @@ async def registrar_movimiento_caja(
 
 
 @router.delete("/tipos-caja/{tipo_id}/reset")
-async def resetear_datos_caja(
+def resetear_datos_caja(
     tipo_id: int,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user),
@@ -1108,7 +1108,7 @@ async def resetear_datos_caja(
 
 
 @router.get("/tipos-caja/{tipo_id}/movimientos")
-async def listar_movimientos_caja(
+def listar_movimientos_caja(
     tipo_id: int,
     desde: Optional[str] = Query(None, description="Fecha inicio YYYY-MM-DD"),
     hasta: Optional[str] = Query(None, description="Fecha fin YYYY-MM-DD"),
@@ -1153,7 +1153,7 @@ async def listar_movimientos_caja(
 
 
 @router.get("/tipos-caja/resumen")
-async def resumen_stock_cajas(
+def resumen_stock_cajas(
     desde: Optional[str] = Query(None, description="Fecha inicio YYYY-MM-DD para cálculo consumo"),
     hasta: Optional[str] = Query(None, description="Fecha fin YYYY-MM-DD para cálculo consumo"),
     entorno_id: Optional[int] = Query(None, description="ID del entorno (sysowner)"),
@@ -1305,7 +1305,7 @@ async def resumen_stock_cajas(
 
 
 @router.put("/tipos-caja/{tipo_id}/stock")
-async def establecer_stock(
+def establecer_stock(
     tipo_id: int,
     stock: int = Query(..., description="Nuevo stock actual"),
     sucursal_id: Optional[int] = Query(None, description="Sucursal (si aplica)"),
@@ -1362,7 +1362,7 @@ DIAS_SEMANA_ES = {
 }
 
 @router.get("/estadisticas", response_model=EstadisticasPaqueteriaResponse)
-async def estadisticas_paqueteria(
+def estadisticas_paqueteria(
     entorno_id: Optional[int] = Query(None, description="ID entorno (solo sysowner)"),
     sucursal_id: Optional[int] = Query(None, description="Filtrar por sucursal (None = General)"),
     db: Session = Depends(get_db),
@@ -15,9 +15,10 @@ import os
 import json
 
 from app.database import get_db
-from app.models.busqueda import PiezaDesguace, BaseDesguace, CSVGuardado, PiezaPedida, PiezaVendida, Usuario
+from app.models.busqueda import PiezaDesguace, BaseDesguace, CSVGuardado, PiezaPedida, PiezaVendida, ReferenciaPieza, Usuario
 from app.dependencies import get_current_user
 from utils.timezone import now_spain_naive
+from services.referencias_index import eliminar_referencias, indexar_piezas, tokens_referencia
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -90,9 +91,51 @@ class PiezaResponse(BaseModel):
         from_attributes = True
 
 
+def _buscar_stock_por_referencias(db: Session, base_desguace: BaseDesguace, referencias: set) -> dict:
+    """
+    Piezas de la base cuyo refid/OEM/OE/IAM coincide con alguna referencia, usando
+    el índice de referencias normalizadas. Devuelve {referencia: [filas]}.
+    """
+    tokens_por_ref = {ref: tokens_referencia(ref) for ref in referencias}
+    filas_por_token = {}
+    todos_tokens = list(set().union(*tokens_por_ref.values())) if tokens_por_ref else []
+    for i in range(0, len(todos_tokens), 500):
+        piezas_db = db.query(
+            ReferenciaPieza.token,
+            PiezaDesguace.id,
+            PiezaDesguace.refid,
+            PiezaDesguace.oem,
+            PiezaDesguace.oe,
+            PiezaDesguace.iam,
+            PiezaDesguace.articulo,
+            PiezaDesguace.marca,
+            PiezaDesguace.precio,
+            PiezaDesguace.ubicacion,
+            PiezaDesguace.fecha_creacion
+        ).join(
+            PiezaDesguace, PiezaDesguace.id == ReferenciaPieza.pieza_id
+        ).filter(
+            ReferenciaPieza.entorno_trabajo_id == base_desguace.entorno_trabajo_id,
+            ReferenciaPieza.token.in_(todos_tokens[i:i + 500]),
+            PiezaDesguace.base_desguace_id == base_desguace.id
+        ).all()
+        for pieza in piezas_db:
+            filas_por_token.setdefault(pieza.token, []).append(pieza)
+    
+    piezas_stock = {}
+    for ref, tokens in tokens_por_ref.items():
+        vistas = {}
+        for token in tokens:
+            for pieza in filas_por_token.get(token, []):
+                vistas.setdefault(pieza.id, pieza)
+        if vistas:
+            piezas_stock[ref] = list(vistas.values())
+    return piezas_stock
+
+
 # ============== ENDPOINTS ==============
 @router.post("/nuevas")
-async def crear_piezas_nuevas(
+def crear_piezas_nuevas(
     request: PiezasNuevasRequest,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -122,6 +165,7 @@ async def crear_piezas_nuevas(
             db.flush()
         
         piezas_insertadas = 0
+        piezas_nuevas = []
         for pieza_data in request.piezas:
             # Validar que tenga al menos un campo identificador
             if not any([pieza_data.refid, pieza_data.oem, pieza_data.articulo]):
@@ -143,6 +187,7 @@ async def crear_piezas_nuevas(
                 fecha_creacion=now_spain_naive(),
             )
             db.add(nueva_pieza)
+            piezas_nuevas.append(nueva_pieza)
             piezas_insertadas += 1
         
         # Actualizar contador de piezas en la base
@@ -150,6 +195,12 @@ async def crear_piezas_nuevas(
             PiezaDesguace.base_desguace_id == base_desguace.id
         ).count() + piezas_insertadas
         
+        # Indexar sus referencias para las búsquedas
+        db.flush()
+        indexar_piezas(db, current_user.entorno_trabajo_id, [
+            (p.id, p.refid, p.oem, p.oe, p.iam) for p in piezas_nuevas
+        ])
+        
         db.commit()
         
         logger.info(f"Usuario {current_user.email} aÃ±adiÃ³ {piezas_insertadas} piezas nuevas")
@@ -172,7 +223,7 @@ async def crear_piezas_nuevas(
 
 
 @router.get("/recientes")
-async def obtener_piezas_recientes(
+def obtener_piezas_recientes(
     limit: int = 20,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -224,7 +275,7 @@ async def obtener_piezas_recientes(
 
 
 @router.delete("/{pieza_id}")
-async def eliminar_pieza(
+def eliminar_pieza(
     pieza_id: int,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -249,6 +300,7 @@ async def eliminar_pieza(
                 detail="Pieza no encontrada"
             )
         
+        eliminar_referencias(db, [pieza.id])
         db.delete(pieza)
         db.commit()
         
@@ -268,7 +320,7 @@ async def eliminar_pieza(
 
 
 @router.post("/verificar-csv")
-async def verificar_piezas_csv(
+def verificar_piezas_csv(
     archivo: UploadFile = File(...),
     umbral_compra: int = Form(30),
     guardar: str = Form("false"),
@@ -287,7 +339,7 @@ async def verificar_piezas_csv(
             )
         
         # Leer el contenido del archivo
-        content = await archivo.read()
+        content = archivo.file.read()
         
         # Detectar encoding
         try:
@@ -394,27 +446,7 @@ async def verificar_piezas_csv(
         # Una sola consulta para todas las piezas del inventario (incluir fecha_creacion para Ãºltima compra)
         piezas_stock = {}
         if base_desguace:
-            piezas_db = db.query(
-                PiezaDesguace.refid,
-                PiezaDesguace.oem, 
-                PiezaDesguace.oe,
-                PiezaDesguace.iam,
-                PiezaDesguace.articulo,
-                PiezaDesguace.marca,
-                PiezaDesguace.precio,
-                PiezaDesguace.ubicacion,
-                PiezaDesguace.fecha_creacion
-            ).filter(
-                PiezaDesguace.base_desguace_id == base_desguace.id
-            ).all()
-            
-            # Indexar por referencia en memoria
-            for pieza in piezas_db:
-                for campo in [pieza.refid, pieza.oem, pieza.oe, pieza.iam]:
-                    if campo and campo in todas_refs:
-                        if campo not in piezas_stock:
-                            piezas_stock[campo] = []
-                        piezas_stock[campo].append(pieza)
+            piezas_stock = _buscar_stock_por_referencias(db, base_desguace, todas_refs)
         
         # Consultar historial de ventas por OEM para calcular rotaciÃ³n
         ventas_por_oem = {}
@@ -585,7 +617,7 @@ class VerificarGuardadoRequest(BaseModel):
 
 
 @router.post("/verificar-guardado/{csv_id}")
-async def verificar_csv_guardado(
+def verificar_csv_guardado(
     csv_id: int,
     request: VerificarGuardadoRequest,
     current_user: Usuario = Depends(get_current_user),
@@ -704,26 +736,7 @@ async def verificar_csv_guardado(
         # Consulta optimizada (incluir fecha_creacion)
         piezas_stock = {}
         if base_desguace:
-            piezas_db = db.query(
-                PiezaDesguace.refid,
-                PiezaDesguace.oem, 
-                PiezaDesguace.oe,
-                PiezaDesguace.iam,
-                PiezaDesguace.articulo,
-                PiezaDesguace.marca,
-                PiezaDesguace.precio,
-                PiezaDesguace.ubicacion,
-                PiezaDesguace.fecha_creacion
-            ).filter(
-                PiezaDesguace.base_desguace_id == base_desguace.id
-            ).all()
-            
-            for pieza in piezas_db:
-                for campo in [pieza.refid, pieza.oem, pieza.oe, pieza.iam]:
-                    if campo and campo in todas_refs:
-                        if campo not in piezas_stock:
-                            piezas_stock[campo] = []
-                        piezas_stock[campo].append(pieza)
+            piezas_stock = _buscar_stock_por_referencias(db, base_desguace, todas_refs)
         
         # Consultar historial de ventas por OEM para calcular rotaciÃ³n
         ventas_por_oem = {}
@@ -885,7 +898,7 @@ async def verificar_csv_guardado(
 
 # ============== ENDPOINTS PARA CSV GUARDADOS ==============
 @router.get("/csv-guardados")
-async def listar_csv_guardados(
+def listar_csv_guardados(
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -927,7 +940,7 @@ async def listar_csv_guardados(
 
 
 @router.get("/csv-guardados/{csv_id}")
-async def descargar_csv(
+def descargar_csv(
     csv_id: int,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -959,7 +972,7 @@ async def descargar_csv(
 
 
 @router.get("/csv-guardados/{csv_id}/contenido")
-async def obtener_contenido_csv(
+def obtener_contenido_csv(
     csv_id: int,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1045,7 +1058,7 @@ class ActualizarCSVRequest(BaseModel):
 
 
 @router.put("/csv-guardados/{csv_id}")
-async def actualizar_csv(
+def actualizar_csv(
     csv_id: int,
     request: ActualizarCSVRequest,
     current_user: Usuario = Depends(get_current_user),
@@ -1093,7 +1106,7 @@ async def actualizar_csv(
 
 
 @router.delete("/csv-guardados/{csv_id}")
-async def eliminar_csv(
+def eliminar_csv(
     csv_id: int,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1134,7 +1147,7 @@ class MarcarPedidaRequest(BaseModel):
 
 
 @router.post("/pedidas")
-async def marcar_pieza_pedida(
+def marcar_pieza_pedida(
     request: MarcarPedidaRequest,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1182,7 +1195,7 @@ async def marcar_pieza_pedida(
 
 
 @router.get("/pedidas")
-async def listar_piezas_pedidas(
+def listar_piezas_pedidas(
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1214,7 +1227,7 @@ async def listar_piezas_pedidas(
 
 
 @router.delete("/pedidas/{referencia}")
-async def desmarcar_pieza_pedida(
+def desmarcar_pieza_pedida(
     referencia: str,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1,8 +1,12 @@
 """
 Router para información de plataformas
 """
+import asyncio
+
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
 from core.scraper_factory import ScraperFactory
+from core.proteccion_hosts import ABIERTO, host_de, proteccion_host
 
 router = APIRouter()
 
@@ -12,22 +16,27 @@ async def listar_plataformas():
     """Obtiene lista de todas las plataformas disponibles"""
     scrapers = ScraperFactory.get_available_platforms()
     
-    detalles = []
-    for platform_id, platform_name in scrapers.items():
+    async def detalle(platform_id: str, platform_name: str) -> dict:
         try:
             scraper = ScraperFactory.create_scraper(platform_id)
-            detalles.append({
+            circuito = proteccion_host(host_de(scraper.base_url)).resumen()
+            return {
                 "id": platform_id,
                 "nombre": scraper.name,
                 "url": scraper.base_url,
-                "disponible": scraper.is_available(),
-            })
+                # Con el circuito abierto no se consulta el host
+                "disponible": circuito["estado"] != ABIERTO and await scraper.is_available_async(),
+                "circuito": circuito,
+            }
         except:
-            detalles.append({
+            return {
                 "id": platform_id,
                 "nombre": platform_name,
                 "disponible": False,
-            })
+            }
+    
+    # Comprobaciones de disponibilidad en paralelo
+    detalles = await asyncio.gather(*(detalle(pid, nombre) for pid, nombre in scrapers.items()))
     
     return {
         "total": len(detalles),
@@ -44,8 +53,9 @@ async def obtener_plataforma(platform_id: str):
             "id": platform_id,
             "nombre": scraper.name,
             "url": scraper.base_url,
-            "disponible": scraper.is_available(),
-            "info": scraper.get_platform_info(),
+            "disponible": await scraper.is_available_async(),
+            "info": await run_in_threadpool(scraper.get_platform_info),
+            "circuito": proteccion_host(host_de(scraper.base_url)).resumen(),
         }
     except ValueError:
         from fastapi import HTTPException
@@ -1,12 +1,18 @@
 """
 Router para búsqueda de precios
 """
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, sessionmaker
+import asyncio
+import json
 import logging
 import random
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional
 
 from app.schemas.precios import (
     BuscarPreciosRequest, BuscarPreciosResponse, PrecioResumen, PrecioSugerido,
@@ -14,403 +20,453 @@ from app.schemas.precios import (
 )
 from app.database import get_db
 from app.models.busqueda import Busqueda, Usuario, BaseDesguace, PiezaDesguace, PiezaVendida, EntornoTrabajo
-from app.dependencies import get_current_user_with_workspace
+from app.dependencies import get_current_user_with_workspace, get_current_admin, get_current_sysowner
 from core.scraper_factory import ScraperFactory
+from core.cache_precios import get_cache_precios
+from utils.single_flight import estadisticas_coalescencia
 from services.pricing import summarize, detect_outliers_iqr
 from services.precio_sugerido import sugerir_precio, sugerir_precio_db, tiene_configuracion_precios
+from services.referencias_index import select_piezas_por_referencia
 from app.scrapers.referencias import obtener_primera_referencia_por_proveedor
-from app.services.busqueda_completa import busqueda_completa
+from app.services.busqueda_completa import busqueda_completa, _buscar_vendidas
 from app.services.desguaces import DesguaceFactory
 from app.services.oem_ebay import buscar_oem_relevantes
+from app.services.almacen_oem import get_almacen_equivalencias
+from app.services.precios_plataformas import scrape_platform
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def _scrape_platform(platform_id: str, referencia: str, cantidad: int) -> Dict:
-    """Función helper para scraping en paralelo de una plataforma"""
-    try:
-        scraper = ScraperFactory.create_scraper(platform_id)
-        
-        if not scraper.setup_session(referencia):
-            return {
-                "plataforma_id": platform_id,
-                "plataforma_nombre": scraper.name,
-                "precios": [],
-                "imagenes": [],
-                "tipo_pieza": None,
-                "error": "No se pudo configurar sesión"
-            }
-        
-        imagenes = []
-        tipo_pieza = None
-        
-        if hasattr(scraper, 'fetch_all_data'):
-            precios, imagenes, tipo_pieza, _ = scraper.fetch_all_data(referencia, cantidad)
-        elif hasattr(scraper, 'fetch_prices_with_images'):
-            precios, imagenes = scraper.fetch_prices_with_images(referencia, cantidad)
-        else:
-            precios = scraper.fetch_prices(referencia, cantidad)
-        
-        return {
-            "plataforma_id": platform_id,
-            "plataforma_nombre": scraper.name,
-            "precios": precios or [],
-            "imagenes": imagenes[:5] if imagenes else [],  # Limitar imágenes
-            "tipo_pieza": tipo_pieza,
-            "error": None
-        }
-    except Exception as e:
-        logger.error(f"Error scraping {platform_id}: {e}")
-        return {
-            "plataforma_id": platform_id,
-            "plataforma_nombre": platform_id.capitalize(),
-            "precios": [],
-            "imagenes": [],
-            "tipo_pieza": None,
-            "error": str(e)
-        }
+def _scrape_plataformas(plataformas: List[str], referencia: str, cantidad: int, usar_cache: bool = True) -> List[Dict]:
+    """Scraping en paralelo de varias plataformas (bloqueante)"""
+    with ThreadPoolExecutor(max_workers=len(plataformas)) as executor:
+        futures = [
+            executor.submit(scrape_platform, pid, referencia, cantidad, usar_cache)
+            for pid in plataformas
+        ]
+        return [future.result() for future in as_completed(futures)]
 
 
-@router.post("/buscar", response_model=BuscarPreciosResponse)
-async def buscar_precios(
-    request: BuscarPreciosRequest,
-    db: Session = Depends(get_db),
-    usuario: Usuario = Depends(get_current_user_with_workspace),
-):
-    """
-    Busca precios de una referencia en una o todas las plataformas
+def _plataformas_a_buscar(request: BuscarPreciosRequest) -> List[str]:
+    """Plataformas que hay que consultar según la selección del request (400 si no es válida)"""
+    # Plataformas rápidas (incluidas en "todas")
+    scrapers_rapidos = ScraperFactory.get_available_platforms()
     
-    Requiere autenticación y que el usuario tenga un entorno de trabajo asignado
-    """
-    try:
-        logger.info(
-            f"Usuario {usuario.email} buscando: {request.referencia} "
-            f"en plataforma {request.plataforma} - Entorno: {usuario.entorno_trabajo_id}"
-        )
-        
-        if not usuario.entorno_trabajo_id:
+    # Plataformas lentas (solo selección explícita)
+    scrapers_lentos = ScraperFactory.get_slow_platforms()
+    
+    # Todas las plataformas válidas
+    todas_plataformas = list(scrapers_rapidos.keys()) + scrapers_lentos
+    
+    if request.plataforma == "todas":
+        # "Todas" incluye las rápidas + las lentas seleccionadas
+        plataformas_a_buscar = list(scrapers_rapidos.keys())
+        # Añadir plataformas lentas si están marcadas
+        if request.incluir_bparts:
+            plataformas_a_buscar.append("bparts")
+        if request.incluir_ovoko:
+            plataformas_a_buscar.append("ovoko")
+        return plataformas_a_buscar
+    
+    if "," in request.plataforma:
+        # Multi-selección: lista separada por comas (ej: "ecooparts,ovoko,ebay")
+        seleccionadas = [p.strip() for p in request.plataforma.split(",") if p.strip()]
+        invalidas = [p for p in seleccionadas if p not in todas_plataformas]
+        if invalidas:
             raise HTTPException(
                 status_code=400,
-                detail="Usuario no tiene entorno de trabajo asignado"
+                detail=f"Plataformas no válidas: {invalidas}. Disponibles: {todas_plataformas}"
             )
+        return seleccionadas
+    
+    if request.plataforma not in todas_plataformas:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Plataforma no válida. Disponibles: {todas_plataformas}"
+        )
+    return [request.plataforma]
+
+
+class _BusquedaPrecios:
+    """
+    Acumula lo que va llegando de una búsqueda de /buscar (plataformas, inventario,
+    IAM, OEM, sugerencia) y compone la respuesta final.
+    La usan tanto /buscar como /buscar/stream, así las dos dan el mismo resultado.
+    """
+
+    def __init__(self, request: BuscarPreciosRequest, plataformas: List[str]):
+        self.request = request
+        self.plataformas = plataformas
+        self.resultados_plataformas: List[PlataformaResultado] = []
+        self.todos_precios: List[float] = []
+        self.todas_imagenes: List[str] = []
+        self.tipo_pieza_scraper: Optional[str] = None
+        self.inventario: Optional[InfoInventario] = None
+        self.tipo_pieza_inventario: Optional[str] = None
+        self.sugerencia: Optional[PrecioSugerido] = None
+        self.referencias_iam: List[str] = []
+        self.oem_equivalentes: List[Dict] = []
+        self.configuracion_precios_activa = False
+
+    @property
+    def tipo_pieza(self) -> Optional[str]:
+        # El de los scrapers manda; si no hay, el del inventario propio
+        return self.tipo_pieza_scraper or self.tipo_pieza_inventario
+
+    def anadir_plataforma(self, resultado: Dict) -> PlataformaResultado:
+        """Añade el resultado de una plataforma (con estadísticas sin outliers)"""
+        precios_plat = resultado["precios"]
         
-        # Plataformas rápidas (incluidas en "todas")
-        scrapers_rapidos = ScraperFactory.get_available_platforms()
-        
-        # Plataformas lentas (solo selección explícita)
-        scrapers_lentos = ScraperFactory.get_slow_platforms()
-        
-        # Todas las plataformas válidas
-        todas_plataformas = list(scrapers_rapidos.keys()) + scrapers_lentos
-        
-        # Determinar qué plataformas buscar
-        if request.plataforma == "todas":
-            # "Todas" incluye las rápidas + las lentas seleccionadas
-            plataformas_a_buscar = list(scrapers_rapidos.keys())
-            # Añadir plataformas lentas si están marcadas
-            if request.incluir_bparts:
-                plataformas_a_buscar.append("bparts")
-            if request.incluir_ovoko:
-                plataformas_a_buscar.append("ovoko")
-        elif "," in request.plataforma:
-            # Multi-selección: lista separada por comas (ej: "ecooparts,ovoko,ebay")
-            seleccionadas = [p.strip() for p in request.plataforma.split(",") if p.strip()]
-            invalidas = [p for p in seleccionadas if p not in todas_plataformas]
-            if invalidas:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Plataformas no válidas: {invalidas}. Disponibles: {todas_plataformas}"
-                )
-            plataformas_a_buscar = seleccionadas
-        else:
-            if request.plataforma not in todas_plataformas:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Plataforma no válida. Disponibles: {todas_plataformas}"
-                )
-            plataformas_a_buscar = [request.plataforma]
-        
-        # Buscar en paralelo en todas las plataformas seleccionadas
-        resultados_plataformas: List[PlataformaResultado] = []
-        todos_precios: List[float] = []
-        todas_imagenes: List[str] = []
-        tipo_pieza_detectado = None
-        
-        with ThreadPoolExecutor(max_workers=len(plataformas_a_buscar)) as executor:
-            futures = {
-                executor.submit(_scrape_platform, pid, request.referencia, request.cantidad): pid
-                for pid in plataformas_a_buscar
-            }
-            
-            for future in as_completed(futures):
-                resultado = future.result()
-                
-                # Calcular estadísticas por plataforma (con outliers removidos)
-                precios_plat = resultado["precios"]
-                
-                # Aplicar detección de outliers para min/max/media
+        # Aplicar detección de outliers para min/max/media
+        precios_limpios = precios_plat
+        if len(precios_plat) > 4:
+            precios_limpios, _ = detect_outliers_iqr(precios_plat)
+            if not precios_limpios:  # Si todos son outliers, usar originales
                 precios_limpios = precios_plat
-                if len(precios_plat) > 4:
-                    precios_limpios, _ = detect_outliers_iqr(precios_plat)
-                    if not precios_limpios:  # Si todos son outliers, usar originales
-                        precios_limpios = precios_plat
-                
-                resultado_plat = PlataformaResultado(
-                    plataforma_id=resultado["plataforma_id"],
-                    plataforma_nombre=resultado["plataforma_nombre"],
-                    precios=precios_plat,  # Guardar todos para referencia
-                    cantidad_precios=len(precios_plat),
-                    precio_minimo=min(precios_limpios) if precios_limpios else None,
-                    precio_maximo=max(precios_limpios) if precios_limpios else None,
-                    precio_medio=sum(precios_limpios) / len(precios_limpios) if precios_limpios else None,
-                    imagenes=resultado["imagenes"],
-                    error=resultado["error"]
-                )
-                resultados_plataformas.append(resultado_plat)
-                
-                # Acumular datos globales
-                todos_precios.extend(precios_plat)
-                todas_imagenes.extend(resultado["imagenes"])
-                
-                # Capturar tipo de pieza si se detectó
-                if not tipo_pieza_detectado and resultado.get("tipo_pieza"):
-                    tipo_pieza_detectado = resultado["tipo_pieza"]
         
-        # Ordenar resultados por plataforma
-        resultados_plataformas.sort(key=lambda x: x.plataforma_id)
+        resultado_plat = PlataformaResultado(
+            plataforma_id=resultado["plataforma_id"],
+            plataforma_nombre=resultado["plataforma_nombre"],
+            precios=precios_plat,  # Guardar todos para referencia
+            cantidad_precios=len(precios_plat),
+            precio_minimo=min(precios_limpios) if precios_limpios else None,
+            precio_maximo=max(precios_limpios) if precios_limpios else None,
+            precio_medio=sum(precios_limpios) / len(precios_limpios) if precios_limpios else None,
+            imagenes=resultado["imagenes"],
+            error=resultado["error"],
+            desde_cache=resultado.get("desde_cache", False),
+        )
+        self.resultados_plataformas.append(resultado_plat)
         
-        plataformas_con_resultados = sum(1 for r in resultados_plataformas if r.cantidad_precios > 0)
+        # Acumular datos globales
+        self.todos_precios.extend(precios_plat)
+        self.todas_imagenes.extend(resultado["imagenes"])
         
+        # Capturar tipo de pieza si se detectó
+        if not self.tipo_pieza_scraper and resultado.get("tipo_pieza"):
+            self.tipo_pieza_scraper = resultado["tipo_pieza"]
+        return resultado_plat
+
+    def necesita_tipo_ecooparts(self) -> bool:
         # Si buscamos en una sola plataforma y no hay tipo de pieza,
         # buscar SOLO en ecooparts (la más rápida para detectar tipo)
-        if request.plataforma != "todas" and not tipo_pieza_detectado and todos_precios:
-            logger.info("Buscando tipo de pieza en ecooparts...")
-            try:
-                resultado_eco = _scrape_platform("ecooparts", request.referencia, 5)
-                if resultado_eco.get("tipo_pieza"):
-                    tipo_pieza_detectado = resultado_eco["tipo_pieza"]
-                    logger.info(f"Tipo de pieza detectado de ecooparts: {tipo_pieza_detectado}")
-                    # Añadir precios para mejor referencia
-                    if resultado_eco["precios"]:
-                        todos_precios.extend(resultado_eco["precios"])
-            except Exception as e:
-                logger.warning(f"Error buscando tipo en ecooparts: {e}")
-        
-        if not todos_precios:
+        return self.request.plataforma != "todas" and not self.tipo_pieza_scraper and bool(self.todos_precios)
+
+    def anadir_ecooparts(self, resultado_eco: Optional[Dict]):
+        if resultado_eco and resultado_eco.get("tipo_pieza"):
+            self.tipo_pieza_scraper = resultado_eco["tipo_pieza"]
+            logger.info(f"Tipo de pieza detectado de ecooparts: {self.tipo_pieza_scraper}")
+            # Añadir precios para mejor referencia
+            if resultado_eco["precios"]:
+                self.todos_precios.extend(resultado_eco["precios"])
+
+    def resumen(self) -> PrecioResumen:
+        """Análisis de los precios combinados (404 si no hay ninguno)"""
+        if not self.todos_precios:
             raise HTTPException(
                 status_code=404,
-                detail=f"No se encontraron precios para {request.referencia} en ninguna plataforma"
+                detail=f"No se encontraron precios para {self.request.referencia} en ninguna plataforma"
             )
-        
-        # Analizar precios combinados
-        resumen_dict = summarize(todos_precios, remove_outliers=True)
-        
-        # Convertir resumen a schema
-        resumen = PrecioResumen(
+        resumen_dict = summarize(self.todos_precios, remove_outliers=True)
+        return PrecioResumen(
             media=resumen_dict.get('media', 0),
             mediana=resumen_dict.get('mediana', 0),
             minimo=resumen_dict.get('minimo', 0),
             maximo=resumen_dict.get('maximo', 0),
             desviacion_estandar=resumen_dict.get('desviacion_estandar', 0),
-            cantidad_precios=len(todos_precios),
+            cantidad_precios=len(self.todos_precios),
             outliers_removidos=resumen_dict.get('outliers_removidos', 0),
             rango_original=resumen_dict.get('rango_original'),
             rango_limpio=resumen_dict.get('rango_limpio'),
         )
-        
-        # Guardar en BD
-        busqueda = Busqueda(
-            usuario_id=usuario.id,
-            entorno_trabajo_id=usuario.entorno_trabajo_id,
-            referencia=request.referencia,
-            plataforma=request.plataforma if request.plataforma != "todas" else "multi",
-            cantidad_precios=len(todos_precios),
-            precio_medio=resumen.media,
-            precio_mediana=resumen.mediana,
-            precio_minimo=resumen.minimo,
-            precio_maximo=resumen.maximo,
-            desviacion_estandar=resumen.desviacion_estandar,
-            outliers_removidos=resumen.outliers_removidos,
-        )
-        db.add(busqueda)
-        db.commit()
-        
-        logger.info(f"Búsqueda guardada con ID: {busqueda.id}")
+
+    def respuesta(self, resumen: PrecioResumen) -> BuscarPreciosResponse:
+        # Ordenar resultados por plataforma
+        resultados_plataformas = sorted(self.resultados_plataformas, key=lambda x: x.plataforma_id)
         
         # Seleccionar imágenes (3 aleatorias de todas las plataformas)
-        imagenes_unicas = list(dict.fromkeys(todas_imagenes))
+        imagenes_unicas = list(dict.fromkeys(self.todas_imagenes))
         imagenes_resultado = random.sample(imagenes_unicas, min(3, len(imagenes_unicas))) if imagenes_unicas else []
         
-        # Consultar piezas en stock y vendidas del inventario propio
-        inventario_info = None
-        try:
-            from sqlalchemy import or_
-            
-            # Buscar en stock (PiezaDesguace)
-            base_desguace = db.query(BaseDesguace).filter(
-                BaseDesguace.entorno_trabajo_id == usuario.entorno_trabajo_id
-            ).first()
-            
-            piezas_stock = []
-            en_stock_count = 0
-            if base_desguace:
-                piezas_en_stock = db.query(PiezaDesguace).filter(
-                    PiezaDesguace.base_desguace_id == base_desguace.id,
-                    or_(
-                        PiezaDesguace.refid.ilike(f"%{request.referencia}%"),
-                        PiezaDesguace.oem.ilike(f"%{request.referencia}%"),
-                        PiezaDesguace.oe.ilike(f"%{request.referencia}%"),
-                        PiezaDesguace.iam.ilike(f"%{request.referencia}%")
-                    )
-                ).all()
-                en_stock_count = len(piezas_en_stock)
-                for p in piezas_en_stock[:5]:  # Limitar a 5
-                    piezas_stock.append({
-                        "id": p.id,
-                        "refid": p.refid,
-                        "oem": p.oem,
-                        "articulo": p.articulo,
-                        "marca": p.marca,
-                        "modelo": p.modelo,
-                        "precio": p.precio,
-                        "ubicacion": p.ubicacion,
-                        "imagen": p.imagen
-                    })
-            
-            # Buscar vendidas (PiezaVendida)
-            piezas_vendidas = db.query(PiezaVendida).filter(
-                PiezaVendida.entorno_trabajo_id == usuario.entorno_trabajo_id,
-                or_(
-                    PiezaVendida.refid.ilike(f"%{request.referencia}%"),
-                    PiezaVendida.oem.ilike(f"%{request.referencia}%"),
-                    PiezaVendida.oe.ilike(f"%{request.referencia}%"),
-                    PiezaVendida.iam.ilike(f"%{request.referencia}%")
-                )
+        referencias_iam_texto = "/".join(self.referencias_iam)
+        return BuscarPreciosResponse(
+            referencia=self.request.referencia,
+            plataforma=self.request.plataforma,
+            precios=sorted(self.todos_precios),
+            resumen=resumen,
+            total_en_mercado=len(self.todos_precios),
+            imagenes=imagenes_resultado,
+            sugerencia=self.sugerencia,
+            inventario=self.inventario,
+            tipo_pieza=self.tipo_pieza,
+            referencias_iam=self.referencias_iam or None,
+            referencias_iam_texto=referencias_iam_texto or None,
+            oem_equivalentes=self.oem_equivalentes or None,
+            oem_equivalentes_texto=_texto_oem_equivalentes(self.oem_equivalentes) or None,
+            resultados_por_plataforma=resultados_plataformas,
+            plataformas_consultadas=len(self.plataformas),
+            plataformas_con_resultados=sum(1 for r in resultados_plataformas if r.cantidad_precios > 0),
+            configuracion_precios_activa=self.configuracion_precios_activa,
+        )
+
+
+def _tipo_pieza_ecooparts(referencia: str, usar_cache: bool = True) -> Optional[Dict]:
+    """Consulta rápida a Ecooparts para detectar el tipo de pieza"""
+    logger.info("Buscando tipo de pieza en ecooparts...")
+    try:
+        return scrape_platform("ecooparts", referencia, 5, usar_cache)
+    except Exception as e:
+        logger.warning(f"Error buscando tipo en ecooparts: {e}")
+        return None
+
+
+def _guardar_busqueda(
+    db: Session, usuario_id: int, entorno_trabajo_id: int, request: BuscarPreciosRequest, resumen: PrecioResumen
+) -> int:
+    """Guarda la búsqueda en el historial y devuelve su ID"""
+    busqueda = Busqueda(
+        usuario_id=usuario_id,
+        entorno_trabajo_id=entorno_trabajo_id,
+        referencia=request.referencia,
+        plataforma=request.plataforma if request.plataforma != "todas" else "multi",
+        cantidad_precios=resumen.cantidad_precios,
+        precio_medio=resumen.media,
+        precio_mediana=resumen.mediana,
+        precio_minimo=resumen.minimo,
+        precio_maximo=resumen.maximo,
+        desviacion_estandar=resumen.desviacion_estandar,
+        outliers_removidos=resumen.outliers_removidos,
+    )
+    db.add(busqueda)
+    db.commit()
+    logger.info(f"Búsqueda guardada con ID: {busqueda.id}")
+    return busqueda.id
+
+
+def _consultar_inventario(
+    db: Session, entorno_trabajo_id: int, referencia: str
+) -> Tuple[Optional[InfoInventario], Optional[str]]:
+    """
+    Piezas en stock y vendidas del inventario propio para la referencia.
+    Devuelve también el tipo de pieza según el inventario (por si los scrapers no lo detectan).
+    """
+    try:
+        from sqlalchemy import or_
+        
+        # Buscar en stock (PiezaDesguace)
+        base_desguace = db.query(BaseDesguace).filter(
+            BaseDesguace.entorno_trabajo_id == entorno_trabajo_id
+        ).first()
+        
+        piezas_stock = []
+        piezas_en_stock = []
+        if base_desguace:
+            piezas_en_stock = db.query(PiezaDesguace).filter(
+                PiezaDesguace.base_desguace_id == base_desguace.id,
+                PiezaDesguace.id.in_(select_piezas_por_referencia(
+                    referencia, entorno_trabajo_id, prefijo=True
+                ))
             ).all()
-            vendidas_count = len(piezas_vendidas)
-            piezas_vendidas_list = []
-            for p in piezas_vendidas[:5]:  # Limitar a 5
-                # Calcular días de rotación
-                dias_rotacion = None
-                if p.fecha_venta and p.fecha_fichaje:
-                    delta = p.fecha_venta - p.fecha_fichaje
-                    dias_rotacion = delta.days
-                
-                piezas_vendidas_list.append({
+            for p in piezas_en_stock[:5]:  # Limitar a 5
+                piezas_stock.append({
                     "id": p.id,
                     "refid": p.refid,
                     "oem": p.oem,
                     "articulo": p.articulo,
+                    "marca": p.marca,
+                    "modelo": p.modelo,
                     "precio": p.precio,
-                    "fecha_venta": p.fecha_venta.isoformat() if p.fecha_venta else None,
-                    "fecha_fichaje": p.fecha_fichaje.isoformat() if p.fecha_fichaje else None,
-                    "dias_rotacion": dias_rotacion
+                    "ubicacion": p.ubicacion,
+                    "imagen": p.imagen
                 })
-            
-            inventario_info = InfoInventario(
-                en_stock=en_stock_count,
-                vendidas=vendidas_count,
-                piezas_stock=piezas_stock,
-                piezas_vendidas=piezas_vendidas_list
+        
+        # Buscar vendidas (PiezaVendida)
+        piezas_vendidas = db.query(PiezaVendida).filter(
+            PiezaVendida.entorno_trabajo_id == entorno_trabajo_id,
+            or_(
+                PiezaVendida.refid.ilike(f"%{referencia}%"),
+                PiezaVendida.oem.ilike(f"%{referencia}%"),
+                PiezaVendida.oe.ilike(f"%{referencia}%"),
+                PiezaVendida.iam.ilike(f"%{referencia}%")
             )
+        ).all()
+        piezas_vendidas_list = []
+        for p in piezas_vendidas[:5]:  # Limitar a 5
+            # Calcular días de rotación
+            dias_rotacion = None
+            if p.fecha_venta and p.fecha_fichaje:
+                delta = p.fecha_venta - p.fecha_fichaje
+                dias_rotacion = delta.days
             
-            # Si no se detectó tipo de pieza desde scrapers, intentar obtenerlo del inventario propio
-            if not tipo_pieza_detectado and piezas_en_stock:
-                for p in piezas_en_stock:
-                    if p.articulo:
-                        tipo_pieza_detectado = p.articulo.strip().upper()
-                        logger.info(f"Tipo de pieza obtenido del inventario: {tipo_pieza_detectado}")
-                        break
-            
-            # También intentar con piezas vendidas si aún no hay tipo
-            if not tipo_pieza_detectado and piezas_vendidas:
-                for p in piezas_vendidas:
-                    if p.articulo:
-                        tipo_pieza_detectado = p.articulo.strip().upper()
-                        logger.info(f"Tipo de pieza obtenido de vendidas: {tipo_pieza_detectado}")
-                        break
-                        
-        except Exception as inv_error:
-            logger.warning(f"Error consultando inventario: {inv_error}")
+            piezas_vendidas_list.append({
+                "id": p.id,
+                "refid": p.refid,
+                "oem": p.oem,
+                "articulo": p.articulo,
+                "precio": p.precio,
+                "fecha_venta": p.fecha_venta.isoformat() if p.fecha_venta else None,
+                "fecha_fichaje": p.fecha_fichaje.isoformat() if p.fecha_fichaje else None,
+                "dias_rotacion": dias_rotacion
+            })
+        
+        inventario = InfoInventario(
+            en_stock=len(piezas_en_stock),
+            vendidas=len(piezas_vendidas),
+            piezas_stock=piezas_stock,
+            piezas_vendidas=piezas_vendidas_list
+        )
+        
+        # Tipo de pieza según el inventario: primero stock, luego vendidas
+        tipo_pieza = next(
+            (p.articulo.strip().upper() for p in list(piezas_en_stock) + list(piezas_vendidas) if p.articulo),
+            None,
+        )
+        return inventario, tipo_pieza
+    except Exception as inv_error:
+        logger.warning(f"Error consultando inventario: {inv_error}")
+        return None, None
+
+
+def _sugerencia_precio(
+    db: Session, entorno_trabajo_id: int, tipo_pieza: Optional[str], precio_medio: float
+) -> Optional[PrecioSugerido]:
+    """
+    Precio sugerido según la familia del tipo de pieza.
+    Usa configuración del desguace si existe, sino CSV global
+    """
+    if not tipo_pieza:
+        logger.warning("No se detectó tipo de pieza, no se puede sugerir precio")
+        return None
+    logger.info(f"Tipo de pieza para sugerencia: {tipo_pieza}")
+    logger.info(f"Precio medio para cálculo: {precio_medio}")
+    sugerencia_data = sugerir_precio_db(db, entorno_trabajo_id, tipo_pieza, precio_medio)
+    logger.info(f"Resultado sugerencia_data: {sugerencia_data}")
+    if not sugerencia_data:
+        return None
+    sugerencia = PrecioSugerido(
+        familia=sugerencia_data["familia"],
+        precio_sugerido=sugerencia_data["precio_sugerido"],
+        precios_familia=sugerencia_data["precios_familia"],
+        precio_mercado=sugerencia_data["precio_mercado"],
+    )
+    logger.info(f"Sugerencia creada: familia={sugerencia.familia}, precio={sugerencia.precio_sugerido}")
+    return sugerencia
+
+
+def _referencias_iam(referencia: str) -> List[str]:
+    """Referencias IAM equivalentes (primera de cada proveedor)"""
+    try:
+        referencias_iam = obtener_primera_referencia_por_proveedor(referencia) or []
+        logger.info(f"Referencias IAM encontradas: {len(referencias_iam)}")
+        return referencias_iam
+    except Exception as ref_error:
+        logger.warning(f"Error buscando referencias IAM: {ref_error}")
+        return []
+
+
+def _modulo_oem_activo(db: Session, entorno_trabajo_id: int) -> bool:
+    try:
+        entorno = db.query(EntornoTrabajo).filter(EntornoTrabajo.id == entorno_trabajo_id).first()
+        if entorno and hasattr(entorno, 'modulo_oem_equivalentes'):
+            return entorno.modulo_oem_equivalentes if entorno.modulo_oem_equivalentes is not None else True
+    except Exception:
+        pass
+    return True
+
+
+def _oem_equivalentes(referencia: str) -> List[Dict]:
+    """OEM equivalentes relevantes (filtradas por eBay)"""
+    try:
+        oem_equivalentes = buscar_oem_relevantes(referencia, top_n=5) or []
+        logger.info(f"OEM equivalentes relevantes: {len(oem_equivalentes)}")
+        return oem_equivalentes
+    except Exception as oem_error:
+        logger.warning(f"Error buscando OEM equivalentes: {oem_error}")
+        return []
+
+
+def _oem_equivalentes_entorno(db: Session, entorno_trabajo_id: int, referencia: str) -> List[Dict]:
+    """OEM equivalentes, solo si el módulo está activo en el entorno"""
+    if not _modulo_oem_activo(db, entorno_trabajo_id):
+        logger.info("Módulo OEM equivalentes desactivado para este entorno")
+        return []
+    return _oem_equivalentes(referencia)
+
+
+def _texto_oem_equivalentes(oem_equivalentes: List[Dict]) -> str:
+    return " / ".join(f"{r['referencia']} ({r['total_en_venta']})" for r in oem_equivalentes)
+
+
+def _usuario_con_entorno(usuario: Usuario):
+    if not usuario.entorno_trabajo_id:
+        raise HTTPException(
+            status_code=400,
+            detail="Usuario no tiene entorno de trabajo asignado"
+        )
+
+
+@router.post("/buscar", response_model=BuscarPreciosResponse)
+def buscar_precios(
+    request: BuscarPreciosRequest,
+    db: Session = Depends(get_db),
+    usuario: Usuario = Depends(get_current_user_with_workspace),
+):
+    """
+    Busca precios de una referencia en una o todas las plataformas
+    
+    Requiere autenticación y que el usuario tenga un entorno de trabajo asignado
+    """
+    try:
+        logger.info(
+            f"Usuario {usuario.email} buscando: {request.referencia} "
+            f"en plataforma {request.plataforma} - Entorno: {usuario.entorno_trabajo_id}"
+        )
+        
+        _usuario_con_entorno(usuario)
+        entorno_id = usuario.entorno_trabajo_id
+        
+        # Determinar qué plataformas buscar
+        plataformas_a_buscar = _plataformas_a_buscar(request)
+        busqueda = _BusquedaPrecios(request, plataformas_a_buscar)
+        
+        # Buscar en paralelo en todas las plataformas seleccionadas
+        resultados_scraping = _scrape_plataformas(
+            plataformas_a_buscar, request.referencia, request.cantidad, not request.sin_cache
+        )
+        for resultado in resultados_scraping:
+            busqueda.anadir_plataforma(resultado)
+        
+        if busqueda.necesita_tipo_ecooparts():
+            busqueda.anadir_ecooparts(_tipo_pieza_ecooparts(request.referencia, not request.sin_cache))
+        
+        # Analizar precios combinados (404 si no hay ninguno)
+        resumen = busqueda.resumen()
+        
+        # Guardar en BD
+        _guardar_busqueda(db, usuario.id, entorno_id, request, resumen)
+        
+        # Consultar piezas en stock y vendidas del inventario propio
+        busqueda.inventario, busqueda.tipo_pieza_inventario = _consultar_inventario(db, entorno_id, request.referencia)
         
         # Intentar sugerir precio basado en familia
         # Usar el tipo de pieza detectado desde cualquier scraper o inventario
-        # Usa configuración del desguace si existe, sino CSV global
-        sugerencia = None
-        if tipo_pieza_detectado:
-            logger.info(f"Tipo de pieza para sugerencia: {tipo_pieza_detectado}")
-            logger.info(f"Precio medio para cálculo: {resumen.media}")
-            sugerencia_data = sugerir_precio_db(db, usuario.entorno_trabajo_id, tipo_pieza_detectado, resumen.media)
-            logger.info(f"Resultado sugerencia_data: {sugerencia_data}")
-            if sugerencia_data:
-                sugerencia = PrecioSugerido(
-                    familia=sugerencia_data["familia"],
-                    precio_sugerido=sugerencia_data["precio_sugerido"],
-                    precios_familia=sugerencia_data["precios_familia"],
-                    precio_mercado=sugerencia_data["precio_mercado"],
-                )
-                logger.info(f"Sugerencia creada: familia={sugerencia.familia}, precio={sugerencia.precio_sugerido}")
-        else:
-            logger.warning("No se detectó tipo de pieza, no se puede sugerir precio")
+        busqueda.sugerencia = _sugerencia_precio(db, entorno_id, busqueda.tipo_pieza, resumen.media)
+        
+        # Buscar referencias IAM equivalentes
+        busqueda.referencias_iam = _referencias_iam(request.referencia)
         
-        # Buscar referencias IAM equivalentes en segundo plano
-        referencias_iam = []
-        referencias_iam_texto = ""
-        try:
-            referencias_iam = obtener_primera_referencia_por_proveedor(request.referencia)
-            referencias_iam_texto = "/".join(referencias_iam) if referencias_iam else ""
-            logger.info(f"Referencias IAM encontradas: {len(referencias_iam)}")
-        except Exception as ref_error:
-            logger.warning(f"Error buscando referencias IAM: {ref_error}")
-
         # Buscar OEM equivalentes relevantes (filtradas por eBay) — solo si módulo activo
-        oem_equivalentes_list = []
-        oem_equivalentes_texto = ""
-        oem_modulo_activo = True
-        try:
-            entorno = db.query(EntornoTrabajo).filter(EntornoTrabajo.id == usuario.entorno_trabajo_id).first()
-            if entorno and hasattr(entorno, 'modulo_oem_equivalentes'):
-                oem_modulo_activo = entorno.modulo_oem_equivalentes if entorno.modulo_oem_equivalentes is not None else True
-        except Exception:
-            pass
-        try:
-            if oem_modulo_activo:
-                oem_equivalentes_list = buscar_oem_relevantes(request.referencia, top_n=5)
-                if oem_equivalentes_list:
-                    oem_equivalentes_texto = " / ".join(
-                        f"{r['referencia']} ({r['total_en_venta']})"
-                        for r in oem_equivalentes_list
-                    )
-                logger.info(f"OEM equivalentes relevantes: {len(oem_equivalentes_list)}")
-            else:
-                logger.info("Módulo OEM equivalentes desactivado para este entorno")
-        except Exception as oem_error:
-            logger.warning(f"Error buscando OEM equivalentes: {oem_error}")
+        if _modulo_oem_activo(db, entorno_id):
+            busqueda.oem_equivalentes = _oem_equivalentes(request.referencia)
+        else:
+            logger.info("Módulo OEM equivalentes desactivado para este entorno")
         
         # Verificar si el entorno tiene configuración de precios
-        tiene_config_precios = tiene_configuracion_precios(db, usuario.entorno_trabajo_id)
+        busqueda.configuracion_precios_activa = tiene_configuracion_precios(db, entorno_id)
         
         # Retornar respuesta con datos multi-plataforma
-        return BuscarPreciosResponse(
-            referencia=request.referencia,
-            plataforma=request.plataforma,
-            precios=sorted(todos_precios),
-            resumen=resumen,
-            total_en_mercado=len(todos_precios),
-            imagenes=imagenes_resultado,
-            sugerencia=sugerencia,
-            inventario=inventario_info,
-            tipo_pieza=tipo_pieza_detectado,
-            referencias_iam=referencias_iam if referencias_iam else None,
-            referencias_iam_texto=referencias_iam_texto if referencias_iam_texto else None,
-            oem_equivalentes=oem_equivalentes_list if oem_equivalentes_list else None,
-            oem_equivalentes_texto=oem_equivalentes_texto if oem_equivalentes_texto else None,
-            resultados_por_plataforma=resultados_plataformas,
-            plataformas_consultadas=len(plataformas_a_buscar),
-            plataformas_con_resultados=plataformas_con_resultados,
-            configuracion_precios_activa=tiene_config_precios,
-        )
+        return busqueda.respuesta(resumen)
         
     except HTTPException:
         raise
@@ -423,8 +479,166 @@ async def buscar_precios(
         )
 
 
+def _sse(evento: str, datos: Any) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
+def _con_sesion(nueva_sesion, funcion, *args):
+    """Ejecuta funcion(sesion, *args) con una sesión propia (para hilos del stream)"""
+    sesion = nueva_sesion()
+    try:
+        return funcion(sesion, *args)
+    finally:
+        sesion.close()
+
+
+@router.post("/buscar/stream")
+def buscar_precios_stream(
+    request: BuscarPreciosRequest,
+    http_request: Request,
+    db: Session = Depends(get_db),
+    usuario: Usuario = Depends(get_current_user_with_workspace),
+):
+    """
+    Variante de /buscar por Server-Sent Events: cada resultado se envía en cuanto está listo.
+    
+    Eventos:
+    - "inicio": plataformas que se consultan
+    - "plataforma": resultado de cada plataforma (PlataformaResultado), en orden de llegada
+    - "ecooparts": tipo de pieza de la consulta extra a Ecooparts (búsqueda en una sola plataforma)
+    - "precios": resumen de los precios combinados, al terminar todas las plataformas
+    - "inventario", "iam", "oem", "sugerencia": datos complementarios
+    - "resumen": respuesta completa, igual que la de /buscar
+    - "error": {status_code, detail} (p. ej. 404 si no hay precios); cierra el stream
+    """
+    _usuario_con_entorno(usuario)
+    plataformas_a_buscar = _plataformas_a_buscar(request)
+    usuario_id, entorno_id = usuario.id, usuario.entorno_trabajo_id
+    usar_cache = not request.sin_cache
+    logger.info(
+        f"Usuario {usuario.email} buscando (stream): {request.referencia} "
+        f"en plataforma {request.plataforma} - Entorno: {entorno_id}"
+    )
+    # Sesiones propias: la del request se cierra antes de que acabe el stream
+    nueva_sesion = sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+
+    async def generar():
+        busqueda = _BusquedaPrecios(request, plataformas_a_buscar)
+        tareas: Dict[asyncio.Future, str] = {}
+
+        def lanzar(nombre: str, funcion, *args):
+            tareas[asyncio.ensure_future(run_in_threadpool(funcion, *args))] = nombre
+
+        yield _sse("inicio", {"referencia": request.referencia, "plataformas": plataformas_a_buscar})
+
+        # Plataformas, inventario, IAM y OEM no dependen entre sí: todo a la vez
+        for pid in plataformas_a_buscar:
+            lanzar("plataforma", scrape_platform, pid, request.referencia, request.cantidad, usar_cache)
+        lanzar("inventario", _con_sesion, nueva_sesion, _consultar_inventario, entorno_id, request.referencia)
+        lanzar("iam", _referencias_iam, request.referencia)
+        lanzar("oem", _con_sesion, nueva_sesion, _oem_equivalentes_entorno, entorno_id, request.referencia)
+        lanzar("configuracion", _con_sesion, nueva_sesion, tiene_configuracion_precios, entorno_id)
+
+        plataformas_pendientes = len(plataformas_a_buscar)
+        inventario_listo = False
+        resumen: Optional[PrecioResumen] = None
+        sugerencia_lanzada = False
+        try:
+            while tareas:
+                hechas, _ = await asyncio.wait(list(tareas), return_when=asyncio.FIRST_COMPLETED)
+                precios_listos = False
+                for tarea in hechas:
+                    nombre = tareas.pop(tarea)
+                    valor = tarea.result()
+                    if nombre == "plataforma":
+                        resultado_plat = busqueda.anadir_plataforma(valor)
+                        plataformas_pendientes -= 1
+                        yield _sse("plataforma", {
+                            **resultado_plat.model_dump(mode="json"),
+                            "plataformas_pendientes": plataformas_pendientes,
+                        })
+                        if plataformas_pendientes == 0:
+                            if busqueda.necesita_tipo_ecooparts():
+                                lanzar("ecooparts", _tipo_pieza_ecooparts, request.referencia, usar_cache)
+                            else:
+                                precios_listos = True
+                    elif nombre == "ecooparts":
+                        busqueda.anadir_ecooparts(valor)
+                        yield _sse("ecooparts", {"tipo_pieza": busqueda.tipo_pieza_scraper})
+                        precios_listos = True
+                    elif nombre == "inventario":
+                        busqueda.inventario, busqueda.tipo_pieza_inventario = valor
+                        inventario_listo = True
+                        yield _sse("inventario", {
+                            "inventario": busqueda.inventario.model_dump(mode="json") if busqueda.inventario else None,
+                            "tipo_pieza": busqueda.tipo_pieza_inventario,
+                        })
+                    elif nombre == "iam":
+                        busqueda.referencias_iam = valor
+                        yield _sse("iam", {
+                            "referencias_iam": valor,
+                            "referencias_iam_texto": "/".join(valor),
+                        })
+                    elif nombre == "oem":
+                        busqueda.oem_equivalentes = valor
+                        yield _sse("oem", {
+                            "oem_equivalentes": valor,
+                            "oem_equivalentes_texto": _texto_oem_equivalentes(valor),
+                        })
+                    elif nombre == "configuracion":
+                        busqueda.configuracion_precios_activa = valor
+                    elif nombre == "sugerencia":
+                        busqueda.sugerencia = valor
+                        yield _sse("sugerencia", {
+                            "tipo_pieza": busqueda.tipo_pieza,
+                            "sugerencia": valor.model_dump(mode="json") if valor else None,
+                        })
+
+                if precios_listos:
+                    try:
+                        resumen = busqueda.resumen()
+                    except HTTPException as e:
+                        yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+                        return
+                    yield _sse("precios", {
+                        "resumen": resumen.model_dump(mode="json"),
+                        "tipo_pieza": busqueda.tipo_pieza_scraper,
+                    })
+                    lanzar("guardar", _con_sesion, nueva_sesion, _guardar_busqueda,
+                           usuario_id, entorno_id, request, resumen)
+
+                # La sugerencia necesita el precio medio y el tipo de pieza definitivo
+                # (el del inventario solo cuenta si los scrapers no dan ninguno)
+                if resumen is not None and inventario_listo and not sugerencia_lanzada:
+                    sugerencia_lanzada = True
+                    lanzar("sugerencia", _con_sesion, nueva_sesion, _sugerencia_precio,
+                           entorno_id, busqueda.tipo_pieza, resumen.media)
+
+                if await http_request.is_disconnected():
+                    logger.info(f"Búsqueda (stream) de {request.referencia} cancelada: cliente desconectado")
+                    return
+
+            yield _sse("resumen", busqueda.respuesta(resumen).model_dump(mode="json"))
+        except Exception as e:
+            logger.error(f"Error en búsqueda de precios (stream): {str(e)}")
+            yield _sse("error", {"status_code": 500, "detail": f"Error durante la búsqueda: {str(e)}"})
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 @router.get("/plataformas-disponibles")
-async def plataformas_disponibles(
+def plataformas_disponibles(
     usuario: Usuario = Depends(get_current_user_with_workspace),
 ):
     """
@@ -439,45 +653,184 @@ async def plataformas_disponibles(
     }
 
 
+@router.get("/cache")
+def estadisticas_cache_precios(
+    usuario: Usuario = Depends(get_current_admin),
+):
+    """
+    Estadísticas de la caché de resultados de scraping (aciertos, fallos, entradas),
+    de las búsquedas simultáneas coalescidas por capa y del almacén de OEM equivalentes.
+    """
+    return {
+        **get_cache_precios().estadisticas(),
+        "coalescencia": estadisticas_coalescencia(),
+        "equivalencias_oem": get_almacen_equivalencias().estadisticas(),
+    }
+
+
+@router.delete("/cache")
+def limpiar_cache_precios(
+    usuario: Usuario = Depends(get_current_sysowner),
+):
+    """Vacía la caché de resultados de scraping (compartida por todos los entornos)"""
+    get_cache_precios().limpiar()
+    logger.info(f"Caché de precios vaciada por {usuario.email}")
+    return {"message": "Caché de precios vaciada"}
+
+
+def _respuesta_busqueda_completa(res, vendidas: List[Dict]) -> BusquedaCompletaResponse:
+    return BusquedaCompletaResponse(
+        referencia_original=res.referencia_original,
+        oem_equivalentes=res.oem_equivalentes,
+        stock_propio=res.stock_propio,
+        stock_otros_entornos=res.stock_otros_entornos,
+        piezas_vendidas=vendidas,
+        piezas_nuevas_iam=res.piezas_nuevas_iam,
+        resultados_desguaces=res.resultados_desguaces,
+        errores=res.errores,
+        total_stock=res.total_stock,
+        total_otros_entornos=res.total_otros_entornos,
+        total_desguaces=res.total_desguaces,
+        total_oem=res.total_oem,
+        total_iam=res.total_iam,
+        desguaces_disponibles=DesguaceFactory.get_nombres(),
+        tiempos_ms=res.tiempos_ms,
+    )
+
+
 @router.post("/busqueda-completa", response_model=BusquedaCompletaResponse)
-async def buscar_completa(
+def buscar_completa(
     request: BusquedaCompletaRequest,
+    http_request: Request,
+    formato: str = Query("json", pattern="^(json|sse|ndjson)$"),
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_user_with_workspace),
 ):
     """
     Búsqueda completa de piezas: OEM equiv → stock propio → IAM → desguaces.
     Usado desde la página de Venta.
+
+    Con formato=sse o formato=ndjson los resultados se envían por partes según
+    llegan (ver _busqueda_completa_stream); por defecto, JSON al terminar.
     """
     if not usuario.entorno_trabajo_id:
         raise HTTPException(status_code=400, detail="Usuario sin entorno de trabajo")
 
-    logger.info(f"[BúsquedaCompleta] {usuario.email} busca '{request.referencia}'")
+    logger.info(f"[BúsquedaCompleta] {usuario.email} busca '{request.referencia}' ({formato})")
+
+    if formato != "json":
+        return _busqueda_completa_stream(request, formato, http_request, db, usuario.entorno_trabajo_id)
 
     try:
         res = busqueda_completa(request.referencia, db, usuario.entorno_trabajo_id)
 
         # Vendidas (extra info no incluida en orquestador)
-        from app.services.busqueda_completa import _buscar_vendidas
+        inicio = time.perf_counter()
         todas_refs = [request.referencia] + res.oem_equivalentes
         vendidas = _buscar_vendidas(db, usuario.entorno_trabajo_id, todas_refs)
+        res.tiempos_ms["vendidas"] = int((time.perf_counter() - inicio) * 1000)
 
-        return BusquedaCompletaResponse(
-            referencia_original=res.referencia_original,
-            oem_equivalentes=res.oem_equivalentes,
-            stock_propio=res.stock_propio,
-            stock_otros_entornos=res.stock_otros_entornos,
-            piezas_vendidas=vendidas,
-            piezas_nuevas_iam=res.piezas_nuevas_iam,
-            resultados_desguaces=res.resultados_desguaces,
-            errores=res.errores,
-            total_stock=res.total_stock,
-            total_otros_entornos=res.total_otros_entornos,
-            total_desguaces=res.total_desguaces,
-            total_oem=res.total_oem,
-            total_iam=res.total_iam,
-            desguaces_disponibles=DesguaceFactory.get_nombres(),
-        )
+        return _respuesta_busqueda_completa(res, vendidas)
     except Exception as e:
         logger.error(f"[BúsquedaCompleta] Error: {e}")
         raise HTTPException(status_code=500, detail=f"Error en búsqueda completa: {str(e)}")
+
+
+def _busqueda_completa_stream(
+    request: BusquedaCompletaRequest,
+    formato: str,
+    http_request: Request,
+    db: Session,
+    entorno_id: int,
+) -> StreamingResponse:
+    """
+    Modo streaming de /busqueda-completa. Cada mensaje es (evento, datos):
+    - "fase": empieza la fase 1 (OEM) o la 2 (resto de fuentes)
+    - "oem_equivalentes", "stock_propio", "otros_entornos", "iam", "desguaces",
+      "vendidas": resultados de cada fuente según termina, con duracion_ms y error
+    - "desguace": resultados de cada desguace competidor según termina
+    - "fin": respuesta completa (igual que en modo JSON, con tiempos_ms)
+    - "error": fallo inesperado; cierra el stream
+    En SSE el evento va en "event:"; en NDJSON cada línea es {"evento", "datos"}.
+    Si el cliente se desconecta, la búsqueda deja de esperar a las fuentes pendientes.
+    """
+    # Sesiones propias: la del request se cierra antes de que acabe el stream
+    nueva_sesion = sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+    referencia = request.referencia
+
+    def formatear(evento: str, datos: Dict) -> str:
+        if formato == "sse":
+            return _sse(evento, datos)
+        return json.dumps({"evento": evento, "datos": datos}, ensure_ascii=False, default=str) + "\n"
+
+    def vendidas(sesion: Session, referencias: List[str]) -> Tuple[List[Dict], int]:
+        inicio = time.perf_counter()
+        return _buscar_vendidas(sesion, entorno_id, referencias), int((time.perf_counter() - inicio) * 1000)
+
+    async def generar():
+        bucle = asyncio.get_running_loop()
+        cola: asyncio.Queue = asyncio.Queue()
+        cancelar = threading.Event()
+
+        def al_progresar(evento: str, datos: Dict):
+            bucle.call_soon_threadsafe(cola.put_nowait, (evento, datos))
+
+        def buscar(sesion: Session):
+            try:
+                return busqueda_completa(referencia, sesion, entorno_id, al_progresar, cancelar)
+            finally:
+                al_progresar(None, None)  # Fin de los eventos
+
+        tarea = asyncio.ensure_future(run_in_threadpool(_con_sesion, nueva_sesion, buscar))
+        tarea_vendidas = None
+        siguiente = None
+        try:
+            while True:
+                if siguiente is None:
+                    siguiente = asyncio.ensure_future(cola.get())
+                hechas, _ = await asyncio.wait({siguiente}, timeout=1.0)
+                if not hechas:
+                    if await http_request.is_disconnected():
+                        logger.info(f"[BúsquedaCompleta] Cliente desconectado, se cancela '{referencia}'")
+                        return
+                    continue
+                evento, datos = siguiente.result()
+                siguiente = None
+                if evento is None:
+                    break
+                yield formatear(evento, datos)
+                if evento == "oem_equivalentes":
+                    # Las vendidas solo necesitan las refs: van en paralelo con la Fase 2
+                    tarea_vendidas = asyncio.ensure_future(run_in_threadpool(
+                        _con_sesion, nueva_sesion, vendidas, [referencia] + datos["resultados"]
+                    ))
+
+            res = await tarea
+            piezas_vendidas = []
+            if tarea_vendidas is not None:
+                piezas_vendidas, res.tiempos_ms["vendidas"] = await tarea_vendidas
+                yield formatear("vendidas", {
+                    "resultados": piezas_vendidas,
+                    "total": len(piezas_vendidas),
+                    "duracion_ms": res.tiempos_ms["vendidas"],
+                    "error": None,
+                })
+            yield formatear("fin", _respuesta_busqueda_completa(res, piezas_vendidas).model_dump(mode="json"))
+        except Exception as e:
+            logger.error(f"[BúsquedaCompleta] Error: {e}")
+            yield formatear("error", {"detail": f"Error en búsqueda completa: {str(e)}"})
+        finally:
+            # Si el stream acaba antes (desconexión, error) la búsqueda deja de esperar
+            cancelar.set()
+            if siguiente is not None:
+                siguiente.cancel()
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream" if formato == "sse" else "application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -15,6 +15,7 @@ from app.models.busqueda import (
     ConfiguracionPrecios, PiezaFamiliaDesguace, FamiliaPreciosDesguace
 )
 from app.routers.auth import get_current_user
+from services.precio_sugerido import marcar_configuracion_precios, invalidar_snapshot_precios
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ router = APIRouter()
 
 
 @router.get("/entornos")
-async def listar_entornos(
+def listar_entornos(
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -38,7 +39,7 @@ async def listar_entornos(
 
 
 @router.get("/estado")
-async def obtener_estado_configuracion(
+def obtener_estado_configuracion(
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -86,7 +87,7 @@ async def obtener_estado_configuracion(
 
 
 @router.post("/pieza-familia")
-async def subir_pieza_familia(
+def subir_pieza_familia(
     file: UploadFile = File(...),
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
@@ -118,7 +119,7 @@ async def subir_pieza_familia(
     
     # Leer contenido del archivo
     try:
-        content = await file.read()
+        content = file.file.read()
         # Intentar diferentes encodings
         for encoding in ['utf-8', 'latin-1', 'cp1252']:
             try:
@@ -193,6 +194,7 @@ async def subir_pieza_familia(
     config.pieza_familia_registros = len(registros)
     config.subido_por_id = current_user.id
     
+    marcar_configuracion_precios(config)
     db.commit()
     
     logger.info(f"Subido pieza_familia para entorno {target_entorno_id}: {len(registros)} registros")
@@ -206,7 +208,7 @@ async def subir_pieza_familia(
 
 
 @router.post("/familia-precios")
-async def subir_familia_precios(
+def subir_familia_precios(
     file: UploadFile = File(...),
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
@@ -239,7 +241,7 @@ async def subir_familia_precios(
     
     # Leer contenido del archivo
     try:
-        content = await file.read()
+        content = file.file.read()
         for encoding in ['utf-8', 'latin-1', 'cp1252']:
             try:
                 decoded = content.decode(encoding)
@@ -327,6 +329,7 @@ async def subir_familia_precios(
     config.familia_precios_registros = len(registros)
     config.subido_por_id = current_user.id
     
+    marcar_configuracion_precios(config)
     db.commit()
     
     logger.info(f"Subido familia_precios para entorno {target_entorno_id}: {len(registros)} registros")
@@ -340,7 +343,7 @@ async def subir_familia_precios(
 
 
 @router.get("/piezas-familia")
-async def listar_piezas_familia(
+def listar_piezas_familia(
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -370,7 +373,7 @@ async def listar_piezas_familia(
 
 
 @router.get("/familias-precios")
-async def listar_familias_precios(
+def listar_familias_precios(
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -407,7 +410,7 @@ async def listar_familias_precios(
 
 
 @router.delete("/eliminar")
-async def eliminar_configuracion(
+def eliminar_configuracion(
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -438,6 +441,7 @@ async def eliminar_configuracion(
     if config:
         db.delete(config)
         db.commit()
+        invalidar_snapshot_precios(target_entorno_id)
     
     return {"success": True, "mensaje": "Configuración eliminada"}
 
@@ -447,7 +451,7 @@ async def eliminar_configuracion(
 # =====================================================
 
 @router.post("/pieza-familia/nuevo")
-async def crear_pieza_familia(
+def crear_pieza_familia(
     pieza: str,
     familia: str,
     current_user: Usuario = Depends(get_current_user),
@@ -495,13 +499,14 @@ async def crear_pieza_familia(
         PiezaFamiliaDesguace.configuracion_id == config.id
     ).count() + 1
     
+    marcar_configuracion_precios(config)
     db.commit()
     
     return {"success": True, "mensaje": "Registro creado", "id": nuevo.id}
 
 
 @router.put("/pieza-familia/{id}")
-async def actualizar_pieza_familia(
+def actualizar_pieza_familia(
     id: int,
     pieza: str,
     familia: str,
@@ -533,13 +538,14 @@ async def actualizar_pieza_familia(
     
     registro.pieza = pieza.strip().upper()
     registro.familia = familia.strip().upper()
+    marcar_configuracion_precios(config)
     db.commit()
     
     return {"success": True, "mensaje": "Registro actualizado"}
 
 
 @router.delete("/pieza-familia/{id}")
-async def eliminar_pieza_familia(
+def eliminar_pieza_familia(
     id: int,
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
@@ -574,6 +580,7 @@ async def eliminar_pieza_familia(
         PiezaFamiliaDesguace.configuracion_id == config.id
     ).count() - 1
     
+    marcar_configuracion_precios(config)
     db.commit()
     
     return {"success": True, "mensaje": "Registro eliminado"}
@@ -584,7 +591,7 @@ async def eliminar_pieza_familia(
 # =====================================================
 
 @router.post("/familia-precios/nuevo")
-async def crear_familia_precios(
+def crear_familia_precios(
     familia: str,
     precios: str,  # Separados por coma: "10,20,30,40"
     current_user: Usuario = Depends(get_current_user),
@@ -640,13 +647,14 @@ async def crear_familia_precios(
         FamiliaPreciosDesguace.configuracion_id == config.id
     ).count() + 1
     
+    marcar_configuracion_precios(config)
     db.commit()
     
     return {"success": True, "mensaje": "Registro creado", "id": nuevo.id}
 
 
 @router.put("/familia-precios/{id}")
-async def actualizar_familia_precios(
+def actualizar_familia_precios(
     id: int,
     familia: str,
     precios: str,
@@ -686,13 +694,14 @@ async def actualizar_familia_precios(
     
     registro.familia = familia.strip().upper()
     registro.precios = precios_str
+    marcar_configuracion_precios(config)
     db.commit()
     
     return {"success": True, "mensaje": "Registro actualizado"}
 
 
 @router.delete("/familia-precios/{id}")
-async def eliminar_familia_precios(
+def eliminar_familia_precios(
     id: int,
     entorno_id: Optional[int] = None,
     current_user: Usuario = Depends(get_current_user),
@@ -727,6 +736,7 @@ async def eliminar_familia_precios(
         FamiliaPreciosDesguace.configuracion_id == config.id
     ).count() - 1
     
+    marcar_configuracion_precios(config)
     db.commit()
     
     return {"success": True, "mensaje": "Registro eliminado"}
@@ -737,7 +747,7 @@ async def eliminar_familia_precios(
 # =====================================================
 
 @router.get("/exportar/pieza-familia")
-async def exportar_pieza_familia(
+def exportar_pieza_familia(
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -774,7 +784,7 @@ async def exportar_pieza_familia(
 
 
 @router.get("/exportar/familia-precios")
-async def exportar_familia_precios(
+def exportar_familia_precios(
     current_user: Usuario = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -2,6 +2,7 @@
 Router para cruce de referencias OEM a IAM
 """
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
@@ -13,6 +14,7 @@ from app.models.busqueda import Usuario
 from app.scrapers.referencias import buscar_en_todos, obtener_primera_referencia_por_proveedor
 from core.scraper_factory import ScraperFactory
 from services.pricing import summarize
+from utils.single_flight import grupo, clave_referencia
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -48,6 +50,18 @@ class ReferenciasRapidasResponse(BaseModel):
     referencias_texto: str  # Separadas por coma
 
 
+def _precios_ecooparts(referencia: str) -> List[float]:
+    """Precios de Ecooparts para el precio de mercado (bloqueante, coalescido por referencia)"""
+    return grupo("precio_mercado").hacer(clave_referencia(referencia), _consultar_ecooparts, referencia)
+
+
+def _consultar_ecooparts(referencia: str) -> List[float]:
+    scraper = ScraperFactory.create_scraper("ecooparts")
+    if not scraper.setup_session(referencia):
+        return []
+    return scraper.fetch_prices(referencia, limit=50)
+
+
 @router.post("/buscar", response_model=BuscarReferenciasResponse)
 async def buscar_referencias(
     request: BuscarReferenciasRequest,
@@ -70,7 +84,8 @@ async def buscar_referencias(
     logger.info(f"Usuario {current_user.email} buscando referencias para OEM: {referencia}")
     
     try:
-        resultados, errores = buscar_en_todos(referencia)
+        # Búsquedas bloqueantes fuera del event loop (y coalescidas por referencia)
+        resultados, errores = await run_in_threadpool(buscar_en_todos, referencia)
         
         total_encontrados = sum(len(items) for items in resultados.values())
         proveedores_con_resultados = len(resultados)
@@ -81,21 +96,19 @@ async def buscar_referencias(
         precios_encontrados = 0
         
         try:
-            scraper = ScraperFactory.create_scraper("ecooparts")
-            if scraper.setup_session(referencia):
-                precios = scraper.fetch_prices(referencia, limit=50)
-                if precios:
-                    precios_encontrados = len(precios)
-                    resumen = summarize(precios, remove_outliers=True)
-                    precio_mercado = resumen.get('media', resumen.get('promedio', 0))
-                    
-                    # Calcular precio sugerido (55% del precio sin IVA, mínimo 10€)
-                    if precio_mercado and precio_mercado > 0:
-                        precio_sin_iva = precio_mercado / 1.21
-                        precio_sugerido = round(precio_sin_iva * 0.55, -1)
-                        if precio_sugerido < 10:
-                            precio_sugerido = 10
-                        logger.info(f"Precio mercado: {precio_mercado:.2f}€, Sugerido: {precio_sugerido:.2f}€")
+            precios = await run_in_threadpool(_precios_ecooparts, referencia)
+            if precios:
+                precios_encontrados = len(precios)
+                resumen = summarize(precios, remove_outliers=True)
+                precio_mercado = resumen.get('media', resumen.get('promedio', 0))
+                
+                # Calcular precio sugerido (55% del precio sin IVA, mínimo 10€)
+                if precio_mercado and precio_mercado > 0:
+                    precio_sin_iva = precio_mercado / 1.21
+                    precio_sugerido = round(precio_sin_iva * 0.55, -1)
+                    if precio_sugerido < 10:
+                        precio_sugerido = 10
+                    logger.info(f"Precio mercado: {precio_mercado:.2f}€, Sugerido: {precio_sugerido:.2f}€")
         except Exception as e:
             logger.warning(f"No se pudo obtener precio de mercado: {e}")
         
@@ -129,7 +142,7 @@ async def referencias_rapidas(
         raise HTTPException(status_code=400, detail="La referencia no puede estar vacía")
     
     try:
-        referencias = obtener_primera_referencia_por_proveedor(referencia)
+        referencias = await run_in_threadpool(obtener_primera_referencia_por_proveedor, referencia)
         
         return ReferenciasRapidasResponse(
             referencia_oem=referencia,
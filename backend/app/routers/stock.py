@@ -1,130 +1,38 @@
 """
 Router para checkeo de stock
 """
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, sessionmaker
 import logging
+import json
 import asyncio
 import time
 from concurrent.futures import ThreadPoolExecutor
 
 from app.schemas.stock import (
     CheckStockRequest, CheckStockResponse, CheckResultItem,
-    CheckStockMasivoRequest, CheckStockMasivoResponse, CheckMasivoResultItem
+    CheckStockMasivoRequest, CheckStockMasivoResponse, CheckMasivoResultItem,
+    TrabajoVerificacionResumen, TrabajoVerificacionResponse,
 )
 from app.database import get_db
-from app.models.busqueda import ResultadoStock, Usuario
+from app.models.busqueda import ResultadoStock, TrabajoVerificacion, Usuario
 from app.dependencies import get_current_admin
 from core.scraper_factory import ScraperFactory
 from services.pricing import summarize
-from services.precio_sugerido import sugerir_precio, buscar_familia, sugerir_precio_db
+from services.precio_sugerido import sugerir_precio, buscar_familia, sugerir_precio_db, get_snapshot_precios, sugerir_precio_snapshot
+from services.verificacion_stock import get_ecooparts_scraper, procesar_item
+from services.cola_verificacion import ESTADOS_FINALES, crear_trabajo, cancelar_trabajo, leer_progreso
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Scraper global reutilizable (evita setup_session en cada petición)
-_ecooparts_scraper = None
-_scraper_last_setup = 0
 
-# Caché de precios por OEM (evita búsquedas repetidas)
-_oem_cache = {}
-
-def get_ecooparts_scraper():
-    """Obtiene scraper de Ecooparts reutilizando sesión si es posible"""
-    global _ecooparts_scraper, _scraper_last_setup
-    
-    current_time = time.time()
-    # Re-crear scraper cada 5 minutos o si no existe
-    if _ecooparts_scraper is None or (current_time - _scraper_last_setup) > 300:
-        logger.info("Creando nueva sesión de Ecooparts scraper...")
-        _ecooparts_scraper = ScraperFactory.create_scraper("ecooparts")
-        if _ecooparts_scraper.setup_session("1K0959653C"):
-            _scraper_last_setup = current_time
-            logger.info("Sesión de Ecooparts creada correctamente")
-        else:
-            logger.error("No se pudo crear sesión de Ecooparts")
-            _ecooparts_scraper = None
-    
-    return _ecooparts_scraper
-
-
-def procesar_item(item, scraper, umbral: float, piezas_minimas: int = 3, db: Session = None, entorno_trabajo_id: int = None):
-    """Procesa un item de forma síncrona (para usar con ThreadPoolExecutor)"""
-    global _oem_cache
-    
-    try:
-        oem = item.ref_oem
-        
-        # Verificar caché primero
-        if oem in _oem_cache:
-            precios, precio_mercado = _oem_cache[oem]
-        else:
-            # Buscar precios en Ecooparts
-            precios = scraper.fetch_prices(oem, limit=50)
-            
-            if not precios or len(precios) < piezas_minimas:
-                _oem_cache[oem] = ([], 0)  # Cachear resultado vacío también
-                return None
-            
-            # Analizar precios
-            resumen = summarize(precios, remove_outliers=True)
-            precio_mercado = resumen.get('media', resumen.get('promedio', 0))
-            
-            # Guardar en caché
-            _oem_cache[oem] = (precios, precio_mercado)
-        
-        if not precios or len(precios) < piezas_minimas or precio_mercado <= 0:
-            return None
-        
-        # Calcular diferencia respecto al mercado
-        diferencia = ((item.precio - precio_mercado) / precio_mercado) * 100
-        
-        # Buscar precio sugerido basado en familia
-        # SOLO usa la configuración de precios de la empresa del usuario
-        precio_sugerido = None
-        familia = ""
-        
-        if item.tipo_pieza and db and entorno_trabajo_id:
-            # Usar configuración de la empresa (si no tiene, devuelve None)
-            sugerencia = sugerir_precio_db(db, entorno_trabajo_id, item.tipo_pieza, precio_mercado)
-            
-            if sugerencia:
-                precio_sugerido = sugerencia.get("precio_sugerido")
-                familia = sugerencia.get("familia", "")
-        
-        # Determinar si es outlier:
-        # El precio sugerido es SIN IVA, el precio actual INCLUYE IVA (21%)
-        # Solo es outlier si el precio actual es significativamente diferente al sugerido+IVA
-        es_outlier = False
-        if precio_sugerido is not None:
-            precio_sugerido_con_iva = precio_sugerido * 1.21
-            # Tolerancia del 10% para evitar falsos positivos por redondeos
-            tolerancia = precio_sugerido_con_iva * 0.10
-            # Solo marcar como outlier si el precio actual está fuera del rango sugerido+IVA
-            if item.precio > precio_sugerido_con_iva + tolerancia:
-                es_outlier = True  # Precio actual muy alto
-            elif item.precio < precio_sugerido_con_iva - tolerancia:
-                es_outlier = True  # Precio actual muy bajo
-            # Si está dentro del rango (sugerido+IVA ± 10%), no es outlier
-        else:
-            # Sin precio sugerido, solo marcar si está MUY por encima del mercado
-            es_outlier = diferencia > umbral  # Solo outlier si está por encima
-        
-        return CheckMasivoResultItem(
-            ref_id=item.ref_id,
-            ref_oem=item.ref_oem,
-            tipo_pieza=item.tipo_pieza,
-            precio_actual=item.precio,
-            precio_mercado=precio_mercado,
-            precio_sugerido=precio_sugerido,
-            diferencia_porcentaje=diferencia,
-            precios_encontrados=len(precios),
-            es_outlier=es_outlier,
-            familia=familia,
-        )
-    except Exception as e:
-        logger.warning(f"Error procesando {item.ref_oem}: {str(e)}")
-        return None
+def _guardar_resultados(db: Session, resultados_bd: list):
+    db.add_all(resultados_bd)
+    db.commit()
 
 
 @router.post("/verificar-masivo", response_model=CheckStockMasivoResponse)
@@ -137,14 +45,27 @@ async def verificar_stock_masivo(
     Verifica stock masivo con mapeo de columnas flexible.
     Incluye cálculo de precios sugeridos por familia.
     
+    Acepta como mucho settings.verificar_masivo_max_items items: las listas
+    grandes van a POST /trabajos (cola en segundo plano), porque aquí se
+    procesan dentro de la petición y los proxies cortan la conexión.
+    
     Requiere autenticación con rol owner o admin
     """
+    if len(request.items) > settings.verificar_masivo_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Demasiados items ({len(request.items)}, máximo {settings.verificar_masivo_max_items}): "
+                "usa POST /api/v1/stock/trabajos para verificaciones grandes"
+            ),
+        )
     try:
         logger.info(f"Usuario {usuario.email} verificando stock masivo - {len(request.items)} items")
         inicio = time.time()
         
-        # Obtener scraper reutilizable
-        scraper = get_ecooparts_scraper()
+        # Obtener scraper reutilizable (scraping y BD bloqueantes: fuera del event loop;
+        # el handler sigue async para que el delay entre items no ocupe un hilo)
+        scraper = await run_in_threadpool(get_ecooparts_scraper)
         
         if not scraper:
             raise HTTPException(
@@ -157,11 +78,16 @@ async def verificar_stock_masivo(
         
         # Procesar items (secuencialmente con delay mínimo)
         # Obtener el entorno_trabajo_id del usuario para configuración de precios
+        # Una sola carga de la configuración de precios para todos los items
         entorno_id = usuario.entorno_trabajo_id
+        snapshot_precios = await run_in_threadpool(get_snapshot_precios, db, entorno_id) if entorno_id else None
         
         for i, item in enumerate(request.items):
             try:
-                resultado = procesar_item(item, scraper, request.umbral_diferencia, request.piezas_minimas, db, entorno_id)
+                resultado = await run_in_threadpool(
+                    procesar_item, item, scraper, request.umbral_diferencia, request.piezas_minimas,
+                    snapshot_precios=snapshot_precios,
+                )
                 
                 if resultado:
                     resultados.append(resultado)
@@ -231,20 +157,21 @@ async def verificar_stock(
         scraper = ScraperFactory.create_scraper("ecooparts")
         
         # Setup sesión
-        if not scraper.setup_session("1K0959653C"):
+        if not await run_in_threadpool(scraper.setup_session, "1K0959653C"):
             raise HTTPException(
                 status_code=500,
                 detail="No se pudo configurar sesión en Ecooparts"
             )
         
         resultados = []
+        resultados_bd = []
         items_con_outliers = 0
         
         # Procesar cada item
         for item in request.items:
             try:
                 # Buscar precios en Ecooparts
-                precios = scraper.fetch_prices(item.ref_oem, limit=50)
+                precios = await run_in_threadpool(scraper.fetch_prices, item.ref_oem, limit=50)
                 
                 if not precios:
                     continue
@@ -276,8 +203,8 @@ async def verificar_stock(
                 )
                 resultados.append(resultado)
                 
-                # Guardar en BD
-                resultado_bd = ResultadoStock(
+                # Guardar en BD (al final, en un solo commit)
+                resultados_bd.append(ResultadoStock(
                     ref_id=item.ref_id,
                     ref_oem=item.ref_oem,
                     precio_azeler=item.precio_azeler,
@@ -285,8 +212,7 @@ async def verificar_stock(
                     diferencia_porcentaje=diferencia,
                     es_outlier=es_outlier,
                     precios_encontrados=len(precios),
-                )
-                db.add(resultado_bd)
+                ))
                 
                 # Delay para no saturar
                 await asyncio.sleep(0.5)
@@ -295,7 +221,7 @@ async def verificar_stock(
                 logger.warning(f"Error procesando {item.ref_oem}: {str(e)}")
                 continue
         
-        db.commit()
+        await run_in_threadpool(_guardar_resultados, db, resultados_bd)
         
         tiempo_procesamiento = time.time() - inicio
         
@@ -315,3 +241,120 @@ async def verificar_stock(
             status_code=500,
             detail=f"Error durante la verificación: {str(e)}"
         )
+
+
+# ============== VERIFICACIÓN MASIVA EN COLA ==============
+
+def _obtener_trabajo(db: Session, trabajo_id: int, usuario: Usuario) -> TrabajoVerificacion:
+    """Trabajo del entorno del usuario (sysowner ve todos) o 404"""
+    trabajo = db.query(TrabajoVerificacion).filter(TrabajoVerificacion.id == trabajo_id).first()
+    if not trabajo or (usuario.rol != "sysowner" and trabajo.entorno_trabajo_id != usuario.entorno_trabajo_id):
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+
+def _sse(evento: str, datos: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/trabajos", response_model=TrabajoVerificacionResumen, status_code=202)
+def encolar_verificacion_masiva(
+    request: CheckStockMasivoRequest,
+    db: Session = Depends(get_db),
+    usuario: Usuario = Depends(get_current_admin),
+):
+    """
+    Encola una verificación masiva (mismos parámetros que /verificar-masivo).
+    Se procesa en segundo plano; el progreso se consulta en /trabajos/{id}
+    o en /trabajos/{id}/eventos (SSE).
+    """
+    return crear_trabajo(db, usuario, request)
+
+
+@router.get("/trabajos", response_model=list[TrabajoVerificacionResumen])
+def listar_trabajos_verificacion(
+    limite: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    usuario: Usuario = Depends(get_current_admin),
+):
+    """Últimas verificaciones masivas del entorno del usuario"""
+    query = db.query(TrabajoVerificacion)
+    if usuario.rol != "sysowner":
+        query = query.filter(TrabajoVerificacion.entorno_trabajo_id == usuario.entorno_trabajo_id)
+    return query.order_by(TrabajoVerificacion.id.desc()).limit(limite).all()
+
+
+@router.get("/trabajos/{trabajo_id}", response_model=TrabajoVerificacionResponse)
+def obtener_trabajo_verificacion(
+    trabajo_id: int,
+    desde: int = Query(0, ge=0, description="Devolver resultados desde esta posición (siguiente_posicion de la consulta anterior)"),
+    db: Session = Depends(get_db),
+    usuario: Usuario = Depends(get_current_admin),
+):
+    """Progreso y resultados parciales de una verificación masiva"""
+    return leer_progreso(db, _obtener_trabajo(db, trabajo_id, usuario), desde)
+
+
+@router.post("/trabajos/{trabajo_id}/cancelar", response_model=TrabajoVerificacionResumen)
+def cancelar_trabajo_verificacion(
+    trabajo_id: int,
+    db: Session = Depends(get_db),
+    usuario: Usuario = Depends(get_current_admin),
+):
+    """Cancela una verificación masiva; los resultados ya obtenidos se conservan"""
+    trabajo = _obtener_trabajo(db, trabajo_id, usuario)
+    if not cancelar_trabajo(db, trabajo):
+        raise HTTPException(status_code=400, detail=f"El trabajo ya está {trabajo.estado}")
+    return trabajo
+
+
+@router.get("/trabajos/{trabajo_id}/eventos")
+def eventos_trabajo_verificacion(
+    trabajo_id: int,
+    request: Request,
+    desde: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    usuario: Usuario = Depends(get_current_admin),
+):
+    """
+    Progreso de una verificación masiva por Server-Sent Events.
+    Eventos: "progreso" (estado + resultados nuevos) y "fin" al terminar.
+    """
+    _obtener_trabajo(db, trabajo_id, usuario)
+    # Sesiones propias: la del request se cierra antes de que acabe el stream
+    nueva_sesion = sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+
+    def consultar(posicion: int) -> TrabajoVerificacionResponse:
+        sesion = nueva_sesion()
+        try:
+            return leer_progreso(sesion, sesion.get(TrabajoVerificacion, trabajo_id), posicion)
+        finally:
+            sesion.close()
+
+    async def generar():
+        posicion = desde
+        visto = None
+        while True:
+            progreso = await run_in_threadpool(consultar, posicion)
+            if progreso.resultados or (progreso.estado, progreso.items_procesados) != visto:
+                visto = (progreso.estado, progreso.items_procesados)
+                posicion = progreso.siguiente_posicion
+                yield _sse("progreso", progreso.model_dump(mode="json"))
+            if progreso.resultados:
+                continue  # Puede haber más resultados pendientes de enviar
+            if progreso.estado in ESTADOS_FINALES:
+                yield _sse("fin", {"estado": progreso.estado})
+                return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(settings.cola_intervalo_eventos_segundos)
+
+    return StreamingResponse(
+        generar(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
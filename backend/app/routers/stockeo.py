@@ -233,6 +233,9 @@ def crear_configuracion(
         config.mapeo_columnas = mapeo_json
         config.intervalo_minutos = data.intervalo_minutos
         config.activo = data.activo
+        # La próxima importación debe ser completa aunque el archivo no cambie
+        from services.csv_auto_import import guardar_firma_configuracion
+        guardar_firma_configuracion(config, None)
     else:
         # Crear nueva
         config = ConfiguracionStockeo(
@@ -303,6 +306,11 @@ def actualizar_configuracion(
     if data.activo is not None:
         config.activo = data.activo
     
+    # Si cambia el archivo o cómo se interpreta, la próxima importación debe ser completa
+    if any(v is not None for v in (data.ruta_csv, data.encoding, data.delimitador, data.mapeo_columnas)):
+        from services.csv_auto_import import guardar_firma_configuracion
+        guardar_firma_configuracion(config, None)
+    
     db.commit()
     db.refresh(config)
     
@@ -426,7 +434,11 @@ def ejecutar_importacion_ahora(
         raise HTTPException(status_code=400, detail="Error en formato del mapeo de columnas")
     
     # Importar función de importación
-    from services.csv_auto_import import importar_csv_con_configuracion
+    from services.csv_auto_import import importar_csv_con_configuracion, calcular_firma_archivo, guardar_firma_configuracion
+    
+    # Firma del archivo antes de importar (la manual siempre importa, pero deja la firma
+    # guardada para que el stockeo programado omita el archivo si no cambia)
+    firma = calcular_firma_archivo(config.ruta_csv) if os.path.exists(config.ruta_csv) else None
     
     # Ejecutar la importación
     resultado = importar_csv_con_configuracion(
@@ -442,6 +454,8 @@ def ejecutar_importacion_ahora(
     config.ultimo_resultado = "éxito" if resultado["success"] else f"error: {resultado.get('error', 'desconocido')}"
     config.piezas_importadas = resultado.get("piezas_importadas", 0)
     config.ventas_detectadas = resultado.get("piezas_vendidas", 0)
+    if resultado["success"]:
+        guardar_firma_configuracion(config, firma)
     db.commit()
     
     if resultado["success"]:
@@ -485,13 +499,17 @@ def eliminar_configuracion(
 
 @router.post("/ejecutar-todos")
 def ejecutar_todos_stockeos(
+    forzar: bool = True,
     current_user: Usuario = Depends(get_current_user)
 ):
-    """Ejecutar stockeo automático para todas las empresas con config activa"""
+    """
+    Ejecutar stockeo automático para todas las empresas con config activa.
+    Con forzar=false se omiten los CSV que no han cambiado desde la última importación.
+    """
     verificar_sysowner(current_user)
 
     from services.csv_auto_import import ejecutar_stockeo_automatico
-    resultados = ejecutar_stockeo_automatico()
+    resultados = ejecutar_stockeo_automatico(forzar=forzar)
 
     return {
         "mensaje": f"Stockeo ejecutado para {len(resultados)} empresas",
@@ -297,7 +297,7 @@ def _run_suite_streaming(archivo: str, suite_id: str, suite_nombre: str):
 
 
 @router.get("/suites")
-async def listar_suites(_: Usuario = Depends(get_current_sysowner)):
+def listar_suites(_: Usuario = Depends(get_current_sysowner)):
     """Lista las suites de tests disponibles."""
     return [
         {"id": k, "nombre": v["nombre"], "descripcion": v["descripcion"], "archivo": v["archivo"]}
@@ -341,7 +341,7 @@ async def ejecutar_suite_stream(suite_id: str, request: Request, current_user: U
 
 
 @router.post("/ejecutar/{suite_id}")
-async def ejecutar_suite(suite_id: str, _: Usuario = Depends(get_current_sysowner)):
+def ejecutar_suite(suite_id: str, _: Usuario = Depends(get_current_sysowner)):
     """Ejecuta una suite de tests (respuesta completa, sin streaming)."""
 
     def run_fallback(archivo: str) -> dict:
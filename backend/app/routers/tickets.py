@@ -81,7 +81,7 @@ class CambiarEstado(BaseModel):
 
 # ============== ENDPOINTS ==============
 @router.post("/crear", response_model=TicketResponse)
-async def crear_ticket(
+def crear_ticket(
     ticket: TicketCreate,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -134,7 +134,7 @@ async def crear_ticket(
 
 
 @router.post("/{ticket_id}/mensaje", response_model=MensajeResponse)
-async def enviar_mensaje(
+def enviar_mensaje(
     ticket_id: int,
     mensaje: MensajeCreate,
     db: Session = Depends(get_db),
@@ -189,7 +189,7 @@ async def enviar_mensaje(
 
 
 @router.get("/mis-tickets", response_model=List[TicketListItem])
-async def obtener_mis_tickets(
+def obtener_mis_tickets(
     estado: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -237,7 +237,7 @@ async def obtener_mis_tickets(
 
 
 @router.get("/todos", response_model=List[TicketListItem])
-async def obtener_todos_tickets(
+def obtener_todos_tickets(
     estado: Optional[str] = None,
     entorno_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -289,7 +289,7 @@ async def obtener_todos_tickets(
 
 
 @router.get("/{ticket_id}", response_model=TicketResponse)
-async def obtener_ticket(
+def obtener_ticket(
     ticket_id: int,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -341,7 +341,7 @@ async def obtener_ticket(
 
 
 @router.put("/{ticket_id}/estado")
-async def cambiar_estado_ticket(
+def cambiar_estado_ticket(
     ticket_id: int,
     datos: CambiarEstado,
     db: Session = Depends(get_db),
@@ -366,7 +366,7 @@ async def cambiar_estado_ticket(
 
 
 @router.delete("/{ticket_id}")
-async def eliminar_ticket(
+def eliminar_ticket(
     ticket_id: int,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
@@ -393,7 +393,7 @@ async def eliminar_ticket(
 
 
 @router.get("/estadisticas/resumen")
-async def obtener_estadisticas(
+def obtener_estadisticas(
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -15,7 +15,7 @@ router = APIRouter()
 
 
 @router.get("/obtener")
-async def obtener_token(
+def obtener_token(
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_admin),
 ):
@@ -45,7 +45,7 @@ async def obtener_token(
 
 
 @router.post("/configurar")
-async def configurar_token(
+def configurar_token(
     token: str,
     db: Session = Depends(get_db),
     usuario: Usuario = Depends(get_current_admin),
@@ -12,6 +12,7 @@ class BuscarPreciosRequest(BaseModel):
     cantidad: int = Field(default=20, ge=1, le=1000, description="Cantidad de piezas para calcular media")
     incluir_bparts: bool = Field(default=False, description="Incluir B-Parts en búsqueda 'todas'")
     incluir_ovoko: bool = Field(default=False, description="Incluir Ovoko en búsqueda 'todas'")
+    sin_cache: bool = Field(default=False, description="Consultar las plataformas aunque haya resultados en caché")
 
 
 class PrecioResumen(BaseModel):
@@ -54,6 +55,7 @@ class PlataformaResultado(BaseModel):
     precio_medio: Optional[float] = None
     imagenes: List[str] = []
     error: Optional[str] = None
+    desde_cache: bool = False
 
 
 class BuscarPreciosResponse(BaseModel):
@@ -141,3 +143,5 @@ class BusquedaCompletaResponse(BaseModel):
     total_oem: int = 0
     total_iam: int = 0
     desguaces_disponibles: Dict[str, str] = {}
+    # Duración de cada fase/fuente en ms
+    tiempos_ms: Dict[str, int] = {}
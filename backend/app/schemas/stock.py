@@ -3,6 +3,7 @@ Schemas para API de stock
 """
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from datetime import datetime
 
 
 class StockItem(BaseModel):
@@ -86,3 +87,28 @@ class CheckStockMasivoResponse(BaseModel):
     items_con_outliers: int
     resultados: List[CheckMasivoResultItem]
     tiempo_procesamiento: float
+
+
+# ========== TRABAJOS DE VERIFICACIÓN MASIVA (COLA) ==========
+
+class TrabajoVerificacionResumen(BaseModel):
+    """Estado y progreso de una verificación masiva encolada"""
+    id: int
+    estado: str
+    total_items: int
+    items_procesados: int
+    items_con_resultado: int
+    items_con_outliers: int
+    mensaje_error: Optional[str] = None
+    fecha_creacion: Optional[datetime] = None
+    fecha_inicio: Optional[datetime] = None
+    fecha_fin: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class TrabajoVerificacionResponse(TrabajoVerificacionResumen):
+    """Progreso más los resultados parciales desde una posición"""
+    resultados: List[CheckMasivoResultItem] = []
+    siguiente_posicion: int = 0  # Pasar como ?desde= en la siguiente consulta
@@ -27,6 +27,7 @@ from .nty import NtyScraper
 from .prasco import PrascoScraper
 from .triclo import search_triclo
 from .vauner import search_vauner
+from utils.single_flight import grupo, clave_referencia
 
 
 def ejecutar_busqueda(nombre, funcion, oem_ref):
@@ -42,7 +43,12 @@ def buscar_en_todos(oem_ref):
     """
     Busca una referencia OEM en todos los proveedores disponibles.
     Retorna un diccionario con los resultados de cada proveedor.
+    Búsquedas simultáneas de la misma referencia comparten una sola ejecución.
     """
+    return grupo("referencias_iam").hacer(clave_referencia(oem_ref), _buscar_en_todos, oem_ref)
+
+
+def _buscar_en_todos(oem_ref):
     script_dir = os.path.dirname(os.path.abspath(__file__))
     vauner_csv = os.path.join(script_dir, "data", "Vauner_Unificado.csv")
     triclo_csv = os.path.join(script_dir, "data", "triclo_final_unificado.csv")
@@ -0,0 +1,108 @@
+"""
+Catálogos locales de referencias cruzadas (CSV de Vauner, Triclo...) cargados
+una sola vez en memoria e indexados:
+
+- Hash de OEM normalizado -> filas, para la búsqueda exacta.
+- Trigramas de los OEM largos, para la búsqueda aproximada de Triclo
+  ("uno contiene al otro") sin recorrer todas las filas.
+
+El catálogo se recarga solo cuando cambia el archivo (mtime/tamaño).
+"""
+import csv
+import os
+import threading
+from collections import defaultdict
+
+# Longitud mínima (en ambos lados) para que cuente la coincidencia por subcadena
+LONGITUD_MINIMA_APROXIMADA = 6
+
+
+def normalizar_oem(ref):
+    return str(ref).strip().upper().replace(" ", "").replace(".", "").replace("-", "")
+
+
+def _trigramas(codigo):
+    return {codigo[i:i + 3] for i in range(len(codigo) - 2)}
+
+
+class CatalogoOEM:
+    """Filas de un CSV indexadas por sus códigos OEM normalizados"""
+
+    def __init__(self, filas, separadores="/,"):
+        self.filas = []
+        self._por_codigo = defaultdict(list)
+        self._por_trigrama = defaultdict(set)
+
+        for fila in filas:
+            oem_raw = str(fila.get("OEM", ""))
+            if not oem_raw or oem_raw.lower() == "nan":
+                continue
+            for sep in separadores[1:]:
+                oem_raw = oem_raw.replace(sep, separadores[0])
+            indice = len(self.filas)
+            self.filas.append(fila)
+            for parte in oem_raw.split(separadores[0]):
+                codigo = normalizar_oem(parte)
+                if not codigo:
+                    continue
+                if indice not in self._por_codigo[codigo]:
+                    self._por_codigo[codigo].append(indice)
+                if len(codigo) >= LONGITUD_MINIMA_APROXIMADA:
+                    for trigrama in _trigramas(codigo):
+                        self._por_trigrama[trigrama].add(codigo)
+
+    def buscar_exacto(self, oem_ref):
+        """Filas (en orden del archivo) con algún OEM igual a la referencia normalizada"""
+        return [self.filas[i] for i in self._por_codigo.get(normalizar_oem(oem_ref), [])]
+
+    def buscar_aproximado(self, oem_ref):
+        """
+        Filas con algún OEM igual a la referencia o, si ambos tienen 6+ caracteres,
+        que uno contenga al otro.
+        """
+        objetivo = normalizar_oem(oem_ref)
+        codigos = {objetivo} if objetivo in self._por_codigo else set()
+
+        if len(objetivo) >= LONGITUD_MINIMA_APROXIMADA:
+            # OEM contenidos en la referencia: sus subcadenas largas
+            for inicio in range(len(objetivo)):
+                for fin in range(inicio + LONGITUD_MINIMA_APROXIMADA, len(objetivo) + 1):
+                    if objetivo[inicio:fin] in self._por_codigo:
+                        codigos.add(objetivo[inicio:fin])
+            # OEM que contienen la referencia: candidatos por trigramas comunes
+            candidatos = None
+            for trigrama in _trigramas(objetivo):
+                con_trigrama = self._por_trigrama.get(trigrama, set())
+                candidatos = con_trigrama if candidatos is None else candidatos & con_trigrama
+                if not candidatos:
+                    break
+            codigos.update(c for c in candidatos or () if objetivo in c)
+
+        indices = sorted({i for codigo in codigos for i in self._por_codigo[codigo]})
+        return [self.filas[i] for i in indices]
+
+
+_catalogos = {}
+_lock = threading.Lock()
+
+
+def obtener_catalogo(csv_path, separadores="/,"):
+    """
+    Catálogo del CSV, cargado la primera vez y cuando el archivo cambia.
+    None si el archivo no existe.
+    """
+    try:
+        estado = os.stat(csv_path)
+    except OSError:
+        return None
+    firma = (estado.st_mtime_ns, estado.st_size)
+    clave = (os.path.abspath(csv_path), separadores)
+
+    with _lock:
+        cargado = _catalogos.get(clave)
+        if cargado and cargado[0] == firma:
+            return cargado[1]
+        with open(csv_path, "r", encoding="utf-8-sig") as f:
+            catalogo = CatalogoOEM(csv.DictReader(f), separadores)
+        _catalogos[clave] = (firma, catalogo)
+        return catalogo
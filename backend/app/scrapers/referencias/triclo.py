@@ -1,56 +1,36 @@
-import csv
 import sys
 import json
 import os
 
+from .catalogo_local import obtener_catalogo
+
 def search_triclo(oem_ref, csv_path=None):
+    """
+    Busca en el CSV de Triclo las filas cuyo OEM coincide con la referencia
+    (exacto, o uno contiene al otro si ambos tienen 6+ caracteres).
+    El CSV se indexa en memoria la primera vez y se recarga si cambia.
+    """
     if csv_path is None:
         script_dir = os.path.dirname(os.path.abspath(__file__))
         csv_path = os.path.join(script_dir, "data", "triclo_final_unificado.csv")
     
-    if not os.path.exists(csv_path):
-        return []
-
-    target = oem_ref.strip().upper().replace(" ", "").replace(".", "").replace("-", "")
     results = []
 
     try:
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                row_oems_raw = str(row.get("OEM", ""))
-                if not row_oems_raw or row_oems_raw.lower() == 'nan':
-                    continue
-                
-                cleaned_oems_str = row_oems_raw.replace("/", ",").replace(";", ",")
-                
-                oem_codes = []
-                for x in cleaned_oems_str.split(","):
-                    clean_code = x.strip().upper().replace(" ", "").replace(".", "").replace("-", "")
-                    if clean_code:
-                        oem_codes.append(clean_code)
-                
-                found = False
-                for code in oem_codes:
-                    if target == code:
-                        found = True
-                        break
-                    if len(target) > 5 and len(code) > 5:
-                        if target in code or code in target:
-                            found = True
-                            break
-                            
-                if found:
-                    iam = str(row.get("Triclo_Ref", "")).replace(".0", "")
-                    
-                    results.append({
-                        "source": "Triclo (Local CSV)",
-                        "iam_ref": iam,
-                        "brand": row.get("Marca", "TRICLO"),
-                        "description": f"{row.get('Modelo','')} {row.get('Info','')}".strip(),
-                        "price": "",
-                        "image_url": ""
-                    })
+        catalogo = obtener_catalogo(csv_path, separadores=",/;")
+        if catalogo is None:
+            return []
+        for row in catalogo.buscar_aproximado(oem_ref):
+            iam = str(row.get("Triclo_Ref", "")).replace(".0", "")
+
+            results.append({
+                "source": "Triclo (Local CSV)",
+                "iam_ref": iam,
+                "brand": row.get("Marca", "TRICLO"),
+                "description": f"{row.get('Modelo','')} {row.get('Info','')}".strip(),
+                "price": "",
+                "image_url": ""
+            })
     except Exception as e:
         pass
 
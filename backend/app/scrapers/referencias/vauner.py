@@ -1,37 +1,28 @@
-import csv
 import os
 
+from .catalogo_local import obtener_catalogo
+
 def buscar_iam_por_oem(oem_ref, csv_path=None):
     """
     Busca en el CSV de Vauner las referencias IAM que corresponden a un OEM dado.
     Retorna lista de tuplas: [(iam_original, iam_limpio), ...]
+    El CSV se indexa en memoria la primera vez y se recarga si cambia.
     """
     if csv_path is None:
         script_dir = os.path.dirname(os.path.abspath(__file__))
         csv_path = os.path.join(script_dir, "data", "Vauner_Unificado.csv")
     
-    if not os.path.exists(csv_path):
-        return []
-
-    target = oem_ref.strip().upper().replace(" ", "").replace(".", "").replace("-", "")
     results = []
 
     try:
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                oem_field = str(row.get("OEM", ""))
-                if not oem_field or oem_field.lower() == 'nan':
-                    continue
-                
-                oem_list = [x.strip().upper().replace(" ", "").replace(".", "").replace("-", "") 
-                           for x in oem_field.replace("/", ",").split(",")]
-                
-                if target in oem_list:
-                    iam_original = str(row.get("Codigo", "")).strip()
-                    iam_limpio = iam_original.replace(".", "").replace("-", "").replace(" ", "")
-                    if iam_original:
-                        results.append((iam_original, iam_limpio))
+        catalogo = obtener_catalogo(csv_path, separadores="/,")
+        if catalogo is None:
+            return []
+        for row in catalogo.buscar_exacto(oem_ref):
+            iam_original = str(row.get("Codigo", "")).strip()
+            iam_limpio = iam_original.replace(".", "").replace("-", "").replace(" ", "")
+            if iam_original:
+                results.append((iam_original, iam_limpio))
     except Exception as e:
         pass
 
@@ -0,0 +1,269 @@
+"""
+Almacén de OEM equivalentes
+===========================
+
+Las equivalencias de una OEM (tarostrade + distri-auto) casi nunca cambian,
+pero consultarlas son varias peticiones HTTP por búsqueda. Se guardan en la
+tabla equivalencias_oem con una capa en memoria (LRU) delante:
+
+- Entrada fresca (menos de settings.oem_equiv_ttl_dias): se devuelve sin red.
+- "Sin equivalencias" también se guarda (caché negativa), pero caduca antes
+  (settings.oem_equiv_ttl_negativo_dias), igual que las consultas en las que
+  alguna fuente falló.
+- Entrada caducada: se devuelve lo guardado y se revalida en segundo plano.
+- Sin entrada: se consulta en el momento. Si todas las fuentes fallan no se
+  guarda nada (un fallo de red no es "sin equivalencias").
+
+Si la BD falla, el almacén sigue funcionando solo en memoria.
+Precarga masiva: python scripts/precalentar_equivalencias_oem.py
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.busqueda import EquivalenciaOEM
+from utils.single_flight import clave_referencia
+from utils.timezone import now_spain_naive
+
+logger = logging.getLogger(__name__)
+
+
+class FuentesNoDisponibles(Exception):
+    """Ninguna fuente de equivalencias respondió"""
+
+
+# Consulta las fuentes: (equivalentes, completa). completa=False si alguna fuente
+# falló; FuentesNoDisponibles si fallaron todas
+ConsultaEquivalencias = Callable[[str], Tuple[List[str], bool]]
+
+
+@dataclass
+class Entrada:
+    equivalentes: List[str]
+    completa: bool
+    fecha_actualizacion: datetime
+
+    def caducada(self, ahora: datetime) -> bool:
+        dias = settings.oem_equiv_ttl_dias
+        if not self.equivalentes or not self.completa:
+            dias = settings.oem_equiv_ttl_negativo_dias
+        return self.fecha_actualizacion + timedelta(days=dias) <= ahora
+
+
+def _acotar(equivalentes: List[str], referencia: str) -> List[str]:
+    """Recorta la lista para que su JSON quepa en la columna equivalentes"""
+    limite = EquivalenciaOEM.equivalentes.type.length
+    tamano = len("[]")
+    for i, equivalente in enumerate(equivalentes):
+        tamano += len(json.dumps(equivalente)) + (2 if i else 0)  # ", " entre elementos
+        if tamano > limite:
+            logger.warning(f"[EquivOEM] {referencia}: {len(equivalentes)} equivalencias, se guardan {i}")
+            return equivalentes[:i]
+    return equivalentes
+
+
+class AlmacenEquivalencias:
+    """Equivalencias OEM en BD con LRU en memoria y revalidación en segundo plano"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self._memoria: "OrderedDict[str, Entrada]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._revalidando: set = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {"memoria": 0, "bd": 0, "consultas": 0, "revalidaciones": 0, "errores": 0}
+
+    # ── Lectura ──────────────────────────────────────────
+
+    def obtener(self, referencia: str, consultar: ConsultaEquivalencias) -> List[str]:
+        """Equivalencias de la referencia: guardadas si las hay, consultadas si no"""
+        clave = clave_referencia(referencia)
+        if not clave:
+            return []
+        entrada = self._leer(clave)
+        if entrada is None:
+            try:
+                return list(self.refrescar(referencia, consultar).equivalentes)
+            except FuentesNoDisponibles as e:
+                logger.warning(f"[EquivOEM] {referencia}: {e}; sin equivalencias (no se guarda)")
+                return []
+        if entrada.caducada(now_spain_naive()):
+            self._revalidar_en_segundo_plano(clave, referencia, consultar)
+        return list(entrada.equivalentes)
+
+    def _leer(self, clave: str) -> Optional[Entrada]:
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                self._memoria.move_to_end(clave)
+                self._stats["memoria"] += 1
+                return entrada
+        try:
+            with self.session_factory() as db:
+                fila = db.query(EquivalenciaOEM).filter(EquivalenciaOEM.clave == clave).first()
+                if fila is None:
+                    return None
+                entrada = Entrada(json.loads(fila.equivalentes or "[]"), bool(fila.completa), fila.fecha_actualizacion)
+        except Exception as e:
+            logger.warning(f"[EquivOEM] Error leyendo {clave} de la BD: {e}")
+            return None
+        with self._lock:
+            self._stats["bd"] += 1
+        self._en_memoria(clave, entrada)
+        return entrada
+
+    def _en_memoria(self, clave: str, entrada: Entrada):
+        with self._lock:
+            self._memoria[clave] = entrada
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > settings.oem_equiv_memoria_max:
+                self._memoria.popitem(last=False)
+
+    # ── Escritura ────────────────────────────────────────
+
+    def refrescar(self, referencia: str, consultar: ConsultaEquivalencias) -> Entrada:
+        """Consulta las fuentes y guarda el resultado (FuentesNoDisponibles si fallan todas)"""
+        clave = clave_referencia(referencia)
+        with self._lock:
+            self._stats["consultas"] += 1
+        try:
+            equivalentes, completa = consultar(referencia)
+        except FuentesNoDisponibles:
+            with self._lock:
+                self._stats["errores"] += 1
+            raise
+        if not completa:
+            # Con alguna fuente caída no se pierden las equivalencias que ya se tenían
+            anterior = self._leer(clave)
+            if anterior is not None:
+                equivalentes = list(equivalentes) + anterior.equivalentes
+        entrada = Entrada(_acotar(sorted(set(equivalentes)), referencia), completa, now_spain_naive())
+        self._guardar(clave, referencia, entrada)
+        self._en_memoria(clave, entrada)
+        return entrada
+
+    def _guardar(self, clave: str, referencia: str, entrada: Entrada):
+        try:
+            with self.session_factory() as db:
+                fila = db.query(EquivalenciaOEM).filter(EquivalenciaOEM.clave == clave).first()
+                if fila is None:
+                    fila = EquivalenciaOEM(clave=clave, referencia=referencia.strip()[:100])
+                    db.add(fila)
+                fila.equivalentes = json.dumps(entrada.equivalentes)
+                fila.completa = entrada.completa
+                fila.fecha_actualizacion = entrada.fecha_actualizacion
+                db.commit()
+        except Exception as e:
+            logger.warning(f"[EquivOEM] Error guardando {clave} en la BD: {e}")
+
+    # ── Revalidación ─────────────────────────────────────
+
+    def _revalidar_en_segundo_plano(self, clave: str, referencia: str, consultar: ConsultaEquivalencias):
+        with self._lock:
+            if clave in self._revalidando:
+                return
+            self._revalidando.add(clave)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.oem_equiv_revalidaciones_simultaneas, thread_name_prefix="equiv-oem"
+                )
+            executor = self._executor
+        try:
+            executor.submit(self._revalidar, clave, referencia, consultar)
+        except RuntimeError:
+            # Executor cerrado (apagado de la app)
+            with self._lock:
+                self._revalidando.discard(clave)
+
+    def _revalidar(self, clave: str, referencia: str, consultar: ConsultaEquivalencias):
+        try:
+            self.refrescar(referencia, consultar)
+            with self._lock:
+                self._stats["revalidaciones"] += 1
+            logger.debug(f"[EquivOEM] {referencia} revalidada")
+        except Exception as e:
+            # Se sigue sirviendo la entrada caducada; se reintentará en el siguiente acceso
+            logger.info(f"[EquivOEM] No se pudo revalidar {referencia}: {e}")
+        finally:
+            with self._lock:
+                self._revalidando.discard(clave)
+
+    # ── Precarga ─────────────────────────────────────────
+
+    def precalentar(
+        self,
+        referencias: Iterable[str],
+        consultar: ConsultaEquivalencias,
+        hilos: int = 4,
+        forzar: bool = False,
+    ) -> Dict[str, int]:
+        """
+        Consulta y guarda las equivalencias de muchas referencias. Salta las que
+        ya están frescas (salvo forzar=True). Devuelve el recuento por resultado.
+        """
+        vistas = set()
+        pendientes = []
+        resumen = {"frescas": 0, "con_equivalencias": 0, "sin_equivalencias": 0, "errores": 0}
+        ahora = now_spain_naive()
+        for referencia in referencias:
+            clave = clave_referencia(referencia)
+            if not clave or clave in vistas:
+                continue
+            vistas.add(clave)
+            entrada = None if forzar else self._leer(clave)
+            if entrada is not None and not entrada.caducada(ahora):
+                resumen["frescas"] += 1
+            else:
+                pendientes.append(referencia)
+
+        def precargar(referencia: str) -> str:
+            try:
+                entrada = self.refrescar(referencia, consultar)
+            except Exception as e:
+                logger.warning(f"[EquivOEM] Precarga de {referencia} fallida: {e}")
+                return "errores"
+            return "con_equivalencias" if entrada.equivalentes else "sin_equivalencias"
+
+        with ThreadPoolExecutor(max_workers=max(1, hilos)) as ex:
+            for resultado in ex.map(precargar, pendientes):
+                resumen[resultado] += 1
+        return resumen
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "en_memoria": len(self._memoria), "revalidando": len(self._revalidando)}
+
+    def cerrar(self):
+        """Cancela las revalidaciones pendientes (apagado de la app)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_almacen: Optional[AlmacenEquivalencias] = None
+_almacen_lock = threading.Lock()
+
+
+def get_almacen_equivalencias() -> AlmacenEquivalencias:
+    global _almacen
+    with _almacen_lock:
+        if _almacen is None:
+            _almacen = AlmacenEquivalencias()
+        return _almacen
+
+
+def cerrar_almacen_equivalencias():
+    with _almacen_lock:
+        almacen = _almacen
+    if almacen is not None:
+        almacen.cerrar()
@@ -10,26 +10,46 @@ Flujo:
     - Buscar en desguaces        (delfincar, logroño, valdizarbe, azor…)
 
 Cada paso de Fase 2 recibe todas las refs (original + equivalentes).
+
+Las ramas de Fase 2 que consultan la BD abren cada una su propia sesión
+corta: una Session de SQLAlchemy no se puede compartir entre hilos.
+
+Con `al_progresar` cada fase y cada fuente se notifica en cuanto termina
+(evento, datos), con su duración; es lo que usa el modo streaming de
+/precios/busqueda-completa. `cancelar` corta la búsqueda (cliente desconectado).
 """
 
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Optional
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Callable, List, Dict, Optional
 from dataclasses import dataclass, field
 
-from sqlalchemy import or_, func
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, func, select
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.models.busqueda import BaseDesguace, PiezaDesguace, PiezaVendida, EntornoTrabajo
 from app.services.oem_equivalentes import buscar_oem_equivalentes
 from app.services.desguaces import DesguaceFactory
 from app.scrapers.referencias import obtener_items_iam_por_proveedor
+from services.referencias_index import select_piezas_por_referencia
+from core.http_async import bucle_de_la_app, ejecutar_en_bucle
 
 logger = logging.getLogger(__name__)
 
 # Entornos que NUNCA se incluyen en búsqueda cruzada
 ENTORNOS_EXCLUIDOS = {"entornoadmin", "admin"}
 
+# Cada cuánto se comprueba si la búsqueda se ha cancelado mientras se espera a la Fase 2
+ESPERA_CANCELACION_SEGUNDOS = 0.2
+
+# al_progresar(evento, datos): se llama desde los hilos de la búsqueda
+Progreso = Callable[[str, Dict[str, Any]], None]
+# Resultados de un desguace (ya filtrados) y lo que ha tardado en ms
+DesguaceTerminado = Callable[[Any, List[Dict], int], None]
+
 
 @dataclass
 class ResultadoBusquedaCompleta:
@@ -47,6 +67,49 @@ class ResultadoBusquedaCompleta:
     total_desguaces: int = 0
     total_oem: int = 0
     total_iam: int = 0
+    # Duración de cada fase/fuente en ms
+    tiempos_ms: Dict[str, int] = field(default_factory=dict)
+
+
+# Fuentes de la Fase 2: (atributo con los resultados, atributo con el total, texto del log)
+FUENTES_FASE2 = {
+    "stock_propio": ("stock_propio", "total_stock", "en stock propio"),
+    "otros_entornos": ("stock_otros_entornos", "total_otros_entornos", "en otros entornos"),
+    "iam": ("piezas_nuevas_iam", "total_iam", "refs IAM"),
+    "desguaces": ("resultados_desguaces", "total_desguaces", "en desguaces"),
+}
+
+
+def _ms_desde(inicio: float) -> int:
+    return int((time.perf_counter() - inicio) * 1000)
+
+
+def _emitir(al_progresar: Optional[Progreso], evento: str, datos: Dict[str, Any]):
+    """Notifica un evento de progreso; un fallo del receptor no para la búsqueda"""
+    if al_progresar is None:
+        return
+    try:
+        al_progresar(evento, datos)
+    except Exception as e:
+        logger.warning(f"[BúsquedaCompleta] Error notificando '{evento}': {e}")
+
+
+def _en_sesion_propia(nueva_sesion: Callable[[], Session], funcion: Callable, *args):
+    """Ejecuta funcion(sesion, *args) con una sesión corta solo para esta rama"""
+    sesion = nueva_sesion()
+    try:
+        return funcion(sesion, *args)
+    finally:
+        sesion.close()
+
+
+def _medir(tiempos: Dict[str, int], fuente: str, funcion: Callable, *args):
+    """Ejecuta funcion(*args) anotando su duración en tiempos[fuente]"""
+    inicio = time.perf_counter()
+    try:
+        return funcion(*args)
+    finally:
+        tiempos[fuente] = _ms_desde(inicio)
 
 
 def _refs_lower_set(referencias: List[str]) -> set:
@@ -77,17 +140,10 @@ def _buscar_stock_propio(
     if not refs_set:
         return []
 
-    # Coincidencia EXACTA en oem, oe, iam o refid
-    filtros = [
-        func.lower(PiezaDesguace.oem).in_(refs_set),
-        func.lower(PiezaDesguace.oe).in_(refs_set),
-        func.lower(PiezaDesguace.iam).in_(refs_set),
-        func.lower(PiezaDesguace.refid).in_(refs_set),
-    ]
-
+    # Coincidencia EXACTA (normalizada) en oem, oe, iam o refid vía índice de referencias
     piezas = db.query(PiezaDesguace).filter(
         PiezaDesguace.base_desguace_id == base.id,
-        or_(*filtros)
+        PiezaDesguace.id.in_(select_piezas_por_referencia(referencias, entorno_trabajo_id))
     ).limit(50).all()
 
     resultados = []
@@ -152,10 +208,21 @@ def _buscar_vendidas(
     return resultados
 
 
-def _buscar_en_desguaces(referencias: List[str]) -> List[Dict]:
-    """Busca en todos los desguaces registrados, en paralelo."""
+def _buscar_en_desguaces(
+    referencias: List[str],
+    bucle: Optional[asyncio.AbstractEventLoop] = None,
+    al_terminar: Optional[DesguaceTerminado] = None,
+) -> List[Dict]:
+    """
+    Busca en todos los desguaces registrados, en paralelo.
+    Con el bucle de la app usa el cliente HTTP asíncrono compartido
+    (core.http_async); sin él (scripts, tests) usa un pool de hilos.
+    al_terminar(scraper, resultados, ms) se llama en cuanto acaba cada desguace.
+    """
+    if bucle is not None:
+        return ejecutar_en_bucle(bucle, _buscar_en_desguaces_async(referencias, al_terminar))
+
     scrapers = DesguaceFactory.crear_todos()
-    resultados: List[Dict] = []
 
     def _buscar_uno(scraper, ref):
         try:
@@ -168,15 +235,56 @@ def _buscar_en_desguaces(referencias: List[str]) -> List[Dict]:
     if not tareas:
         return []
 
+    inicio = time.perf_counter()
+    listas: List[List[Dict]] = []
+    por_desguace: Dict[str, List[List[Dict]]] = {s.id: [] for s in scrapers}
     with ThreadPoolExecutor(max_workers=min(12, len(tareas))) as ex:
-        futures = {ex.submit(_buscar_uno, s, ref): (s.id, ref) for s, ref in tareas}
-        ids_vistos: set = set()
+        futures = {ex.submit(_buscar_uno, s, ref): s for s, ref in tareas}
         for f in as_completed(futures):
-            for pieza in f.result():
-                key = (pieza.get("desguace_id"), pieza.get("id"))
-                if key not in ids_vistos:
-                    ids_vistos.add(key)
-                    resultados.append(pieza)
+            scraper = futures[f]
+            listas.append(f.result())
+            por_desguace[scraper.id].append(listas[-1])
+            if al_terminar is not None and len(por_desguace[scraper.id]) == len(referencias):
+                al_terminar(scraper, _filtrar_resultados_desguaces(por_desguace[scraper.id], referencias), _ms_desde(inicio))
+
+    return _filtrar_resultados_desguaces(listas, referencias)
+
+
+async def _buscar_en_desguaces_async(
+    referencias: List[str],
+    al_terminar: Optional[DesguaceTerminado] = None,
+) -> List[Dict]:
+    """Variante async: todas las (desguace, ref) a la vez sobre el cliente compartido"""
+    scrapers = DesguaceFactory.crear_todos()
+    inicio = time.perf_counter()
+
+    async def _buscar_uno(scraper, ref):
+        try:
+            return await scraper.buscar_async(ref)
+        except Exception as e:
+            logger.warning(f"[{scraper.nombre}] Error con {ref}: {e}")
+            return []
+
+    async def _buscar_desguace(scraper):
+        listas = await asyncio.gather(*(_buscar_uno(scraper, ref) for ref in referencias))
+        if al_terminar is not None:
+            al_terminar(scraper, _filtrar_resultados_desguaces(listas, referencias), _ms_desde(inicio))
+        return listas
+
+    por_desguace = await asyncio.gather(*(_buscar_desguace(s) for s in scrapers))
+    return _filtrar_resultados_desguaces([l for listas in por_desguace for l in listas], referencias)
+
+
+def _filtrar_resultados_desguaces(listas: List[List[Dict]], referencias: List[str]) -> List[Dict]:
+    """Quita duplicados (desguace, id) y deja solo OEM que coinciden exactamente"""
+    resultados: List[Dict] = []
+    ids_vistos: set = set()
+    for lista in listas:
+        for pieza in lista:
+            key = (pieza.get("desguace_id"), pieza.get("id"))
+            if key not in ids_vistos:
+                ids_vistos.add(key)
+                resultados.append(pieza)
 
     # Post-filtrar: OEM del resultado debe coincidir EXACTAMENTE con alguna ref
     refs_set = _refs_lower_set(referencias)
@@ -190,72 +298,102 @@ def _buscar_en_desguaces(referencias: List[str]) -> List[Dict]:
     return resultados_filtrados
 
 
-def _buscar_stock_otros_entornos(
+# Máximo de piezas por entorno en la búsqueda cruzada
+LIMITE_PIEZAS_POR_ENTORNO = 100
+
+
+def _entornos_compartidos(entorno_propio_id: int):
+    """
+    Select de los entornos cuyo stock se muestra a los demás: activos, con el
+    módulo de inventario activo (NULL cuenta como activo) y que no son el propio
+    ni los de ENTORNOS_EXCLUIDOS (admin).
+    """
+    return select(EntornoTrabajo.id).where(
+        EntornoTrabajo.id != entorno_propio_id,
+        EntornoTrabajo.activo == True,
+        or_(EntornoTrabajo.modulo_inventario_piezas.is_(None), EntornoTrabajo.modulo_inventario_piezas == True),
+        func.replace(func.lower(EntornoTrabajo.nombre), " ", "").notin_(ENTORNOS_EXCLUIDOS),
+    )
+
+
+def buscar_stock_compartido(
     db: Session,
     entorno_propio_id: int,
     referencias: List[str],
 ) -> List[Dict]:
     """
-    Busca piezas en los stocks de OTROS entornos de trabajo (excl. admin).
-    Si soy Motocoche → busca en DOCU. Si soy DOCU → busca en Motocoche. Etc.
+    Piezas de los stocks de OTROS entornos de trabajo que coinciden con alguna
+    de las referencias, agrupadas por entorno:
+    [{"entorno_id", "entorno_nombre", "total", "piezas": [...]}], por nombre.
+
+    Una sola consulta para todos los entornos: las referencias se resuelven en
+    el índice referencias_piezas (entorno, token normalizado), así el coste no
+    crece con el número de entornos ni con sus piezas. Como mucho
+    LIMITE_PIEZAS_POR_ENTORNO piezas por entorno.
     """
-    # Obtener todos los entornos activos que no sean el mío ni admin
-    entornos = db.query(EntornoTrabajo).filter(
-        EntornoTrabajo.id != entorno_propio_id,
-        EntornoTrabajo.activo == True,
-    ).all()
-
-    # Filtrar los excluidos (admin)
-    entornos = [e for e in entornos if e.nombre.lower().replace(" ", "") not in ENTORNOS_EXCLUIDOS]
-    if not entornos:
+    if not _refs_lower_set(referencias):
         return []
 
-    resultados: List[Dict] = []
-    ids_vistos: set = set()
-
-    for entorno in entornos:
-        base = db.query(BaseDesguace).filter(
-            BaseDesguace.entorno_trabajo_id == entorno.id
-        ).first()
-        if not base:
-            continue
+    coincidentes = (
+        select(
+            PiezaDesguace.id.label("pieza_id"),
+            BaseDesguace.entorno_trabajo_id.label("entorno_id"),
+            func.row_number().over(
+                partition_by=BaseDesguace.entorno_trabajo_id, order_by=PiezaDesguace.id
+            ).label("orden"),
+        )
+        .join(BaseDesguace, BaseDesguace.id == PiezaDesguace.base_desguace_id)
+        .where(PiezaDesguace.id.in_(
+            select_piezas_por_referencia(referencias, _entornos_compartidos(entorno_propio_id))
+        ))
+        .subquery()
+    )
+    filas = (
+        db.query(PiezaDesguace, EntornoTrabajo.id, EntornoTrabajo.nombre)
+        .join(coincidentes, coincidentes.c.pieza_id == PiezaDesguace.id)
+        .join(EntornoTrabajo, EntornoTrabajo.id == coincidentes.c.entorno_id)
+        .filter(coincidentes.c.orden <= LIMITE_PIEZAS_POR_ENTORNO)
+        .order_by(EntornoTrabajo.nombre, PiezaDesguace.id)
+        .all()
+    )
 
-        refs_set = _refs_lower_set(referencias)
-        if not refs_set:
-            continue
+    grupos: Dict[int, Dict] = {}
+    for p, entorno_id, entorno_nombre in filas:
+        grupo = grupos.setdefault(entorno_id, {
+            "entorno_id": entorno_id,
+            "entorno_nombre": entorno_nombre,
+            "total": 0,
+            "piezas": [],
+        })
+        grupo["piezas"].append({
+            "id": p.id,
+            "refid": p.refid,
+            "oem": p.oem,
+            "articulo": p.articulo,
+            "marca": p.marca,
+            "modelo": p.modelo,
+            "precio": float(p.precio) if p.precio else None,
+            "precio_texto": f"{p.precio} €" if p.precio else "",
+            "ubicacion": p.ubicacion,
+            "imagen": p.imagen or "",
+            "fuente": f"entorno_{entorno_id}",
+            "fuente_nombre": entorno_nombre,
+        })
+        grupo["total"] += 1
+    return list(grupos.values())
 
-        filtros = [
-            func.lower(PiezaDesguace.oem).in_(refs_set),
-            func.lower(PiezaDesguace.oe).in_(refs_set),
-            func.lower(PiezaDesguace.iam).in_(refs_set),
-            func.lower(PiezaDesguace.refid).in_(refs_set),
-        ]
-
-        piezas = db.query(PiezaDesguace).filter(
-            PiezaDesguace.base_desguace_id == base.id,
-            or_(*filtros)
-        ).limit(100).all()
-
-        for p in piezas:
-            if p.id in ids_vistos:
-                continue
-            ids_vistos.add(p.id)
-            resultados.append({
-                "id": p.id,
-                "refid": p.refid,
-                "oem": p.oem,
-                "articulo": p.articulo,
-                "marca": p.marca,
-                "modelo": p.modelo,
-                "precio": float(p.precio) if p.precio else None,
-                "precio_texto": f"{p.precio} €" if p.precio else "",
-                "ubicacion": p.ubicacion,
-                "imagen": p.imagen or "",
-                "fuente": f"entorno_{entorno.id}",
-                "fuente_nombre": entorno.nombre,
-            })
 
-    return resultados
+def _buscar_stock_otros_entornos(
+    db: Session,
+    entorno_propio_id: int,
+    referencias: List[str],
+) -> List[Dict]:
+    """
+    Busca piezas en los stocks de OTROS entornos de trabajo (excl. admin).
+    Si soy Motocoche → busca en DOCU. Si soy DOCU → busca en Motocoche. Etc.
+    Lista plana (agrupada por entorno) para la respuesta de la búsqueda completa.
+    """
+    return [pieza for grupo in buscar_stock_compartido(db, entorno_propio_id, referencias) for pieza in grupo["piezas"]]
 
 
 def _buscar_iam_todas_refs(referencias: List[str]) -> List[Dict]:
@@ -289,6 +427,9 @@ def busqueda_completa(
     referencia: str,
     db: Session,
     entorno_trabajo_id: int,
+    al_progresar: Optional[Progreso] = None,
+    cancelar: Optional[threading.Event] = None,
+    nueva_sesion: Optional[Callable[[], Session]] = None,
 ) -> ResultadoBusquedaCompleta:
     """
     Ejecuta la búsqueda completa en 2 fases:
@@ -298,10 +439,20 @@ def busqueda_completa(
         - Stock de otros entornos (excl. admin)
         - IAM cross-ref (ref original + equivalentes)
         - Desguaces competidores (ref original + equivalentes)
+
+    Eventos de al_progresar: "fase", "oem_equivalentes", una por fuente de
+    FUENTES_FASE2 (en orden de llegada) y "desguace" por cada desguace.
+    Si se activa `cancelar` se deja de esperar y se devuelve lo que haya.
+
+    Las ramas de BD no usan `db` sino sesiones de `nueva_sesion` (por defecto,
+    sesiones sobre la misma conexión/engine que `db`), una por rama.
     """
     resultado = ResultadoBusquedaCompleta(referencia_original=referencia)
+    inicio_total = time.perf_counter()
 
     # ── Fase 1: OEM equivalentes ─────────────────────────
+    _emitir(al_progresar, "fase", {"fase": 1, "referencia": referencia})
+    inicio = time.perf_counter()
     try:
         oem_eq = buscar_oem_equivalentes(referencia)
         resultado.oem_equivalentes = oem_eq
@@ -310,6 +461,17 @@ def busqueda_completa(
     except Exception as e:
         logger.error(f"[BúsquedaCompleta] Error OEM equiv: {e}")
         resultado.errores["oem_equivalentes"] = str(e)
+    resultado.tiempos_ms["oem_equivalentes"] = _ms_desde(inicio)
+    _emitir(al_progresar, "oem_equivalentes", {
+        "resultados": resultado.oem_equivalentes,
+        "total": resultado.total_oem,
+        "duracion_ms": resultado.tiempos_ms["oem_equivalentes"],
+        "error": resultado.errores.get("oem_equivalentes"),
+    })
+
+    if cancelar is not None and cancelar.is_set():
+        logger.info(f"[BúsquedaCompleta] '{referencia}' cancelada tras la Fase 1")
+        return resultado
 
     # Todas las refs = original + equivalentes
     todas_refs = [referencia] + resultado.oem_equivalentes
@@ -322,49 +484,72 @@ def busqueda_completa(
         f"{len(refs_desguaces)} para desguaces (match exacto en BD)"
     )
 
+    # Si venimos del threadpool de FastAPI, los desguaces van por el bucle de la app
+    bucle = bucle_de_la_app()
+
+    def desguace_terminado(scraper, piezas: List[Dict], duracion_ms: int):
+        _emitir(al_progresar, "desguace", {
+            "desguace_id": scraper.id,
+            "desguace": scraper.nombre,
+            "resultados": piezas,
+            "total": len(piezas),
+            "duracion_ms": duracion_ms,
+        })
+
     # ── Fase 2: Todo en paralelo ────
     # BD usa TODAS las refs con match exacto (seguro incluso con refs cortas)
     # Desguaces usa refs filtradas para evitar HTTP requests inútiles
-    with ThreadPoolExecutor(max_workers=4) as ex:
-        f_stock = ex.submit(_buscar_stock_propio, db, entorno_trabajo_id, todas_refs)
-        f_otros = ex.submit(_buscar_stock_otros_entornos, db, entorno_trabajo_id, todas_refs)
-        f_iam = ex.submit(_buscar_iam_todas_refs, todas_refs)
-        f_desg = ex.submit(_buscar_en_desguaces, refs_desguaces)
-
-        # Stock propio
-        try:
-            resultado.stock_propio = f_stock.result()
-            resultado.total_stock = len(resultado.stock_propio)
-            logger.info(f"[BúsquedaCompleta] {resultado.total_stock} en stock propio")
-        except Exception as e:
-            logger.error(f"[BúsquedaCompleta] Error stock: {e}")
-            resultado.errores["stock_propio"] = str(e)
-
-        # Stock de otros entornos
-        try:
-            resultado.stock_otros_entornos = f_otros.result()
-            resultado.total_otros_entornos = len(resultado.stock_otros_entornos)
-            logger.info(f"[BúsquedaCompleta] {resultado.total_otros_entornos} en otros entornos")
-        except Exception as e:
-            logger.error(f"[BúsquedaCompleta] Error otros entornos: {e}")
-            resultado.errores["otros_entornos"] = str(e)
-
-        # IAM
-        try:
-            resultado.piezas_nuevas_iam = f_iam.result()
-            resultado.total_iam = len(resultado.piezas_nuevas_iam)
-            logger.info(f"[BúsquedaCompleta] {resultado.total_iam} refs IAM")
-        except Exception as e:
-            logger.error(f"[BúsquedaCompleta] Error IAM: {e}")
-            resultado.errores["iam"] = str(e)
+    _emitir(al_progresar, "fase", {"fase": 2, "referencias": todas_refs, "referencias_desguaces": refs_desguaces})
+    if nueva_sesion is None:
+        nueva_sesion = sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+    fuentes = {
+        "stock_propio": (_en_sesion_propia, nueva_sesion, _buscar_stock_propio, entorno_trabajo_id, todas_refs),
+        "otros_entornos": (_en_sesion_propia, nueva_sesion, _buscar_stock_otros_entornos, entorno_trabajo_id, todas_refs),
+        "iam": (_buscar_iam_todas_refs, todas_refs),
+        "desguaces": (_buscar_en_desguaces, refs_desguaces, bucle, desguace_terminado if al_progresar else None),
+    }
+    ex = ThreadPoolExecutor(max_workers=4)
+    cancelada = False
+    try:
+        pendientes = {
+            ex.submit(_medir, resultado.tiempos_ms, fuente, *tarea): fuente
+            for fuente, tarea in fuentes.items()
+        }
+        # Cada fuente se recoge (y se notifica) en cuanto termina
+        while pendientes:
+            hechos, _ = wait(
+                pendientes,
+                timeout=ESPERA_CANCELACION_SEGUNDOS if cancelar is not None else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for f in hechos:
+                _recoger_fuente(resultado, pendientes.pop(f), f, al_progresar)
+            if pendientes and cancelar is not None and cancelar.is_set():
+                cancelada = True
+                logger.info(f"[BúsquedaCompleta] '{referencia}' cancelada; sin esperar a {sorted(pendientes.values())}")
+                break
+    finally:
+        # Cancelada: las fuentes en curso acaban solas, no se espera por ellas
+        ex.shutdown(wait=not cancelada, cancel_futures=True)
+
+    resultado.tiempos_ms["total"] = _ms_desde(inicio_total)
+    return resultado
 
-        # Desguaces competidores
-        try:
-            resultado.resultados_desguaces = f_desg.result()
-            resultado.total_desguaces = len(resultado.resultados_desguaces)
-            logger.info(f"[BúsquedaCompleta] {resultado.total_desguaces} en desguaces")
-        except Exception as e:
-            logger.error(f"[BúsquedaCompleta] Error desguaces: {e}")
-            resultado.errores["desguaces"] = str(e)
 
-    return resultado
+def _recoger_fuente(resultado: ResultadoBusquedaCompleta, fuente: str, futuro, al_progresar: Optional[Progreso]):
+    """Pasa el resultado de una fuente de la Fase 2 a `resultado` y lo notifica"""
+    atributo, atributo_total, texto = FUENTES_FASE2[fuente]
+    try:
+        piezas = futuro.result()
+        setattr(resultado, atributo, piezas)
+        setattr(resultado, atributo_total, len(piezas))
+        logger.info(f"[BúsquedaCompleta] {len(piezas)} {texto}")
+    except Exception as e:
+        logger.error(f"[BúsquedaCompleta] Error {fuente}: {e}")
+        resultado.errores[fuente] = str(e)
+    _emitir(al_progresar, fuente, {
+        "resultados": getattr(resultado, atributo),
+        "total": getattr(resultado, atributo_total),
+        "duracion_ms": resultado.tiempos_ms.get(fuente),
+        "error": resultado.errores.get(fuente),
+    })
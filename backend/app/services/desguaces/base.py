@@ -1,15 +1,27 @@
 """
 Clase base abstracta para scrapers de desguaces competidores.
 Cada desguace implementa esta interfaz.
+
+buscar() y buscar_async() de cada desguace se envuelven automáticamente con la
+limitación de ritmo y el circuit breaker de su host (core.proteccion_hosts).
 """
 
 from abc import ABC, abstractmethod
 from typing import List, Dict, Optional
 
+from core.http_async import en_hilo
+from core.proteccion_hosts import envolver_metodo, host_de
+
 
 class DesguaceScraper(ABC):
     """Interfaz que deben implementar todos los scrapers de desguaces."""
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for nombre in ("buscar", "buscar_async"):
+            if nombre in cls.__dict__:
+                setattr(cls, nombre, envolver_metodo(cls.__dict__[nombre], lambda self: host_de(self.url_base)))
+
     @property
     @abstractmethod
     def id(self) -> str:
@@ -41,3 +53,11 @@ class DesguaceScraper(ABC):
           - desguace: str        (self.nombre)
           - desguace_id: str     (self.id)
         """
+
+    async def buscar_async(self, referencia: str) -> List[Dict]:
+        """
+        Variante async de buscar() para los endpoints. Por defecto ejecuta
+        buscar() en el threadpool; los scrapers HTTP la sobrescriben con
+        core.http_async (pool compartido y límite por host).
+        """
+        return await en_hilo(self.buscar, referencia)
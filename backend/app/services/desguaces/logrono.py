@@ -2,20 +2,26 @@
 Scraper para desguaceslogrono.com (API JSON).
 """
 
+import asyncio
 import logging
+import contextvars
+import httpx
 import requests
 from typing import List, Dict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from core import http_async
+from core.proteccion_hosts import notificar_fallo
 from .base import DesguaceScraper
 
 logger = logging.getLogger(__name__)
 
-_SESSION = requests.Session()
-_SESSION.headers.update({
+_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
     'Accept': 'application/json',
-})
+}
+_SESSION = requests.Session()
+_SESSION.headers.update(_HEADERS)
 
 
 class LogronoScraper(DesguaceScraper):
@@ -28,6 +34,7 @@ class LogronoScraper(DesguaceScraper):
             return self._buscar_todas_paginas(referencia)
         except Exception as e:
             logger.error(f"[Logroño] Error buscando {referencia}: {e}")
+            notificar_fallo(str(e))
             return []
 
     def _fetch_page(self, referencia: str, pagina: int):
@@ -36,7 +43,8 @@ class LogronoScraper(DesguaceScraper):
             r = _SESSION.get(url, timeout=10)
             r.raise_for_status()
             return pagina, r.json()
-        except requests.RequestException:
+        except requests.RequestException as e:
+            notificar_fallo(f"página {pagina}: {e}")
             return pagina, None
 
     def _buscar_todas_paginas(self, referencia: str, max_pag: int = 5) -> List[Dict]:
@@ -60,7 +68,7 @@ class LogronoScraper(DesguaceScraper):
 
         # Resto en paralelo
         with ThreadPoolExecutor(max_workers=3) as ex:
-            futures = {ex.submit(self._fetch_page, referencia, p): p for p in range(2, num_paginas + 1)}
+            futures = {ex.submit(contextvars.copy_context().run, self._fetch_page, referencia, p): p for p in range(2, num_paginas + 1)}
             for f in as_completed(futures):
                 _, page_data = f.result()
                 if page_data:
@@ -68,6 +76,42 @@ class LogronoScraper(DesguaceScraper):
 
         return piezas
 
+    async def buscar_async(self, referencia: str) -> List[Dict]:
+        try:
+            return await self._buscar_todas_paginas_async(referencia)
+        except Exception as e:
+            logger.error(f"[Logroño] Error buscando {referencia}: {e}")
+            notificar_fallo(str(e))
+            return []
+
+    async def _fetch_page_async(self, referencia: str, pagina: int):
+        url = f"{self.url_base}/desguacesv8/api/recambios/piezas/?locale=es&q={referencia}&pagina={pagina}"
+        try:
+            r = await http_async.get(url, headers=_HEADERS, timeout=10)
+            r.raise_for_status()
+            return pagina, r.json()
+        except (httpx.HTTPError, ValueError) as e:
+            notificar_fallo(f"página {pagina}: {e}")
+            return pagina, None
+
+    async def _buscar_todas_paginas_async(self, referencia: str, max_pag: int = 5) -> List[Dict]:
+        _, data = await self._fetch_page_async(referencia, 1)
+        if not data:
+            return []
+
+        total = data.get('total', 0)
+        num_paginas = min((total + 12 - 1) // 12, max_pag)
+
+        piezas = []
+        ids_vistos: set = set()
+        self._procesar_pagina(data, referencia, piezas, ids_vistos)
+
+        resto = await asyncio.gather(*(self._fetch_page_async(referencia, p) for p in range(2, num_paginas + 1)))
+        for _, page_data in resto:
+            if page_data:
+                self._procesar_pagina(page_data, referencia, piezas, ids_vistos)
+        return piezas
+
     def _procesar_pagina(self, data: dict, referencia: str, piezas: List[Dict], ids_vistos: set):
         if not data or 'piezas' not in data:
             return
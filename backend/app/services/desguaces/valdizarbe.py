@@ -3,22 +3,28 @@ Scraper para valdizarbe.es (PrestaShop search_ajax).
 """
 
 import re
+import asyncio
 import logging
+import contextvars
+import httpx
 import requests
 from html import unescape
 from typing import List, Dict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from core import http_async
+from core.proteccion_hosts import notificar_fallo
 from .base import DesguaceScraper
 
 logger = logging.getLogger(__name__)
 
-_SESSION = requests.Session()
-_SESSION.headers.update({
+_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
     'X-Requested-With': 'XMLHttpRequest',
     'Accept': 'text/html,*/*',
-})
+}
+_SESSION = requests.Session()
+_SESSION.headers.update(_HEADERS)
 
 RE_URL = re.compile(r'href="(https://valdizarbe\.es/(\d+)-([^"]+)\.html)"')
 RE_ALT = re.compile(r'alt="([^"]+)"')
@@ -53,6 +59,7 @@ class ValdizarbeScraper(DesguaceScraper):
             return self._buscar_todas_paginas(referencia)
         except Exception as e:
             logger.error(f"[Valdizarbe] Error buscando {referencia}: {e}")
+            notificar_fallo(str(e))
             return []
 
     def _fetch_page(self, referencia: str, pagina: int):
@@ -61,21 +68,43 @@ class ValdizarbeScraper(DesguaceScraper):
             r = _SESSION.post(url, timeout=10)
             r.raise_for_status()
             return pagina, r.text
-        except requests.RequestException:
+        except requests.RequestException as e:
+            notificar_fallo(f"página {pagina}: {e}")
             return pagina, ""
 
     def _buscar_todas_paginas(self, referencia: str, max_pag: int = 3) -> List[Dict]:
-        piezas = []
-        ids_vistos: set = set()
-
         with ThreadPoolExecutor(max_workers=3) as ex:
-            futures = {ex.submit(self._fetch_page, referencia, p): p for p in range(1, max_pag + 1)}
+            futures = {ex.submit(contextvars.copy_context().run, self._fetch_page, referencia, p): p for p in range(1, max_pag + 1)}
             paginas = {}
             for f in as_completed(futures):
                 pag, html = f.result()
                 if html:
                     paginas[pag] = html
 
+        return self._procesar_paginas(paginas, referencia)
+
+    async def buscar_async(self, referencia: str) -> List[Dict]:
+        try:
+            resultados = await asyncio.gather(*(self._fetch_page_async(referencia, p) for p in range(1, 4)))
+            return self._procesar_paginas({pag: html for pag, html in resultados if html}, referencia)
+        except Exception as e:
+            logger.error(f"[Valdizarbe] Error buscando {referencia}: {e}")
+            notificar_fallo(str(e))
+            return []
+
+    async def _fetch_page_async(self, referencia: str, pagina: int):
+        url = f"{self.url_base}/modules/search_ajax/ajax.php?text={referencia}&sa_pag={pagina}&id_category=3"
+        try:
+            r = await http_async.post(url, headers=_HEADERS, timeout=10)
+            r.raise_for_status()
+            return pagina, r.text
+        except httpx.HTTPError as e:
+            notificar_fallo(f"página {pagina}: {e}")
+            return pagina, ""
+
+    def _procesar_paginas(self, paginas: Dict[int, str], referencia: str) -> List[Dict]:
+        piezas = []
+        ids_vistos: set = set()
         ref_upper = referencia.upper()
         for pag in sorted(paginas):
             html = paginas[pag]
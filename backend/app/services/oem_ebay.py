@@ -11,6 +11,7 @@ from typing import List, Dict, Any, Optional
 
 from app.config import settings
 from app.services.oem_equivalentes import buscar_oem_equivalentes
+from utils.single_flight import grupo, clave_referencia
 
 logger = logging.getLogger(__name__)
 
@@ -93,7 +94,14 @@ def buscar_oem_relevantes(
     2. Consulta cada una en eBay para contar items a la venta.
     3. Devuelve las top_n con más resultados (>0).
     Retorna: [{"referencia": "XXX", "total_en_venta": 42}, ...]
+    Búsquedas simultáneas de la misma referencia comparten una sola ejecución.
     """
+    return list(grupo("oem_relevantes").hacer(
+        (clave_referencia(referencia), top_n), _buscar_oem_relevantes, referencia, top_n
+    ))
+
+
+def _buscar_oem_relevantes(referencia: str, top_n: int) -> List[Dict[str, Any]]:
     oem_refs = buscar_oem_equivalentes(referencia)
     if not oem_refs:
         return []
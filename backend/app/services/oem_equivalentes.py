@@ -2,13 +2,19 @@
 Servicio para buscar referencias OEM equivalentes.
 Fuentes: tarostrade.es y distri-auto.es
 Escalable: añadir nuevas fuentes registrándolas en FUENTES_OEM.
+
+Los resultados se guardan en el almacén de equivalencias (app/services/almacen_oem.py):
+solo se scrapea la primera vez que se ve una referencia o al revalidarla.
 """
 
 import re
 import logging
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Set
+from typing import Callable, List, Set, Tuple
+
+from app.services.almacen_oem import FuentesNoDisponibles, get_almacen_equivalencias
+from utils.single_flight import grupo, clave_referencia
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +32,25 @@ PALABRAS_EXCLUIR = {
 }
 
 
+def _refs_productos(urls: List[str], refs_producto: Callable[..., Set[str]], *args) -> Tuple[Set[str], bool]:
+    """
+    Une las referencias de las páginas de producto: (refs, completa).
+    completa=False si alguna página falló; si fallan todas se propaga el error
+    (la fuente cuenta como caída, no como "sin equivalencias").
+    """
+    todas: Set[str] = set()
+    errores = []
+    with ThreadPoolExecutor(max_workers=min(10, len(urls))) as ex:
+        for future in as_completed([ex.submit(refs_producto, url, *args) for url in urls]):
+            try:
+                todas.update(future.result())
+            except Exception as e:
+                errores.append(e)
+    if len(errores) == len(urls):
+        raise errores[0]
+    return todas, not errores
+
+
 # ─── TarosTrade ───────────────────────────────────────────
 
 def _taros_extraer_referencias(descripcion: str) -> List[str]:
@@ -50,85 +75,65 @@ def _taros_filtrar(referencias: List[str]) -> List[str]:
 
 
 def _taros_buscar_urls(referencia: str) -> List[str]:
-    try:
-        r = requests.get(f"https://www.tarostrade.es/search?search={referencia}", headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        urls = []
-        for m in re.findall(r'href=["\']?(/[^"\'>\s]+/po/[^"\'>\s]+)["\']?', r.text):
-            url = f"https://www.tarostrade.es{m}"
-            if url not in urls:
-                urls.append(url)
-        for url in re.findall(r'https://www\.tarostrade\.es/[^"\'>\s]+/po/[^"\'>\s]+', r.text):
-            url = url.split('"')[0].split("'")[0]
-            if url not in urls:
-                urls.append(url)
-        return urls
-    except Exception as e:
-        logger.debug(f"TarosTrade URLs error: {e}")
-        return []
+    # Un error aquí es "fuente caída" (no "sin equivalencias"): se propaga
+    r = requests.get(f"https://www.tarostrade.es/search?search={referencia}", headers=HEADERS, timeout=15)
+    r.raise_for_status()
+    urls = []
+    for m in re.findall(r'href=["\']?(/[^"\'>\s]+/po/[^"\'>\s]+)["\']?', r.text):
+        url = f"https://www.tarostrade.es{m}"
+        if url not in urls:
+            urls.append(url)
+    for url in re.findall(r'https://www\.tarostrade\.es/[^"\'>\s]+/po/[^"\'>\s]+', r.text):
+        url = url.split('"')[0].split("'")[0]
+        if url not in urls:
+            urls.append(url)
+    return urls
 
 
 def _taros_refs_producto(url: str, referencia: str) -> Set[str]:
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        refs: Set[str] = set()
-        for desc in re.findall(r'"description"\s*:\s*"([^"]+)"', r.text):
-            desc_limpia = desc.replace('\\/', '/')
-            if referencia.upper() in desc_limpia.upper():
-                refs.update(_taros_extraer_referencias(desc_limpia))
-        refs.update(m.upper() for m in re.findall(r'OE[:\s]*([A-Z0-9]{5,20})', r.text, re.I))
-        return refs
-    except Exception:
-        return set()
-
-
-def buscar_tarostrade(referencia: str) -> List[str]:
+    r = requests.get(url, headers=HEADERS, timeout=15)
+    r.raise_for_status()
+    refs: Set[str] = set()
+    for desc in re.findall(r'"description"\s*:\s*"([^"]+)"', r.text):
+        desc_limpia = desc.replace('\\/', '/')
+        if referencia.upper() in desc_limpia.upper():
+            refs.update(_taros_extraer_referencias(desc_limpia))
+    refs.update(m.upper() for m in re.findall(r'OE[:\s]*([A-Z0-9]{5,20})', r.text, re.I))
+    return refs
+
+
+def buscar_tarostrade(referencia: str) -> Tuple[List[str], bool]:
     urls = _taros_buscar_urls(referencia)
     if not urls:
-        return []
-    todas: Set[str] = set()
-    for url in urls[:3]:
-        todas.update(_taros_refs_producto(url, referencia))
-    return _taros_filtrar(list(todas))
+        return [], True
+    todas, completa = _refs_productos(urls[:3], _taros_refs_producto, referencia)
+    return _taros_filtrar(list(todas)), completa
 
 
 # ─── Distri-Auto ──────────────────────────────────────────
 
 def _distri_buscar_urls(referencia: str) -> List[str]:
-    try:
-        r = requests.get(f"https://www.distri-auto.es/piezas-automovil/busqueda?q={referencia}", headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        urls = set()
-        for u in re.findall(r'data-serp-product-clicable-url-value="(/[^"]+)"', r.text):
-            urls.add(f"https://www.distri-auto.es{u.split('?')[0]}")
-        return list(urls)
-    except Exception as e:
-        logger.debug(f"DistriAuto URLs error: {e}")
-        return []
+    # Un error aquí es "fuente caída" (no "sin equivalencias"): se propaga
+    r = requests.get(f"https://www.distri-auto.es/piezas-automovil/busqueda?q={referencia}", headers=HEADERS, timeout=15)
+    r.raise_for_status()
+    urls = set()
+    for u in re.findall(r'data-serp-product-clicable-url-value="(/[^"]+)"', r.text):
+        urls.add(f"https://www.distri-auto.es{u.split('?')[0]}")
+    return list(urls)
 
 
 def _distri_refs_producto(url: str) -> Set[str]:
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        return {ref.strip() for ref in re.findall(r'href="/piezas-automovil/oem/([^"]+)"', r.text) if ref.strip()}
-    except Exception:
-        return set()
+    r = requests.get(url, headers=HEADERS, timeout=15)
+    r.raise_for_status()
+    return {ref.strip() for ref in re.findall(r'href="/piezas-automovil/oem/([^"]+)"', r.text) if ref.strip()}
 
 
-def buscar_distriauto(referencia: str) -> List[str]:
+def buscar_distriauto(referencia: str) -> Tuple[List[str], bool]:
     urls = _distri_buscar_urls(referencia)
     if not urls:
-        return []
-    todas: Set[str] = set()
-    with ThreadPoolExecutor(max_workers=10) as ex:
-        for future in as_completed({ex.submit(_distri_refs_producto, u): u for u in urls}):
-            try:
-                todas.update(future.result())
-            except Exception:
-                pass
-    return sorted(todas)
+        return [], True
+    todas, completa = _refs_productos(urls, _distri_refs_producto)
+    return sorted(todas), completa
 
 
 # ─── API Pública ──────────────────────────────────────────
@@ -137,8 +142,23 @@ def buscar_oem_equivalentes(referencia: str) -> List[str]:
     """
     Busca OEM equivalentes en todas las fuentes registradas.
     Retorna lista deduplicada y normalizada (uppercase).
+    Lo ya consultado sale del almacén de equivalencias, sin red.
+    Búsquedas simultáneas de la misma referencia comparten una sola ejecución.
+    """
+    return list(grupo("oem_equivalentes").hacer(
+        clave_referencia(referencia), get_almacen_equivalencias().obtener, referencia, _consultar_fuentes
+    ))
+
+
+def _consultar_fuentes(referencia: str) -> Tuple[List[str], bool]:
+    """
+    Scrapea todas las fuentes: (equivalentes, completa). completa=False si
+    alguna fuente (o alguna de sus páginas de producto) falló;
+    FuentesNoDisponibles si fallaron todas.
     """
     todas: Set[str] = set()
+    fallidas = []
+    parciales = []
 
     with ThreadPoolExecutor(max_workers=2) as ex:
         futuros = {
@@ -148,12 +168,18 @@ def buscar_oem_equivalentes(referencia: str) -> List[str]:
         for f in as_completed(futuros):
             nombre = futuros[f]
             try:
-                refs = f.result()
-                logger.info(f"OEM equiv [{nombre}]: {len(refs)} refs")
+                refs, fuente_completa = f.result()
+                logger.info(f"OEM equiv [{nombre}]: {len(refs)} refs" + ("" if fuente_completa else " (parcial)"))
                 todas.update(r.upper() for r in refs)
+                if not fuente_completa:
+                    parciales.append(nombre)
             except Exception as e:
                 logger.warning(f"OEM equiv [{nombre}] error: {e}")
+                fallidas.append(nombre)
+
+    if len(fallidas) == len(futuros):
+        raise FuentesNoDisponibles(f"Fuentes de OEM equivalentes caídas: {', '.join(sorted(fallidas))}")
 
     # Excluir la referencia original
     todas.discard(referencia.upper())
-    return sorted(todas)
+    return sorted(todas), not fallidas and not parciales
@@ -0,0 +1,83 @@
+"""
+Scraping de precios por plataforma
+==================================
+
+Capa compartida por /precios/buscar, su modo streaming y el estudio de coches
+(/desguace/estudio-coches): cada consulta pasa por la caché de precios y las
+búsquedas simultáneas de la misma referencia comparten un solo scraping.
+"""
+import logging
+from typing import Dict
+
+from core.cache_precios import get_cache_precios, clave_cache
+from core.scraper_factory import ScraperFactory
+from utils.single_flight import grupo
+
+logger = logging.getLogger(__name__)
+
+
+def scrape_platform(platform_id: str, referencia: str, cantidad: int, usar_cache: bool = True) -> Dict:
+    """
+    Precios de una plataforma para una referencia (bloqueante).
+    Con usar_cache=False se consulta siempre la plataforma (y se refresca la caché).
+    """
+    if usar_cache:
+        cacheado = get_cache_precios().obtener(platform_id, referencia, cantidad)
+        if cacheado is not None:
+            return {**cacheado, "desde_cache": True}
+
+    # Búsquedas simultáneas de la misma referencia comparten un solo scraping
+    return grupo("plataformas").hacer(
+        clave_cache(platform_id, referencia, cantidad),
+        _scrape_y_cachear, platform_id, referencia, cantidad,
+    )
+
+
+def _scrape_y_cachear(platform_id: str, referencia: str, cantidad: int) -> Dict:
+    resultado = _scrape_platform_sin_cache(platform_id, referencia, cantidad)
+    get_cache_precios().guardar(platform_id, referencia, cantidad, resultado)
+    return resultado
+
+
+def _scrape_platform_sin_cache(platform_id: str, referencia: str, cantidad: int) -> Dict:
+    try:
+        scraper = ScraperFactory.create_scraper(platform_id)
+        
+        if not scraper.setup_session(referencia):
+            return {
+                "plataforma_id": platform_id,
+                "plataforma_nombre": scraper.name,
+                "precios": [],
+                "imagenes": [],
+                "tipo_pieza": None,
+                "error": "No se pudo configurar sesión"
+            }
+        
+        imagenes = []
+        tipo_pieza = None
+        
+        if hasattr(scraper, 'fetch_all_data'):
+            precios, imagenes, tipo_pieza, _ = scraper.fetch_all_data(referencia, cantidad)
+        elif hasattr(scraper, 'fetch_prices_with_images'):
+            precios, imagenes = scraper.fetch_prices_with_images(referencia, cantidad)
+        else:
+            precios = scraper.fetch_prices(referencia, cantidad)
+        
+        return {
+            "plataforma_id": platform_id,
+            "plataforma_nombre": scraper.name,
+            "precios": precios or [],
+            "imagenes": imagenes[:5] if imagenes else [],  # Limitar imágenes
+            "tipo_pieza": tipo_pieza,
+            "error": None
+        }
+    except Exception as e:
+        logger.error(f"Error scraping {platform_id}: {e}")
+        return {
+            "plataforma_id": platform_id,
+            "plataforma_nombre": platform_id.capitalize(),
+            "precios": [],
+            "imagenes": [],
+            "tipo_pieza": None,
+            "error": str(e)
+        }
@@ -1,13 +1,32 @@
 """
 Clase base abstracta para scrapers
+
+Cada método de scraping tiene una variante async (sufijo _async) para los
+endpoints. Por defecto ejecuta la versión síncrona en el threadpool; los
+scrapers HTTP la sobrescriben usando core.http_async.
+
+Los métodos de búsqueda de las subclases se envuelven automáticamente con la
+limitación de ritmo y el circuit breaker de su host (core.proteccion_hosts).
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from core.http_async import en_hilo
+from core.proteccion_hosts import envolver_metodo, host_de
+
+# Métodos de búsqueda protegidos por host en cada subclase
+METODOS_PROTEGIDOS = ('fetch_prices', 'fetch_prices_with_images', 'fetch_all_data', 'fetch_all_data_async')
 
 
 class PlatformScraper(ABC):
     """Interfaz abstracta para scrapers de plataformas"""
     
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for nombre in METODOS_PROTEGIDOS:
+            if nombre in cls.__dict__:
+                setattr(cls, nombre, envolver_metodo(cls.__dict__[nombre], lambda self: host_de(self.base_url)))
+    
     def __init__(self, name: str, base_url: str):
         self.name = name
         self.base_url = base_url
@@ -35,3 +54,28 @@ class PlatformScraper(ABC):
             "base_url": self.base_url,
             "available": self.is_available()
         }
+    
+    # ---------- Variantes async ----------
+    
+    async def setup_session_async(self, reference: str) -> bool:
+        return await en_hilo(self.setup_session, reference)
+    
+    async def fetch_all_data_async(self, reference: str, limit: int = 30) -> Tuple[List[float], List[str], Optional[str], int]:
+        """
+        Precios, imágenes, tipo de pieza y total encontrados, con el método más
+        completo que tenga el scraper
+        """
+        if hasattr(self, 'fetch_all_data'):
+            return await en_hilo(self.fetch_all_data, reference, limit)
+        if hasattr(self, 'fetch_prices_with_images'):
+            precios, imagenes = await en_hilo(self.fetch_prices_with_images, reference, limit)
+        else:
+            precios, imagenes = await en_hilo(self.fetch_prices, reference, limit), []
+        return precios, imagenes, None, len(precios)
+    
+    async def fetch_prices_async(self, reference: str, limit: int = 30) -> List[float]:
+        precios, _, _, _ = await self.fetch_all_data_async(reference, limit)
+        return precios
+    
+    async def is_available_async(self) -> bool:
+        return await en_hilo(self.is_available)
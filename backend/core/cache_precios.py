@@ -0,0 +1,166 @@
+"""
+Caché de resultados de scraping de plataformas
+
+Guarda lo que devuelve cada plataforma (precios, imágenes, tipo de pieza) por
+(plataforma, referencia normalizada, cantidad) durante settings.cache_ttl_seconds,
+para que dos búsquedas seguidas de la misma referencia no vuelvan a consultar
+el marketplace.
+
+Backend en memoria (LRU por proceso) por defecto; con settings.cache_backend =
+"redis" se comparte entre workers usando settings.redis_url. Si Redis falla, la
+búsqueda sigue sin caché.
+"""
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from utils.single_flight import clave_referencia
+
+logger = logging.getLogger(__name__)
+
+PREFIJO_REDIS = "desguapro:precios:"
+
+
+def clave_cache(plataforma: str, referencia: str, cantidad: int) -> str:
+    """'ebay', '1k0-615.301 ', 20 -> 'ebay|1K0615301|20'"""
+    return f"{plataforma}|{clave_referencia(referencia)}|{cantidad}"
+
+
+class CacheMemoria:
+    """LRU en memoria con caducidad por entrada (seguro entre hilos)"""
+
+    nombre = "memoria"
+
+    def __init__(self, max_entradas: int = 2000):
+        self.max_entradas = max_entradas
+        self._datos: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            caduca, valor = entrada
+            if caduca < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave: str, valor: Dict[str, Any], ttl: int):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def tamano(self) -> int:
+        return len(self._datos)
+
+
+class CacheRedis:
+    """Caché compartida entre workers en Redis (JSON con EX = ttl)"""
+
+    nombre = "redis"
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        valor = self._redis.get(PREFIJO_REDIS + clave)
+        return json.loads(valor) if valor else None
+
+    def guardar(self, clave: str, valor: Dict[str, Any], ttl: int):
+        self._redis.set(PREFIJO_REDIS + clave, json.dumps(valor), ex=ttl)
+
+    def limpiar(self):
+        claves = list(self._redis.scan_iter(match=PREFIJO_REDIS + "*", count=500))
+        if claves:
+            self._redis.delete(*claves)
+
+    def tamano(self) -> Optional[int]:
+        return None
+
+
+class CachePrecios:
+    """Caché de resultados por plataforma con estadísticas de aciertos/fallos"""
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._contadores = {"aciertos": 0, "fallos": 0, "guardados": 0, "errores": 0}
+
+    def _contar(self, nombre: str):
+        with self._lock:
+            self._contadores[nombre] += 1
+
+    def obtener(self, plataforma: str, referencia: str, cantidad: int) -> Optional[Dict[str, Any]]:
+        try:
+            valor = self.backend.obtener(clave_cache(plataforma, referencia, cantidad))
+        except Exception as e:
+            logger.warning(f"Caché de precios no disponible ({self.backend.nombre}): {e}")
+            self._contar("errores")
+            return None
+        self._contar("aciertos" if valor is not None else "fallos")
+        return valor
+
+    def guardar(self, plataforma: str, referencia: str, cantidad: int, resultado: Dict[str, Any]):
+        """Guarda un resultado correcto (los que tienen error no se cachean)"""
+        if resultado.get("error") or self.ttl <= 0:
+            return
+        try:
+            self.backend.guardar(clave_cache(plataforma, referencia, cantidad), resultado, self.ttl)
+            self._contar("guardados")
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en caché de precios ({self.backend.nombre}): {e}")
+            self._contar("errores")
+
+    def limpiar(self):
+        self.backend.limpiar()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            contadores = dict(self._contadores)
+        consultas = contadores["aciertos"] + contadores["fallos"]
+        try:
+            entradas = self.backend.tamano()
+        except Exception:
+            entradas = None
+        return {
+            "backend": self.backend.nombre,
+            "ttl_segundos": self.ttl,
+            "entradas": entradas,
+            **contadores,
+            "ratio_aciertos": round(contadores["aciertos"] / consultas, 3) if consultas else None,
+        }
+
+
+_cache: Optional[CachePrecios] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache_precios() -> CachePrecios:
+    """Caché de precios del proceso (se crea en el primer uso según settings)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend = None
+                if settings.cache_backend == "redis":
+                    try:
+                        backend = CacheRedis(settings.redis_url)
+                    except ImportError:
+                        logger.warning("redis no instalado: caché de precios en memoria")
+                _cache = CachePrecios(backend or CacheMemoria(settings.cache_max_entradas), settings.cache_ttl_seconds)
+    return _cache
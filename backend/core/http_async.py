@@ -0,0 +1,112 @@
+"""
+Cliente HTTP asíncrono compartido para los scrapers
+
+Un httpx.AsyncClient por bucle de eventos con pool de conexiones, keep-alive,
+HTTP/2 si está instalado h2 (httpx[http2]) y un límite de peticiones
+simultáneas por host (settings.http_max_por_host), para que una búsqueda con
+muchas referencias no abra decenas de conexiones contra el mismo desguace.
+
+Los scrapers lo usan desde sus variantes async (fetch_all_data_async,
+buscar_async...); las variantes síncronas siguen usando requests para el
+scheduler y los scripts.
+"""
+import asyncio
+import importlib.util
+import logging
+import weakref
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import anyio.from_thread
+import anyio.to_thread
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HTTP2_DISPONIBLE = importlib.util.find_spec("h2") is not None
+
+
+class _ClienteBucle:
+    """Cliente y semáforos por host de un bucle de eventos"""
+
+    def __init__(self):
+        self.cliente = httpx.AsyncClient(
+            http2=HTTP2_DISPONIBLE,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_conexiones,
+                max_keepalive_connections=settings.http_max_conexiones,
+                keepalive_expiry=settings.http_keepalive_segundos,
+            ),
+            timeout=httpx.Timeout(15.0),
+            follow_redirects=True,
+        )
+        self.por_host: dict = {}
+
+    def semaforo(self, host: str) -> asyncio.Semaphore:
+        if host not in self.por_host:
+            self.por_host[host] = asyncio.Semaphore(settings.http_max_por_host)
+        return self.por_host[host]
+
+
+_clientes: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _ClienteBucle]" = weakref.WeakKeyDictionary()
+
+
+def _cliente_del_bucle() -> _ClienteBucle:
+    bucle = asyncio.get_running_loop()
+    cliente = _clientes.get(bucle)
+    if cliente is None or cliente.cliente.is_closed:
+        cliente = _ClienteBucle()
+        _clientes[bucle] = cliente
+    return cliente
+
+
+async def peticion(metodo: str, url: str, **kwargs: Any) -> httpx.Response:
+    """
+    Petición con el cliente compartido, esperando turno si el host ya tiene
+    settings.http_max_por_host peticiones en curso. Admite los mismos kwargs
+    que httpx (params, headers, timeout, data...).
+    """
+    cliente = _cliente_del_bucle()
+    async with cliente.semaforo(urlsplit(url).netloc):
+        return await cliente.cliente.request(metodo, url, **kwargs)
+
+
+async def get(url: str, **kwargs: Any) -> httpx.Response:
+    return await peticion("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs: Any) -> httpx.Response:
+    return await peticion("POST", url, **kwargs)
+
+
+async def cerrar_cliente_http():
+    """Cierra el cliente del bucle actual (apagado de la app)"""
+    cliente = _clientes.pop(asyncio.get_running_loop(), None)
+    if cliente is not None:
+        await cliente.cliente.aclose()
+
+
+async def en_hilo(funcion: Callable[..., T], *args: Any) -> T:
+    """Ejecuta una función bloqueante en el threadpool (variantes async por defecto)"""
+    return await anyio.to_thread.run_sync(lambda: funcion(*args))
+
+
+def bucle_de_la_app() -> Optional[asyncio.AbstractEventLoop]:
+    """
+    Bucle de eventos de la app si el hilo actual es un worker del threadpool de
+    FastAPI (run_in_threadpool); None en scripts, scheduler o hilos propios.
+    Sirve para que código síncrono lance trabajo async con ejecutar_en_bucle.
+    """
+    try:
+        return anyio.from_thread.run_sync(asyncio.get_running_loop)
+    except RuntimeError:
+        return None
+
+
+def ejecutar_en_bucle(bucle: asyncio.AbstractEventLoop, corrutina: Awaitable[T]) -> T:
+    """Ejecuta la corrutina en el bucle de la app y espera su resultado desde este hilo"""
+    return asyncio.run_coroutine_threadsafe(corrutina, bucle).result()
@@ -0,0 +1,303 @@
+"""
+Pool de navegador Playwright compartido
+=======================================
+
+Un único Chromium de larga duración para los scrapers que necesitan navegador
+(Ovoko, B-Parts) y para renovar el TOEN de Ecooparts, en vez de lanzar uno
+nuevo en cada búsqueda (segundos de arranque y cientos de MB cada vez).
+
+- Playwright async en un hilo propio con su bucle de eventos: la API sync de
+  Playwright no se puede compartir entre hilos, y así varias búsquedas
+  navegan a la vez desde los workers del threadpool.
+- Un contexto reutilizable por perfil (user agent, idioma, viewport), que
+  conserva cookies (p. ej. la de Cloudflare) entre búsquedas.
+- Como mucho settings.navegador_max_paginas páginas abiertas a la vez.
+- Comprobación de salud: si Chromium se ha caído se relanza en el siguiente uso.
+- Reciclado: se cierra tras settings.navegador_segundos_inactivo sin uso, tras
+  settings.navegador_max_usos páginas o si sus procesos superan
+  settings.navegador_memoria_max_mb (Linux, leyendo /proc).
+
+Uso desde código síncrono:
+
+    async def extraer(page):
+        await page.goto(url)
+        return await page.content()
+
+    html = get_pool_navegador().usar_pagina(extraer, perfil=PERFIL_ESCRITORIO)
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from app.config import settings
+
+try:
+    from playwright.async_api import async_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ARGS_CHROMIUM = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+]
+
+# Perfil de contexto: (user_agent, locale, ancho, alto). None = valores por defecto de Playwright
+PerfilContexto = Optional[Tuple[str, str, int, int]]
+
+PERFIL_ESCRITORIO: PerfilContexto = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'es-ES',
+    1920,
+    1080,
+)
+
+
+def _memoria_procesos_hijos_mb() -> Optional[float]:
+    """RSS de los procesos descendientes (driver de Playwright y Chromium), None fuera de Linux"""
+    if not os.path.isdir("/proc"):
+        return None
+    padres: Dict[int, int] = {}
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as f:
+                # pid (nombre) estado ppid ... ; el nombre puede tener espacios
+                campos = f.read().rsplit(")", 1)[1].split()
+            padres[int(entrada)] = int(campos[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    descendientes = set()
+    pendientes = [os.getpid()]
+    while pendientes:
+        padre = pendientes.pop()
+        for pid, ppid in padres.items():
+            if ppid == padre and pid not in descendientes:
+                descendientes.add(pid)
+                pendientes.append(pid)
+
+    total_kb = 0
+    for pid in descendientes:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        total_kb += int(linea.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class PoolNavegador:
+    """Chromium compartido con contextos reutilizables y páginas limitadas"""
+
+    def __init__(self):
+        self._bucle: Optional[asyncio.AbstractEventLoop] = None
+        self._hilo: Optional[threading.Thread] = None
+        self._lock_hilo = threading.Lock()
+        # Estado del navegador: solo se toca desde el hilo del pool
+        self._playwright = None
+        self._navegador = None
+        self._contextos: Dict[PerfilContexto, Any] = {}
+        self._paginas: Optional[asyncio.Semaphore] = None
+        self._lock_navegador: Optional[asyncio.Lock] = None
+        self._en_uso = 0
+        self._usos = 0
+        self._lanzamientos = 0
+        self._ultimo_uso = time.monotonic()
+        self._reciclar = False
+        self._vigilancia: Optional[asyncio.Task] = None
+
+    # ---------- Hilo del pool ----------
+
+    def _asegurar_hilo(self) -> asyncio.AbstractEventLoop:
+        with self._lock_hilo:
+            if self._bucle is None or not self._hilo.is_alive():
+                bucle = asyncio.new_event_loop()
+                listo = threading.Event()
+
+                def ejecutar():
+                    asyncio.set_event_loop(bucle)
+                    self._paginas = asyncio.Semaphore(settings.navegador_max_paginas)
+                    self._lock_navegador = asyncio.Lock()
+                    self._vigilancia = bucle.create_task(self._vigilar())
+                    listo.set()
+                    bucle.run_forever()
+                    bucle.close()
+
+                self._hilo = threading.Thread(target=ejecutar, name="pool-navegador", daemon=True)
+                self._hilo.start()
+                listo.wait()
+                self._bucle = bucle
+            return self._bucle
+
+    async def _vigilar(self):
+        """Recicla el navegador inactivo o que ocupa demasiada memoria"""
+        while True:
+            await asyncio.sleep(settings.navegador_intervalo_vigilancia_segundos)
+            if self._navegador is None or self._en_uso:
+                continue
+            inactivo = time.monotonic() - self._ultimo_uso
+            if inactivo > settings.navegador_segundos_inactivo:
+                logger.info(f"[Navegador] Cerrando tras {inactivo:.0f}s inactivo")
+            elif self._reciclar or self._memoria_excedida():
+                logger.info("[Navegador] Reciclando (memoria o usos)")
+            else:
+                continue
+            async with self._lock_navegador:
+                await self._cerrar_navegador()
+
+    def _memoria_excedida(self) -> bool:
+        memoria = _memoria_procesos_hijos_mb()
+        return memoria is not None and memoria > settings.navegador_memoria_max_mb
+
+    # ---------- Navegador y contextos ----------
+
+    async def _asegurar_navegador(self):
+        async with self._lock_navegador:
+            if self._navegador is not None and self._navegador.is_connected():
+                return
+            if self._navegador is not None:
+                logger.warning("[Navegador] Chromium desconectado, relanzando")
+                await self._cerrar_navegador()
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._navegador = await self._playwright.chromium.launch(headless=True, args=ARGS_CHROMIUM)
+            self._lanzamientos += 1
+            self._usos = 0
+            self._reciclar = False
+            logger.info("[Navegador] Chromium lanzado")
+
+    async def _contexto(self, perfil: PerfilContexto):
+        async with self._lock_navegador:
+            contexto = self._contextos.get(perfil)
+            if contexto is None:
+                if perfil is None:
+                    contexto = await self._navegador.new_context()
+                else:
+                    user_agent, locale, ancho, alto = perfil
+                    contexto = await self._navegador.new_context(
+                        user_agent=user_agent,
+                        locale=locale,
+                        viewport={'width': ancho, 'height': alto},
+                    )
+                self._contextos[perfil] = contexto
+            return contexto
+
+    async def _cerrar_navegador(self):
+        contextos, self._contextos = list(self._contextos.values()), {}
+        navegador, self._navegador = self._navegador, None
+        for contexto in contextos:
+            try:
+                await contexto.close()
+            except Exception:
+                pass
+        if navegador is not None:
+            try:
+                await navegador.close()
+            except Exception as e:
+                logger.warning(f"[Navegador] Error cerrando Chromium: {e}")
+
+    async def _con_pagina(self, trabajo: Callable[[Any], Awaitable[T]], perfil: PerfilContexto) -> T:
+        async with self._paginas:
+            self._en_uso += 1
+            try:
+                await self._asegurar_navegador()
+                pagina = await (await self._contexto(perfil)).new_page()
+                try:
+                    return await trabajo(pagina)
+                finally:
+                    try:
+                        await pagina.close()
+                    except Exception:
+                        pass
+            finally:
+                self._en_uso -= 1
+                self._usos += 1
+                self._ultimo_uso = time.monotonic()
+                if self._usos >= settings.navegador_max_usos:
+                    self._reciclar = True
+
+    # ---------- API pública ----------
+
+    def usar_pagina(
+        self,
+        trabajo: Callable[[Any], Awaitable[T]],
+        perfil: PerfilContexto = None,
+        timeout: Optional[float] = None,
+    ) -> T:
+        """
+        Ejecuta trabajo(page) con una página del pool y la devuelve al terminar.
+        Bloquea el hilo que llama (no usar desde el propio bucle del pool).
+        Lanza ImportError si Playwright no está instalado.
+        """
+        if not PLAYWRIGHT_AVAILABLE:
+            raise ImportError("playwright")
+        bucle = self._asegurar_hilo()
+        futuro = asyncio.run_coroutine_threadsafe(self._con_pagina(trabajo, perfil), bucle)
+        try:
+            return futuro.result(timeout or settings.navegador_timeout_segundos)
+        except concurrent.futures.TimeoutError:
+            futuro.cancel()
+            raise
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "activo": self._navegador is not None,
+            "paginas_en_uso": self._en_uso,
+            "max_paginas": settings.navegador_max_paginas,
+            "usos": self._usos,
+            "lanzamientos": self._lanzamientos,
+            "memoria_mb": round(_memoria_procesos_hijos_mb() or 0, 1) if self._navegador is not None else 0,
+        }
+
+    def cerrar(self):
+        """Cierra Chromium y Playwright (apagado de la app)"""
+        with self._lock_hilo:
+            bucle, self._bucle = self._bucle, None
+        if bucle is None:
+            return
+
+        async def cerrar_todo():
+            self._vigilancia.cancel()
+            await self._cerrar_navegador()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+        try:
+            asyncio.run_coroutine_threadsafe(cerrar_todo(), bucle).result(30)
+        except Exception as e:
+            logger.warning(f"[Navegador] Error cerrando el pool: {e}")
+        bucle.call_soon_threadsafe(bucle.stop)
+
+
+_pool: Optional[PoolNavegador] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool_navegador() -> PoolNavegador:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolNavegador()
+        return _pool
+
+
+def cerrar_pool_navegador():
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        pool.cerrar()
@@ -0,0 +1,311 @@
+"""
+Limitación de ritmo y circuit breaker por host para los scrapers
+
+Cada host externo (marketplace o desguace) tiene:
+- Un cubo de tokens: como máximo settings.scraper_peticiones_por_segundo
+  búsquedas sostenidas, con ráfagas de settings.scraper_rafaga_por_host. Si
+  el turno tarda más de settings.scraper_espera_maxima_segundos la búsqueda se
+  descarta (LimiteHostExcedido) en vez de encolarse.
+- Un circuito: tras settings.circuito_fallos_para_abrir fallos seguidos se abre
+  y las búsquedas fallan al momento (CircuitoAbierto) durante
+  settings.circuito_segundos_abierto. Después deja pasar una única búsqueda de
+  prueba (semiabierto): si va bien se cierra, si falla vuelve a abrirse.
+
+PlatformScraper y DesguaceScraper envuelven automáticamente sus métodos de
+búsqueda con proteger()/proteger_async(). Cuenta como fallo una excepción o un
+aviso explícito con notificar_fallo() (los scrapers capturan sus errores y
+devuelven listas vacías, así que avisan desde sus except).
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class HostNoDisponible(Exception):
+    """No se consulta el host (circuito abierto o sin turno)"""
+
+    def __init__(self, host: str, mensaje: str):
+        super().__init__(mensaje)
+        self.host = host
+
+
+class CircuitoAbierto(HostNoDisponible):
+    def __init__(self, host: str, reintento_en: float):
+        super().__init__(host, f"{host} no disponible (circuito abierto, reintento en {reintento_en:.0f}s)")
+        self.reintento_en = reintento_en
+
+
+class LimiteHostExcedido(HostNoDisponible):
+    def __init__(self, host: str, espera: float):
+        super().__init__(host, f"{host} saturado (turno en {espera:.1f}s)")
+        self.espera = espera
+
+
+class CuboTokens:
+    """Token bucket seguro entre hilos"""
+
+    def __init__(self, por_segundo: float, capacidad: int):
+        self.por_segundo = por_segundo
+        self.capacidad = capacidad
+        self._tokens = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rellenar(self, ahora: float):
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.por_segundo)
+        self._ultimo = ahora
+
+    def reservar(self, espera_maxima: float) -> Optional[float]:
+        """
+        Reserva un token y devuelve los segundos que hay que esperar para
+        usarlo (0 si hay disponible), o None si la espera supera el máximo
+        """
+        with self._lock:
+            self._rellenar(time.monotonic())
+            espera = max(0.0, (1 - self._tokens) / self.por_segundo)
+            if espera > espera_maxima:
+                return None
+            self._tokens -= 1
+            return espera
+
+    def disponibles(self) -> float:
+        with self._lock:
+            self._rellenar(time.monotonic())
+            return self._tokens
+
+
+class Circuito:
+    """Circuit breaker cerrado -> abierto -> semiabierto (una prueba) -> cerrado"""
+
+    def __init__(self, host: str, fallos_para_abrir: int, segundos_abierto: float):
+        self.host = host
+        self.fallos_para_abrir = fallos_para_abrir
+        self.segundos_abierto = segundos_abierto
+        self.estado = CERRADO
+        self.fallos_seguidos = 0
+        self.ultimo_fallo: Optional[str] = None
+        self.veces_abierto = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def antes_de_llamar(self):
+        """Lanza CircuitoAbierto si no se puede consultar el host ahora"""
+        with self._lock:
+            if self.estado == ABIERTO:
+                restante = self._abierto_hasta - time.monotonic()
+                if restante > 0:
+                    raise CircuitoAbierto(self.host, restante)
+                self.estado = SEMIABIERTO
+                logger.info(f"[Circuito] {self.host}: semiabierto, probando")
+            if self.estado == SEMIABIERTO:
+                if self._prueba_en_curso:
+                    raise CircuitoAbierto(self.host, 0)
+                self._prueba_en_curso = True
+
+    def registrar_exito(self):
+        with self._lock:
+            if self.estado != CERRADO:
+                logger.info(f"[Circuito] {self.host}: cerrado")
+            self.estado = CERRADO
+            self.fallos_seguidos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self, motivo: str):
+        with self._lock:
+            self.fallos_seguidos += 1
+            self.ultimo_fallo = motivo
+            self._prueba_en_curso = False
+            if self.estado == SEMIABIERTO or self.fallos_seguidos >= self.fallos_para_abrir:
+                if self.estado != ABIERTO:
+                    self.veces_abierto += 1
+                    logger.warning(
+                        f"[Circuito] {self.host}: abierto {self.segundos_abierto}s "
+                        f"tras {self.fallos_seguidos} fallos ({motivo})"
+                    )
+                self.estado = ABIERTO
+                self._abierto_hasta = time.monotonic() + self.segundos_abierto
+
+    def cancelar(self):
+        """La llamada no llegó a hacerse: libera la prueba del semiabierto"""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos_seguidos": self.fallos_seguidos,
+                "ultimo_fallo": self.ultimo_fallo,
+                "veces_abierto": self.veces_abierto,
+                "reintento_en": round(max(0.0, self._abierto_hasta - time.monotonic()), 1)
+                if self.estado == ABIERTO else None,
+            }
+
+
+class ProteccionHost:
+    def __init__(self, host: str):
+        self.host = host
+        self.cubo = CuboTokens(settings.scraper_peticiones_por_segundo, settings.scraper_rafaga_por_host)
+        self.circuito = Circuito(host, settings.circuito_fallos_para_abrir, settings.circuito_segundos_abierto)
+
+    def resumen(self) -> Dict:
+        return {**self.circuito.resumen(), "tokens": round(self.cubo.disponibles(), 2)}
+
+
+_protecciones: Dict[str, ProteccionHost] = {}
+_lock = threading.Lock()
+
+# Fallos notificados durante la llamada protegida en curso. Las tareas asyncio
+# heredan el contexto, los hilos no: un scraper que pagine con un
+# ThreadPoolExecutor debe lanzar cada página con contextvars.copy_context().run
+# (así lo hacen los desguaces) para que sus notificar_fallo cuenten aquí
+_fallos_llamada: ContextVar[Optional[List[str]]] = ContextVar("_fallos_llamada", default=None)
+# Host de la llamada protegida en curso, para no volver a proteger llamadas anidadas
+_host_en_curso: ContextVar[Optional[str]] = ContextVar("_host_en_curso", default=None)
+
+
+def host_de(url: str) -> str:
+    """'https://www.b-parts.com/' -> 'www.b-parts.com'"""
+    return urlsplit(url).netloc.lower() or url
+
+
+def proteccion_host(host: str) -> ProteccionHost:
+    with _lock:
+        if host not in _protecciones:
+            _protecciones[host] = ProteccionHost(host)
+        return _protecciones[host]
+
+
+def estado_hosts() -> Dict[str, Dict]:
+    """Estado del circuito y tokens disponibles de cada host consultado"""
+    with _lock:
+        protecciones = list(_protecciones.values())
+    return {p.host: p.resumen() for p in protecciones}
+
+
+def reiniciar_protecciones():
+    """Olvida el estado de todos los hosts (tests)"""
+    with _lock:
+        _protecciones.clear()
+
+
+def notificar_fallo(motivo: str):
+    """Marca como fallida la llamada protegida en curso (bloqueo, timeout, HTTP 5xx...)"""
+    fallos = _fallos_llamada.get()
+    if fallos is not None:
+        fallos.append(motivo)
+
+
+def notificar_respuesta(status_code: int):
+    """Cuenta como fallo del host las respuestas de saturación (429) o de error del servidor (5xx)"""
+    if status_code == 429 or status_code >= 500:
+        notificar_fallo(f"HTTP {status_code}")
+
+
+def _turno(proteccion: ProteccionHost) -> float:
+    proteccion.circuito.antes_de_llamar()
+    espera = proteccion.cubo.reservar(settings.scraper_espera_maxima_segundos)
+    if espera is None:
+        proteccion.circuito.cancelar()
+        raise LimiteHostExcedido(proteccion.host, settings.scraper_espera_maxima_segundos)
+    return espera
+
+
+def _cerrar_llamada(proteccion: ProteccionHost, fallos: List[str], error: Optional[BaseException]):
+    if isinstance(error, HostNoDisponible):
+        proteccion.circuito.cancelar()
+    elif isinstance(error, Exception):
+        proteccion.circuito.registrar_fallo(str(error) or type(error).__name__)
+    elif error is not None:
+        # Cancelación (CancelledError, KeyboardInterrupt): no dice nada del host
+        proteccion.circuito.cancelar()
+    elif fallos:
+        proteccion.circuito.registrar_fallo(fallos[-1])
+    else:
+        proteccion.circuito.registrar_exito()
+
+
+@contextmanager
+def proteger(host: str):
+    """Espera turno en el host, falla al momento si su circuito está abierto y registra el resultado"""
+    if _host_en_curso.get() == host:
+        yield
+        return
+    proteccion = proteccion_host(host)
+    espera = _turno(proteccion)
+    if espera:
+        time.sleep(espera)
+    fallos: List[str] = []
+    token_fallos = _fallos_llamada.set(fallos)
+    token_host = _host_en_curso.set(host)
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _host_en_curso.reset(token_host)
+        _fallos_llamada.reset(token_fallos)
+        _cerrar_llamada(proteccion, fallos, error)
+
+
+@asynccontextmanager
+async def proteger_async(host: str):
+    """Como proteger() pero esperando el turno sin bloquear el bucle"""
+    if _host_en_curso.get() == host:
+        yield
+        return
+    proteccion = proteccion_host(host)
+    espera = _turno(proteccion)
+    fallos: List[str] = []
+    token_fallos = _fallos_llamada.set(fallos)
+    token_host = _host_en_curso.set(host)
+    error = None
+    try:
+        if espera:
+            await asyncio.sleep(espera)
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _host_en_curso.reset(token_host)
+        _fallos_llamada.reset(token_fallos)
+        _cerrar_llamada(proteccion, fallos, error)
+
+
+def envolver_metodo(metodo: Callable, obtener_host: Callable[[object], str]) -> Callable:
+    """Envuelve un método de scraper (sync o async) con la protección de su host"""
+    if getattr(metodo, "_protegido", False):
+        return metodo
+
+    if asyncio.iscoroutinefunction(metodo):
+        @functools.wraps(metodo)
+        async def envuelto_async(self, *args, **kwargs):
+            async with proteger_async(obtener_host(self)):
+                return await metodo(self, *args, **kwargs)
+        envuelto_async._protegido = True
+        return envuelto_async
+
+    @functools.wraps(metodo)
+    def envuelto(self, *args, **kwargs):
+        with proteger(obtener_host(self)):
+            return metodo(self, *args, **kwargs)
+    envuelto._protegido = True
+    return envuelto
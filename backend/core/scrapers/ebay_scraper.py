@@ -10,6 +10,7 @@ import json
 from datetime import datetime, timedelta
 
 from core.base_scraper import PlatformScraper
+from core.proteccion_hosts import notificar_fallo, notificar_respuesta
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -171,9 +172,11 @@ class EbayScraper(PlatformScraper):
                     return self.fetch_prices_with_images(reference, limit)
             else:
                 logger.warning(f"eBay: Error en búsqueda: {response.status_code} - {response.text[:200]}")
+                notificar_respuesta(response.status_code)
                 
         except Exception as e:
             logger.error(f"eBay: Error en fetch_prices_with_images: {e}")
+            notificar_fallo(str(e))
         
         return prices, images
     
@@ -7,8 +7,11 @@ from typing import List, Tuple, Optional
 import logging
 import re
 
+from core import http_async
 from core.base_scraper import PlatformScraper
-from core.toen import load_toen, get_new_toen, save_toen
+from core.http_async import en_hilo
+from core.proteccion_hosts import notificar_fallo, notificar_respuesta
+from core.toen import get_gestor_toen
 from utils.encoding import b64
 
 logger = logging.getLogger(__name__)
@@ -28,29 +31,32 @@ class EcoopartsScraper(PlatformScraper):
         super().__init__("Ecooparts", "https://ecooparts.com/")
     
     def setup_session(self, reference: str) -> bool:
-        """Configura sesión obteniendo token TOEN"""
+        """
+        Configura sesión con el token TOEN del gestor (core.toen). Solo espera
+        a Playwright en frío; después el gestor lo renueva en segundo plano.
+        """
         try:
-            # Intentar cargar token cacheado
-            toen = load_toen()
+            toen = get_gestor_toen().obtener(reference)
             if toen:
                 self.session_data['toen'] = toen
-                logger.info("Token TOEN cargado del caché")
-                return True
-            
-            # Generar nuevo token
-            toen = get_new_toen(reference)
-            if toen:
-                self.session_data['toen'] = toen
-                save_toen(toen)
-                logger.info("Token TOEN generado y guardado")
                 return True
             
             logger.error("No se pudo obtener token TOEN")
+            notificar_fallo("sin token TOEN")
             return False
         except Exception as e:
             logger.error(f"Error en setup_session: {e}")
             return False
     
+    def _token(self) -> str:
+        """Token vigente: el del gestor si ya lo ha renovado, o el de la sesión"""
+        return get_gestor_toen().actual() or self.session_data['toen']
+    
+    def _comprobar_respuesta(self, status_code: int):
+        notificar_respuesta(status_code)
+        if status_code in (401, 403):
+            get_gestor_toen().invalidar()
+    
     def fetch_prices(self, reference: str, limit: int = 30) -> List[float]:
         """Obtiene precios de Ecooparts"""
         prices, _, _, _ = self.fetch_all_data(reference, limit)
@@ -72,7 +78,7 @@ class EcoopartsScraper(PlatformScraper):
             if not self.setup_session(reference):
                 return [], [], None, 0
         
-        token = self.session_data['toen']
+        token = self._token()
         all_prices = []
         all_images = []
         tipo_pieza = None
@@ -85,6 +91,7 @@ class EcoopartsScraper(PlatformScraper):
                     params = self._build_ajax_params(reference, page, token, 180)
                     r = requests.get(AJAX_URL, headers=HEADERS, params=params, timeout=10)
                     
+                    self._comprobar_respuesta(r.status_code)
                     if r.status_code != 200 or not r.text.strip():
                         break
                     
@@ -105,6 +112,7 @@ class EcoopartsScraper(PlatformScraper):
                     params = self._build_ajax_params(reference, page, token, 180)
                     r = requests.get(AJAX_URL, headers=HEADERS, params=params, timeout=10)
                     
+                    self._comprobar_respuesta(r.status_code)
                     if r.status_code != 200 or not r.text.strip():
                         break
                     
@@ -120,24 +128,70 @@ class EcoopartsScraper(PlatformScraper):
                     if len(all_prices) >= limit * 2:
                         break
             
-            # Guardar el total antes de limitar
-            total_encontradas = len(all_prices)
-            
-            # Ordenar precios y aplicar límite
-            all_prices.sort()
-            if limit != -1:
-                all_prices = all_prices[:limit]
+            return self._resultado(all_prices, all_images, tipo_pieza, limit)
             
-            # Mantener solo imágenes únicas
-            all_images = list(dict.fromkeys(all_images))
+        except Exception as e:
+            logger.error(f"Error en fetch_prices: {e}")
+            notificar_fallo(str(e))
+            return [], [], None, 0
+    
+    async def fetch_all_data_async(self, reference: str, limit: int = 30) -> Tuple[List[float], List[str], Optional[str], int]:
+        """Variante async de fetch_all_data con el cliente HTTP compartido"""
+        if 'toen' not in self.session_data:
+            if not await self.setup_session_async(reference):
+                return [], [], None, 0
+        
+        token = self._token()
+        all_prices = []
+        all_images = []
+        tipo_pieza = None
+        max_paginas = 10 if limit == -1 else max(1, (limit // 30) + 2)
+        
+        try:
+            for page in range(1, max_paginas + 1):
+                params = self._build_ajax_params(reference, page, token, 180)
+                r = await http_async.get(AJAX_URL, headers=HEADERS, params=params, timeout=10)
+                
+                self._comprobar_respuesta(r.status_code)
+                if r.status_code != 200 or not r.text.strip():
+                    break
+                
+                # El parseo del HTML es CPU: fuera del bucle de eventos
+                prices, images, pieza = await en_hilo(self._extract_all_data, r.text)
+                if not prices:
+                    break
+                
+                all_prices.extend(prices)
+                all_images.extend(images)
+                if not tipo_pieza and pieza:
+                    tipo_pieza = pieza
+                
+                if limit != -1 and len(all_prices) >= limit * 2:
+                    break
             
-            logger.info(f"Obtenidos {len(all_prices)} precios (de {total_encontradas}), {len(all_images)} imágenes, tipo: {tipo_pieza}")
-            return all_prices, all_images, tipo_pieza, total_encontradas
+            return self._resultado(all_prices, all_images, tipo_pieza, limit)
             
         except Exception as e:
             logger.error(f"Error en fetch_prices: {e}")
+            notificar_fallo(str(e))
             return [], [], None, 0
     
+    def _resultado(self, all_prices: List[float], all_images: List[str], tipo_pieza: Optional[str], limit: int) -> Tuple[List[float], List[str], Optional[str], int]:
+        """Ordena y limita los precios y deja las imágenes únicas"""
+        # Guardar el total antes de limitar
+        total_encontradas = len(all_prices)
+        
+        # Ordenar precios y aplicar límite
+        all_prices.sort()
+        if limit != -1:
+            all_prices = all_prices[:limit]
+        
+        # Mantener solo imágenes únicas
+        all_images = list(dict.fromkeys(all_images))
+        
+        logger.info(f"Obtenidos {len(all_prices)} precios (de {total_encontradas}), {len(all_images)} imágenes, tipo: {tipo_pieza}")
+        return all_prices, all_images, tipo_pieza, total_encontradas
+    
     def is_available(self) -> bool:
         """Verifica si la plataforma está disponible"""
         try:
@@ -146,6 +200,13 @@ class EcoopartsScraper(PlatformScraper):
         except:
             return False
     
+    async def is_available_async(self) -> bool:
+        try:
+            r = await http_async.get(self.base_url, timeout=5)
+            return r.status_code == 200
+        except Exception:
+            return False
+    
     def _build_ajax_params(self, reference: str, page: int, token: str, limit: int) -> dict:
         """Construye parámetros para petición AJAX"""
         busval_raw = f"|{reference}|ninguno|producto|-1|0|0|0|0|0|0|0"
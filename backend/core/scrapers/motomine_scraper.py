@@ -9,6 +9,7 @@ import logging
 import re
 
 from core.base_scraper import PlatformScraper
+from core.proteccion_hosts import notificar_fallo, notificar_respuesta
 
 logger = logging.getLogger(__name__)
 
@@ -78,6 +79,7 @@ class MotomineScraper(PlatformScraper):
             
             if response.status_code != 200:
                 logger.warning(f"Motomine: Error HTTP {response.status_code}")
+                notificar_respuesta(response.status_code)
                 return [], []
             
             html = response.text
@@ -124,7 +126,9 @@ class MotomineScraper(PlatformScraper):
             
         except requests.Timeout:
             logger.warning(f"Motomine: Timeout buscando {reference}")
+            notificar_fallo("timeout")
         except Exception as e:
             logger.error(f"Motomine: Error: {e}")
+            notificar_fallo(str(e))
         
         return prices, images
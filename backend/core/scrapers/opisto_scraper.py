@@ -9,6 +9,7 @@ from typing import List, Tuple
 from bs4 import BeautifulSoup
 
 from core.base_scraper import PlatformScraper
+from core.proteccion_hosts import notificar_fallo, notificar_respuesta
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +57,7 @@ class OpistoScraper(PlatformScraper):
             
             if response.status_code != 200:
                 logger.warning(f"Opisto: Status {response.status_code}")
+                notificar_respuesta(response.status_code)
                 return [], []
             
             html = response.text
@@ -133,9 +135,11 @@ class OpistoScraper(PlatformScraper):
             
         except requests.Timeout:
             logger.warning(f"Opisto: Timeout para '{reference}'")
+            notificar_fallo("timeout")
             return [], []
         except Exception as e:
             logger.error(f"Opisto error: {e}")
+            notificar_fallo(str(e))
             return [], []
     
     def is_available(self) -> bool:
@@ -9,6 +9,7 @@ import logging
 import re
 
 from core.base_scraper import PlatformScraper
+from core.proteccion_hosts import notificar_fallo, notificar_respuesta
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +64,7 @@ class PartsssScraper(PlatformScraper):
             
             if response.status_code != 200:
                 logger.warning(f"Partsss: Error HTTP {response.status_code}")
+                notificar_respuesta(response.status_code)
                 return [], []
             
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -123,6 +125,7 @@ class PartsssScraper(PlatformScraper):
             
         except Exception as e:
             logger.error(f"Partsss: Error - {e}")
+            notificar_fallo(str(e))
         
         return prices[:limit], images[:limit]
     
@@ -1,13 +1,17 @@
 """
 Scraper de RecambioVerde
 """
+import httpx
 import requests
 from bs4 import BeautifulSoup
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import logging
 import re
 
+from core import http_async
 from core.base_scraper import PlatformScraper
+from core.http_async import en_hilo
+from core.proteccion_hosts import notificar_fallo, notificar_respuesta
 
 logger = logging.getLogger(__name__)
 
@@ -37,66 +41,95 @@ class RecambioVerdeScraper(PlatformScraper):
         prices, _ = self.fetch_prices_with_images(reference, limit)
         return prices
     
+    def _url_busqueda(self, reference: str) -> str:
+        # URL correcta de búsqueda ordenada por precio
+        return f"https://recambioverde.es/recambios-desguace/{reference}?Orden=Precio"
+    
     def fetch_prices_with_images(self, reference: str, limit: int = 30) -> Tuple[List[float], List[str]]:
         """Obtiene precios e imágenes de RecambioVerde"""
         try:
-            # URL correcta de búsqueda ordenada por precio
-            url = f"https://recambioverde.es/recambios-desguace/{reference}?Orden=Precio"
-            
-            response = requests.get(url, headers=HEADERS, timeout=15)
+            response = requests.get(self._url_busqueda(reference), headers=HEADERS, timeout=15)
             if response.status_code != 200:
                 logger.warning(f"RecambioVerde respondió con código {response.status_code}")
+                notificar_respuesta(response.status_code)
                 return [], []
             
-            soup = BeautifulSoup(response.text, "html.parser")
-            prices = []
-            images = []
-            
-            # Buscar precios en elementos con clase 'price' o 'price-new'
-            price_elements = soup.select(".price-new, .price")
-            
-            for element in price_elements:
-                try:
-                    text = element.get_text(strip=True)
-                    # Limpiar el precio: "51,42 €" -> 51.42
-                    # Eliminar símbolo €, espacios, y convertir coma a punto
-                    value = text.replace("€", "").replace(" ", "").replace(".", "").replace(",", ".").strip()
-                    
-                    if not value:
-                        continue
-                        
-                    price = float(value)
-                    # Filtrar precios válidos (entre 1€ y 10000€)
-                    if 1.0 <= price <= 10000:
-                        prices.append(price)
-                except (ValueError, AttributeError):
-                    continue
-            
-            # Buscar imágenes de productos
-            img_elements = soup.select("img[src*='metasync'], img[src*='cdn']")
-            for img in img_elements[:10]:  # Limitar imágenes
-                src = img.get("src") or img.get("data-src")
-                if src and src.startswith("http"):
-                    images.append(src)
-            
-            # Eliminar duplicados manteniendo orden
-            prices = list(dict.fromkeys(prices))
-            images = list(dict.fromkeys(images))
-            
-            # Aplicar límite
-            if limit > 0:
-                prices = prices[:limit]
-            
-            logger.info(f"RecambioVerde: {len(prices)} precios, {len(images)} imágenes para '{reference}'")
-            return prices, images
+            return self._extraer_precios_imagenes(response.text, reference, limit)
             
         except requests.Timeout:
             logger.error("Timeout al conectar con RecambioVerde")
+            notificar_fallo("timeout")
             return [], []
         except Exception as e:
             logger.error(f"Error en RecambioVerde: {e}")
+            notificar_fallo(str(e))
             return [], []
     
+    async def fetch_all_data_async(self, reference: str, limit: int = 30) -> Tuple[List[float], List[str], Optional[str], int]:
+        """Variante async con el cliente HTTP compartido"""
+        try:
+            response = await http_async.get(self._url_busqueda(reference), headers=HEADERS, timeout=15)
+            if response.status_code != 200:
+                logger.warning(f"RecambioVerde respondió con código {response.status_code}")
+                notificar_respuesta(response.status_code)
+                return [], [], None, 0
+            
+            prices, images = await en_hilo(self._extraer_precios_imagenes, response.text, reference, limit)
+            return prices, images, None, len(prices)
+            
+        except httpx.TimeoutException:
+            logger.error("Timeout al conectar con RecambioVerde")
+            notificar_fallo("timeout")
+            return [], [], None, 0
+        except Exception as e:
+            logger.error(f"Error en RecambioVerde: {e}")
+            notificar_fallo(str(e))
+            return [], [], None, 0
+    
+    def _extraer_precios_imagenes(self, html: str, reference: str, limit: int) -> Tuple[List[float], List[str]]:
+        """Extrae precios e imágenes del HTML de resultados"""
+        soup = BeautifulSoup(html, "html.parser")
+        prices = []
+        images = []
+        
+        # Buscar precios en elementos con clase 'price' o 'price-new'
+        price_elements = soup.select(".price-new, .price")
+        
+        for element in price_elements:
+            try:
+                text = element.get_text(strip=True)
+                # Limpiar el precio: "51,42 €" -> 51.42
+                # Eliminar símbolo €, espacios, y convertir coma a punto
+                value = text.replace("€", "").replace(" ", "").replace(".", "").replace(",", ".").strip()
+                
+                if not value:
+                    continue
+                    
+                price = float(value)
+                # Filtrar precios válidos (entre 1€ y 10000€)
+                if 1.0 <= price <= 10000:
+                    prices.append(price)
+            except (ValueError, AttributeError):
+                continue
+        
+        # Buscar imágenes de productos
+        img_elements = soup.select("img[src*='metasync'], img[src*='cdn']")
+        for img in img_elements[:10]:  # Limitar imágenes
+            src = img.get("src") or img.get("data-src")
+            if src and src.startswith("http"):
+                images.append(src)
+        
+        # Eliminar duplicados manteniendo orden
+        prices = list(dict.fromkeys(prices))
+        images = list(dict.fromkeys(images))
+        
+        # Aplicar límite
+        if limit > 0:
+            prices = prices[:limit]
+        
+        logger.info(f"RecambioVerde: {len(prices)} precios, {len(images)} imágenes para '{reference}'")
+        return prices, images
+    
     def is_available(self) -> bool:
         """Verifica disponibilidad"""
         try:
@@ -104,3 +137,10 @@ class RecambioVerdeScraper(PlatformScraper):
             return r.status_code == 200
         except:
             return False
+    
+    async def is_available_async(self) -> bool:
+        try:
+            r = await http_async.get(self.base_url, headers=HEADERS, timeout=5)
+            return r.status_code == 200
+        except Exception:
+            return False
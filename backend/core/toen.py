@@ -1,17 +1,22 @@
 """
 Gestión de token TOEN para Ecooparts
+
+El token se guarda en toen_cache.txt; la fecha del archivo es la del token.
+GestorToen lo renueva en segundo plano antes de que caduque (por edad o si
+deja de validar), con un bloqueo de archivo para que solo un worker lance
+Playwright a la vez. Las peticiones solo esperan por el token en frío (sin
+token en caché).
 """
 import os
+import threading
+import time
 import requests
 import logging
+from contextlib import contextmanager
+from typing import Optional
 
-# Intentar importar Playwright
-try:
-    from playwright.sync_api import sync_playwright
-    PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
-
+from core.navegador import PLAYWRIGHT_AVAILABLE, get_pool_navegador
+from app.config import settings
 from utils.encoding import b64
 
 logger = logging.getLogger(__name__)
@@ -46,15 +51,21 @@ def load_toen(cache_file: str = None) -> str:
 
 
 def save_toen(token: str, cache_file: str = None):
-    """Guarda token en archivo de caché"""
+    """Guarda token en archivo de caché (escritura atómica: nadie lee un archivo a medias)"""
     if cache_file is None:
         cache_file = DEFAULT_CACHE_FILE
+    temporal = f"{cache_file}.{os.getpid()}.tmp"
     try:
-        with open(cache_file, "w") as f:
+        with open(temporal, "w") as f:
             f.write(token)
+        os.replace(temporal, cache_file)
         logger.info(f"Token guardado en {cache_file}")
     except Exception as e:
         logger.error(f"Error guardando token: {e}")
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
 
 
 def validate_toen(token: str, reference: str = "1K0959653C") -> bool:
@@ -75,43 +86,44 @@ def validate_toen(token: str, reference: str = "1K0959653C") -> bool:
 
 
 def get_toen_with_playwright(reference: str = "1K0959653C") -> str:
-    """Obtiene TOEN usando Playwright"""
+    """Obtiene TOEN con una página del navegador compartido (core.navegador)"""
     if not PLAYWRIGHT_AVAILABLE:
         return None
     
-    token_value = None
+    busval_raw = f"|{reference}|ninguno|producto|-1|0|0|0|0|0|0|0"
+    search_url = (
+        f"{BASE_URL}"
+        f"?pag=pro"
+        f"&busval={b64(busval_raw)}"
+        f"&tebu={b64(reference)}"
+        f"&txbu={b64(reference)}"
+        f"&panu={b64('1')}"
+    )
+    
+    async def capturar_toen(page):
+        token_value = None
+        
+        def on_request(req):
+            nonlocal token_value
+            if "ajax/ajax_buscador.php" in req.url and "toen=" in req.url:
+                for part in req.url.split("&"):
+                    if part.startswith("toen="):
+                        token_value = part.split("=", 1)[1]
+        
+        page.on("request", on_request)
+        await page.goto(search_url, wait_until="networkidle")
+        # La petición AJAX con el token puede llegar justo después: hasta 2 s
+        for _ in range(20):
+            if token_value:
+                break
+            await page.wait_for_timeout(100)
+        return token_value
+    
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            def on_request(req):
-                nonlocal token_value
-                if "ajax/ajax_buscador.php" in req.url and "toen=" in req.url:
-                    for part in req.url.split("&"):
-                        if part.startswith("toen="):
-                            token_value = part.split("=", 1)[1]
-            
-            page.on("request", on_request)
-            
-            busval_raw = f"|{reference}|ninguno|producto|-1|0|0|0|0|0|0|0"
-            search_url = (
-                f"{BASE_URL}"
-                f"?pag=pro"
-                f"&busval={b64(busval_raw)}"
-                f"&tebu={b64(reference)}"
-                f"&txbu={b64(reference)}"
-                f"&panu={b64('1')}"
-            )
-            
-            page.goto(search_url, wait_until="networkidle")
-            page.wait_for_timeout(2000)
-            browser.close()
+        return get_pool_navegador().usar_pagina(capturar_toen)
     except Exception as e:
         logger.error(f"Error obteniendo token con Playwright: {e}")
         return None
-    
-    return token_value
 
 
 def get_new_toen(reference: str = "1K0959653C") -> str:
@@ -123,3 +135,198 @@ def get_new_toen(reference: str = "1K0959653C") -> str:
     
     logger.warning("No se pudo obtener token TOEN automáticamente")
     return None
+
+
+@contextmanager
+def _bloqueo_entre_workers(ruta: str):
+    """
+    Bloqueo exclusivo no bloqueante sobre un archivo, compartido entre procesos.
+    Devuelve True si se ha conseguido y False si otro worker lo tiene.
+    """
+    f = open(ruta, "a+")
+    conseguido = False
+    try:
+        try:
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            conseguido = True
+        except OSError:
+            pass
+        yield conseguido
+    finally:
+        if conseguido:
+            try:
+                if os.name == "nt":
+                    import msvcrt
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    import fcntl
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            except OSError:
+                pass
+        f.close()
+
+
+class GestorToen:
+    """Token TOEN en memoria con renovación anticipada en segundo plano"""
+
+    def __init__(self, cache_file: str = None):
+        self.cache_file = cache_file or DEFAULT_CACHE_FILE
+        self.lock_file = f"{self.cache_file}.lock"
+        self._token: Optional[str] = None
+        self._firma = None  # (mtime_ns, tamaño) del archivo leído
+        self._obtenido = 0.0  # time.time() del token actual
+        self._invalidado_en = 0.0  # time.time() del último aviso de token inválido
+        self._lock = threading.Lock()
+        self._refrescando = threading.Lock()
+        self._refrescos = 0
+        self._ultimo_error: Optional[str] = None
+        self._fallo_en: Optional[float] = None  # time.monotonic() del último intento fallido
+
+    # ---------- Lectura ----------
+
+    def _releer_archivo(self):
+        """Recarga el token si otro worker (o /token/configurar) ha escrito el archivo"""
+        try:
+            st = os.stat(self.cache_file)
+        except OSError:
+            return
+        firma = (st.st_mtime_ns, st.st_size)
+        if firma == self._firma:
+            return
+        token = load_toen(self.cache_file)
+        with self._lock:
+            self._firma = firma
+            if token:
+                self._token = token
+                self._obtenido = st.st_mtime
+
+    def edad(self) -> Optional[float]:
+        return time.time() - self._obtenido if self._token else None
+
+    def actual(self) -> Optional[str]:
+        """Token actual sin esperar nunca; si está viejo lanza la renovación en segundo plano"""
+        self._releer_archivo()
+        token, edad = self._token, self.edad()
+        if edad is not None and edad > settings.toen_refresco_segundos:
+            self.refrescar_en_segundo_plano()
+        return token
+
+    def _fallo_reciente(self) -> bool:
+        fallo_en = self._fallo_en
+        return fallo_en is not None and time.monotonic() - fallo_en < settings.toen_espera_tras_fallo_segundos
+
+    def obtener(self, reference: str = "1K0959653C") -> Optional[str]:
+        """
+        Token para una petición. Solo bloquea en frío (no hay token): entonces
+        lo genera o espera a que lo genere otro worker. Si generarlo acaba de
+        fallar en este proceso no se espera: se devuelve None al momento.
+        """
+        token = self.actual()
+        if token:
+            return token
+        limite = time.monotonic() + settings.toen_espera_arranque_segundos
+        while time.monotonic() < limite:
+            if self.refrescar(reference):
+                return self._token
+            if self._fallo_reciente():
+                return self._token
+            # Otro worker está generando el token: esperar a que lo escriba
+            time.sleep(0.5)
+            self._releer_archivo()
+            if self._token:
+                return self._token
+        return self._token
+
+    # ---------- Renovación ----------
+
+    def refrescar(self, reference: str = "1K0959653C") -> bool:
+        """
+        Genera un token nuevo si ningún otro hilo ni worker lo está haciendo.
+        Devuelve True si había token al terminar (nuevo o ya renovado por otro).
+        Tras un intento fallido no se vuelve a lanzar Playwright hasta pasados
+        settings.toen_espera_tras_fallo_segundos.
+        """
+        if self._fallo_reciente():
+            return self._token is not None
+        if not self._refrescando.acquire(blocking=False):
+            return False
+        try:
+            with _bloqueo_entre_workers(self.lock_file) as conseguido:
+                if not conseguido:
+                    return False
+                # Puede que otro worker acabe de renovarlo
+                self._releer_archivo()
+                edad = self.edad()
+                if (edad is not None and edad < settings.toen_refresco_segundos
+                        and self._obtenido > self._invalidado_en):
+                    return True
+                token = get_new_toen(reference)
+                if not token:
+                    self._ultimo_error = "No se pudo obtener token TOEN"
+                    self._fallo_en = time.monotonic()
+                    return self._token is not None
+                save_toen(token, self.cache_file)
+                with self._lock:
+                    self._token = token
+                    self._obtenido = time.time()
+                    self._refrescos += 1
+                    self._ultimo_error = None
+                    self._fallo_en = None
+                self._releer_archivo()
+                return True
+        except Exception as e:
+            logger.error(f"Error renovando token TOEN: {e}")
+            self._ultimo_error = str(e)
+            self._fallo_en = time.monotonic()
+            return self._token is not None
+        finally:
+            self._refrescando.release()
+
+    def refrescar_en_segundo_plano(self):
+        if self._refrescando.locked():
+            return
+        threading.Thread(target=self.refrescar, name="refresco-toen", daemon=True).start()
+
+    def invalidar(self):
+        """El token ha dejado de funcionar: renovarlo ya, en segundo plano"""
+        self._invalidado_en = time.time()
+        self.refrescar_en_segundo_plano()
+
+    def comprobar(self):
+        """Tarea periódica: renueva el token si falta, está viejo o ya no valida"""
+        self._releer_archivo()
+        edad = self.edad()
+        if edad is None or edad > settings.toen_refresco_segundos:
+            self.refrescar()
+        elif not validate_toen(self._token):
+            logger.warning("Token TOEN ya no valida, renovando")
+            self._invalidado_en = time.time()
+            self.refrescar()
+
+    def estado(self) -> dict:
+        edad = self.edad()
+        return {
+            "hay_token": self._token is not None,
+            "edad_segundos": round(edad) if edad is not None else None,
+            "refrescando": self._refrescando.locked(),
+            "refrescos": self._refrescos,
+            "ultimo_error": self._ultimo_error,
+        }
+
+
+_gestor: Optional[GestorToen] = None
+_gestor_lock = threading.Lock()
+
+
+def get_gestor_toen() -> GestorToen:
+    global _gestor
+    with _gestor_lock:
+        if _gestor is None:
+            _gestor = GestorToen()
+        return _gestor
@@ -23,6 +23,10 @@ def add_indexes():
         ("ix_piezas_vendidas_modelo", "piezas_vendidas", "modelo"),
         ("ix_piezas_vendidas_entorno_id", "piezas_vendidas", "entorno_trabajo_id"),
         ("ix_piezas_vendidas_fecha_venta", "piezas_vendidas", "fecha_venta"),
+        
+        # Índices compuestos para la paginación por cursor (/ventas y /admin/api-logs)
+        ("ix_piezas_vendidas_entorno_fecha", "piezas_vendidas", "entorno_trabajo_id, fecha_venta"),
+        ("ix_api_logs_entorno_fecha", "api_request_logs", "entorno_trabajo_id, fecha"),
     ]
     
     with engine.connect() as conn:
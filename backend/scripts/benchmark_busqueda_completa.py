@@ -0,0 +1,138 @@
+"""
+Benchmark de la Fase 2 de la búsqueda completa con sesiones por rama.
+
+Crea una BD SQLite temporal con varios entornos de N piezas (indexadas en
+referencias_piezas) y simula los scrapers (OEM, IAM y desguaces) con una
+latencia fija. Mide cada rama de la Fase 2 y comprueba que la consulta de
+stock (propio y de otros entornos) se solapa con el scraping: el tiempo de la
+fase debe acercarse al de la rama más lenta, no a la suma de todas.
+
+Uso: python scripts/benchmark_busqueda_completa.py [--entornos 8] [--piezas 20000]
+     [--latencia 0.5] [--busquedas 4] [--repeticiones 3]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.busqueda import EntornoTrabajo, BaseDesguace, PiezaDesguace
+from app.services import busqueda_completa as bc
+from services.referencias_index import reindexar_base
+
+RAMAS = ("stock_propio", "otros_entornos", "iam", "desguaces")
+
+
+class DesguaceSimulado:
+    def __init__(self, n: int, latencia: float):
+        self.id = f"simulado{n}"
+        self.nombre = f"Simulado {n}"
+        self.latencia = latencia
+
+    def buscar(self, referencia: str):
+        time.sleep(self.latencia)
+        return [{"id": f"{self.id}-{referencia}", "oem": referencia, "desguace": self.nombre, "desguace_id": self.id}]
+
+
+def simular_scrapers(latencia: float):
+    """Sustituye los scrapers externos por esperas fijas"""
+    bc.buscar_oem_equivalentes = lambda ref: [f"EQ{i:03d}-{ref}" for i in range(5)]
+
+    def iam(referencias):
+        time.sleep(latencia)
+        return [{"iam_ref": f"IAM-{r}"} for r in referencias]
+
+    bc._buscar_iam_todas_refs = iam
+    bc.DesguaceFactory.crear_todos = staticmethod(lambda: [DesguaceSimulado(n, latencia) for n in range(4)])
+
+
+def poblar(nueva_sesion, entornos: int, piezas: int):
+    """Inserta `entornos` entornos con `piezas` piezas cada uno; 1 de cada 500 con la OEM buscada"""
+    with nueva_sesion() as db:
+        for n in range(entornos):
+            entorno = EntornoTrabajo(nombre=f"Benchmark {n}", activo=True)
+            db.add(entorno)
+            db.flush()
+            base = BaseDesguace(entorno_trabajo_id=entorno.id, nombre_archivo="bench.csv", total_piezas=piezas)
+            db.add(base)
+            db.flush()
+            db.bulk_insert_mappings(PiezaDesguace, [
+                {
+                    "base_desguace_id": base.id,
+                    "refid": f"{n}-{i}",
+                    "oem": "1K0615301AA" if i % 500 == 0 else f"{n:02d}{i:07d}K0",
+                    "articulo": "PINZA DE FRENO",
+                }
+                for i in range(piezas)
+            ])
+            reindexar_base(db, base.id, entorno.id)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la Fase 2 de la búsqueda completa")
+    parser.add_argument("--entornos", type=int, default=8)
+    parser.add_argument("--piezas", type=int, default=20_000, help="Piezas por entorno")
+    parser.add_argument("--latencia", type=float, default=0.5, help="Segundos por consulta de scraper simulado")
+    parser.add_argument("--busquedas", type=int, default=4, help="Búsquedas completas simultáneas")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    simular_scrapers(args.latencia)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        Base.metadata.create_all(bind=engine)
+        nueva_sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        print(f"Generando {args.entornos} entornos x {args.piezas} piezas...")
+        poblar(nueva_sesion, args.entornos, args.piezas)
+
+        # Referencia: cuánto tarda la rama de stock sin nada más en marcha
+        with nueva_sesion() as db:
+            refs = ["1K0615301AA"] + bc.buscar_oem_equivalentes("1K0615301AA")
+            inicio = time.perf_counter()
+            bc._buscar_stock_otros_entornos(db, 1, refs)
+            print(f"Stock de otros entornos en solitario: {(time.perf_counter() - inicio) * 1000:.1f} ms\n")
+
+        print(f"{'ronda':<6} {'stock':>8} {'otros':>8} {'iam':>8} {'desg.':>8} {'fase 2':>8} {'suma':>8}  solape")
+        for ronda in range(args.repeticiones):
+            resultados = []
+
+            def buscar(entorno_id):
+                with nueva_sesion() as db:
+                    resultados.append(bc.busqueda_completa("1K0615301AA", db, entorno_id))
+
+            hilos = [threading.Thread(target=buscar, args=(1 + i % args.entornos,)) for i in range(args.busquedas)]
+            for h in hilos:
+                h.start()
+            for h in hilos:
+                h.join()
+
+            for res in resultados:
+                t = res.tiempos_ms
+                fase2 = t["total"] - t["oem_equivalentes"]
+                suma = sum(t[r] for r in RAMAS)
+                # 1.0 = la fase dura lo que la rama más lenta; 0.0 = lo que la suma de las ramas
+                maximo = max(t[r] for r in RAMAS)
+                solape = (suma - fase2) / (suma - maximo) if suma > maximo else 1.0
+                print(
+                    f"{ronda:<6} {t['stock_propio']:>8} {t['otros_entornos']:>8} {t['iam']:>8} "
+                    f"{t['desguaces']:>8} {fase2:>8} {suma:>8}  {solape:5.2f}"
+                    + (f"  errores: {res.errores}" if res.errores else "")
+                )
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
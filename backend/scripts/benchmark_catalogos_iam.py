@@ -0,0 +1,85 @@
+"""
+Benchmark de las búsquedas en los catálogos IAM locales (Triclo, Vauner).
+
+Compara el recorrido completo del CSV en cada búsqueda (comportamiento
+anterior) con el catálogo indexado en memoria (hash exacto + trigramas),
+usando OEM reales del CSV, recortes (búsqueda "contenida") y OEM inexistentes.
+
+Uso: python scripts/benchmark_catalogos_iam.py [--csv ruta.csv] [--consultas 500]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import csv
+import random
+import time
+
+from app.scrapers.referencias.catalogo_local import obtener_catalogo, normalizar_oem, LONGITUD_MINIMA_APROXIMADA
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "app", "scrapers", "referencias", "data")
+
+
+def buscar_recorriendo(csv_path: str, oem_ref: str) -> list:
+    """Búsqueda aproximada recorriendo el CSV entero (como antes del índice)"""
+    objetivo = normalizar_oem(oem_ref)
+    filas = []
+    with open(csv_path, "r", encoding="utf-8-sig") as f:
+        for fila in csv.DictReader(f):
+            oem_raw = str(fila.get("OEM", ""))
+            if not oem_raw or oem_raw.lower() == "nan":
+                continue
+            for parte in oem_raw.replace("/", ",").replace(";", ",").split(","):
+                codigo = normalizar_oem(parte)
+                if not codigo:
+                    continue
+                if objetivo == codigo or (
+                    len(objetivo) >= LONGITUD_MINIMA_APROXIMADA and len(codigo) >= LONGITUD_MINIMA_APROXIMADA
+                    and (objetivo in codigo or codigo in objetivo)
+                ):
+                    filas.append(fila)
+                    break
+    return filas
+
+
+def medir(titulo: str, funcion, consultas: list):
+    inicio = time.perf_counter()
+    encontrados = sum(len(funcion(c)) for c in consultas)
+    media_ms = (time.perf_counter() - inicio) / len(consultas) * 1000
+    print(f"  {titulo:<35} {media_ms:9.3f} ms/consulta  ({encontrados} filas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los catálogos IAM locales")
+    parser.add_argument("--csv", default=os.path.join(DATA_DIR, "triclo_final_unificado.csv"))
+    parser.add_argument("--consultas", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(args.csv, "r", encoding="utf-8-sig") as f:
+        codigos = sorted({
+            parte.strip()
+            for fila in csv.DictReader(f)
+            for parte in str(fila.get("OEM", "")).replace("/", ",").replace(";", ",").split(",")
+            if parte.strip() and parte.strip().lower() != "nan"
+        })
+
+    rnd = random.Random(1)
+    consultas = [rnd.choice(codigos) for _ in range(args.consultas // 2)]
+    consultas += [rnd.choice(codigos)[:7] for _ in range(args.consultas // 4)]
+    consultas += [f"ZX{rnd.randint(0, 10**8):08d}" for _ in range(args.consultas - len(consultas))]
+
+    inicio = time.perf_counter()
+    catalogo = obtener_catalogo(args.csv, separadores=",/;")
+    print(f"Catálogo cargado: {len(catalogo.filas)} filas, {len(codigos)} OEM "
+          f"en {(time.perf_counter() - inicio) * 1000:.1f} ms\n")
+
+    muestra = consultas[:max(1, len(consultas) // 10)]
+    medir("Recorriendo el CSV (antes)", lambda c: buscar_recorriendo(args.csv, c), muestra)
+    medir("Catálogo indexado (aproximado)", catalogo.buscar_aproximado, consultas)
+    medir("Catálogo indexado (exacto)", catalogo.buscar_exacto, consultas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark de la importación en streaming del CSV de stock.
+
+Genera un CSV sintético (200.000 filas por defecto), lo importa en una BD SQLite
+temporal y después importa una segunda versión con un pequeño delta (precios
+cambiados, piezas vendidas y piezas nuevas), que es el caso habitual del
+stockeo cada 30 minutos. Muestra tiempo y pico de memoria de cada pasada.
+
+tracemalloc ralentiza bastante la ejecución; con --sin-memoria se miden solo
+los tiempos reales.
+
+Uso: python scripts/benchmark_importacion_csv.py [--filas 200000] [--lote 5000] [--sin-memoria]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.busqueda import EntornoTrabajo, PiezaDesguace
+from services import csv_auto_import
+
+MAPEO = {
+    "refid": "ref.id",
+    "oem_oe_iam": "ref.pieza",
+    "precio": "precio",
+    "ubicacion": "ubicacion",
+    "articulo": "articulo",
+    "marca": "marca",
+    "modelo": "modelo",
+}
+ARTICULOS = ["FARO DELANTERO", "PILOTO TRASERO", "RETROVISOR", "ALTERNADOR", "MOTOR ARRANQUE"]
+MARCAS = ["SEAT", "RENAULT", "PEUGEOT", "FORD", "OPEL", "VOLKSWAGEN"]
+
+
+def generar_csv(ruta: str, filas: int, semilla: int, cambios: float = 0.0, vendidas: float = 0.0):
+    """Escribe un CSV sintético con el formato de StockSeinto.csv"""
+    rnd = random.Random(semilla)
+    total_vendidas = int(filas * vendidas)
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write("ref.id;ref.pieza;precio;ubicacion;articulo;marca;modelo\n")
+        for i in range(total_vendidas, filas + total_vendidas):
+            precio = 10 + (i % 500)
+            if cambios and rnd.random() < cambios:
+                precio += 1
+            f.write(
+                f"{100000 + i};OEM{i:07d} / IAM{i:07d} / OE{i:07d};{precio},50;"
+                f"P{i % 40}-E{i % 12};{ARTICULOS[i % 5]};{MARCAS[i % 6]};MODELO {i % 30}\n"
+            )
+
+
+def medir(titulo: str, funcion, memoria: bool = True):
+    """Ejecuta la función midiendo tiempo y (opcionalmente) pico de memoria Python"""
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    print(f"\n{titulo}")
+    print(f"  Tiempo:        {duracion:.2f} s")
+    if memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  Pico memoria:  {pico / 1024 / 1024:.1f} MB")
+    for clave in ("piezas_importadas", "piezas_actualizadas", "piezas_sin_cambios", "piezas_vendidas", "total_piezas"):
+        print(f"  {clave}: {resultado.get(clave)}")
+    if resultado.get("error"):
+        print(f"  ERROR: {resultado['error']}")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de importación CSV en streaming")
+    parser.add_argument("--filas", type=int, default=200_000)
+    parser.add_argument("--lote", type=int, default=csv_auto_import.TAMANO_LOTE_IMPORTACION)
+    parser.add_argument("--sin-memoria", action="store_true", help="No usar tracemalloc")
+    args = parser.parse_args()
+
+    csv_auto_import.TAMANO_LOTE_IMPORTACION = args.lote
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        csv_auto_import.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = csv_auto_import.SessionLocal()
+        entorno = EntornoTrabajo(nombre="Benchmark", activo=True)
+        db.add(entorno)
+        db.commit()
+        entorno_id = entorno.id
+        db.close()
+
+        ruta = os.path.join(tmp, "stock.csv")
+        print(f"Generando CSV sintético de {args.filas} filas (lote {args.lote})...")
+        generar_csv(ruta, args.filas, semilla=1)
+        print(f"  Tamaño: {os.path.getsize(ruta) / 1024 / 1024:.1f} MB")
+
+        medir("Importación inicial", lambda: csv_auto_import.importar_csv_con_configuracion(
+            entorno_id, ruta, MAPEO
+        ), memoria=not args.sin_memoria)
+        medir("Reimportación sin cambios", lambda: csv_auto_import.importar_csv_con_configuracion(
+            entorno_id, ruta, MAPEO
+        ), memoria=not args.sin_memoria)
+
+        # Delta típico: 2% precios cambiados, 1% vendidas y 1% nuevas
+        generar_csv(ruta, args.filas, semilla=2, cambios=0.02, vendidas=0.01)
+        medir("Reimportación con delta (2% cambios, 1% ventas)", lambda: csv_auto_import.importar_csv_con_configuracion(
+            entorno_id, ruta, MAPEO
+        ), memoria=not args.sin_memoria)
+
+        db = csv_auto_import.SessionLocal()
+        print(f"\nPiezas en BD al final: {db.query(PiezaDesguace).count()}")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark de la búsqueda por referencia con el índice referencias_piezas.
+
+Crea una BD SQLite temporal con N piezas sintéticas (500.000 por defecto),
+construye el índice y compara la búsqueda antigua (ilike '%ref%' sobre
+refid/oem/oe/iam) con la búsqueda por igualdad y por prefijo en el índice.
+
+Uso: python scripts/benchmark_referencias.py [--piezas 500000] [--repeticiones 200]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, or_
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.busqueda import EntornoTrabajo, BaseDesguace, PiezaDesguace
+from services.referencias_index import reindexar_base, select_piezas_por_referencia
+
+
+def poblar(db, piezas: int) -> BaseDesguace:
+    """Inserta piezas sintéticas con refid, OEM y varias IAM por pieza"""
+    entorno = EntornoTrabajo(nombre="Benchmark", activo=True)
+    db.add(entorno)
+    db.flush()
+    base = BaseDesguace(entorno_trabajo_id=entorno.id, nombre_archivo="bench.csv", total_piezas=piezas)
+    db.add(base)
+    db.flush()
+    lote = []
+    for i in range(piezas):
+        lote.append({
+            "base_desguace_id": base.id,
+            "refid": str(100000 + i),
+            "oem": f"{i:07d}K0-615.301",
+            "oe": f"OE{i:07d}",
+            "iam": f"IAM{i:07d}A, IAM{i:07d}B",
+            "articulo": "FARO DELANTERO",
+        })
+        if len(lote) >= 10000:
+            db.bulk_insert_mappings(PiezaDesguace, lote)
+            lote = []
+    if lote:
+        db.bulk_insert_mappings(PiezaDesguace, lote)
+    db.commit()
+    return base
+
+
+def medir(titulo: str, funcion, repeticiones: int):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    media_ms = (time.perf_counter() - inicio) / repeticiones * 1000
+    print(f"  {titulo:<40} {media_ms:9.3f} ms/consulta  ({len(resultado)} resultados)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de referencias")
+    parser.add_argument("--piezas", type=int, default=500_000)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+        print(f"Generando {args.piezas} piezas...")
+        base = poblar(db, args.piezas)
+        inicio = time.perf_counter()
+        tokens = reindexar_base(db, base.id, base.entorno_trabajo_id)
+        db.commit()
+        print(f"Índice construido: {tokens} referencias en {time.perf_counter() - inicio:.1f}s\n")
+
+        rnd = random.Random(1)
+        objetivo = rnd.randrange(args.piezas)
+        ref = f"{objetivo:07d}K0615301"
+
+        def ilike():
+            return db.query(PiezaDesguace.id).filter(
+                PiezaDesguace.base_desguace_id == base.id,
+                or_(*[getattr(PiezaDesguace, c).ilike(f"%{ref}%") for c in ("refid", "oem", "oe", "iam")])
+            ).limit(50).all()
+
+        def igualdad():
+            return db.query(PiezaDesguace.id).filter(
+                PiezaDesguace.base_desguace_id == base.id,
+                PiezaDesguace.id.in_(select_piezas_por_referencia(f"{objetivo:07d}K0-615.301", base.entorno_trabajo_id))
+            ).limit(50).all()
+
+        def prefijo():
+            return db.query(PiezaDesguace.id).filter(
+                PiezaDesguace.base_desguace_id == base.id,
+                PiezaDesguace.id.in_(select_piezas_por_referencia(f"IAM{objetivo:07d}", base.entorno_trabajo_id, prefijo=True))
+            ).limit(50).all()
+
+        medir("ilike '%ref%' (antes)", ilike, max(1, args.repeticiones // 50))
+        medir("índice, igualdad", igualdad, args.repeticiones)
+        medir("índice, prefijo", prefijo, args.repeticiones)
+
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
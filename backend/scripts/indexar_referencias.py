@@ -0,0 +1,40 @@
+"""
+Reconstruye el índice de referencias normalizadas (tabla referencias_piezas)
+para todas las bases de desguace. Crea la tabla si no existe.
+Seguro para ejecutar múltiples veces (idempotente).
+
+Los importadores mantienen el índice al día y la app indexa al arrancar los
+entornos que no tienen ningún token; este script solo hace falta si se han
+tocado piezas a mano en la BD.
+
+Ejecutar en el VPS: python scripts/indexar_referencias.py
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal, engine
+from app.models.busqueda import BaseDesguace, ReferenciaPieza
+from services.referencias_index import reindexar_base
+
+
+def indexar():
+    ReferenciaPieza.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        bases = db.query(BaseDesguace.id, BaseDesguace.entorno_trabajo_id).all()
+        for base_id, entorno_id in bases:
+            inicio = time.perf_counter()
+            tokens = reindexar_base(db, base_id, entorno_id)
+            db.commit()
+            print(f"  ✅ Entorno {entorno_id}: {tokens} referencias indexadas en {time.perf_counter() - inicio:.1f}s")
+    finally:
+        db.close()
+
+    print("\n✓ Índice de referencias reconstruido")
+
+
+if __name__ == "__main__":
+    indexar()
@@ -0,0 +1,45 @@
+"""
+Migración: columna sello_actualizacion en configuracion_precios.
+Cambia con cada edición de la configuración de precios y sirve para saber si el
+snapshot de precios cacheado en memoria sigue siendo válido.
+Seguro para ejecutar múltiples veces (idempotente).
+
+Ejecutar en el VPS: python scripts/migrar_precios_sello.py
+"""
+import sqlite3
+import sys
+import os
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "desguapro.db")
+
+
+def migrar():
+    if not os.path.exists(DB_PATH):
+        print(f"❌ No se encontró la BD en {DB_PATH}")
+        sys.exit(1)
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='configuracion_precios'")
+    if not cursor.fetchone():
+        print("  ✅ configuracion_precios no existe todavía, se creará al arrancar")
+        conn.close()
+        return
+
+    cursor.execute("PRAGMA table_info(configuracion_precios)")
+    existentes = {col[1] for col in cursor.fetchall()}
+
+    if "sello_actualizacion" in existentes:
+        print("  ✅ configuracion_precios.sello_actualizacion ya existe")
+    else:
+        print("  ➕ ALTER TABLE configuracion_precios ADD COLUMN sello_actualizacion VARCHAR(32)")
+        cursor.execute("ALTER TABLE configuracion_precios ADD COLUMN sello_actualizacion VARCHAR(32)")
+
+    conn.commit()
+    conn.close()
+    print("\n✓ Migración completada")
+
+
+if __name__ == "__main__":
+    migrar()
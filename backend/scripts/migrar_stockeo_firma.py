@@ -0,0 +1,51 @@
+"""
+Migración: columnas de firma del último CSV importado en configuraciones_stockeo.
+Permiten al stockeo automático omitir los archivos que no han cambiado.
+Seguro para ejecutar múltiples veces (idempotente).
+
+Ejecutar en el VPS: python scripts/migrar_stockeo_firma.py
+"""
+import sqlite3
+import sys
+import os
+
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "desguapro.db")
+
+COLUMNAS = [
+    ("ultimo_archivo_tamano", "INTEGER"),
+    ("ultimo_archivo_mtime", "FLOAT"),
+    ("ultimo_archivo_hash", "VARCHAR(64)"),
+]
+
+
+def migrar():
+    if not os.path.exists(DB_PATH):
+        print(f"❌ No se encontró la BD en {DB_PATH}")
+        sys.exit(1)
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='configuraciones_stockeo'")
+    if not cursor.fetchone():
+        print("  ✅ configuraciones_stockeo no existe todavía, se creará al arrancar")
+        conn.close()
+        return
+
+    cursor.execute("PRAGMA table_info(configuraciones_stockeo)")
+    existentes = {col[1] for col in cursor.fetchall()}
+
+    for columna, definicion in COLUMNAS:
+        if columna in existentes:
+            print(f"  ✅ configuraciones_stockeo.{columna} ya existe")
+        else:
+            print(f"  ➕ ALTER TABLE configuraciones_stockeo ADD COLUMN {columna} {definicion}")
+            cursor.execute(f"ALTER TABLE configuraciones_stockeo ADD COLUMN {columna} {definicion}")
+
+    conn.commit()
+    conn.close()
+    print("\n✓ Migración completada")
+
+
+if __name__ == "__main__":
+    migrar()
@@ -0,0 +1,81 @@
+"""
+Precarga el almacén de OEM equivalentes (tabla equivalencias_oem) para que la
+Fase 1 de la búsqueda completa sea una consulta local también la primera vez.
+
+Por defecto toma las OEM del stock de todos los entornos (tokens 'oem' del
+índice referencias_piezas) y consulta tarostrade/distri-auto solo para las que
+no están guardadas o han caducado. Crea la tabla si no existe. Se puede
+interrumpir y volver a lanzar: lo ya guardado se salta.
+
+Uso:
+  python scripts/precalentar_equivalencias_oem.py [--entorno ID] [--limite N] [--hilos 4]
+  python scripts/precalentar_equivalencias_oem.py --caducadas      # solo revalidar las caducadas
+  python scripts/precalentar_equivalencias_oem.py 1K0615301AA 5Q0407271 [--forzar]
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+
+from app.database import SessionLocal, engine
+from app.models.busqueda import EquivalenciaOEM, ReferenciaPieza
+from app.services.almacen_oem import AlmacenEquivalencias
+from app.services.oem_equivalentes import _consultar_fuentes
+
+# Las fuentes descartan referencias más cortas
+LONGITUD_MINIMA = 5
+
+
+def referencias_del_stock(entorno_id=None, limite=None):
+    db = SessionLocal()
+    try:
+        consulta = db.query(ReferenciaPieza.token).filter(ReferenciaPieza.campo == "oem").distinct()
+        if entorno_id is not None:
+            consulta = consulta.filter(ReferenciaPieza.entorno_trabajo_id == entorno_id)
+        tokens = [t for (t,) in consulta.order_by(ReferenciaPieza.token) if len(t) >= LONGITUD_MINIMA]
+    finally:
+        db.close()
+    return tokens[:limite] if limite else tokens
+
+
+def referencias_guardadas(limite=None):
+    """Todas las guardadas: el almacén salta las que siguen frescas"""
+    db = SessionLocal()
+    try:
+        refs = [r for (r,) in db.query(EquivalenciaOEM.referencia).order_by(EquivalenciaOEM.fecha_actualizacion)]
+    finally:
+        db.close()
+    return refs[:limite] if limite else refs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precarga de OEM equivalentes")
+    parser.add_argument("referencias", nargs="*", help="Referencias concretas (por defecto, las OEM del stock)")
+    parser.add_argument("--entorno", type=int, help="Solo las OEM del stock de este entorno")
+    parser.add_argument("--caducadas", action="store_true", help="Revalidar las entradas guardadas que han caducado")
+    parser.add_argument("--limite", type=int, help="Máximo de referencias a considerar")
+    parser.add_argument("--hilos", type=int, default=4, help="Referencias consultadas a la vez")
+    parser.add_argument("--forzar", action="store_true", help="Consultar aunque estén frescas")
+    args = parser.parse_args()
+
+    EquivalenciaOEM.__table__.create(bind=engine, checkfirst=True)
+
+    if args.referencias:
+        referencias = args.referencias
+    elif args.caducadas:
+        referencias = referencias_guardadas(args.limite)
+    else:
+        referencias = referencias_del_stock(args.entorno, args.limite)
+    print(f"{len(referencias)} referencias a revisar ({args.hilos} hilos)...")
+
+    inicio = time.perf_counter()
+    resumen = AlmacenEquivalencias().precalentar(referencias, _consultar_fuentes, hilos=args.hilos, forzar=args.forzar)
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    print(f"\n✓ Precarga terminada en {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Búsqueda de Texto en Stock y Ventas
+===================================
+
+Índice de texto completo sobre los campos de búsqueda de piezas_desguace y
+piezas_vendidas (refid, OEM, OE, IAM, artículo, marca y modelo), para que los
+listados /desguace/stock y /desguace/ventas filtren y ordenen por relevancia sin
+recorrer la tabla entera con ilike.
+
+- SQLite: tabla virtual FTS5 con contenido externo (<tabla>_fts) y triggers
+  AFTER INSERT/UPDATE/DELETE, así que se mantiene sola también con las
+  sentencias en bloque de los importadores.
+- PostgreSQL: índice GIN sobre to_tsvector('simple', ...) de los mismos campos.
+
+Las tablas se crean junto a las del modelo (create_all) y, en BDs ya
+existentes, al arrancar con instalar_indices_texto().
+"""
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import DDL, Float, Integer, event, func, literal_column, or_, text
+from sqlalchemy.orm import Query, Session
+from app.models.busqueda import PiezaDesguace, PiezaVendida
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_TEXTO = ("refid", "oem", "oe", "iam", "articulo", "marca", "modelo")
+MODELOS_TEXTO = (PiezaDesguace, PiezaVendida)
+_TERMINO = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def _tabla_fts(modelo) -> str:
+    return f"{modelo.__tablename__}_fts"
+
+
+def _ddl_sqlite(tabla: str) -> List[str]:
+    """Sentencias (idempotentes) de la tabla FTS5 y sus triggers de sincronización"""
+    fts = f"{tabla}_fts"
+    columnas = ", ".join(CAMPOS_TEXTO)
+    nuevos = ", ".join(f"new.{c}" for c in CAMPOS_TEXTO)
+    viejos = ", ".join(f"old.{c}" for c in CAMPOS_TEXTO)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{columnas}, content='{tabla}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columnas}) VALUES (new.id, {nuevos}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columnas}) VALUES ('delete', old.id, {viejos}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columnas} ON {tabla} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columnas}) VALUES ('delete', old.id, {viejos}); "
+        f"INSERT INTO {fts}(rowid, {columnas}) VALUES (new.id, {nuevos}); END",
+    ]
+
+
+def _vector_postgres(modelo):
+    """to_tsvector('simple', ...) de los campos de texto (misma expresión que el índice GIN)"""
+    concatenado = func.concat_ws(literal_column("' '"), *[getattr(modelo, c) for c in CAMPOS_TEXTO])
+    return func.to_tsvector(literal_column("'simple'"), concatenado)
+
+
+def _ddl_postgres(tabla: str) -> List[str]:
+    campos = ", ".join(CAMPOS_TEXTO)
+    return [
+        f"CREATE INDEX IF NOT EXISTS ix_{tabla}_busqueda_texto ON {tabla} "
+        f"USING GIN (to_tsvector('simple', concat_ws(' ', {campos})))"
+    ]
+
+
+# Crear/borrar los índices de texto junto con las tablas del modelo
+for _modelo in MODELOS_TEXTO:
+    _tabla = _modelo.__tablename__
+    for _sentencia in _ddl_sqlite(_tabla):
+        event.listen(_modelo.__table__, "after_create", DDL(_sentencia).execute_if(dialect="sqlite"))
+    for _sentencia in _ddl_postgres(_tabla):
+        event.listen(_modelo.__table__, "after_create", DDL(_sentencia).execute_if(dialect="postgresql"))
+    event.listen(
+        _modelo.__table__, "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {_tabla}_fts").execute_if(dialect="sqlite"),
+    )
+
+
+def instalar_indices_texto(engine) -> Dict[str, bool]:
+    """
+    Crea los índices de texto en una BD existente (las tablas ya estaban creadas y
+    create_all no dispara after_create). Si la tabla FTS es nueva, la rellena con
+    las filas actuales. Idempotente. Devuelve {tabla: creada_ahora}.
+    """
+    creados = {}
+    with engine.begin() as conn:
+        dialecto = conn.dialect.name
+        for modelo in MODELOS_TEXTO:
+            tabla = modelo.__tablename__
+            if dialecto == "sqlite":
+                existia = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"),
+                    {"n": _tabla_fts(modelo)},
+                ).first() is not None
+                for sentencia in _ddl_sqlite(tabla):
+                    conn.execute(text(sentencia))
+                if not existia:
+                    conn.execute(text(f"INSERT INTO {_tabla_fts(modelo)}({_tabla_fts(modelo)}) VALUES ('rebuild')"))
+                    logger.info(f"Índice de texto {_tabla_fts(modelo)} creado y rellenado")
+                creados[tabla] = not existia
+            elif dialecto == "postgresql":
+                for sentencia in _ddl_postgres(tabla):
+                    conn.execute(text(sentencia))
+                creados[tabla] = False
+    return creados
+
+
+def terminos_busqueda(texto: Optional[str]) -> List[str]:
+    """Palabras de la búsqueda en minúsculas: '1K0-615 faro' -> ['1k0', '615', 'faro']"""
+    return _TERMINO.findall(texto.lower()) if texto else []
+
+
+def _indice_disponible(db: Session, modelo) -> bool:
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        return True
+    if dialecto != "sqlite":
+        return False
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"),
+        {"n": _tabla_fts(modelo)},
+    ).first() is not None
+
+
+def aplicar_busqueda_texto(
+    db: Session,
+    query: Query,
+    modelo,
+    texto: str,
+    alternativas: Tuple = (),
+) -> Optional[Tuple[Query, list]]:
+    """
+    Filtra la query por el índice de texto: cada palabra de la búsqueda debe
+    aparecer como prefijo de algún término de los campos de CAMPOS_TEXTO.
+    `alternativas` son condiciones extra que también cuentan como coincidencia
+    (p. ej. el usuario que fichó la pieza).
+
+    Devuelve (query filtrada, orden por relevancia) o None si la BD no tiene
+    índice de texto, para que quien llama use el filtro ilike de siempre.
+    """
+    terminos = terminos_busqueda(texto)
+    if not terminos or not _indice_disponible(db, modelo):
+        return None
+
+    if db.get_bind().dialect.name == "postgresql":
+        consulta = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{t}:*" for t in terminos))
+        vector = _vector_postgres(modelo)
+        coincide = vector.op("@@")(consulta)
+        relevancia = func.ts_rank(vector, consulta)
+        query = query.filter(or_(coincide, *alternativas))
+        return query, [relevancia.desc(), modelo.id.desc()]
+
+    fts = _tabla_fts(modelo)
+    expresion = " ".join(f'"{t}"*' for t in terminos)
+    coincidencias = text(
+        f"SELECT rowid AS id, bm25({fts}) AS rango FROM {fts} WHERE {fts} MATCH :expresion"
+    ).bindparams(expresion=expresion).columns(id=Integer, rango=Float).subquery()
+
+    if alternativas:
+        query = query.outerjoin(coincidencias, coincidencias.c.id == modelo.id).filter(
+            or_(coincidencias.c.id.isnot(None), *alternativas)
+        )
+    else:
+        query = query.join(coincidencias, coincidencias.c.id == modelo.id)
+    # bm25: cuanto más negativo, más relevante; las coincidencias solo por alternativas al final
+    return query, [coincidencias.c.rango.is_(None), coincidencias.c.rango, modelo.id.desc()]
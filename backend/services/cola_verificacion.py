@@ -0,0 +1,344 @@
+"""
+Cola persistente de verificaciones masivas de stock
+===================================================
+
+/stock/verificar-masivo procesa la lista entera dentro de la petición HTTP; con
+listas grandes la conexión dura minutos y la cortan los proxies, así que solo
+acepta listas cortas (settings.verificar_masivo_max_items). Aquí la
+verificación se encola como un trabajo en la BD de la app (SQLite por defecto)
+y la procesan workers en segundo plano:
+
+- Pool acotado: settings.cola_verificacion_workers trabajos a la vez por
+  proceso. Cada trabajo recorre sus items en orden respetando su delay; el
+  ritmo por host lo pone core.proteccion_hosts (token bucket y circuito de
+  Ecooparts). Si Ecooparts no está disponible el trabajo se aparca
+  settings.cola_reintento_segundos sin marcar sus items como "sin datos".
+- Reparto entre procesos: un trabajo se reclama con un UPDATE condicional
+  (estado pendiente -> en_curso), así varios workers de uvicorn comparten cola.
+- Reanudable: cada item se guarda al procesarse junto con el latido del
+  trabajo. Al parar la app el trabajo vuelve a pendiente; si el proceso muere,
+  el trabajo se recupera cuando su latido caduca
+  (settings.cola_latido_caducado_segundos). Se sigue por el primer item pendiente.
+
+El progreso y los resultados parciales se consultan con leer_progreso (polling
+y SSE en el router de stock).
+"""
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.busqueda import ItemTrabajoVerificacion, TrabajoVerificacion, Usuario
+from app.schemas.stock import (
+    CheckMasivoResultItem, CheckStockMasivoRequest, StockMasivoItem,
+    TrabajoVerificacionResponse, TrabajoVerificacionResumen,
+)
+from core.proteccion_hosts import HostNoDisponible
+from services.precio_sugerido import get_snapshot_precios
+from services.verificacion_stock import get_ecooparts_scraper, procesar_item
+from utils.timezone import now_spain_naive
+
+logger = logging.getLogger(__name__)
+
+# Estados del trabajo
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+CANCELADO = "cancelado"
+ERROR = "error"
+ESTADOS_FINALES = (COMPLETADO, CANCELADO, ERROR)
+
+# Estados de cada item
+ITEM_PENDIENTE = "pendiente"
+ITEM_PROCESADO = "procesado"  # Con resultado
+ITEM_SIN_DATOS = "sin_datos"  # Sin precios suficientes en Ecooparts
+
+
+# ============== ALTA Y CONSULTA ==============
+
+def crear_trabajo(db: Session, usuario: Usuario, request: CheckStockMasivoRequest) -> TrabajoVerificacion:
+    """Encola una verificación masiva y avisa a los workers"""
+    ahora = now_spain_naive()
+    trabajo = TrabajoVerificacion(
+        usuario_id=usuario.id,
+        entorno_trabajo_id=usuario.entorno_trabajo_id,
+        estado=PENDIENTE if request.items else COMPLETADO,
+        umbral_diferencia=request.umbral_diferencia,
+        piezas_minimas=request.piezas_minimas,
+        delay=request.delay,
+        total_items=len(request.items),
+        items_procesados=0,
+        items_con_resultado=0,
+        items_con_outliers=0,
+        fecha_creacion=ahora,
+        fecha_fin=None if request.items else ahora,
+    )
+    db.add(trabajo)
+    db.flush()
+    db.add_all([
+        ItemTrabajoVerificacion(
+            trabajo_id=trabajo.id,
+            posicion=i,
+            datos=item.model_dump_json(),
+            estado=ITEM_PENDIENTE,
+        )
+        for i, item in enumerate(request.items)
+    ])
+    db.commit()
+    db.refresh(trabajo)
+    logger.info(f"[Cola] Trabajo {trabajo.id} encolado: {trabajo.total_items} items ({usuario.email})")
+    get_cola_verificacion().avisar()
+    return trabajo
+
+
+def cancelar_trabajo(db: Session, trabajo: TrabajoVerificacion) -> bool:
+    """Cancela un trabajo no terminado; el worker lo deja tras el item en curso"""
+    actualizados = db.query(TrabajoVerificacion).filter(
+        TrabajoVerificacion.id == trabajo.id,
+        TrabajoVerificacion.estado.in_([PENDIENTE, EN_CURSO]),
+    ).update({"estado": CANCELADO, "fecha_fin": now_spain_naive()}, synchronize_session=False)
+    db.commit()
+    db.refresh(trabajo)
+    return bool(actualizados)
+
+
+def leer_progreso(db: Session, trabajo: TrabajoVerificacion, desde: int = 0, limite: int = 500) -> TrabajoVerificacionResponse:
+    """Progreso del trabajo y resultados con posición >= desde (en orden)"""
+    items = db.query(ItemTrabajoVerificacion.posicion, ItemTrabajoVerificacion.resultado).filter(
+        ItemTrabajoVerificacion.trabajo_id == trabajo.id,
+        ItemTrabajoVerificacion.estado == ITEM_PROCESADO,
+        ItemTrabajoVerificacion.posicion >= desde,
+    ).order_by(ItemTrabajoVerificacion.posicion).limit(limite).all()
+
+    resultados: List[CheckMasivoResultItem] = [
+        CheckMasivoResultItem.model_validate_json(resultado) for _, resultado in items
+    ]
+    siguiente = items[-1].posicion + 1 if items else desde
+    return TrabajoVerificacionResponse(
+        **TrabajoVerificacionResumen.model_validate(trabajo).model_dump(),
+        resultados=resultados,
+        siguiente_posicion=siguiente,
+    )
+
+
+# ============== WORKERS ==============
+
+class ColaVerificacion:
+    """Pool de workers que procesa los trabajos pendientes de la BD"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, workers: Optional[int] = None):
+        self.session_factory = session_factory
+        self.workers = workers or settings.cola_verificacion_workers
+        # Identifica a este proceso como propietario de los trabajos que reclama
+        self.id_proceso = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._aviso = threading.Event()
+        self._parar = threading.Event()
+        self._hilos: List[threading.Thread] = []
+
+    # ---------- Ciclo de vida ----------
+
+    def iniciar(self):
+        if self._hilos:
+            return
+        self._parar.clear()
+        for i in range(self.workers):
+            hilo = threading.Thread(target=self._bucle_worker, name=f"cola-verificacion-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        logger.info(f"[Cola] {self.workers} workers de verificación iniciados")
+
+    def detener(self, timeout: float = 10):
+        """Para los workers; el trabajo en curso vuelve a pendiente tras el item actual"""
+        self._parar.set()
+        self._aviso.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+
+    def avisar(self):
+        """Despierta a los workers (hay un trabajo nuevo)"""
+        self._aviso.set()
+
+    def _bucle_worker(self):
+        while not self._parar.is_set():
+            try:
+                trabajo_id = self.reclamar_siguiente()
+            except Exception as e:
+                logger.error(f"[Cola] Error buscando trabajos: {e}")
+                trabajo_id = None
+            if trabajo_id is None:
+                self._aviso.wait(settings.cola_intervalo_segundos)
+                self._aviso.clear()
+                continue
+            self.procesar_trabajo(trabajo_id)
+
+    # ---------- Reparto de trabajos ----------
+
+    def recuperar_abandonados(self, db: Session) -> int:
+        """Devuelve a pendiente los trabajos en curso cuyo proceso dejó de dar latidos"""
+        limite = now_spain_naive() - timedelta(seconds=settings.cola_latido_caducado_segundos)
+        recuperados = db.query(TrabajoVerificacion).filter(
+            TrabajoVerificacion.estado == EN_CURSO,
+            or_(TrabajoVerificacion.latido.is_(None), TrabajoVerificacion.latido < limite),
+        ).update({"estado": PENDIENTE, "propietario": None}, synchronize_session=False)
+        db.commit()
+        if recuperados:
+            logger.warning(f"[Cola] {recuperados} trabajos abandonados vuelven a la cola")
+        return recuperados
+
+    def reclamar_siguiente(self) -> Optional[int]:
+        """Reclama el trabajo pendiente más antiguo; None si no hay"""
+        db = self.session_factory()
+        try:
+            self.recuperar_abandonados(db)
+            ahora = now_spain_naive()
+            candidatos = db.query(TrabajoVerificacion.id).filter(
+                TrabajoVerificacion.estado == PENDIENTE,
+                or_(TrabajoVerificacion.disponible_desde.is_(None), TrabajoVerificacion.disponible_desde <= ahora),
+            ).order_by(TrabajoVerificacion.id).limit(5).all()
+            for (trabajo_id,) in candidatos:
+                # UPDATE condicional: si otro worker se adelantó no actualiza nada
+                reclamado = db.query(TrabajoVerificacion).filter(
+                    TrabajoVerificacion.id == trabajo_id,
+                    TrabajoVerificacion.estado == PENDIENTE,
+                ).update({
+                    "estado": EN_CURSO,
+                    "propietario": self.id_proceso,
+                    "latido": ahora,
+                    "disponible_desde": None,
+                    "fecha_inicio": func.coalesce(TrabajoVerificacion.fecha_inicio, ahora),
+                }, synchronize_session=False)
+                db.commit()
+                if reclamado:
+                    return trabajo_id
+            return None
+        finally:
+            db.close()
+
+    def _es_mio(self, db: Session, trabajo: TrabajoVerificacion) -> bool:
+        """Sigue en curso y a nombre de este proceso (no cancelado ni recuperado por otro)"""
+        db.refresh(trabajo)
+        return trabajo.estado == EN_CURSO and trabajo.propietario == self.id_proceso
+
+    def _cerrar(self, db: Session, trabajo_id: int, cambios: Dict[str, Any]):
+        """Cambia el estado solo si el trabajo sigue siendo de este proceso"""
+        db.query(TrabajoVerificacion).filter(
+            TrabajoVerificacion.id == trabajo_id,
+            TrabajoVerificacion.estado == EN_CURSO,
+            TrabajoVerificacion.propietario == self.id_proceso,
+        ).update(cambios, synchronize_session=False)
+        db.commit()
+
+    def _liberar(self, db: Session, trabajo_id: int, espera: float = 0, motivo: Optional[str] = None):
+        cambios: Dict[str, Any] = {"estado": PENDIENTE, "propietario": None}
+        if espera:
+            cambios["disponible_desde"] = now_spain_naive() + timedelta(seconds=espera)
+        if motivo:
+            cambios["mensaje_error"] = motivo[:500]
+        self._cerrar(db, trabajo_id, cambios)
+
+    # ---------- Proceso de un trabajo ----------
+
+    def procesar_trabajo(self, trabajo_id: int):
+        """Procesa los items pendientes del trabajo hasta acabar, parar o perderlo"""
+        db = self.session_factory()
+        try:
+            trabajo = db.get(TrabajoVerificacion, trabajo_id)
+            scraper = get_ecooparts_scraper()
+            if not scraper:
+                self._liberar(db, trabajo_id, settings.cola_reintento_segundos, "No se pudo configurar sesión en Ecooparts")
+                return
+            snapshot_precios = get_snapshot_precios(db, trabajo.entorno_trabajo_id) if trabajo.entorno_trabajo_id else None
+
+            primero = True
+            while True:
+                if self._parar.is_set():
+                    self._liberar(db, trabajo_id)
+                    return
+                if not self._es_mio(db, trabajo):
+                    logger.info(f"[Cola] Trabajo {trabajo_id} cancelado o reasignado, se deja")
+                    return
+
+                item = db.query(ItemTrabajoVerificacion).filter(
+                    ItemTrabajoVerificacion.trabajo_id == trabajo_id,
+                    ItemTrabajoVerificacion.estado == ITEM_PENDIENTE,
+                ).order_by(ItemTrabajoVerificacion.posicion).first()
+                if item is None:
+                    break
+
+                # Delay entre items del mismo trabajo (interrumpible al parar la app)
+                if not primero and trabajo.delay:
+                    if self._parar.wait(trabajo.delay):
+                        continue
+                primero = False
+
+                try:
+                    resultado = procesar_item(
+                        StockMasivoItem.model_validate_json(item.datos), scraper,
+                        trabajo.umbral_diferencia, trabajo.piezas_minimas,
+                        snapshot_precios=snapshot_precios,
+                    )
+                except HostNoDisponible as e:
+                    logger.warning(f"[Cola] Trabajo {trabajo_id} aparcado: {e}")
+                    self._liberar(db, trabajo_id, settings.cola_reintento_segundos, str(e))
+                    return
+
+                ahora = now_spain_naive()
+                item.estado = ITEM_PROCESADO if resultado else ITEM_SIN_DATOS
+                item.resultado = resultado.model_dump_json() if resultado else None
+                item.fecha_proceso = ahora
+                trabajo.items_procesados += 1
+                if resultado:
+                    trabajo.items_con_resultado += 1
+                    if resultado.es_outlier:
+                        trabajo.items_con_outliers += 1
+                trabajo.latido = ahora
+                db.commit()
+
+            self._cerrar(db, trabajo_id, {"estado": COMPLETADO, "fecha_fin": now_spain_naive(), "mensaje_error": None})
+            logger.info(f"[Cola] Trabajo {trabajo_id} completado")
+        except Exception as e:
+            logger.error(f"[Cola] Error en el trabajo {trabajo_id}: {e}")
+            db.rollback()
+            self._cerrar(db, trabajo_id, {"estado": ERROR, "fecha_fin": now_spain_naive(), "mensaje_error": str(e)[:500]})
+        finally:
+            db.close()
+
+    def procesar_pendientes(self) -> int:
+        """Procesa en este hilo todos los trabajos disponibles (scripts y tests)"""
+        procesados = 0
+        while (trabajo_id := self.reclamar_siguiente()) is not None:
+            self.procesar_trabajo(trabajo_id)
+            procesados += 1
+        return procesados
+
+
+_cola: Optional[ColaVerificacion] = None
+_cola_lock = threading.Lock()
+
+
+def get_cola_verificacion() -> ColaVerificacion:
+    global _cola
+    with _cola_lock:
+        if _cola is None:
+            _cola = ColaVerificacion()
+        return _cola
+
+
+def iniciar_cola_verificacion():
+    get_cola_verificacion().iniciar()
+
+
+def detener_cola_verificacion():
+    with _cola_lock:
+        cola = _cola
+    if cola is not None:
+        cola.detener()
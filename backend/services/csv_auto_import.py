@@ -10,14 +10,21 @@ ref.id;ref.pieza;anostock;precio;peso;estado;ubicacion;observaciones;articulo;ma
 """
 import os
 import csv
+import hashlib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, Tuple
+from itertools import chain
+from typing import Optional, Dict, List, Set, Tuple, Iterable, Iterator
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from app.config import settings
 from app.database import SessionLocal
 from app.models.busqueda import BaseDesguace, PiezaDesguace, PiezaVendida, EntornoTrabajo, PiezaPedida, FichadaPieza, ConfiguracionStockeo
 from utils.timezone import now_spain_naive
+from services.referencias_index import eliminar_referencias, sincronizar_referencias_base, ultimo_id_pieza
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -49,6 +56,17 @@ MAPEO_COLUMNAS = {
     "imágenes": "imagen",
 }
 
+# Importación en streaming: filas por lote y refids por sentencia DELETE
+TAMANO_LOTE_IMPORTACION = 5000
+TAMANO_LOTE_BORRADO = 500
+
+# Campos de PiezaDesguace que forman la huella de una pieza. Si la huella de la
+# fila del CSV coincide con la guardada, la pieza no se vuelve a escribir.
+CAMPOS_HUELLA = (
+    "oem", "oe", "iam", "precio", "ubicacion", "observaciones",
+    "articulo", "marca", "modelo", "version", "imagen",
+)
+
 
 def obtener_entorno_motocoche(db: Session) -> Optional[int]:
     """
@@ -71,38 +89,84 @@ def obtener_entorno_motocoche(db: Session) -> Optional[int]:
     return None
 
 
-def leer_csv_stock(csv_path: str) -> Tuple[list, list]:
+def iterar_lotes_csv(
+    csv_path: str,
+    encoding: str = 'utf-8-sig',
+    delimitador: Optional[str] = None,
+    tamano_lote: Optional[int] = None
+) -> Iterator[Tuple[list, list]]:
     """
-    Lee el archivo CSV y devuelve las cabeceras y filas.
-    Maneja el formato específico de StockSeinto.csv (separado por ;)
+    Lee el CSV en streaming y devuelve tuplas (cabeceras, filas) con como mucho
+    tamano_lote filas cada una. Si no se indica delimitador se detecta con la
+    primera línea (';' o ','). Siempre devuelve al menos un lote (puede ir vacío)
+    para que el llamador conozca las cabeceras.
     """
-    filas = []
-    cabeceras = []
-    
-    # Usar utf-8-sig para manejar BOM automáticamente
-    with open(csv_path, 'r', encoding='utf-8-sig', errors='replace') as f:
-        # Detectar delimitador
-        primera_linea = f.readline()
-        f.seek(0)
-        
-        delimitador = ';' if ';' in primera_linea else ','
-        
+    tamano_lote = tamano_lote or TAMANO_LOTE_IMPORTACION
+    with open(csv_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        if delimitador is None:
+            primera_linea = f.readline()
+            f.seek(0)
+            delimitador = ';' if ';' in primera_linea else ','
+
         reader = csv.reader(f, delimiter=delimitador)
-        cabeceras = next(reader)
-        
+        cabeceras = next(reader, [])
+
         # Limpiar cabeceras (remover BOM residual si lo hubiera)
         cabeceras = [c.strip().lower().lstrip('\ufeff') for c in cabeceras]
-        
+
+        lote = []
+        emitido = False
         for fila in reader:
             if len(fila) >= len(cabeceras) / 2:  # Al menos la mitad de columnas
                 # Limpiar BOM del primer valor si existe
                 if fila and fila[0]:
                     fila[0] = fila[0].lstrip('\ufeff')
-                filas.append(fila)
-    
+                lote.append(fila)
+                if len(lote) >= tamano_lote:
+                    yield cabeceras, lote
+                    emitido = True
+                    lote = []
+
+        if lote or not emitido:
+            yield cabeceras, lote
+
+
+def leer_csv_stock(csv_path: str) -> Tuple[list, list]:
+    """
+    Lee el archivo CSV y devuelve las cabeceras y filas.
+    Maneja el formato específico de StockSeinto.csv (separado por ;)
+
+    Carga el archivo entero en memoria; las importaciones programadas usan
+    iterar_lotes_csv para procesarlo por lotes.
+    """
+    filas = []
+    cabeceras = []
+    for cabeceras, lote in iterar_lotes_csv(csv_path):
+        filas.extend(lote)
     return cabeceras, filas
 
 
+def huella_pieza(valores: Iterable) -> int:
+    """Huella de los CAMPOS_HUELLA de una pieza (válida dentro del mismo proceso)."""
+    return hash(tuple(valores))
+
+
+def cargar_proyeccion_stock(db: Session, base_desguace_id: int) -> Dict[str, Tuple[int, int]]:
+    """
+    Devuelve {refid: (id, huella)} del stock de una base consultando solo
+    columnas, sin materializar objetos PiezaDesguace.
+    """
+    columnas = [getattr(PiezaDesguace, campo) for campo in CAMPOS_HUELLA]
+    proyeccion = {}
+    for fila in db.query(PiezaDesguace.id, PiezaDesguace.refid, *columnas).filter(
+        PiezaDesguace.base_desguace_id == base_desguace_id,
+        PiezaDesguace.refid.isnot(None)
+    ).yield_per(TAMANO_LOTE_IMPORTACION):
+        if fila[1]:
+            proyeccion[fila[1]] = (fila[0], huella_pieza(fila[2:]))
+    return proyeccion
+
+
 def mapear_fila_a_pieza(cabeceras: list, fila: list, mapeo_custom: dict = None) -> Dict:
     """
     Mapea una fila del CSV a un diccionario de campos de PiezaDesguace.
@@ -208,7 +272,8 @@ def detectar_piezas_vendidas(
     base_desguace_id: int,
     entorno_trabajo_id: int,
     nuevos_refids: set,
-    max_porcentaje_vendidas: float = 20.0  # Máximo 20% del stock puede marcarse como vendido de golpe
+    max_porcentaje_vendidas: float = 20.0,  # Máximo 20% del stock puede marcarse como vendido de golpe
+    refids_actuales: Optional[set] = None
 ) -> int:
     """
     Detecta piezas que ya no están en el CSV (vendidas) y las mueve al historial.
@@ -216,14 +281,23 @@ def detectar_piezas_vendidas(
     
     PROTECCIÓN: Si se detecta más del max_porcentaje_vendidas% del stock como vendido,
     se asume que hay un error en el CSV y no se marca ninguna como vendida.
+
+    refids_actuales permite pasar el stock previo a la importación cuando las
+    piezas nuevas ya se han insertado; si no se indica se consulta la BD.
+
+    Las vendidas salen de una única diferencia de conjuntos y se insertan en el
+    historial con un solo bulk insert; las consultas auxiliares van por lotes de
+    refids, así que el coste depende del número de ventas y no del stock.
     """
-    # Obtener IDs actuales en la BD
-    piezas_actuales = db.query(PiezaDesguace.refid).filter(
-        PiezaDesguace.base_desguace_id == base_desguace_id,
-        PiezaDesguace.refid.isnot(None)
-    ).all()
-    
-    ids_actuales = {p.refid for p in piezas_actuales if p.refid}
+    if refids_actuales is not None:
+        ids_actuales = {r for r in refids_actuales if r}
+    else:
+        # Obtener IDs actuales en la BD
+        piezas_actuales = db.query(PiezaDesguace.refid).filter(
+            PiezaDesguace.base_desguace_id == base_desguace_id,
+            PiezaDesguace.refid.isnot(None)
+        ).all()
+        ids_actuales = {p.refid for p in piezas_actuales if p.refid}
     total_actuales = len(ids_actuales)
     
     # Detectar IDs que ya no están
@@ -248,48 +322,326 @@ def detectar_piezas_vendidas(
         )
         return 0
     
-    contador_vendidas = 0
-    for refid in ids_vendidas:
-        # Obtener datos de la pieza antes de marcarla como vendida
-        pieza = db.query(PiezaDesguace).filter(
+    if not ids_vendidas:
+        return 0
+
+    # Refids ya presentes en el historial de vendidas (una consulta por lote de refids)
+    lista_vendidas = list(ids_vendidas)
+    ya_vendidas = set()
+    for i in range(0, len(lista_vendidas), TAMANO_LOTE_BORRADO):
+        ya_vendidas.update(r for (r,) in db.query(PiezaVendida.refid).filter(
+            PiezaVendida.entorno_trabajo_id == entorno_trabajo_id,
+            PiezaVendida.refid.in_(lista_vendidas[i:i + TAMANO_LOTE_BORRADO])
+        ))
+    pendientes = [r for r in lista_vendidas if r not in ya_vendidas]
+
+    # Copiar los datos de las piezas vendidas (solo columnas) y crear el historial de una vez
+    campos_copia = CAMPOS_HUELLA + ("fecha_fichaje", "usuario_fichaje_id", "operario_desmontaje")
+    columnas = [getattr(PiezaDesguace, campo) for campo in campos_copia]
+    fecha_venta = now_spain_naive()
+    nuevas_vendidas = {}
+    for i in range(0, len(pendientes), TAMANO_LOTE_BORRADO):
+        for fila in db.query(PiezaDesguace.refid, *columnas).filter(
             PiezaDesguace.base_desguace_id == base_desguace_id,
-            PiezaDesguace.refid == refid
-        ).first()
-        
-        if pieza:
-            # Verificar si ya existe en vendidas
-            existe = db.query(PiezaVendida).filter(
-                PiezaVendida.entorno_trabajo_id == entorno_trabajo_id,
-                PiezaVendida.refid == refid
-            ).first()
-            
-            if not existe:
-                # Crear registro de pieza vendida
-                vendida = PiezaVendida(
-                    entorno_trabajo_id=entorno_trabajo_id,
-                    refid=pieza.refid,
-                    oem=pieza.oem,
-                    oe=pieza.oe,
-                    iam=pieza.iam,
-                    articulo=pieza.articulo,
-                    precio=pieza.precio,
-                    ubicacion=pieza.ubicacion,
-                    observaciones=pieza.observaciones,
-                    marca=pieza.marca,
-                    modelo=pieza.modelo,
-                    version=pieza.version,
-                    imagen=pieza.imagen,
-                    fecha_venta=now_spain_naive(),
-                    fecha_fichaje=pieza.fecha_fichaje if hasattr(pieza, 'fecha_fichaje') else None,
-                    usuario_fichaje_id=pieza.usuario_fichaje_id if hasattr(pieza, 'usuario_fichaje_id') else None,
-                    operario_desmontaje=pieza.operario_desmontaje if hasattr(pieza, 'operario_desmontaje') else None,
-                )
-                db.add(vendida)
-                contador_vendidas += 1
-    
+            PiezaDesguace.refid.in_(pendientes[i:i + TAMANO_LOTE_BORRADO])
+        ).order_by(PiezaDesguace.id):
+            if fila[0] not in nuevas_vendidas:
+                nuevas_vendidas[fila[0]] = {
+                    "entorno_trabajo_id": entorno_trabajo_id,
+                    "refid": fila[0],
+                    "fecha_venta": fecha_venta,
+                    **dict(zip(campos_copia, fila[1:])),
+                }
+
+    if nuevas_vendidas:
+        db.bulk_insert_mappings(PiezaVendida, list(nuevas_vendidas.values()))
+
+    contador_vendidas = len(nuevas_vendidas)
     return contador_vendidas
 
 
+def _obtener_o_crear_base(db: Session, entorno_trabajo_id: int, nombre_archivo: str, cabeceras: list) -> BaseDesguace:
+    """Obtiene la BaseDesguace del entorno o la crea si todavía no existe."""
+    base = db.query(BaseDesguace).filter(
+        BaseDesguace.entorno_trabajo_id == entorno_trabajo_id
+    ).first()
+
+    if not base:
+        base = BaseDesguace(
+            entorno_trabajo_id=entorno_trabajo_id,
+            nombre_archivo=nombre_archivo,
+            total_piezas=0,
+            columnas=",".join(cabeceras),
+            fecha_subida=now_spain_naive()
+        )
+        db.add(base)
+        db.flush()
+        logger.info(f"Creada nueva BaseDesguace ID {base.id}")
+
+    return base
+
+
+def _sin_cambios_con_vacios(db: Session, cambios: List[Dict]) -> Set[int]:
+    """
+    Ids de los cambios que no modifican nada: sus campos no vacíos coinciden con
+    los guardados (los vacíos del CSV no se escriben). Lee solo esas piezas.
+    """
+    por_id = {cambio["id"]: cambio for cambio in cambios}
+    columnas = [getattr(PiezaDesguace, campo) for campo in CAMPOS_HUELLA]
+    iguales = set()
+    ids = list(por_id)
+    for i in range(0, len(ids), TAMANO_LOTE_BORRADO):
+        for fila in db.query(PiezaDesguace.id, *columnas).filter(
+            PiezaDesguace.id.in_(ids[i:i + TAMANO_LOTE_BORRADO])
+        ):
+            cambio = por_id[fila[0]]
+            if all(cambio.get(campo, actual) == actual for campo, actual in zip(CAMPOS_HUELLA, fila[1:])):
+                iguales.add(fila[0])
+    return iguales
+
+
+def _importar_lotes_stock(
+    db: Session,
+    base_desguace_id: int,
+    lotes: Iterable[Tuple[list, list]],
+    mapeo_custom: dict = None
+) -> Dict:
+    """
+    Recorre los lotes del CSV comparando cada fila contra la proyección
+    {refid: (id, huella)} del stock actual. Las piezas nuevas se insertan y las
+    que han cambiado se actualizan en bloque al terminar cada lote; las filas
+    cuya huella coincide no generan escritura.
+    """
+    proyeccion = cargar_proyeccion_stock(db, base_desguace_id)
+    logger.info(f"Piezas existentes en BD: {len(proyeccion)}")
+
+    nuevos_refids = set()
+    refs_nuevas = set()  # OEM/refid de las piezas nuevas (para marcar pedidas recibidas)
+    ids_modificados = []  # Piezas actualizadas, para reindexar sus referencias
+    nuevas = actualizadas = sin_cambios = duplicadas = 0
+
+    for cabeceras, filas in lotes:
+        inserciones = []
+        cambios = []
+        con_vacios = []  # Cambios de filas con algún campo vacío: se comprueban contra la BD
+
+        for fila in filas:
+            datos = mapear_fila_a_pieza(cabeceras, fila, mapeo_custom=mapeo_custom)
+            refid = datos.get("refid")
+            if not refid:
+                continue
+
+            if refid in nuevos_refids:
+                duplicadas += 1
+                continue
+            nuevos_refids.add(refid)
+
+            existente = proyeccion.get(refid)
+            if existente is None:
+                # Nueva pieza
+                inserciones.append({
+                    "base_desguace_id": base_desguace_id,
+                    "refid": refid,
+                    "fecha_creacion": now_spain_naive(),
+                    **{campo: datos.get(campo) for campo in CAMPOS_HUELLA},
+                })
+                if datos.get("oem"):
+                    refs_nuevas.add(datos["oem"].strip().upper())
+                refs_nuevas.add(str(refid).strip().upper())
+                nuevas += 1
+                continue
+
+            # Pieza existente: solo se escribe si la huella ha cambiado
+            actualizadas += 1
+            pieza_id, huella_actual = existente
+            if huella_pieza(datos.get(campo) for campo in CAMPOS_HUELLA) == huella_actual:
+                sin_cambios += 1
+                continue
+
+            cambio = {
+                campo: valor for campo, valor in datos.items()
+                if campo in CAMPOS_HUELLA and valor is not None
+            }
+            if not cambio:
+                continue
+            cambio["id"] = pieza_id
+            if len(cambio) <= len(CAMPOS_HUELLA):
+                # Campos vacíos en el CSV: se conserva lo guardado, así que la huella
+                # hay que compararla con lo que quedaría tras escribir
+                con_vacios.append(cambio)
+            else:
+                cambios.append(cambio)
+
+        if con_vacios:
+            sin_cambio_real = _sin_cambios_con_vacios(db, con_vacios)
+            sin_cambios += len(sin_cambio_real)
+            cambios.extend(c for c in con_vacios if c["id"] not in sin_cambio_real)
+        ids_modificados.extend(c["id"] for c in cambios)
+
+        if inserciones:
+            db.bulk_insert_mappings(PiezaDesguace, inserciones)
+        if cambios:
+            db.bulk_update_mappings(PiezaDesguace, cambios)
+
+    if duplicadas:
+        logger.warning(f"Filas con refid duplicado ignoradas: {duplicadas}")
+
+    return {
+        "nuevos_refids": nuevos_refids,
+        "refids_actuales": set(proyeccion.keys()),
+        "refs_nuevas": refs_nuevas,
+        "ids_modificados": ids_modificados,
+        "nuevas": nuevas,
+        "actualizadas": actualizadas,
+        "sin_cambios": sin_cambios,
+    }
+
+
+def _restaurar_fichajes(db: Session, base_desguace_id: int, entorno_trabajo_id: int) -> int:
+    """
+    Cruza las piezas sin fichaje con la tabla fichadas_piezas y les asigna la
+    fichada más reciente de su refid. Trabaja solo con columnas, sin objetos ORM.
+    """
+    fichadas_por_refid = {}
+    for id_pieza, fecha_fichada, usuario_id in db.query(
+        FichadaPieza.id_pieza, FichadaPieza.fecha_fichada, FichadaPieza.usuario_id
+    ).filter(
+        FichadaPieza.entorno_trabajo_id == entorno_trabajo_id
+    ).yield_per(TAMANO_LOTE_IMPORTACION):
+        refid_upper = id_pieza.strip().upper() if id_pieza else None
+        if refid_upper:
+            if refid_upper not in fichadas_por_refid or fecha_fichada > fichadas_por_refid[refid_upper][0]:
+                fichadas_por_refid[refid_upper] = (fecha_fichada, usuario_id)
+
+    if not fichadas_por_refid:
+        return 0
+
+    cambios = []
+    for pieza_id, refid in db.query(PiezaDesguace.id, PiezaDesguace.refid).filter(
+        PiezaDesguace.base_desguace_id == base_desguace_id,
+        PiezaDesguace.usuario_fichaje_id.is_(None)
+    ).yield_per(TAMANO_LOTE_IMPORTACION):
+        if refid:
+            fichada = fichadas_por_refid.get(refid.strip().upper())
+            if fichada:
+                cambios.append({"id": pieza_id, "fecha_fichaje": fichada[0], "usuario_fichaje_id": fichada[1]})
+
+    for i in range(0, len(cambios), TAMANO_LOTE_IMPORTACION):
+        db.bulk_update_mappings(PiezaDesguace, cambios[i:i + TAMANO_LOTE_IMPORTACION])
+
+    return len(cambios)
+
+
+def _marcar_pedidas_recibidas(db: Session, entorno_trabajo_id: int, refs_nuevas: set) -> int:
+    """Marca como recibidas las piezas pedidas cuya referencia ha entrado en stock."""
+    if not refs_nuevas:
+        return 0
+
+    piezas_recibidas = 0
+    pedidas_pendientes = db.query(PiezaPedida).filter(
+        PiezaPedida.entorno_trabajo_id == entorno_trabajo_id,
+        PiezaPedida.recibida == False
+    ).all()
+
+    for pedida in pedidas_pendientes:
+        ref_upper = pedida.referencia.strip().upper() if pedida.referencia else ""
+        if ref_upper in refs_nuevas:
+            pedida.recibida = True
+            pedida.fecha_recepcion = now_spain_naive()
+            piezas_recibidas += 1
+            logger.info(f"Pieza pedida '{pedida.referencia}' marcada como RECIBIDA")
+
+    return piezas_recibidas
+
+
+def _importar_stock_streaming(
+    db: Session,
+    entorno_trabajo_id: int,
+    csv_path: str,
+    nombre_archivo: str,
+    mapeo_custom: dict = None,
+    encoding: str = 'utf-8-sig',
+    delimitador: Optional[str] = None
+) -> Dict:
+    """
+    Motor de importación común a MotoCoche y al stockeo automático.
+
+    Lee el CSV por lotes de TAMANO_LOTE_IMPORTACION filas, de modo que la memoria
+    no depende del tamaño del archivo: solo se mantienen los refids del stock
+    (con su huella) y los del CSV para poder detectar las ventas.
+    No hace commit; de eso se encarga quien lo llama.
+    """
+    lotes = iterar_lotes_csv(csv_path, encoding=encoding, delimitador=delimitador)
+    cabeceras, primer_lote = next(lotes, ([], []))
+    logger.info(f"CSV abierto, columnas: {cabeceras[:5]}...")
+
+    base = _obtener_o_crear_base(db, entorno_trabajo_id, nombre_archivo, cabeceras)
+    desde_id = ultimo_id_pieza(db)
+
+    stats = _importar_lotes_stock(
+        db, base.id, chain([(cabeceras, primer_lote)], lotes), mapeo_custom=mapeo_custom
+    )
+    nuevos_refids = stats["nuevos_refids"]
+    logger.info(
+        f"Piezas en CSV: {len(nuevos_refids)}, Nuevas: {stats['nuevas']}, "
+        f"Actualizadas: {stats['actualizadas']} ({stats['sin_cambios']} sin cambios)"
+    )
+
+    # Detectar piezas vendidas contra el stock previo a la importación
+    vendidas = detectar_piezas_vendidas(
+        db, base.id, entorno_trabajo_id, nuevos_refids,
+        refids_actuales=stats["refids_actuales"]
+    )
+
+    # Eliminar piezas que ya no están (vendidas)
+    if vendidas > 0:
+        ids_a_eliminar = list(stats["refids_actuales"] - nuevos_refids)
+        for i in range(0, len(ids_a_eliminar), TAMANO_LOTE_BORRADO):
+            filtro_lote = (
+                PiezaDesguace.base_desguace_id == base.id,
+                PiezaDesguace.refid.in_(ids_a_eliminar[i:i + TAMANO_LOTE_BORRADO])
+            )
+            eliminar_referencias(db, select(PiezaDesguace.id).where(*filtro_lote))
+            db.query(PiezaDesguace).filter(*filtro_lote).delete(synchronize_session=False)
+
+    # Mantener el índice de referencias al día con las altas y cambios
+    sincronizar_referencias_base(db, base.id, entorno_trabajo_id, stats["ids_modificados"], desde_id)
+    db.flush()
+
+    # ========== RESTAURAR FICHAJES EN PIEZAS ==========
+    piezas_fichaje_restaurado = _restaurar_fichajes(db, base.id, entorno_trabajo_id)
+    if piezas_fichaje_restaurado > 0:
+        logger.info(f"Fichajes restaurados en {piezas_fichaje_restaurado} piezas")
+
+    # ========== MARCAR PIEZAS PEDIDAS COMO RECIBIDAS ==========
+    piezas_recibidas = _marcar_pedidas_recibidas(db, entorno_trabajo_id, stats["refs_nuevas"])
+
+    # Actualizar metadatos de la base
+    base.total_piezas = len(nuevos_refids)
+    base.fecha_subida = now_spain_naive()  # Actualizar fecha de última subida (incluso automática)
+    base.fecha_actualizacion = now_spain_naive()
+    base.nombre_archivo = nombre_archivo
+
+    return {
+        "piezas_importadas": stats["nuevas"],
+        "piezas_actualizadas": stats["actualizadas"],
+        "piezas_sin_cambios": stats["sin_cambios"],
+        "piezas_vendidas": vendidas,
+        "piezas_recibidas": piezas_recibidas,
+        "total_piezas": len(nuevos_refids),
+    }
+
+
+def _log_resumen_importacion(titulo: str, resultado: Dict):
+    """Escribe en el log el resumen de una importación completada."""
+    logger.info(f"[{datetime.now()}] {titulo}:")
+    logger.info(f"  - Nuevas: {resultado['piezas_importadas']}")
+    logger.info(f"  - Actualizadas: {resultado['piezas_actualizadas']} ({resultado['piezas_sin_cambios']} sin cambios)")
+    logger.info(f"  - Vendidas detectadas: {resultado['piezas_vendidas']}")
+    logger.info(f"  - Pedidas recibidas: {resultado['piezas_recibidas']}")
+    logger.info(f"  - Total en stock: {resultado['total_piezas']}")
+
+
 def importar_csv_motocoche(csv_path: str = CSV_PATH) -> Dict:
     """
     Importa el CSV de MotoCoche a la base de datos.
@@ -325,155 +677,15 @@ def importar_csv_motocoche(csv_path: str = CSV_PATH) -> Dict:
         
         logger.info(f"Entorno de trabajo MotoCoche: ID {entorno_id}")
         
-        # Leer CSV
-        cabeceras, filas = leer_csv_stock(csv_path)
-        logger.info(f"CSV leído: {len(filas)} filas, columnas: {cabeceras[:5]}...")
-        
-        # Obtener o crear BaseDesguace para este entorno
-        base = db.query(BaseDesguace).filter(
-            BaseDesguace.entorno_trabajo_id == entorno_id
-        ).first()
-        
-        if not base:
-            base = BaseDesguace(
-                entorno_trabajo_id=entorno_id,
-                nombre_archivo="StockSeinto.csv (auto)",
-                total_piezas=0,
-                columnas=",".join(cabeceras),
-                fecha_subida=now_spain_naive()
-            )
-            db.add(base)
-            db.flush()
-            logger.info(f"Creada nueva BaseDesguace ID {base.id}")
-        
-        # Recopilar nuevos IDs para detectar vendidas
-        nuevos_refids = set()
-        
-        # Indexar piezas existentes por refid para actualizaciones
-        piezas_existentes = {}
-        for pieza in db.query(PiezaDesguace).filter(
-            PiezaDesguace.base_desguace_id == base.id
-        ).all():
-            if pieza.refid:
-                piezas_existentes[pieza.refid] = pieza
-        
-        # Procesar filas
-        piezas_nuevas = []
-        actualizadas = 0
-        
-        for fila in filas:
-            datos = mapear_fila_a_pieza(cabeceras, fila)
-            refid = datos.get("refid")
-            
-            if refid:
-                nuevos_refids.add(refid)
-                
-                if refid in piezas_existentes:
-                    # Actualizar pieza existente
-                    pieza = piezas_existentes[refid]
-                    for campo, valor in datos.items():
-                        if valor is not None:
-                            setattr(pieza, campo, valor)
-                    actualizadas += 1
-                else:
-                    # Nueva pieza
-                    nueva = PiezaDesguace(
-                        base_desguace_id=base.id,
-                        **datos
-                    )
-                    piezas_nuevas.append(nueva)
-        
-        # Detectar piezas vendidas
-        vendidas = detectar_piezas_vendidas(db, base.id, entorno_id, nuevos_refids)
-        
-        # Eliminar piezas que ya no están (vendidas)
-        if vendidas > 0:
-            ids_a_eliminar = set(piezas_existentes.keys()) - nuevos_refids
-            db.query(PiezaDesguace).filter(
-                PiezaDesguace.base_desguace_id == base.id,
-                PiezaDesguace.refid.in_(ids_a_eliminar)
-            ).delete(synchronize_session=False)
-        
-        # Insertar nuevas piezas
-        db.bulk_save_objects(piezas_nuevas)
-        db.flush()
-
-        # ========== RESTAURAR FICHAJES EN PIEZAS ==========
-        # Cruzar piezas sin fichaje con la tabla fichadas_piezas
-        fichadas_por_refid = {}
-        todas_fichadas = db.query(FichadaPieza).filter(
-            FichadaPieza.entorno_trabajo_id == entorno_id
-        ).all()
-        for f in todas_fichadas:
-            refid_upper = f.id_pieza.strip().upper() if f.id_pieza else None
-            if refid_upper:
-                if refid_upper not in fichadas_por_refid or f.fecha_fichada > fichadas_por_refid[refid_upper].fecha_fichada:
-                    fichadas_por_refid[refid_upper] = f
-
-        piezas_fichaje_restaurado = 0
-        for pieza in db.query(PiezaDesguace).filter(
-            PiezaDesguace.base_desguace_id == base.id,
-            PiezaDesguace.usuario_fichaje_id.is_(None)
-        ).all():
-            if pieza.refid:
-                refid_upper = pieza.refid.strip().upper()
-                if refid_upper in fichadas_por_refid:
-                    fichada = fichadas_por_refid[refid_upper]
-                    pieza.fecha_fichaje = fichada.fecha_fichada
-                    pieza.usuario_fichaje_id = fichada.usuario_id
-                    piezas_fichaje_restaurado += 1
-
-        if piezas_fichaje_restaurado > 0:
-            logger.info(f"Fichajes restaurados en {piezas_fichaje_restaurado} piezas")
-
-        # ========== MARCAR PIEZAS PEDIDAS COMO RECIBIDAS ==========
-        # Si hay nuevas piezas, verificar si alguna estaba en la lista de pedidas
-        piezas_recibidas = 0
-        if piezas_nuevas:
-            # Obtener los OEMs de las nuevas piezas
-            oems_nuevos = set()
-            for p in piezas_nuevas:
-                if p.oem:
-                    oems_nuevos.add(p.oem.strip().upper())
-                if p.refid:
-                    oems_nuevos.add(str(p.refid).strip().upper())
-            
-            # Buscar pedidas pendientes que coincidan
-            if oems_nuevos:
-                pedidas_pendientes = db.query(PiezaPedida).filter(
-                    PiezaPedida.entorno_trabajo_id == entorno_id,
-                    PiezaPedida.recibida == False
-                ).all()
-                
-                for pedida in pedidas_pendientes:
-                    ref_upper = pedida.referencia.strip().upper() if pedida.referencia else ""
-                    if ref_upper in oems_nuevos:
-                        pedida.recibida = True
-                        pedida.fecha_recepcion = now_spain_naive()
-                        piezas_recibidas += 1
-                        logger.info(f"Pieza pedida '{pedida.referencia}' marcada como RECIBIDA")
-        
-        # Actualizar metadatos de la base
-        base.total_piezas = len(nuevos_refids)
-        base.fecha_subida = now_spain_naive()  # Actualizar fecha de última subida (incluso automática)
-        base.fecha_actualizacion = now_spain_naive()
-        base.nombre_archivo = "StockSeinto.csv (auto)"
+        # Importar en streaming (delimitador detectado automáticamente)
+        resultado.update(_importar_stock_streaming(
+            db, entorno_id, csv_path, "StockSeinto.csv (auto)"
+        ))
         
         db.commit()
         
         resultado["success"] = True
-        resultado["piezas_importadas"] = len(piezas_nuevas)
-        resultado["piezas_actualizadas"] = actualizadas
-        resultado["piezas_vendidas"] = vendidas
-        resultado["piezas_recibidas"] = piezas_recibidas
-        resultado["total_piezas"] = len(nuevos_refids)
-        
-        logger.info(f"[{datetime.now()}] Importación completada:")
-        logger.info(f"  - Nuevas: {len(piezas_nuevas)}")
-        logger.info(f"  - Actualizadas: {actualizadas}")
-        logger.info(f"  - Vendidas detectadas: {vendidas}")
-        logger.info(f"  - Pedidas recibidas: {piezas_recibidas}")
-        logger.info(f"  - Total en stock: {len(nuevos_refids)}")
+        _log_resumen_importacion("Importación completada", resultado)
         
     except Exception as e:
         db.rollback()
@@ -536,168 +748,16 @@ def importar_csv_con_configuracion(
         
         logger.info(f"Entorno de trabajo: {entorno.nombre} (ID {entorno_trabajo_id})")
         
-        # Leer CSV con encoding y delimitador personalizados
-        filas = []
-        cabeceras = []
-        
-        with open(csv_path, 'r', encoding=encoding, errors='replace') as f:
-            reader = csv.reader(f, delimiter=delimitador)
-            cabeceras = next(reader)
-            cabeceras = [c.strip().lower().lstrip('\ufeff') for c in cabeceras]
-            
-            for fila in reader:
-                if len(fila) >= len(cabeceras) / 2:
-                    if fila and fila[0]:
-                        fila[0] = fila[0].lstrip('\ufeff')
-                    filas.append(fila)
-        
-        logger.info(f"CSV leído: {len(filas)} filas, columnas: {cabeceras[:5]}...")
-        
-        # Obtener o crear BaseDesguace para este entorno
-        base = db.query(BaseDesguace).filter(
-            BaseDesguace.entorno_trabajo_id == entorno_trabajo_id
-        ).first()
-        
-        if not base:
-            base = BaseDesguace(
-                entorno_trabajo_id=entorno_trabajo_id,
-                nombre_archivo=os.path.basename(csv_path) + " (auto)",
-                total_piezas=0,
-                columnas=",".join(cabeceras),
-                fecha_subida=now_spain_naive()
-            )
-            db.add(base)
-            db.flush()
-            logger.info(f"Creada nueva BaseDesguace ID {base.id}")
-        
-        # Recopilar nuevos IDs para detectar vendidas
-        nuevos_refids = set()
-        
-        # Indexar piezas existentes por refid para actualizaciones
-        piezas_existentes = {}
-        for pieza in db.query(PiezaDesguace).filter(
-            PiezaDesguace.base_desguace_id == base.id
-        ).all():
-            if pieza.refid:
-                piezas_existentes[pieza.refid] = pieza
-        
-        logger.info(f"Piezas existentes en BD: {len(piezas_existentes)}")
-        
-        # Procesar filas con mapeo personalizado
-        piezas_nuevas = []
-        actualizadas = 0
-        
-        for fila in filas:
-            datos = mapear_fila_a_pieza(cabeceras, fila, mapeo_custom=mapeo_columnas)
-            refid = datos.get("refid")
-            
-            if refid:
-                nuevos_refids.add(refid)
-                
-                if refid in piezas_existentes:
-                    # Actualizar pieza existente
-                    pieza = piezas_existentes[refid]
-                    for campo, valor in datos.items():
-                        if valor is not None:
-                            setattr(pieza, campo, valor)
-                    actualizadas += 1
-                else:
-                    # Nueva pieza
-                    nueva = PiezaDesguace(
-                        base_desguace_id=base.id,
-                        **datos
-                    )
-                    piezas_nuevas.append(nueva)
-        
-        logger.info(f"Piezas en CSV: {len(nuevos_refids)}, Nuevas: {len(piezas_nuevas)}, Actualizadas: {actualizadas}")
-        
-        # Detectar piezas vendidas
-        vendidas = detectar_piezas_vendidas(db, base.id, entorno_trabajo_id, nuevos_refids)
-        
-        # Eliminar piezas que ya no están (vendidas)
-        if vendidas > 0:
-            ids_a_eliminar = set(piezas_existentes.keys()) - nuevos_refids
-            db.query(PiezaDesguace).filter(
-                PiezaDesguace.base_desguace_id == base.id,
-                PiezaDesguace.refid.in_(ids_a_eliminar)
-            ).delete(synchronize_session=False)
-        
-        # Insertar nuevas piezas
-        db.bulk_save_objects(piezas_nuevas)
-        db.flush()
-
-        # ========== RESTAURAR FICHAJES EN PIEZAS ==========
-        fichadas_por_refid = {}
-        todas_fichadas = db.query(FichadaPieza).filter(
-            FichadaPieza.entorno_trabajo_id == entorno_trabajo_id
-        ).all()
-        for f in todas_fichadas:
-            refid_upper = f.id_pieza.strip().upper() if f.id_pieza else None
-            if refid_upper:
-                if refid_upper not in fichadas_por_refid or f.fecha_fichada > fichadas_por_refid[refid_upper].fecha_fichada:
-                    fichadas_por_refid[refid_upper] = f
-
-        piezas_fichaje_restaurado = 0
-        for pieza in db.query(PiezaDesguace).filter(
-            PiezaDesguace.base_desguace_id == base.id,
-            PiezaDesguace.usuario_fichaje_id.is_(None)
-        ).all():
-            if pieza.refid:
-                refid_upper = pieza.refid.strip().upper()
-                if refid_upper in fichadas_por_refid:
-                    fichada = fichadas_por_refid[refid_upper]
-                    pieza.fecha_fichaje = fichada.fecha_fichada
-                    pieza.usuario_fichaje_id = fichada.usuario_id
-                    piezas_fichaje_restaurado += 1
-
-        if piezas_fichaje_restaurado > 0:
-            logger.info(f"Fichajes restaurados en {piezas_fichaje_restaurado} piezas")
-
-        # ========== MARCAR PIEZAS PEDIDAS COMO RECIBIDAS ==========
-        piezas_recibidas = 0
-        if piezas_nuevas:
-            oems_nuevos = set()
-            for p in piezas_nuevas:
-                if p.oem:
-                    oems_nuevos.add(p.oem.strip().upper())
-                if p.refid:
-                    oems_nuevos.add(str(p.refid).strip().upper())
-            
-            if oems_nuevos:
-                pedidas_pendientes = db.query(PiezaPedida).filter(
-                    PiezaPedida.entorno_trabajo_id == entorno_trabajo_id,
-                    PiezaPedida.recibida == False
-                ).all()
-                
-                for pedida in pedidas_pendientes:
-                    ref_upper = pedida.referencia.strip().upper() if pedida.referencia else ""
-                    if ref_upper in oems_nuevos:
-                        pedida.recibida = True
-                        pedida.fecha_recepcion = now_spain_naive()
-                        piezas_recibidas += 1
-                        logger.info(f"Pieza pedida '{pedida.referencia}' marcada como RECIBIDA")
-        
-        # Actualizar metadatos de la base
-        base.total_piezas = len(nuevos_refids)
-        base.fecha_subida = now_spain_naive()
-        base.fecha_actualizacion = now_spain_naive()
-        base.nombre_archivo = os.path.basename(csv_path) + " (auto)"
+        # Importar en streaming con encoding, delimitador y mapeo personalizados
+        resultado.update(_importar_stock_streaming(
+            db, entorno_trabajo_id, csv_path, os.path.basename(csv_path) + " (auto)",
+            mapeo_custom=mapeo_columnas, encoding=encoding, delimitador=delimitador
+        ))
         
         db.commit()
         
         resultado["success"] = True
-        resultado["piezas_importadas"] = len(piezas_nuevas)
-        resultado["piezas_actualizadas"] = actualizadas
-        resultado["piezas_vendidas"] = vendidas
-        resultado["piezas_recibidas"] = piezas_recibidas
-        resultado["total_piezas"] = len(nuevos_refids)
-        
-        logger.info(f"[{datetime.now()}] Importación personalizada completada:")
-        logger.info(f"  - Nuevas: {len(piezas_nuevas)}")
-        logger.info(f"  - Actualizadas: {actualizadas}")
-        logger.info(f"  - Vendidas detectadas: {vendidas}")
-        logger.info(f"  - Pedidas recibidas: {piezas_recibidas}")
-        logger.info(f"  - Total en stock: {len(nuevos_refids)}")
+        _log_resumen_importacion("Importación personalizada completada", resultado)
         
     except Exception as e:
         db.rollback()
@@ -709,17 +769,137 @@ def importar_csv_con_configuracion(
     return resultado
 
 
-def ejecutar_importacion_programada():
+# ============== FIRMA DE ARCHIVOS (OMITIR CSV SIN CAMBIOS) ==============
+TAMANO_BLOQUE_HASH = 1024 * 1024
+
+# Firma del último CSV de MotoCoche importado con éxito. Se guarda en memoria:
+# tras reiniciar el servidor la primera importación programada se hace completa.
+_firma_motocoche: Dict = {}
+
+# Última ejecución programada de cada importación (visible en obtener_estado_scheduler)
+_estado_importaciones: Dict[str, Dict] = {}
+_ultimo_stockeo: Dict = {}
+_estado_lock = threading.Lock()
+
+
+def calcular_firma_archivo(ruta: str, firma_anterior: Optional[Dict] = None) -> Dict:
+    """
+    Devuelve {"tamano", "mtime", "hash"} de un archivo.
+    Si tamaño y mtime coinciden con firma_anterior se reutiliza su hash sin leer
+    el archivo; si no, se calcula el SHA-256 leyéndolo por bloques.
+    """
+    stat = os.stat(ruta)
+    firma = {"tamano": stat.st_size, "mtime": stat.st_mtime, "hash": None}
+
+    if (
+        firma_anterior
+        and firma_anterior.get("hash")
+        and firma_anterior.get("tamano") == firma["tamano"]
+        and firma_anterior.get("mtime") == firma["mtime"]
+    ):
+        firma["hash"] = firma_anterior["hash"]
+        return firma
+
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+            sha.update(bloque)
+    firma["hash"] = sha.hexdigest()
+    return firma
+
+
+def archivo_sin_cambios(firma: Optional[Dict], firma_anterior: Optional[Dict]) -> bool:
+    """True si el contenido del archivo coincide con el de la última importación."""
+    return bool(firma and firma_anterior and firma_anterior.get("hash") and firma["hash"] == firma_anterior["hash"])
+
+
+def firma_configuracion(config: ConfiguracionStockeo) -> Optional[Dict]:
+    """Firma guardada en una ConfiguracionStockeo (None si nunca se importó)."""
+    if not config.ultimo_archivo_hash:
+        return None
+    return {
+        "tamano": config.ultimo_archivo_tamano,
+        "mtime": config.ultimo_archivo_mtime,
+        "hash": config.ultimo_archivo_hash,
+    }
+
+
+def guardar_firma_configuracion(config: ConfiguracionStockeo, firma: Optional[Dict]):
+    """Guarda (o borra, si firma es None) la firma del último CSV importado."""
+    config.ultimo_archivo_tamano = firma["tamano"] if firma else None
+    config.ultimo_archivo_mtime = firma["mtime"] if firma else None
+    config.ultimo_archivo_hash = firma["hash"] if firma else None
+
+
+def _registrar_estado_importacion(clave: str, nombre: str, omitida: bool, detalle: str, duracion: Optional[float] = None):
+    """Anota el resultado de la última ejecución programada de una importación."""
+    with _estado_lock:
+        _estado_importaciones[clave] = {
+            "nombre": nombre,
+            "fecha": now_spain_naive().isoformat(),
+            "omitida": omitida,
+            "detalle": detalle,
+            "duracion_segundos": duracion,
+        }
+
+
+def obtener_estado_importaciones() -> Dict[str, Dict]:
+    """Estado de la última ejecución de cada importación (incluye las omitidas)."""
+    with _estado_lock:
+        return {clave: dict(estado) for clave, estado in _estado_importaciones.items()}
+
+
+def obtener_resumen_stockeo() -> Dict:
+    """Resumen de la última ejecución completa del stockeo automático."""
+    with _estado_lock:
+        return dict(_ultimo_stockeo)
+
+
+def _resultado_omitido(csv_path: str) -> Dict:
+    """Resultado de una importación omitida porque el archivo no ha cambiado."""
+    return {
+        "success": True,
+        "omitida": True,
+        "archivo": csv_path,
+        "piezas_importadas": 0,
+        "piezas_actualizadas": 0,
+        "piezas_vendidas": 0,
+        "error": None,
+    }
+
+
+def ejecutar_importacion_programada(forzar: bool = False):
     """
     Función wrapper para el scheduler.
     Se llama cada 30 minutos.
+
+    Si el CSV no ha cambiado desde la última importación correcta se omite,
+    salvo que se indique forzar=True.
     """
+    global _firma_motocoche
     logger.info(f"[{datetime.now()}] Ejecutando importación programada de CSV MotoCoche...")
+    inicio = time.perf_counter()
+
+    firma = None
+    if os.path.exists(CSV_PATH):
+        firma = calcular_firma_archivo(CSV_PATH, _firma_motocoche)
+        if not forzar and archivo_sin_cambios(firma, _firma_motocoche):
+            logger.info(f"[{datetime.now()}] CSV MotoCoche sin cambios desde la última importación, se omite")
+            _registrar_estado_importacion(
+                "motocoche", "MotoCoche", True, "Archivo sin cambios", round(time.perf_counter() - inicio, 2)
+            )
+            return _resultado_omitido(CSV_PATH)
+
     resultado = importar_csv_motocoche()
+    duracion = round(time.perf_counter() - inicio, 2)
     
     if resultado["success"]:
+        if firma:
+            _firma_motocoche = firma
+        _registrar_estado_importacion("motocoche", "MotoCoche", False, "OK", duracion)
         logger.info(f"[{datetime.now()}] Importación programada completada exitosamente")
     else:
+        _registrar_estado_importacion("motocoche", "MotoCoche", False, f"ERROR: {resultado.get('error')}", duracion)
         logger.error(f"[{datetime.now()}] Error en importación programada: {resultado.get('error')}")
     
     return resultado
@@ -817,16 +997,99 @@ def ejecutar_limpieza_ventas_programada():
     return resultado
 
 
-def ejecutar_stockeo_automatico():
+def _actualizar_configuracion_stockeo(config_id: int, resultado: Dict, ultimo_resultado: str, firma: Optional[Dict]):
+    """Guarda los metadatos de la ejecución en la ConfiguracionStockeo con una sesión propia."""
+    db = SessionLocal()
+    try:
+        config = db.query(ConfiguracionStockeo).filter(ConfiguracionStockeo.id == config_id).first()
+        if not config:
+            return
+        config.ultima_ejecucion = now_spain_naive()
+        config.ultimo_resultado = ultimo_resultado[:500]
+        if resultado["success"] and not resultado.get("omitida"):
+            config.piezas_importadas = resultado.get("piezas_importadas", 0)
+            config.ventas_detectadas = resultado.get("piezas_vendidas", 0)
+            guardar_firma_configuracion(config, firma)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error guardando resultado del stockeo (config {config_id}): {e}")
+    finally:
+        db.close()
+
+
+def _ejecutar_stockeo_entorno(tarea: Dict, forzar: bool) -> Dict:
+    """
+    Importa el CSV de un entorno. Se ejecuta en un hilo del pool del stockeo
+    automático: usa sus propias sesiones de BD y cualquier error queda recogido
+    en el resultado del entorno sin afectar al resto.
+    """
+    nombre = tarea["nombre"]
+    ruta_csv = tarea["ruta_csv"]
+    clave = f"entorno_{tarea['entorno_trabajo_id']}"
+    inicio = time.perf_counter()
+    firma = None
+    omitida = False
+
+    try:
+        if os.path.exists(ruta_csv):
+            firma = calcular_firma_archivo(ruta_csv, tarea["firma_anterior"])
+            omitida = not forzar and archivo_sin_cambios(firma, tarea["firma_anterior"])
+
+        if omitida:
+            logger.info(f"  [{nombre}] CSV sin cambios desde la última importación, se omite.")
+            resultado = _resultado_omitido(ruta_csv)
+            ultimo_resultado = "SIN CAMBIOS: archivo idéntico a la última importación"
+        else:
+            logger.info(f"  [{nombre}] Importando desde {ruta_csv}...")
+            resultado = importar_csv_con_configuracion(
+                entorno_trabajo_id=tarea["entorno_trabajo_id"],
+                csv_path=ruta_csv,
+                mapeo_columnas=tarea["mapeo"],
+                encoding=tarea["encoding"],
+                delimitador=tarea["delimitador"]
+            )
+            if resultado["success"]:
+                ultimo_resultado = (
+                    f"OK: {resultado.get('piezas_importadas', 0)} nuevas, "
+                    f"{resultado.get('piezas_actualizadas', 0)} actualizadas, "
+                    f"{resultado.get('piezas_vendidas', 0)} vendidas"
+                )
+                logger.info(f"  [{nombre}] Importación exitosa: {ultimo_resultado}")
+            else:
+                ultimo_resultado = f"ERROR: {resultado.get('error', 'desconocido')}"
+                logger.error(f"  [{nombre}] {ultimo_resultado}")
+    except Exception as e:
+        logger.error(f"  [{nombre}] Error inesperado en stockeo: {e}", exc_info=True)
+        resultado = {"success": False, "archivo": ruta_csv, "error": str(e)}
+        ultimo_resultado = f"ERROR: {e}"
+
+    duracion = round(time.perf_counter() - inicio, 2)
+    _actualizar_configuracion_stockeo(tarea["config_id"], resultado, ultimo_resultado, firma)
+    _registrar_estado_importacion(clave, nombre, omitida, ultimo_resultado, duracion)
+
+    return {"entorno": nombre, **resultado, "duracion_segundos": duracion}
+
+
+def ejecutar_stockeo_automatico(forzar: bool = False, max_concurrencia: Optional[int] = None):
     """
     Ejecuta la importación automática para TODOS los entornos con
     ConfiguracionStockeo activa. Se llama desde el scheduler.
+
+    Los entornos se importan en paralelo con un pool de como mucho
+    max_concurrencia hilos (por defecto settings.stockeo_max_concurrencia),
+    cada uno con su propia sesión de BD.
+
+    Los entornos cuyo CSV no ha cambiado desde la última importación correcta
+    se omiten, salvo que se indique forzar=True.
     """
     import json
     logger.info(f"[{datetime.now()}] Ejecutando stockeo automático para todas las empresas...")
+    inicio = time.perf_counter()
 
+    # Leer configuraciones y preparar las tareas (datos planos, sin objetos ORM)
     db = SessionLocal()
-    resultados = []
+    tareas = []
     try:
         configs = db.query(ConfiguracionStockeo).filter(
             ConfiguracionStockeo.activo == True
@@ -834,15 +1097,16 @@ def ejecutar_stockeo_automatico():
 
         if not configs:
             logger.info("No hay configuraciones de stockeo activas.")
-            return resultados
+            return []
 
         logger.info(f"Configuraciones activas encontradas: {len(configs)}")
 
+        nombres = dict(db.query(EntornoTrabajo.id, EntornoTrabajo.nombre).filter(
+            EntornoTrabajo.id.in_([c.entorno_trabajo_id for c in configs])
+        ).all())
+
         for config in configs:
-            entorno = db.query(EntornoTrabajo).filter(
-                EntornoTrabajo.id == config.entorno_trabajo_id
-            ).first()
-            nombre = entorno.nombre if entorno else f"ID {config.entorno_trabajo_id}"
+            nombre = nombres.get(config.entorno_trabajo_id) or f"ID {config.entorno_trabajo_id}"
 
             if not config.ruta_csv:
                 logger.warning(f"  [{nombre}] Sin ruta CSV configurada, saltando.")
@@ -858,41 +1122,42 @@ def ejecutar_stockeo_automatico():
                 logger.error(f"  [{nombre}] Error parseando mapeo de columnas, saltando.")
                 continue
 
-            logger.info(f"  [{nombre}] Importando desde {config.ruta_csv}...")
-
-            resultado = importar_csv_con_configuracion(
-                entorno_trabajo_id=config.entorno_trabajo_id,
-                csv_path=config.ruta_csv,
-                mapeo_columnas=mapeo,
-                encoding=config.encoding or 'utf-8-sig',
-                delimitador=config.delimitador or ';'
-            )
-
-            # Actualizar metadatos de la configuración
-            config.ultima_ejecucion = now_spain_naive()
-            if resultado["success"]:
-                config.ultimo_resultado = (
-                    f"OK: {resultado.get('piezas_importadas', 0)} nuevas, "
-                    f"{resultado.get('piezas_actualizadas', 0)} actualizadas, "
-                    f"{resultado.get('piezas_vendidas', 0)} vendidas"
-                )
-                config.piezas_importadas = resultado.get("piezas_importadas", 0)
-                config.ventas_detectadas = resultado.get("piezas_vendidas", 0)
-                logger.info(f"  [{nombre}] Importación exitosa: {config.ultimo_resultado}")
-            else:
-                config.ultimo_resultado = f"ERROR: {resultado.get('error', 'desconocido')}"
-                logger.error(f"  [{nombre}] {config.ultimo_resultado}")
-
-            resultados.append({"entorno": nombre, **resultado})
-
-        db.commit()
+            tareas.append({
+                "config_id": config.id,
+                "entorno_trabajo_id": config.entorno_trabajo_id,
+                "nombre": nombre,
+                "ruta_csv": config.ruta_csv,
+                "mapeo": mapeo,
+                "encoding": config.encoding or 'utf-8-sig',
+                "delimitador": config.delimitador or ';',
+                "firma_anterior": firma_configuracion(config),
+            })
     except Exception as e:
-        db.rollback()
         logger.error(f"Error en stockeo automático: {e}", exc_info=True)
+        return []
     finally:
         db.close()
 
-    logger.info(f"[{datetime.now()}] Stockeo automático finalizado. Empresas procesadas: {len(resultados)}")
+    resultados = []
+    concurrencia = 0
+    if tareas:
+        concurrencia = min(max(1, max_concurrencia or settings.stockeo_max_concurrencia), len(tareas))
+        with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+            resultados = list(executor.map(lambda tarea: _ejecutar_stockeo_entorno(tarea, forzar), tareas))
+
+    duracion = round(time.perf_counter() - inicio, 2)
+    with _estado_lock:
+        _ultimo_stockeo.clear()
+        _ultimo_stockeo.update({
+            "fecha": now_spain_naive().isoformat(),
+            "duracion_segundos": duracion,
+            "entornos": len(resultados),
+            "omitidos": sum(1 for r in resultados if r.get("omitida")),
+            "errores": sum(1 for r in resultados if not r.get("success")),
+            "concurrencia": concurrencia,
+        })
+
+    logger.info(f"[{datetime.now()}] Stockeo automático finalizado en {duracion}s. Empresas procesadas: {len(resultados)}")
     return resultados
 
 
@@ -0,0 +1,303 @@
+"""
+Servicio de Subida de Base de Desguace
+======================================
+
+Procesa el CSV que sube un admin desde /desguace/upload sin cargarlo entero
+en memoria: el archivo se vuelca a disco, el encoding se detecta leyéndolo por
+bloques y las filas se leen por lotes, aplicando inserciones, actualizaciones
+y ventas con sentencias en bloque.
+"""
+import codecs
+import shutil
+import logging
+import tempfile
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.busqueda import PiezaDesguace, PiezaVendida, FichadaPieza, VerificacionFichada
+from services.csv_auto_import import CAMPOS_HUELLA, TAMANO_LOTE_IMPORTACION, TAMANO_LOTE_BORRADO, huella_pieza
+from services.referencias_index import eliminar_referencias, sincronizar_referencias_base, ultimo_id_pieza
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE_COPIA = 1024 * 1024  # Bytes por bloque al volcar la subida a disco
+TAMANO_BLOQUE_ENCODING = 64 * 1024  # Bytes por bloque al detectar el encoding
+
+
+def guardar_upload_en_disco(origen: BinaryIO) -> Tuple[str, int]:
+    """
+    Copia el archivo subido a un temporal en disco por bloques.
+    Devuelve (ruta, tamaño en bytes). Quien llama debe borrar el temporal.
+    """
+    destino = tempfile.NamedTemporaryFile(delete=False, suffix=".csv")
+    try:
+        shutil.copyfileobj(origen, destino, TAMANO_BLOQUE_COPIA)
+        tamano = destino.tell()
+    finally:
+        destino.close()
+    return destino.name, tamano
+
+
+def detectar_encoding(ruta: str) -> Optional[str]:
+    """
+    Detecta el encoding decodificando el archivo entero por bloques de
+    TAMANO_BLOQUE_ENCODING bytes (memoria constante). Mismo orden que antes
+    (utf-8 y si no latin-1): un CSV en latin-1 cuyo primer acento aparece
+    lejos del principio no se lee como utf-8 con caracteres sustituidos.
+    """
+    for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
+        decodificador = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(ruta, 'rb') as f:
+                for bloque in iter(lambda: f.read(TAMANO_BLOQUE_ENCODING), b''):
+                    decodificador.decode(bloque)
+            decodificador.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def detectar_delimitador(ruta: str, encoding: str) -> str:
+    """Detecta el delimitador (';' o ',') con la primera línea del archivo."""
+    with open(ruta, 'r', encoding=encoding, errors='replace', newline='') as f:
+        primera_linea = f.readline()
+    return ';' if ';' in primera_linea else ','
+
+
+def mapear_fila_upload(fila: Dict, mapeo_dict: Dict, columna_combinada: Optional[str]) -> Dict:
+    """
+    Convierte una fila del CSV (DictReader) en los campos de PiezaDesguace según
+    el mapeo. Con columna_combinada, esa columna se separa por '/' en OEM/OE/IAM.
+    """
+    pieza_data = {}
+
+    # Si se usa formato combinado, procesar primero la columna combinada
+    if columna_combinada and columna_combinada in fila:
+        valor_combinado = fila[columna_combinada].strip() if fila[columna_combinada] else ""
+        if valor_combinado:
+            # Separar por "/" para obtener OEM/OE/IAM
+            partes = valor_combinado.split("/")
+            if len(partes) >= 1:
+                pieza_data["oem"] = partes[0].strip() if partes[0].strip() else None
+            if len(partes) >= 2:
+                pieza_data["oe"] = partes[1].strip() if partes[1].strip() else None
+            if len(partes) >= 3:
+                # IAM puede tener múltiples valores separados por coma o más "/"
+                iam_completo = "/".join(partes[2:]).strip()
+                pieza_data["iam"] = iam_completo if iam_completo else None
+
+    # Aplicar mapeo normal para los demás campos
+    for campo, columna_csv in mapeo_dict.items():
+        # Si usamos formato combinado, NO sobrescribir oem, oe, iam
+        if columna_combinada and campo in ["oem", "oe", "iam"]:
+            continue
+
+        if columna_csv and columna_csv in fila:
+            valor = fila[columna_csv].strip() if fila[columna_csv] else None
+
+            # Convertir precio a float
+            if campo == "precio" and valor:
+                try:
+                    valor = float(valor.replace(',', '.').replace('€', '').replace('$', '').strip())
+                except ValueError:
+                    valor = None
+
+            pieza_data[campo] = valor
+
+    return pieza_data
+
+
+def clave_pieza(refid, oem, articulo, marca, modelo) -> Optional[str]:
+    """
+    Clave para emparejar piezas entre subidas: el refid normalizado o, si la pieza
+    no tiene, la combinación OEM + artículo + marca + modelo.
+    """
+    if refid and refid.strip():
+        return refid.strip().upper()
+    clave = "_".join((v or "").strip() for v in (oem, articulo, marca, modelo))
+    return clave if clave != "___" else None
+
+
+def _cargar_proyeccion(db: Session, base_desguace_id: int) -> Dict[Optional[str], list]:
+    """{clave: [(id, huella), ...]} de las piezas actuales de la base (solo columnas)."""
+    columnas = [getattr(PiezaDesguace, campo) for campo in CAMPOS_HUELLA]
+    indices = {campo: i for i, campo in enumerate(CAMPOS_HUELLA)}
+    proyeccion: Dict[Optional[str], list] = {}
+    for fila in db.query(PiezaDesguace.id, PiezaDesguace.refid, *columnas).filter(
+        PiezaDesguace.base_desguace_id == base_desguace_id
+    ).yield_per(TAMANO_LOTE_IMPORTACION):
+        valores = fila[2:]
+        clave = clave_pieza(
+            fila[1], valores[indices["oem"]], valores[indices["articulo"]],
+            valores[indices["marca"]], valores[indices["modelo"]]
+        )
+        proyeccion.setdefault(clave, []).append((fila[0], huella_pieza(valores)))
+    return proyeccion
+
+
+def _mover_a_vendidas(db: Session, ids: list, entorno_trabajo_id: int, archivo_origen: Optional[str]) -> int:
+    """Copia las piezas indicadas al historial de vendidas y las borra del stock, por lotes."""
+    campos_copia = ("refid",) + CAMPOS_HUELLA + ("fecha_fichaje", "usuario_fichaje_id", "operario_desmontaje")
+    columnas = [getattr(PiezaDesguace, campo) for campo in campos_copia]
+    total = 0
+    for i in range(0, len(ids), TAMANO_LOTE_BORRADO):
+        lote = ids[i:i + TAMANO_LOTE_BORRADO]
+        vendidas = [
+            {
+                "entorno_trabajo_id": entorno_trabajo_id,
+                "archivo_origen": archivo_origen,
+                **dict(zip(campos_copia, fila)),
+            }
+            for fila in db.query(*columnas).filter(PiezaDesguace.id.in_(lote))
+        ]
+        if vendidas:
+            db.bulk_insert_mappings(PiezaVendida, vendidas)
+        eliminar_referencias(db, lote)
+        db.query(PiezaDesguace).filter(PiezaDesguace.id.in_(lote)).delete(synchronize_session=False)
+        total += len(vendidas)
+    return total
+
+
+def _verificar_fichadas(db: Session, base_desguace_id: int, entorno_trabajo_id: int) -> Dict:
+    """
+    Registra una VerificacionFichada por cada fichada del entorno (en stock si la
+    pieza está o estuvo en la base) y copia el fichaje más reciente a las piezas.
+    """
+    refids_en_stock = {
+        r.strip().upper() for (r,) in db.query(PiezaDesguace.refid).filter(
+            PiezaDesguace.base_desguace_id == base_desguace_id,
+            PiezaDesguace.refid.isnot(None)
+        ) if r
+    }
+    refids_vendidas = {
+        r.strip().upper() for (r,) in db.query(PiezaVendida.refid).filter(
+            PiezaVendida.entorno_trabajo_id == entorno_trabajo_id,
+            PiezaVendida.refid.isnot(None)
+        ).distinct() if r
+    }
+
+    fichadas_por_refid = {}
+    verificaciones = []
+    verificadas = encontradas = 0
+    for fichada_id, usuario_id, id_pieza, fecha_fichada in db.query(
+        FichadaPieza.id, FichadaPieza.usuario_id, FichadaPieza.id_pieza, FichadaPieza.fecha_fichada
+    ).filter(FichadaPieza.entorno_trabajo_id == entorno_trabajo_id).yield_per(TAMANO_LOTE_IMPORTACION):
+        refid_upper = id_pieza.strip().upper() if id_pieza else ""
+        # Guardar la fichada más reciente si hay múltiples
+        if refid_upper and (refid_upper not in fichadas_por_refid or fecha_fichada > fichadas_por_refid[refid_upper][0]):
+            fichadas_por_refid[refid_upper] = (fecha_fichada, usuario_id)
+
+        # Si alguna vez estuvo en la base, se considera "encontrada"
+        en_stock = refid_upper in refids_en_stock or refid_upper in refids_vendidas
+        verificadas += 1
+        encontradas += 1 if en_stock else 0
+        verificaciones.append({
+            "fichada_id": fichada_id,
+            "usuario_id": usuario_id,
+            "entorno_trabajo_id": entorno_trabajo_id,
+            "id_pieza": id_pieza,
+            "hora_fichada": fecha_fichada,
+            "en_stock": en_stock,
+        })
+        if len(verificaciones) >= TAMANO_LOTE_IMPORTACION:
+            db.bulk_insert_mappings(VerificacionFichada, verificaciones)
+            verificaciones = []
+    if verificaciones:
+        db.bulk_insert_mappings(VerificacionFichada, verificaciones)
+
+    # Copiar datos de fichaje a las piezas de la base
+    cambios = []
+    if fichadas_por_refid:
+        for pieza_id, refid in db.query(PiezaDesguace.id, PiezaDesguace.refid).filter(
+            PiezaDesguace.base_desguace_id == base_desguace_id,
+            PiezaDesguace.refid.isnot(None)
+        ).yield_per(TAMANO_LOTE_IMPORTACION):
+            fichada = fichadas_por_refid.get(refid.strip().upper()) if refid else None
+            if fichada:
+                cambios.append({"id": pieza_id, "fecha_fichaje": fichada[0], "usuario_fichaje_id": fichada[1]})
+        for i in range(0, len(cambios), TAMANO_LOTE_IMPORTACION):
+            db.bulk_update_mappings(PiezaDesguace, cambios[i:i + TAMANO_LOTE_IMPORTACION])
+
+    return {"verificadas": verificadas, "encontradas": encontradas, "piezas_con_fichaje": len(cambios)}
+
+
+def procesar_csv_desguace(
+    db: Session,
+    base_desguace_id: int,
+    entorno_trabajo_id: int,
+    filas: Iterable[Dict],
+    mapeo_dict: Dict,
+    columna_combinada: Optional[str] = None,
+    archivo_origen: Optional[str] = None,
+) -> Dict:
+    """
+    Aplica las filas del CSV subido a la base del desguace.
+
+    Las filas se consumen en streaming. De la base actual solo se carga una
+    proyección {clave: [(id, huella)]}: las filas que coinciden se actualizan si
+    su huella cambió, las que no coinciden se insertan y las piezas que quedan
+    sin emparejar se mueven a vendidas. Escrituras en bloques de
+    TAMANO_LOTE_IMPORTACION. No hace commit.
+    """
+    proyeccion = _cargar_proyeccion(db, base_desguace_id)
+    desde_id = ultimo_id_pieza(db)
+    ids_modificados = []
+
+    stats = {"filas": 0, "insertadas": 0, "actualizadas": 0, "sin_cambios": 0, "vendidas": 0}
+    nuevas = []
+    cambios = []
+
+    def volcar():
+        if nuevas:
+            db.bulk_insert_mappings(PiezaDesguace, nuevas)
+            stats["insertadas"] += len(nuevas)
+            nuevas.clear()
+        if cambios:
+            db.bulk_update_mappings(PiezaDesguace, cambios)
+            stats["actualizadas"] += len(cambios)
+            cambios.clear()
+
+    for fila in filas:
+        stats["filas"] += 1
+        try:
+            pieza_data = mapear_fila_upload(fila, mapeo_dict, columna_combinada)
+        except Exception as e:
+            logger.warning(f"Error procesando fila: {e}")
+            continue
+
+        clave = clave_pieza(
+            pieza_data.get("refid"), pieza_data.get("oem"), pieza_data.get("articulo"),
+            pieza_data.get("marca"), pieza_data.get("modelo")
+        )
+        anteriores = proyeccion.get(clave) if clave else None
+        if anteriores:
+            # Cada pieza existente se empareja con una sola fila (claves repetidas en orden)
+            pieza_id, huella_anterior = anteriores.pop(0)
+            if not anteriores:
+                del proyeccion[clave]
+            valores = tuple(pieza_data.get(campo) for campo in CAMPOS_HUELLA)
+            if huella_pieza(valores) != huella_anterior:
+                cambios.append({"id": pieza_id, **dict(zip(CAMPOS_HUELLA, valores))})
+                ids_modificados.append(pieza_id)
+            else:
+                stats["sin_cambios"] += 1
+        else:
+            nuevas.append({**pieza_data, "base_desguace_id": base_desguace_id})
+
+        if len(nuevas) + len(cambios) >= TAMANO_LOTE_IMPORTACION:
+            volcar()
+    volcar()
+
+    # Las piezas que no aparecen en el CSV se han vendido
+    ids_vendidas = [pieza_id for anteriores in proyeccion.values() for pieza_id, _ in anteriores]
+    proyeccion.clear()
+    if ids_vendidas:
+        stats["vendidas"] = _mover_a_vendidas(db, ids_vendidas, entorno_trabajo_id, archivo_origen)
+
+    sincronizar_referencias_base(db, base_desguace_id, entorno_trabajo_id, ids_modificados, desde_id)
+
+    fichadas = _verificar_fichadas(db, base_desguace_id, entorno_trabajo_id)
+    stats["fichadas_verificadas"] = fichadas["verificadas"]
+    stats["fichadas_encontradas"] = fichadas["encontradas"]
+    stats["piezas_con_fichaje"] = fichadas["piezas_con_fichaje"]
+    return stats
@@ -0,0 +1,240 @@
+"""
+Precios de mercado del estudio de coches en segundo plano
+=========================================================
+
+/desguace/estudio-coches/buscar-precios busca en Ecooparts el precio de cada
+pieza de un modelo (60 piezas o más). Hacerlo dentro de la petición tarda
+minutos, así que se lanza como un trabajo:
+
+- Cada OEM distinto se busca una sola vez, con
+  settings.estudio_busquedas_simultaneas búsquedas en paralelo a través de la
+  capa de scraping compartida (caché de precios, coalescencia y protección por
+  host). Como mucho settings.estudio_trabajos_simultaneos estudios a la vez.
+- Pedir otra vez el mismo modelo mientras se está estudiando devuelve el mismo
+  trabajo. Si el modelo se estudió hace menos de settings.estudio_cache_segundos,
+  el nuevo trabajo reutiliza sus precios por OEM y solo busca los OEM nuevos:
+  repetir el estudio es casi instantáneo.
+
+Los trabajos viven en memoria del proceso (la app corre en un solo proceso);
+el progreso se consulta con TrabajoEstudio.resultado / progreso.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from utils.single_flight import clave_referencia
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+ERROR = "error"
+
+# Busca el precio de mercado de un OEM: None si no hay precios, excepción si la
+# búsqueda falló (no se guarda como "sin precio" y se reintenta en el siguiente estudio)
+ConsultaPrecio = Callable[[str], Optional[float]]
+
+# (entorno, marca, modelo, versión)
+ClaveEstudio = Tuple[int, str, str, Optional[str]]
+
+
+class TrabajoEstudio:
+    """Búsqueda de precios de las piezas de un modelo"""
+
+    def __init__(self, clave: ClaveEstudio, piezas: List[Dict[str, Any]], resumen_base: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.clave = clave
+        self.entorno_id = clave[0]
+        self.piezas = piezas
+        self.resumen_base = resumen_base
+        self.estado = PENDIENTE
+        self.error: Optional[str] = None
+        self.creado = time.monotonic()
+        self.terminado: Optional[float] = None
+
+        # OEM normalizado -> índices de las piezas con ese OEM
+        self.oems: Dict[str, List[int]] = {}
+        self.oem_original: Dict[str, str] = {}
+        for i, pieza in enumerate(piezas):
+            oem = (pieza.get("oem") or "").strip()
+            clave_oem = clave_referencia(oem)
+            if clave_oem:
+                self.oems.setdefault(clave_oem, []).append(i)
+                self.oem_original.setdefault(clave_oem, oem)
+
+        # OEM normalizado -> precio de mercado (None = buscado sin precios)
+        self.precios_oem: Dict[str, Optional[float]] = {}
+        self.procesados = 0
+        # Piezas con precio en el orden en que se obtuvieron (para los eventos)
+        self.actualizaciones: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.oems)
+
+    def registrar(self, clave_oem: str, precio: Optional[float], guardar: bool = True):
+        """Anota el resultado de un OEM en sus piezas"""
+        with self._lock:
+            self.procesados += 1
+            if guardar:
+                self.precios_oem[clave_oem] = precio
+            if not precio:
+                return
+            for i in self.oems.get(clave_oem, []):
+                self.piezas[i]["precio_mercado"] = round(precio, 2)
+                self.actualizaciones.append({"id": self.piezas[i]["id"], "precio_mercado": round(precio, 2)})
+
+    def terminar(self, estado: str = COMPLETADO, error: Optional[str] = None):
+        with self._lock:
+            self.estado = estado
+            self.error = error
+            self.terminado = time.monotonic()
+
+    def _estado(self) -> Dict[str, Any]:
+        return {
+            "trabajo_id": self.id,
+            "estado": self.estado,
+            "error": self.error,
+            "total_busquedas": self.total,
+            "busquedas_hechas": self.procesados,
+        }
+
+    def resultado(self) -> Dict[str, Any]:
+        """Piezas con los precios obtenidos hasta ahora y el resumen (formato de buscar-precios)"""
+        with self._lock:
+            piezas = [dict(p) for p in self.piezas]
+            estado = self._estado()
+        con_precio = [p["precio_mercado"] for p in piezas if p.get("precio_mercado")]
+        valor_mercado = sum(con_precio)
+        return {
+            **estado,
+            "piezas": piezas,
+            "resumen": {
+                **self.resumen_base,
+                "valor_mercado": round(valor_mercado, 2) if valor_mercado > 0 else None,
+            },
+            "piezas_actualizadas": len(con_precio),
+        }
+
+    def progreso(self, desde: int = 0) -> Tuple[Dict[str, Any], int]:
+        """Estado y precios obtenidos desde la actualización `desde`; devuelve también la siguiente"""
+        with self._lock:
+            nuevas = self.actualizaciones[desde:]
+            return {**self._estado(), "piezas": nuevas}, desde + len(nuevas)
+
+
+class GestorEstudios:
+    """Registro de estudios y pool que los ejecuta"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_id: Dict[str, TrabajoEstudio] = {}
+        self._por_clave: Dict[ClaveEstudio, TrabajoEstudio] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._parar = threading.Event()
+
+    def _purgar(self):
+        limite = time.monotonic() - settings.estudio_cache_segundos
+        for trabajo in list(self._por_id.values()):
+            if trabajo.terminado is not None and trabajo.terminado < limite:
+                del self._por_id[trabajo.id]
+                if self._por_clave.get(trabajo.clave) is trabajo:
+                    del self._por_clave[trabajo.clave]
+
+    def iniciar(
+        self,
+        clave: ClaveEstudio,
+        piezas: List[Dict[str, Any]],
+        resumen_base: Dict[str, Any],
+        consultar: ConsultaPrecio,
+        forzar: bool = False,
+    ) -> TrabajoEstudio:
+        """Lanza el estudio del modelo (o devuelve el que ya está en curso)"""
+        with self._lock:
+            self._purgar()
+            anterior = self._por_clave.get(clave)
+            if anterior is not None and anterior.estado in (PENDIENTE, EN_CURSO):
+                return anterior
+
+            trabajo = TrabajoEstudio(clave, piezas, resumen_base)
+            if anterior is not None and anterior.estado == COMPLETADO and not forzar:
+                # Precios del estudio anterior: solo se buscan los OEM nuevos
+                for clave_oem in trabajo.oems:
+                    if clave_oem in anterior.precios_oem:
+                        trabajo.registrar(clave_oem, anterior.precios_oem[clave_oem])
+
+            self._por_id[trabajo.id] = trabajo
+            self._por_clave[clave] = trabajo
+            if trabajo.procesados == trabajo.total:
+                trabajo.terminar()
+            else:
+                if self._executor is None:
+                    self._parar.clear()
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.estudio_trabajos_simultaneos, thread_name_prefix="estudio-precios"
+                    )
+                self._executor.submit(self._ejecutar, trabajo, consultar)
+        logger.info(
+            f"[Estudio] {clave[1]} {clave[2]}: {trabajo.total} OEM, "
+            f"{trabajo.total - trabajo.procesados} por buscar (trabajo {trabajo.id})"
+        )
+        return trabajo
+
+    def _ejecutar(self, trabajo: TrabajoEstudio, consultar: ConsultaPrecio):
+        trabajo.estado = EN_CURSO
+        pendientes = [k for k in trabajo.oems if k not in trabajo.precios_oem]
+        try:
+            with ThreadPoolExecutor(max_workers=settings.estudio_busquedas_simultaneas) as ex:
+                futuros = {ex.submit(consultar, trabajo.oem_original[k]): k for k in pendientes}
+                for futuro in as_completed(futuros):
+                    if self._parar.is_set():
+                        for f in futuros:
+                            f.cancel()
+                        trabajo.terminar(ERROR, "Servidor detenido")
+                        return
+                    try:
+                        trabajo.registrar(futuros[futuro], futuro.result())
+                    except Exception as e:
+                        logger.debug(f"[Estudio] Error buscando OEM {trabajo.oem_original[futuros[futuro]]}: {e}")
+                        trabajo.registrar(futuros[futuro], None, guardar=False)
+            trabajo.terminar()
+        except Exception as e:
+            logger.error(f"[Estudio] Error en el trabajo {trabajo.id}: {e}")
+            trabajo.terminar(ERROR, str(e))
+
+    def obtener(self, trabajo_id: str) -> Optional[TrabajoEstudio]:
+        with self._lock:
+            return self._por_id.get(trabajo_id)
+
+    def cerrar(self):
+        """Cancela las búsquedas pendientes (apagado de la app)"""
+        self._parar.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_gestor: Optional[GestorEstudios] = None
+_gestor_lock = threading.Lock()
+
+
+def get_gestor_estudios() -> GestorEstudios:
+    global _gestor
+    with _gestor_lock:
+        if _gestor is None:
+            _gestor = GestorEstudios()
+        return _gestor
+
+
+def cerrar_gestor_estudios():
+    with _gestor_lock:
+        gestor = _gestor
+    if gestor is not None:
+        gestor.cerrar()
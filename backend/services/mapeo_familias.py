@@ -0,0 +1,198 @@
+"""
+Mapeo pieza -> familia compilado
+================================
+
+Precompila un mapeo {PIEZA: FAMILIA} para que buscar la familia de un texto no
+recorra todas las piezas. Devuelve exactamente la misma familia que las reglas
+de búsqueda por recorrido (buscar_familia_en_mapeo / buscar_familia):
+
+- Piezas contenidas en el texto: se prueban las subcadenas del texto (hasta la
+  longitud de la pieza más larga) contra un hash de piezas.
+- Piezas que contienen el texto: autómata de sufijos de todas las piezas; cada
+  estado guarda la mejor pieza que contiene sus subcadenas.
+- Palabras: índice palabra -> mejor pieza y par de palabras -> mejor pieza
+  (cubre "todas las palabras del texto están en la pieza" y "2+ en común").
+- Fallback por primera palabra: índice de prefijos -> primera pieza.
+
+"Mejor" es la pieza más larga (a igualdad, la primera del mapeo) o la primera
+del mapeo según la regla, como en el recorrido. El coste de una búsqueda
+depende de la longitud del texto, no del número de piezas.
+"""
+from itertools import combinations
+from typing import Dict, List, Optional
+
+# Separador entre piezas en el autómata (no aparece en los nombres de pieza)
+_SEPARADOR = "\x00"
+
+PALABRAS_IGNORAR = {'DE', 'EL', 'LA', 'LOS', 'LAS', 'DEL', 'AL', 'Y', 'O', 'EN', 'CON', 'POR', 'PARA'}
+
+
+def _palabras(texto: str) -> List[str]:
+    return texto.replace('/', ' ').split()
+
+
+class _AutomataSufijos:
+    """
+    Autómata de sufijos de las piezas concatenadas. Para cada estado guarda el
+    mínimo de cada rango (por largo y por orden) de las piezas donde aparece.
+    """
+
+    def __init__(self, piezas: List[str], rango_largo: List[int]):
+        self.siguiente: List[Dict[str, int]] = [{}]
+        self.enlace = [-1]
+        self.longitud = [0]
+        self.mejor_largo: List[Optional[int]] = [None]
+        self.mejor_orden: List[Optional[int]] = [None]
+        ultimo = 0
+
+        for orden, pieza in enumerate(piezas):
+            for caracter in pieza + _SEPARADOR:
+                ultimo = self._extender(ultimo, caracter)
+                if caracter != _SEPARADOR:
+                    self._anotar(ultimo, rango_largo[orden], orden)
+
+        # Propagar de cada estado a su enlace de sufijo (de más largo a más corto)
+        for estado in sorted(range(1, len(self.longitud)), key=self.longitud.__getitem__, reverse=True):
+            self._anotar(self.enlace[estado], self.mejor_largo[estado], self.mejor_orden[estado])
+
+    def _nuevo_estado(self, longitud: int, siguiente: Dict[str, int], enlace: int) -> int:
+        self.siguiente.append(siguiente)
+        self.enlace.append(enlace)
+        self.longitud.append(longitud)
+        self.mejor_largo.append(None)
+        self.mejor_orden.append(None)
+        return len(self.longitud) - 1
+
+    def _extender(self, ultimo: int, caracter: str) -> int:
+        actual = self._nuevo_estado(self.longitud[ultimo] + 1, {}, -1)
+        p = ultimo
+        while p != -1 and caracter not in self.siguiente[p]:
+            self.siguiente[p][caracter] = actual
+            p = self.enlace[p]
+        if p == -1:
+            self.enlace[actual] = 0
+            return actual
+        q = self.siguiente[p][caracter]
+        if self.longitud[p] + 1 == self.longitud[q]:
+            self.enlace[actual] = q
+            return actual
+        clon = self._nuevo_estado(self.longitud[p] + 1, dict(self.siguiente[q]), self.enlace[q])
+        while p != -1 and self.siguiente[p].get(caracter) == q:
+            self.siguiente[p][caracter] = clon
+            p = self.enlace[p]
+        self.enlace[q] = clon
+        self.enlace[actual] = clon
+        return actual
+
+    def _anotar(self, estado: int, largo: Optional[int], orden: Optional[int]):
+        if largo is not None and (self.mejor_largo[estado] is None or largo < self.mejor_largo[estado]):
+            self.mejor_largo[estado] = largo
+        if orden is not None and (self.mejor_orden[estado] is None or orden < self.mejor_orden[estado]):
+            self.mejor_orden[estado] = orden
+
+    def estado_de(self, texto: str) -> Optional[int]:
+        """Estado al que lleva el texto, o None si no es subcadena de ninguna pieza"""
+        estado = 0
+        for caracter in texto:
+            estado = self.siguiente[estado].get(caracter)
+            if estado is None:
+                return None
+        return estado
+
+
+class MapeoFamilias:
+    """Mapeo pieza -> familia compilado (inmutable una vez construido)"""
+
+    def __init__(self, pieza_familia: Dict[str, str]):
+        self.piezas = list(pieza_familia)
+        self.familias = [pieza_familia[p] for p in self.piezas]
+        self._orden = {p: i for i, p in enumerate(self.piezas)}
+
+        # Rango "mejor pieza" de la búsqueda parcial: más larga y, a igualdad, la primera
+        por_largo = sorted(range(len(self.piezas)), key=lambda i: (-len(self.piezas[i]), i))
+        self._pieza_por_largo = por_largo
+        rango_largo = [0] * len(self.piezas)
+        for rango, orden in enumerate(por_largo):
+            rango_largo[orden] = rango
+        self._rango_largo = rango_largo
+        self._longitud_maxima = max((len(p) for p in self.piezas), default=0)
+
+        self._automata = _AutomataSufijos(self.piezas, rango_largo)
+
+        self._por_palabra: Dict[str, int] = {}
+        self._por_par: Dict[tuple, int] = {}
+        self._por_prefijo: Dict[str, int] = {}
+        for orden, pieza in enumerate(self.piezas):
+            rango = rango_largo[orden]
+            palabras = set(_palabras(pieza))
+            for palabra in palabras:
+                self._por_palabra[palabra] = min(self._por_palabra.get(palabra, rango), rango)
+            for par in combinations(sorted(palabras), 2):
+                self._por_par[par] = min(self._por_par.get(par, rango), rango)
+            for fin in range(1, len(pieza) + 1):
+                self._por_prefijo.setdefault(pieza[:fin], orden)
+
+    def __len__(self):
+        return len(self.piezas)
+
+    def _piezas_contenidas(self, texto: str):
+        """Órdenes de las piezas que son subcadena del texto"""
+        if "" in self._orden:
+            yield self._orden[""]
+        for inicio in range(len(texto)):
+            for fin in range(inicio + 1, min(len(texto), inicio + self._longitud_maxima) + 1):
+                orden = self._orden.get(texto[inicio:fin])
+                if orden is not None:
+                    yield orden
+
+    def buscar(self, referencia: str) -> Optional[str]:
+        """
+        Misma regla que buscar_familia_en_mapeo: exacta, luego la pieza más larga
+        que contiene/está contenida o comparte palabras, y por último el fallback
+        por la primera palabra significativa.
+        """
+        texto = referencia.strip().upper()
+        orden = self._orden.get(texto)
+        if orden is not None:
+            return self.familias[orden]
+
+        candidatos = [self._rango_largo[o] for o in self._piezas_contenidas(texto)]
+        estado = self._automata.estado_de(texto)
+        if estado is not None and self._automata.mejor_largo[estado] is not None:
+            candidatos.append(self._automata.mejor_largo[estado])
+        palabras = set(_palabras(texto))
+        if len(palabras) == 1:
+            candidatos.append(self._por_palabra.get(next(iter(palabras))))
+        for par in combinations(sorted(palabras), 2):
+            candidatos.append(self._por_par.get(par))
+        candidatos = [c for c in candidatos if c is not None]
+        if candidatos:
+            return self.familias[self._pieza_por_largo[min(candidatos)]]
+
+        significativas = [p for p in _palabras(texto) if p not in PALABRAS_IGNORAR and len(p) > 2]
+        if significativas:
+            primera_palabra = significativas[0]
+            orden = self._por_prefijo.get(primera_palabra)
+            if orden is None:
+                estado = self._automata.estado_de(primera_palabra)
+                orden = self._automata.mejor_orden[estado] if estado is not None else None
+            if orden is not None:
+                return self.familias[orden]
+
+        return None
+
+    def buscar_primera(self, texto: str) -> Optional[str]:
+        """
+        Misma regla que buscar_familia: exacta y si no la primera pieza del mapeo
+        que contiene al texto o está contenida en él.
+        """
+        texto = texto.strip().upper()
+        orden = self._orden.get(texto)
+        if orden is not None:
+            return self.familias[orden]
+
+        candidatos = list(self._piezas_contenidas(texto))
+        estado = self._automata.estado_de(texto)
+        if estado is not None and self._automata.mejor_orden[estado] is not None:
+            candidatos.append(self._automata.mejor_orden[estado])
+        return self.familias[min(candidatos)] if candidatos else None
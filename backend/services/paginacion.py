@@ -0,0 +1,194 @@
+"""
+Paginación por Cursor (Keyset)
+==============================
+
+Paginación de listados grandes (stock, ventas, logs de API) sin OFFSET: cada
+página filtra "después de la última fila vista" sobre claves de orden estables
+(fecha, id), así que la página 1000 cuesta lo mismo que la primera si hay un
+índice sobre esas claves.
+
+El cursor es opaco para el cliente (base64 de un JSON) y lleva además el total
+calculado en la primera página, para no repetir el count() en cada cambio de
+página. Si el listado está ordenado por relevancia (búsqueda de texto) no hay
+clave estable y el cursor guarda la posición.
+
+Los parámetros offset/pagina de siempre siguen funcionando para clientes
+antiguos.
+"""
+import json
+import base64
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Query
+
+MODOS_TOTAL = ("exacto", "estimado", "ninguno")
+LIMITE_TOTAL_ESTIMADO = 10_000  # En modo estimado se cuenta como mucho hasta aquí
+
+
+class CursorInvalido(ValueError):
+    """Cursor mal formado o generado con otros filtros"""
+
+
+@dataclass
+class Pagina:
+    """Resultado de paginar(): filas de la página y metadatos de paginación"""
+    filas: List[Any]
+    total: Optional[int]
+    total_estimado: bool
+    siguiente_cursor: Optional[str]
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {"d": valor.isoformat()}
+    return valor
+
+
+def _deserializar(valor):
+    if isinstance(valor, dict) and "d" in valor:
+        return datetime.fromisoformat(valor["d"])
+    return valor
+
+
+def huella_filtros(*filtros) -> str:
+    """Huella corta de los filtros del listado (un cursor solo vale para los mismos filtros)"""
+    return hashlib.sha1(json.dumps(filtros, default=str).encode()).hexdigest()[:12]
+
+
+def codificar_cursor(datos: Dict[str, Any]) -> str:
+    contenido = json.dumps(datos, separators=(",", ":"), default=_serializar)
+    return base64.urlsafe_b64encode(contenido.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, huella: str = "") -> Dict[str, Any]:
+    """Decodifica un cursor de codificar_cursor(). Lanza CursorInvalido si no es válido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError) as e:
+        raise CursorInvalido("Cursor no válido") from e
+    if not isinstance(datos, dict) or ("k" not in datos and "o" not in datos):
+        raise CursorInvalido("Cursor no válido")
+    if datos.get("h", "") != huella:
+        raise CursorInvalido("El cursor corresponde a otros filtros")
+    if "k" in datos:
+        datos["k"] = [_deserializar(v) for v in datos["k"]]
+    return datos
+
+
+def _admite_nulos(columna) -> bool:
+    return bool(getattr(columna.expression, "nullable", False))
+
+
+def orden_keyset(claves: Sequence) -> list:
+    """ORDER BY de las claves: todas descendentes, NULL al final"""
+    return [c.desc().nulls_last() if _admite_nulos(c) else c.desc() for c in claves]
+
+
+def condicion_siguiente(claves: Sequence, valores: Sequence):
+    """
+    Filas que van después de `valores` en orden_keyset(claves). Se escribe como
+    rango (clave <= valor AND ...) para que la BD busque directamente en el
+    índice en lugar de recorrerlo desde el principio. La última clave debe ser
+    única y no nula (normalmente el id); solo la primera puede ser nula.
+    """
+    columna, valor = claves[0], valores[0]
+    if len(claves) == 1:
+        return columna < valor
+    resto = condicion_siguiente(claves[1:], valores[1:])
+    if valor is None:
+        return and_(columna.is_(None), resto)
+    return and_(columna <= valor, or_(columna < valor, resto))
+
+
+def contar_filas(query: Query, modo: str = "exacto"):
+    """
+    Total de filas de la query según el modo: (total, es_estimado).
+    'estimado' deja de contar en LIMITE_TOTAL_ESTIMADO (total = "al menos");
+    'ninguno' no cuenta.
+    """
+    if modo == "ninguno":
+        return None, True
+    if modo == "estimado":
+        acotada = query.order_by(None).limit(LIMITE_TOTAL_ESTIMADO + 1).subquery()
+        total = query.session.query(func.count()).select_from(acotada).scalar()
+        return min(total, LIMITE_TOTAL_ESTIMADO), total > LIMITE_TOTAL_ESTIMADO
+    return query.order_by(None).count(), False
+
+
+def _filas_keyset(query: Query, claves: Sequence, despues_de: Optional[list], cantidad: int) -> list:
+    """
+    Hasta `cantidad` filas tras `despues_de`. Si la primera clave admite NULL,
+    primero se recorren las filas con valor (rango sobre el índice) y después,
+    al final, las que lo tienen a NULL.
+    """
+    primera = claves[0]
+    if despues_de is not None and despues_de[0] is None:
+        return query.filter(condicion_siguiente(claves, despues_de)).order_by(*orden_keyset(claves)).limit(cantidad).all()
+
+    con_valor = query
+    if despues_de is not None:
+        con_valor = con_valor.filter(condicion_siguiente(claves, despues_de))
+    elif _admite_nulos(primera):
+        con_valor = con_valor.filter(primera.isnot(None))
+    filas = con_valor.order_by(*orden_keyset(claves)).limit(cantidad).all()
+
+    if len(filas) < cantidad and len(claves) > 1 and _admite_nulos(primera):
+        filas += query.filter(primera.is_(None)).order_by(*orden_keyset(claves[1:])).limit(cantidad - len(filas)).all()
+    return filas
+
+
+def paginar(
+    query: Query,
+    claves: Sequence,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    huella: str = "",
+    orden: Optional[list] = None,
+    modo_total: str = "exacto",
+    calcular_extras: Optional[Callable[[], Dict[str, Any]]] = None,
+) -> Pagina:
+    """
+    Página de `query` ordenada por `claves` (columnas, la última única).
+
+    - Sin cursor: primera página (o la del offset antiguo); calcula el total
+      según modo_total y los extras (p. ej. el valor total de las ventas).
+    - Con cursor: sigue tras la última fila de la página anterior y reutiliza el
+      total y los extras guardados en él.
+    - `orden` (p. ej. relevancia de la búsqueda de texto) sustituye al orden por
+      claves; entonces se pagina por posición.
+    """
+    datos = decodificar_cursor(cursor, huella) if cursor else None
+
+    if datos is None:
+        total, estimado = contar_filas(query, modo_total)
+        extras = calcular_extras() if calcular_extras else {}
+    else:
+        total, estimado, extras = datos.get("t"), datos.get("e", False), datos.get("x", {})
+
+    posicion = None
+    if orden is not None:
+        posicion = int(datos.get("o", 0)) if datos else offset
+        filas = query.order_by(*orden).offset(posicion).limit(limit + 1).all()
+    elif offset and not datos:
+        # Paginación antigua por offset
+        filas = query.order_by(*orden_keyset(claves)).offset(offset).limit(limit + 1).all()
+    else:
+        filas = _filas_keyset(query, claves, datos.get("k") if datos else None, limit + 1)
+
+    siguiente_cursor = None
+    if limit > 0 and len(filas) > limit:
+        filas = filas[:limit]
+        if posicion is not None:
+            siguiente = {"o": posicion + limit}
+        else:
+            siguiente = {"k": [getattr(filas[-1], c.key) for c in claves]}
+        siguiente.update({"h": huella, "t": total, "e": estimado, "x": extras})
+        siguiente_cursor = codificar_cursor(siguiente)
+
+    return Pagina(filas, total, estimado, siguiente_cursor, extras)
@@ -5,10 +5,17 @@ O la base de datos específica del desguace si está configurada
 """
 import csv
 import os
-from typing import Optional, List, Dict
+import threading
+import uuid
+from bisect import bisect_right
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional, List, Dict, Union, Iterable, Mapping, Sequence, Tuple
 from sqlalchemy.orm import Session
 import logging
 
+from services.mapeo_familias import MapeoFamilias
+
 logger = logging.getLogger(__name__)
 
 # Ruta base del backend
@@ -75,6 +82,11 @@ def load_familia_precios() -> Dict[str, List[float]]:
 # Cache global
 _pieza_familia_cache: Optional[Dict[str, str]] = None
 _familia_precios_cache: Optional[Dict[str, List[float]]] = None
+_mapeo_familias_cache: Optional[MapeoFamilias] = None
+
+# Snapshots de configuración de precios por entorno (validados por sello)
+_snapshots: Dict[int, "SnapshotPrecios"] = {}
+_snapshots_lock = threading.Lock()
 
 
 def get_pieza_familia() -> Dict[str, str]:
@@ -93,71 +105,24 @@ def get_familia_precios() -> Dict[str, List[float]]:
     return _familia_precios_cache
 
 
-def buscar_familia_en_mapeo(referencia: str, pieza_familia: Dict[str, str]) -> Optional[str]:
+def get_mapeo_familias() -> MapeoFamilias:
+    """Mapeo pieza -> familia global compilado (con cache)"""
+    global _mapeo_familias_cache
+    if _mapeo_familias_cache is None:
+        _mapeo_familias_cache = MapeoFamilias(get_pieza_familia())
+    return _mapeo_familias_cache
+
+
+def buscar_familia_en_mapeo(referencia: str, pieza_familia: Union[Dict[str, str], MapeoFamilias]) -> Optional[str]:
     """
     Busca la familia de una pieza en un mapeo dado.
     Usa búsqueda exacta primero, luego parcial con prioridad por longitud.
     Si no encuentra, busca por la primera palabra significativa.
+    Acepta el mapeo compilado (lo normal) o un dict, que se compila al vuelo.
     """
-    referencia_upper = referencia.strip().upper()
-    
-    # Búsqueda exacta primero
-    if referencia_upper in pieza_familia:
-        return pieza_familia[referencia_upper]
-    
-    # Búsqueda parcial - priorizar coincidencias más específicas
-    mejor_match = None
-    mejor_longitud = 0
-    
-    for pieza, fam in pieza_familia.items():
-        # Coincidencia directa (una contiene a la otra)
-        if pieza in referencia_upper or referencia_upper in pieza:
-            longitud = len(pieza)
-            if longitud > mejor_longitud:
-                mejor_match = fam
-                mejor_longitud = longitud
-        else:
-            # Búsqueda por palabras clave
-            palabras_ref = set(referencia_upper.replace('/', ' ').split())
-            palabras_pieza = set(pieza.replace('/', ' ').split())
-            # Si todas las palabras de la referencia están en la pieza
-            if palabras_ref and palabras_ref.issubset(palabras_pieza):
-                longitud = len(pieza)
-                if longitud > mejor_longitud:
-                    mejor_match = fam
-                    mejor_longitud = longitud
-            # Si hay al menos 2 palabras en común
-            elif len(palabras_ref & palabras_pieza) >= 2:
-                longitud = len(pieza)
-                if longitud > mejor_longitud:
-                    mejor_match = fam
-                    mejor_longitud = longitud
-    
-    if mejor_match:
-        return mejor_match
-    
-    # FALLBACK: Buscar solo por la primera palabra significativa
-    # Ignorar palabras cortas como "DE", "EL", "LA", etc.
-    palabras_ignorar = {'DE', 'EL', 'LA', 'LOS', 'LAS', 'DEL', 'AL', 'Y', 'O', 'EN', 'CON', 'POR', 'PARA'}
-    palabras = [p for p in referencia_upper.replace('/', ' ').split() if p not in palabras_ignorar and len(p) > 2]
-    
-    if palabras:
-        primera_palabra = palabras[0]
-        logger.info(f"Buscando fallback por primera palabra: {primera_palabra}")
-        
-        for pieza, fam in pieza_familia.items():
-            # Si la pieza empieza con la misma palabra
-            if pieza.startswith(primera_palabra):
-                logger.info(f"Fallback encontrado: {pieza} -> {fam}")
-                return fam
-        
-        # Último intento: buscar cualquier pieza que contenga la primera palabra
-        for pieza, fam in pieza_familia.items():
-            if primera_palabra in pieza:
-                logger.info(f"Fallback parcial encontrado: {pieza} -> {fam}")
-                return fam
-    
-    return None
+    if not isinstance(pieza_familia, MapeoFamilias):
+        pieza_familia = MapeoFamilias(pieza_familia)
+    return pieza_familia.buscar(referencia)
 
 
 def sugerir_precio(referencia: str, precio_mercado: float) -> Optional[Dict]:
@@ -171,11 +136,10 @@ def sugerir_precio(referencia: str, precio_mercado: float) -> Optional[Dict]:
     Returns:
         Dict con precio_sugerido, familia, y lista de precios de la familia
     """
-    pieza_familia = get_pieza_familia()
     familia_precios = get_familia_precios()
     
     # Buscar la familia de la pieza usando la función mejorada
-    familia = buscar_familia_en_mapeo(referencia, pieza_familia)
+    familia = buscar_familia_en_mapeo(referencia, get_mapeo_familias())
     
     logger.info(f"Familia encontrada para '{referencia}': {familia}")
     
@@ -252,19 +216,7 @@ def sugerir_precio(referencia: str, precio_mercado: float) -> Optional[Dict]:
 
 def buscar_familia(texto: str) -> Optional[str]:
     """Busca la familia de una pieza por texto (usa archivos CSV globales)"""
-    pieza_familia = get_pieza_familia()
-    texto_upper = texto.strip().upper()
-    
-    # Búsqueda exacta
-    if texto_upper in pieza_familia:
-        return pieza_familia[texto_upper]
-    
-    # Búsqueda parcial
-    for pieza, familia in pieza_familia.items():
-        if pieza in texto_upper or texto_upper in pieza:
-            return familia
-    
-    return None
+    return get_mapeo_familias().buscar_primera(texto)
 
 
 # ============== FUNCIONES PARA USAR BASE DE DATOS POR DESGUACE ==============
@@ -328,114 +280,196 @@ def tiene_configuracion_precios(db: Session, entorno_trabajo_id: int) -> bool:
         return False
 
 
-def sugerir_precio_db(
-    db: Session, 
-    entorno_trabajo_id: int, 
-    referencia: str, 
-    precio_mercado: float
-) -> Optional[Dict]:
+# ============== SNAPSHOT DE LA CONFIGURACIÓN POR DESGUACE ==============
+
+@dataclass(frozen=True)
+class SnapshotPrecios:
     """
-    Sugiere un precio para una pieza usando la configuración del desguace
-    
-    Si el desguace tiene configuración propia, la usa.
-    Si no, usa los archivos CSV globales como fallback.
-    
-    Args:
-        db: Sesión de base de datos
-        entorno_trabajo_id: ID del entorno de trabajo del usuario
-        referencia: Nombre/tipo de la pieza (ej: "ALTERNADOR", "FARO DERECHO")
-        precio_mercado: Precio medio del mercado
-    
-    Returns:
-        Dict con precio_sugerido, familia, y lista de precios de la familia
-        O None si el desguace no tiene configuración de precios
+    Configuración de precios de un desguace ya preparada para sugerir precios:
+    mapeo pieza -> familia compilado y tramos de precios ordenados por familia.
+    Inmutable: se comparte entre peticiones hasta que cambia el sello.
     """
-    # Verificar si tiene configuración propia
-    if not tiene_configuracion_precios(db, entorno_trabajo_id):
-        # No tiene configuración - NO usar fallback global
-        logger.info(f"Entorno {entorno_trabajo_id} sin configuración de precios propia")
+    entorno_trabajo_id: int
+    configuracion_id: int
+    sello: Optional[str]
+    mapeo: MapeoFamilias
+    precios: Mapping[str, Tuple[float, ...]]
+
+
+def marcar_configuracion_precios(config) -> str:
+    """
+    Renueva el sello de la configuración. Llamar en toda escritura de pieza-familia
+    o familia-precios (antes del commit) para que los snapshots cacheados en este
+    y en los demás workers dejen de usarse.
+    """
+    config.sello_actualizacion = uuid.uuid4().hex
+    return config.sello_actualizacion
+
+
+def invalidar_snapshot_precios(entorno_trabajo_id: Optional[int] = None):
+    """Descarta el snapshot cacheado de un entorno (o de todos si no se indica)"""
+    with _snapshots_lock:
+        if entorno_trabajo_id is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(entorno_trabajo_id, None)
+
+
+def _construir_snapshot(db: Session, config) -> SnapshotPrecios:
+    from app.models.busqueda import PiezaFamiliaDesguace, FamiliaPreciosDesguace
+
+    piezas = db.query(PiezaFamiliaDesguace.pieza, PiezaFamiliaDesguace.familia).filter(
+        PiezaFamiliaDesguace.configuracion_id == config.id
+    ).order_by(PiezaFamiliaDesguace.id).all()
+    familias = db.query(FamiliaPreciosDesguace.familia, FamiliaPreciosDesguace.precios).filter(
+        FamiliaPreciosDesguace.configuracion_id == config.id
+    ).order_by(FamiliaPreciosDesguace.id).all()
+
+    return SnapshotPrecios(
+        entorno_trabajo_id=config.entorno_trabajo_id,
+        configuracion_id=config.id,
+        sello=config.sello_actualizacion,
+        mapeo=MapeoFamilias({pieza: familia for pieza, familia in piezas}),
+        precios=MappingProxyType({
+            familia: tuple(sorted(float(p) for p in (precios or "").split(",") if p))
+            for familia, precios in familias
+        }),
+    )
+
+
+def get_snapshot_precios(db: Session, entorno_trabajo_id: int) -> Optional[SnapshotPrecios]:
+    """
+    Snapshot de la configuración de precios del desguace, o None si no tiene
+    configuración propia completa. Solo consulta la fila de ConfiguracionPrecios;
+    el mapeo y los precios se cargan de nuevo únicamente si cambió el sello.
+    """
+    from app.models.busqueda import ConfiguracionPrecios
+
+    try:
+        config = db.query(ConfiguracionPrecios).filter(
+            ConfiguracionPrecios.entorno_trabajo_id == entorno_trabajo_id
+        ).first()
+    except Exception as e:
+        # Si la tabla no existe o hay error, sin configuración propia
+        logger.warning(f"Error verificando config precios: {e}")
         return None
-    
-    pieza_familia = get_pieza_familia_db(db, entorno_trabajo_id)
-    familia_precios = get_familia_precios_db(db, entorno_trabajo_id)
-    logger.info(f"Usando configuración de precios del entorno {entorno_trabajo_id}")
-    
-    # Buscar la familia de la pieza usando la función mejorada
-    familia = buscar_familia_en_mapeo(referencia, pieza_familia)
-    
+
+    if not config or not config.pieza_familia_registros or not config.familia_precios_registros:
+        return None
+
+    snapshot = _snapshots.get(entorno_trabajo_id)
+    if snapshot and snapshot.configuracion_id == config.id and snapshot.sello == config.sello_actualizacion:
+        return snapshot
+
+    snapshot = _construir_snapshot(db, config)
+    with _snapshots_lock:
+        _snapshots[entorno_trabajo_id] = snapshot
+    logger.info(f"Snapshot de precios del entorno {entorno_trabajo_id}: {len(snapshot.mapeo)} piezas, {len(snapshot.precios)} familias")
+    return snapshot
+
+
+def _precio_por_tramos(precios_familia: Sequence[float], precio_sin_iva: float) -> float:
+    """
+    Tramo de la familia para el precio de mercado sin IVA: mínimo/máximo en los
+    extremos y, entre dos tramos, el bajo salvo que se supere el 65% del rango.
+    """
+    if precio_sin_iva <= precios_familia[0]:
+        return precios_familia[0]
+    if precio_sin_iva >= precios_familia[-1]:
+        return precios_familia[-1]
+    i = bisect_right(precios_familia, precio_sin_iva)
+    precio_bajo, precio_alto = precios_familia[i - 1], precios_familia[i]
+    punto_corte = precio_bajo + (precio_alto - precio_bajo) * 0.65
+    return precio_bajo if precio_sin_iva < punto_corte else precio_alto
+
+
+def sugerir_precio_snapshot(snapshot: SnapshotPrecios, referencia: str, precio_mercado: float) -> Dict:
+    """Sugiere el precio de una pieza con un snapshot ya cargado (sin consultas)"""
+    familia = snapshot.mapeo.buscar(referencia)
+    precio_sin_iva = precio_mercado / 1.21
+
     if not familia:
         logger.warning(f"No se encontró familia para: {referencia.upper()}")
         # FALLBACK FINAL: Calcular precio sugerido por porcentaje
-        precio_sin_iva = precio_mercado / 1.21
-        precio_sugerido = round(precio_sin_iva * 0.55, -1)  # 55% redondeado a decenas
-        if precio_sugerido < 10:
-            precio_sugerido = 10
         return {
             "familia": "SIN CLASIFICAR",
-            "precio_sugerido": precio_sugerido,
+            "precio_sugerido": max(round(precio_sin_iva * 0.55, -1), 10),  # 55% redondeado a decenas
             "precios_familia": [],
             "precio_mercado": precio_mercado,
             "metodo": "fallback_porcentaje"
         }
-    
-    logger.info(f"Familia encontrada para '{referencia}': {familia}")
-    
-    # Obtener precios de la familia
-    precios_familia = familia_precios.get(familia, [])
+
+    precios_familia = snapshot.precios.get(familia)
     if not precios_familia:
         logger.warning(f"No hay precios definidos para familia: {familia}")
         # FALLBACK: Familia encontrada pero sin precios
-        precio_sin_iva = precio_mercado / 1.21
-        precio_sugerido = round(precio_sin_iva * 0.55, -1)
-        if precio_sugerido < 10:
-            precio_sugerido = 10
         return {
             "familia": familia,
-            "precio_sugerido": precio_sugerido,
+            "precio_sugerido": max(round(precio_sin_iva * 0.55, -1), 10),
             "precios_familia": [],
             "precio_mercado": precio_mercado,
             "metodo": "fallback_familia_sin_precios"
         }
-    
-    # Quitar 21% IVA al precio de mercado para comparar
-    precio_sin_iva = precio_mercado / 1.21
-    
-    # Si el precio está por debajo del mínimo, usar el mínimo
-    if precio_sin_iva <= precios_familia[0]:
-        precio_sugerido = precios_familia[0]
-    # Si el precio está por encima del máximo, usar el máximo
-    elif precio_sin_iva >= precios_familia[-1]:
-        precio_sugerido = precios_familia[-1]
-    else:
-        # Buscar entre qué dos precios cae y aplicar regla 65%
-        precio_sugerido = precios_familia[-1]  # Default al máximo
-        for i in range(len(precios_familia) - 1):
-            precio_bajo = precios_familia[i]
-            precio_alto = precios_familia[i + 1]
-            
-            if precio_bajo <= precio_sin_iva < precio_alto:
-                rango = precio_alto - precio_bajo
-                punto_corte = precio_bajo + (rango * 0.65)
-                
-                if precio_sin_iva < punto_corte:
-                    precio_sugerido = precio_bajo
-                else:
-                    precio_sugerido = precio_alto
-                break
-    
+
     return {
         "familia": familia,
-        "precio_sugerido": precio_sugerido,
-        "precios_familia": precios_familia,
+        "precio_sugerido": _precio_por_tramos(precios_familia, precio_sin_iva),
+        "precios_familia": list(precios_familia),
         "precio_mercado": precio_mercado,
     }
 
 
+def sugerir_precio_db(
+    db: Session, 
+    entorno_trabajo_id: int, 
+    referencia: str, 
+    precio_mercado: float
+) -> Optional[Dict]:
+    """
+    Sugiere un precio para una pieza usando la configuración del desguace
+    
+    Si el desguace tiene configuración propia, la usa.
+    Si no, devuelve None (no se usan los CSV globales).
+    
+    Args:
+        db: Sesión de base de datos
+        entorno_trabajo_id: ID del entorno de trabajo del usuario
+        referencia: Nombre/tipo de la pieza (ej: "ALTERNADOR", "FARO DERECHO")
+        precio_mercado: Precio medio del mercado
+    
+    Returns:
+        Dict con precio_sugerido, familia, y lista de precios de la familia
+        O None si el desguace no tiene configuración de precios
+    """
+    snapshot = get_snapshot_precios(db, entorno_trabajo_id)
+    if snapshot is None:
+        # No tiene configuración - NO usar fallback global
+        logger.info(f"Entorno {entorno_trabajo_id} sin configuración de precios propia")
+        return None
+    
+    return sugerir_precio_snapshot(snapshot, referencia, precio_mercado)
+
+
+def sugerir_precios_db(
+    db: Session,
+    entorno_trabajo_id: int,
+    items: Iterable[Tuple[str, float]],
+) -> List[Optional[Dict]]:
+    """
+    Sugiere precios para muchas piezas (referencia, precio_mercado) con un único
+    snapshot de la configuración. Misma salida que sugerir_precio_db por item.
+    """
+    snapshot = get_snapshot_precios(db, entorno_trabajo_id)
+    if snapshot is None:
+        return [None for _ in items]
+    return [sugerir_precio_snapshot(snapshot, referencia, precio) for referencia, precio in items]
+
+
 def buscar_familia_db(db: Session, entorno_trabajo_id: int, texto: str) -> Optional[str]:
     """Busca la familia de una pieza usando la configuración del desguace"""
-    if not tiene_configuracion_precios(db, entorno_trabajo_id):
+    snapshot = get_snapshot_precios(db, entorno_trabajo_id)
+    if snapshot is None:
         # No tiene configuración propia - no buscar
         return None
     
-    pieza_familia = get_pieza_familia_db(db, entorno_trabajo_id)
-    return buscar_familia_en_mapeo(texto, pieza_familia)
+    return snapshot.mapeo.buscar(texto)
@@ -0,0 +1,226 @@
+"""
+Índice de Referencias de Piezas
+===============================
+
+Mantiene la tabla referencias_piezas: una fila por cada referencia normalizada
+(refid, OEM, OE, IAM) de las piezas del desguace, apuntando a la pieza y a su
+entorno. Las búsquedas por referencia usan igualdad o prefijo sobre el token,
+que sí pueden usar índice, en lugar de ilike('%ref%') sobre cuatro columnas.
+
+Normalización: mayúsculas, sin espacios/guiones/puntos y separando por
+'/', ',', ';' y '|' (un campo IAM con varias referencias genera varios tokens).
+
+La tabla la sincronizan los importadores (csv_auto_import, subida de base y
+alta manual de piezas). Al arrancar, la app indexa los entornos que tienen
+piezas pero ningún token (BD anterior a esta tabla), para que las búsquedas no
+devuelvan vacío hasta la siguiente importación. Para reconstruirla entera:
+python scripts/indexar_referencias.py
+"""
+import re
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Union
+from sqlalchemy import and_, exists, false, func, insert, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from app.models.busqueda import BaseDesguace, PiezaDesguace, ReferenciaPieza
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_REFERENCIA = ("refid", "oem", "oe", "iam")
+TAMANO_LOTE_INDICE = 5000
+LONGITUD_MAXIMA_TOKEN = 100
+_SEPARADORES = re.compile(r"[/,;|]+")
+_CARACTERES_IGNORADOS = re.compile(r"[\s\-.]+")
+_FIN_PREFIJO = "\U0010ffff"  # Mayor que cualquier carácter: token < prefijo + _FIN_PREFIJO
+
+
+def normalizar_referencia(valor: Optional[str]) -> str:
+    """Mayúsculas y sin espacios, guiones ni puntos: '1k0-615.301 a' -> '1K0615301A'"""
+    if not valor:
+        return ""
+    return _CARACTERES_IGNORADOS.sub("", str(valor)).upper()[:LONGITUD_MAXIMA_TOKEN]
+
+
+def tokens_referencia(valor: Optional[str]) -> Set[str]:
+    """Tokens normalizados de un campo de referencia, separando por / , ; |"""
+    if not valor:
+        return set()
+    tokens = (normalizar_referencia(parte) for parte in _SEPARADORES.split(str(valor)))
+    return {token for token in tokens if token}
+
+
+def _filas_indice(pieza_id: int, entorno_trabajo_id: int, valores: Sequence) -> List[Dict]:
+    """Filas de referencias_piezas para una pieza (valores en el orden de CAMPOS_REFERENCIA)"""
+    filas = []
+    vistos = set()
+    for campo, valor in zip(CAMPOS_REFERENCIA, valores):
+        for token in tokens_referencia(valor):
+            if token not in vistos:
+                vistos.add(token)
+                filas.append({
+                    "token": token,
+                    "pieza_id": pieza_id,
+                    "entorno_trabajo_id": entorno_trabajo_id,
+                    "campo": campo,
+                })
+    return filas
+
+
+def indexar_piezas(db: Session, entorno_trabajo_id: int, piezas: Iterable[Sequence]) -> int:
+    """
+    Inserta los tokens de las piezas dadas como tuplas (id, refid, oem, oe, iam).
+    No borra tokens previos: para piezas ya indexadas usar reindexar_piezas.
+    Usa insert de Core (executemany), bastante más rápido que bulk_insert_mappings
+    para las millones de filas de una reconstrucción completa.
+    """
+    total = 0
+    lote = []
+    for pieza in piezas:
+        lote.extend(_filas_indice(pieza[0], entorno_trabajo_id, pieza[1:]))
+        if len(lote) >= TAMANO_LOTE_INDICE:
+            db.execute(insert(ReferenciaPieza.__table__), lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        db.execute(insert(ReferenciaPieza.__table__), lote)
+        total += len(lote)
+    return total
+
+
+def _columnas_referencia():
+    return [PiezaDesguace.id] + [getattr(PiezaDesguace, campo) for campo in CAMPOS_REFERENCIA]
+
+
+def eliminar_referencias(db: Session, pieza_ids) -> None:
+    """Borra los tokens de las piezas indicadas (lista de ids o select de ids)"""
+    if isinstance(pieza_ids, (list, tuple, set)):
+        pieza_ids = list(pieza_ids)
+        for i in range(0, len(pieza_ids), TAMANO_LOTE_INDICE):
+            db.query(ReferenciaPieza).filter(
+                ReferenciaPieza.pieza_id.in_(pieza_ids[i:i + TAMANO_LOTE_INDICE])
+            ).delete(synchronize_session=False)
+    else:
+        db.query(ReferenciaPieza).filter(
+            ReferenciaPieza.pieza_id.in_(pieza_ids)
+        ).delete(synchronize_session=False)
+
+
+def reindexar_piezas(db: Session, entorno_trabajo_id: int, pieza_ids: Iterable[int]) -> int:
+    """Vuelve a generar los tokens de piezas existentes (p. ej. tras actualizar sus referencias)"""
+    pieza_ids = list(pieza_ids)
+    if not pieza_ids:
+        return 0
+    eliminar_referencias(db, pieza_ids)
+    total = 0
+    for i in range(0, len(pieza_ids), TAMANO_LOTE_INDICE):
+        total += indexar_piezas(db, entorno_trabajo_id, db.query(*_columnas_referencia()).filter(
+            PiezaDesguace.id.in_(pieza_ids[i:i + TAMANO_LOTE_INDICE])
+        ).all())
+    return total
+
+
+def reindexar_base(db: Session, base_desguace_id: int, entorno_trabajo_id: int) -> int:
+    """Reconstruye todos los tokens del entorno a partir de las piezas de su base"""
+    db.query(ReferenciaPieza).filter(
+        ReferenciaPieza.entorno_trabajo_id == entorno_trabajo_id
+    ).delete(synchronize_session=False)
+    return indexar_piezas(db, entorno_trabajo_id, db.query(*_columnas_referencia()).filter(
+        PiezaDesguace.base_desguace_id == base_desguace_id
+    ).yield_per(TAMANO_LOTE_INDICE))
+
+
+def ultimo_id_pieza(db: Session) -> int:
+    """Id más alto de piezas_desguace; las piezas insertadas después tendrán uno mayor"""
+    return db.query(func.max(PiezaDesguace.id)).scalar() or 0
+
+
+def sincronizar_referencias_base(
+    db: Session,
+    base_desguace_id: int,
+    entorno_trabajo_id: int,
+    ids_modificados: Iterable[int] = (),
+    desde_id: int = 0,
+) -> int:
+    """
+    Sincroniza el índice tras una importación: reindexa las piezas modificadas e
+    indexa las insertadas (id > desde_id). Las borradas deben haberse quitado con
+    eliminar_referencias. Si el entorno aún no tiene índice (BD anterior a esta
+    tabla), lo reconstruye entero.
+    """
+    sin_indice = db.query(ReferenciaPieza.id).filter(
+        ReferenciaPieza.entorno_trabajo_id == entorno_trabajo_id
+    ).first() is None
+    if sin_indice:
+        return reindexar_base(db, base_desguace_id, entorno_trabajo_id)
+
+    total = reindexar_piezas(db, entorno_trabajo_id, ids_modificados)
+    total += indexar_piezas(db, entorno_trabajo_id, db.query(*_columnas_referencia()).filter(
+        PiezaDesguace.base_desguace_id == base_desguace_id,
+        PiezaDesguace.id > desde_id
+    ).yield_per(TAMANO_LOTE_INDICE))
+    return total
+
+
+def indexar_entornos_sin_referencias(engine) -> Dict[int, int]:
+    """
+    Indexa las bases cuyo entorno tiene piezas pero ningún token (la tabla se
+    desplegó después de su última importación). Idempotente: los entornos ya
+    indexados no se tocan. Un commit por base; si una falla se sigue con las
+    demás. Devuelve {entorno_id: tokens indexados}.
+    """
+    indexados = {}
+    with Session(bind=engine) as db:
+        pendientes = db.query(BaseDesguace.id, BaseDesguace.entorno_trabajo_id).filter(
+            exists().where(PiezaDesguace.base_desguace_id == BaseDesguace.id),
+            ~exists().where(ReferenciaPieza.entorno_trabajo_id == BaseDesguace.entorno_trabajo_id),
+        ).all()
+        for base_id, entorno_id in pendientes:
+            inicio = time.perf_counter()
+            try:
+                indexados[entorno_id] = reindexar_base(db, base_id, entorno_id)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error indexando referencias del entorno {entorno_id}: {e}")
+                continue
+            logger.info(
+                f"Índice de referencias del entorno {entorno_id} creado: "
+                f"{indexados[entorno_id]} tokens en {time.perf_counter() - inicio:.1f}s"
+            )
+    return indexados
+
+
+def select_piezas_por_referencia(
+    referencias: Union[str, Iterable[str]],
+    entorno_trabajo_id: Union[int, Iterable[int], Select, None] = None,
+    prefijo: bool = False,
+):
+    """
+    Select de pieza_id cuyas referencias coinciden (igualdad o, con prefijo=True,
+    empiezan por) con alguna de las dadas. Pensado para PiezaDesguace.id.in_(...).
+    entorno_trabajo_id puede ser un id, varios o un select de ids (subconsulta).
+    """
+    if isinstance(referencias, str):
+        referencias = [referencias]
+    tokens = set()
+    for referencia in referencias:
+        tokens |= tokens_referencia(referencia)
+
+    consulta = select(ReferenciaPieza.pieza_id)
+    if entorno_trabajo_id is not None:
+        if isinstance(entorno_trabajo_id, int):
+            consulta = consulta.where(ReferenciaPieza.entorno_trabajo_id == entorno_trabajo_id)
+        elif isinstance(entorno_trabajo_id, Select):
+            consulta = consulta.where(ReferenciaPieza.entorno_trabajo_id.in_(entorno_trabajo_id))
+        else:
+            consulta = consulta.where(ReferenciaPieza.entorno_trabajo_id.in_(list(entorno_trabajo_id)))
+
+    if not tokens:
+        return consulta.where(false())
+    if prefijo:
+        return consulta.where(or_(*[
+            and_(ReferenciaPieza.token >= token, ReferenciaPieza.token < token + _FIN_PREFIJO)
+            for token in tokens
+        ]))
+    return consulta.where(ReferenciaPieza.token.in_(tokens))
@@ -7,7 +7,9 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.database import SessionLocal
+from core.toen import get_gestor_toen
 from services.backup import BackupService
 
 # Configurar logging
@@ -50,6 +52,7 @@ def iniciar_scheduler():
     - Backup diario a las 3:00 AM
     - Importación CSV MotoCoche cada 30 minutos
     - Limpieza de ventas falsas cada 6 horas
+    - Comprobación/renovación del token TOEN
     """
     if scheduler.running:
         logger.info("Scheduler ya está corriendo")
@@ -89,6 +92,15 @@ def iniciar_scheduler():
         replace_existing=True
     )
     
+    # Renovación anticipada del token TOEN de Ecooparts (solo un worker la hace a la vez)
+    scheduler.add_job(
+        get_gestor_toen().comprobar,
+        IntervalTrigger(minutes=settings.toen_intervalo_comprobacion_minutos),
+        id="refresco_toen",
+        name="Renovación del token TOEN",
+        replace_existing=True
+    )
+    
     # Programar limpieza de ventas falsas cada 6 horas
     scheduler.add_job(
         ejecutar_limpieza_ventas_programada,
@@ -104,6 +116,7 @@ def iniciar_scheduler():
     logger.info("  - Importación CSV MotoCoche cada 30 minutos")
     logger.info("  - Stockeo automático todas las empresas cada 30 minutos")
     logger.info("  - Limpieza de ventas falsas cada 6 horas")
+    logger.info(f"  - Token TOEN comprobado cada {settings.toen_intervalo_comprobacion_minutos} minutos")
     
     # Listar jobs activos
     for job in scheduler.get_jobs():
@@ -118,7 +131,12 @@ def detener_scheduler():
 
 
 def obtener_estado_scheduler() -> dict:
-    """Obtener estado actual del scheduler"""
+    """
+    Obtener estado actual del scheduler.
+    Incluye la última ejecución de cada importación CSV (duración y si se
+    omitió por no haber cambios) y el resumen del último stockeo automático.
+    """
+    from services.csv_auto_import import obtener_estado_importaciones, obtener_resumen_stockeo
     jobs = []
     if scheduler.running:
         for job in scheduler.get_jobs():
@@ -131,7 +149,9 @@ def obtener_estado_scheduler() -> dict:
     
     return {
         "running": scheduler.running,
-        "jobs": jobs
+        "jobs": jobs,
+        "importaciones": obtener_estado_importaciones(),
+        "stockeo_automatico": obtener_resumen_stockeo()
     }
 
 
@@ -141,18 +161,24 @@ def forzar_backup_ahora():
     ejecutar_backup_programado()
 
 
-def forzar_importacion_csv_ahora():
-    """Ejecutar importación CSV de MotoCoche inmediatamente"""
+def forzar_importacion_csv_ahora(forzar: bool = True):
+    """
+    Ejecutar importación CSV de MotoCoche inmediatamente.
+    Con forzar=True se importa aunque el archivo no haya cambiado.
+    """
     from services.csv_auto_import import ejecutar_importacion_programada
     logger.info("Ejecutando importación CSV forzada...")
-    return ejecutar_importacion_programada()
+    return ejecutar_importacion_programada(forzar=forzar)
 
 
-def forzar_stockeo_automatico_ahora():
-    """Ejecutar stockeo automático de todas las empresas inmediatamente"""
+def forzar_stockeo_automatico_ahora(forzar: bool = True):
+    """
+    Ejecutar stockeo automático de todas las empresas inmediatamente.
+    Con forzar=True se importan también los CSV que no han cambiado.
+    """
     from services.csv_auto_import import ejecutar_stockeo_automatico
     logger.info("Ejecutando stockeo automático forzado...")
-    return ejecutar_stockeo_automatico()
+    return ejecutar_stockeo_automatico(forzar=forzar)
 
 
 def forzar_limpieza_ventas_ahora():
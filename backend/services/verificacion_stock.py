@@ -0,0 +1,131 @@
+"""
+Verificación de precios de stock contra Ecooparts
+
+Lógica compartida por /stock/verificar-masivo y por la cola de trabajos
+(services.cola_verificacion).
+"""
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.schemas.stock import CheckMasivoResultItem
+from core.proteccion_hosts import HostNoDisponible
+from core.scraper_factory import ScraperFactory
+from services.pricing import summarize
+from services.precio_sugerido import sugerir_precio_db, sugerir_precio_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Scraper global reutilizable (el token TOEN lo renueva core.toen en segundo plano)
+_ecooparts_scraper = None
+_ecooparts_lock = threading.Lock()
+
+# Caché de precios por OEM (evita búsquedas repetidas)
+_oem_cache = {}
+
+
+def get_ecooparts_scraper():
+    """Obtiene scraper de Ecooparts reutilizando sesión si es posible"""
+    global _ecooparts_scraper
+    
+    with _ecooparts_lock:
+        if _ecooparts_scraper is None:
+            logger.info("Creando nueva sesión de Ecooparts scraper...")
+            scraper = ScraperFactory.create_scraper("ecooparts")
+            if scraper.setup_session("1K0959653C"):
+                _ecooparts_scraper = scraper
+                logger.info("Sesión de Ecooparts creada correctamente")
+            else:
+                logger.error("No se pudo crear sesión de Ecooparts")
+    
+    return _ecooparts_scraper
+
+
+def procesar_item(item, scraper, umbral: float, piezas_minimas: int = 3, db: Session = None, entorno_trabajo_id: int = None, snapshot_precios=None):
+    """
+    Procesa un item de forma síncrona (para usar con ThreadPoolExecutor).
+    Devuelve None si no hay precios suficientes; lanza HostNoDisponible si
+    Ecooparts no se puede consultar ahora.
+    """
+    global _oem_cache
+    
+    try:
+        oem = item.ref_oem
+        
+        # Verificar caché primero
+        if oem in _oem_cache:
+            precios, precio_mercado = _oem_cache[oem]
+        else:
+            # Buscar precios en Ecooparts
+            precios = scraper.fetch_prices(oem, limit=50)
+            
+            if not precios or len(precios) < piezas_minimas:
+                _oem_cache[oem] = ([], 0)  # Cachear resultado vacío también
+                return None
+            
+            # Analizar precios
+            resumen = summarize(precios, remove_outliers=True)
+            precio_mercado = resumen.get('media', resumen.get('promedio', 0))
+            
+            # Guardar en caché
+            _oem_cache[oem] = (precios, precio_mercado)
+        
+        if not precios or len(precios) < piezas_minimas or precio_mercado <= 0:
+            return None
+        
+        # Calcular diferencia respecto al mercado
+        diferencia = ((item.precio - precio_mercado) / precio_mercado) * 100
+        
+        # Buscar precio sugerido basado en familia
+        # SOLO usa la configuración de precios de la empresa del usuario
+        precio_sugerido = None
+        familia = ""
+        
+        if item.tipo_pieza and (snapshot_precios or (db and entorno_trabajo_id)):
+            # Usar configuración de la empresa (si no tiene, devuelve None)
+            if snapshot_precios:
+                sugerencia = sugerir_precio_snapshot(snapshot_precios, item.tipo_pieza, precio_mercado)
+            else:
+                sugerencia = sugerir_precio_db(db, entorno_trabajo_id, item.tipo_pieza, precio_mercado)
+            
+            if sugerencia:
+                precio_sugerido = sugerencia.get("precio_sugerido")
+                familia = sugerencia.get("familia", "")
+        
+        # Determinar si es outlier:
+        # El precio sugerido es SIN IVA, el precio actual INCLUYE IVA (21%)
+        # Solo es outlier si el precio actual es significativamente diferente al sugerido+IVA
+        es_outlier = False
+        if precio_sugerido is not None:
+            precio_sugerido_con_iva = precio_sugerido * 1.21
+            # Tolerancia del 10% para evitar falsos positivos por redondeos
+            tolerancia = precio_sugerido_con_iva * 0.10
+            # Solo marcar como outlier si el precio actual está fuera del rango sugerido+IVA
+            if item.precio > precio_sugerido_con_iva + tolerancia:
+                es_outlier = True  # Precio actual muy alto
+            elif item.precio < precio_sugerido_con_iva - tolerancia:
+                es_outlier = True  # Precio actual muy bajo
+            # Si está dentro del rango (sugerido+IVA ± 10%), no es outlier
+        else:
+            # Sin precio sugerido, solo marcar si está MUY por encima del mercado
+            es_outlier = diferencia > umbral  # Solo outlier si está por encima
+        
+        return CheckMasivoResultItem(
+            ref_id=item.ref_id,
+            ref_oem=item.ref_oem,
+            tipo_pieza=item.tipo_pieza,
+            precio_actual=item.precio,
+            precio_mercado=precio_mercado,
+            precio_sugerido=precio_sugerido,
+            diferencia_porcentaje=diferencia,
+            precios_encontrados=len(precios),
+            es_outlier=es_outlier,
+            familia=familia,
+        )
+    except HostNoDisponible:
+        # Circuito abierto o sin turno: el item no se ha podido consultar (no es "sin datos")
+        raise
+    except Exception as e:
+        logger.warning(f"Error procesando {item.ref_oem}: {str(e)}")
+        return None
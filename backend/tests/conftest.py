@@ -52,6 +52,14 @@ def override_get_db():
         db.close()
 
 
+@pytest.fixture(autouse=True)
+def _protecciones_hosts_limpias():
+    """Los fallos de red de un test no abren circuitos en los siguientes"""
+    from core.proteccion_hosts import reiniciar_protecciones
+    reiniciar_protecciones()
+    yield
+
+
 @pytest.fixture(scope="function")
 def db_session() -> Generator:
     """
@@ -68,6 +76,9 @@ def db_session() -> Generator:
         session.close()
         # Limpiar tablas después del test
         Base.metadata.drop_all(bind=engine)
+        # Los snapshots de precios por entorno apuntan a datos de esta BD
+        from services.precio_sugerido import invalidar_snapshot_precios
+        invalidar_snapshot_precios()
 
 
 @pytest.fixture(scope="function")
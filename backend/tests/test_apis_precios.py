@@ -249,7 +249,7 @@ class TestBuscarPrecios:
     """Tests del endpoint principal de búsqueda de precios.
     Se mockean los scrapers para evitar llamadas externas."""
 
-    def _mock_scrape_platform(self, platform_id, referencia, cantidad):
+    def _mock_scrape_platform(self, platform_id, referencia, cantidad, usar_cache=True):
         """Helper: simula resultado de scraper"""
         return {
             "plataforma_id": platform_id,
@@ -270,7 +270,7 @@ class TestBuscarPrecios:
         assert resp.status_code in (401, 403)
 
     @pytest.mark.integration
-    @patch("app.routers.precios._scrape_platform")
+    @patch("app.routers.precios.scrape_platform")
     @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
     def test_buscar_todas_con_mock(self, mock_iam, mock_scrape, client, auth_headers_admin):
         """Busca precios en todas las plataformas con scrapers mockeados. Espera: 200 con referencia y resumen con media > 0."""
@@ -288,7 +288,7 @@ class TestBuscarPrecios:
         assert data["resumen"]["media"] > 0
 
     @pytest.mark.integration
-    @patch("app.routers.precios._scrape_platform")
+    @patch("app.routers.precios.scrape_platform")
     @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
     def test_buscar_plataforma_unica_mock(self, mock_iam, mock_scrape, client, auth_headers_admin):
         """Busca precios en una sola plataforma (ecooparts). Espera: 200 con plataforma = 'ecooparts'."""
@@ -313,7 +313,7 @@ class TestBuscarPrecios:
         assert resp.status_code == 400
 
     @pytest.mark.integration
-    @patch("app.routers.precios._scrape_platform")
+    @patch("app.routers.precios.scrape_platform")
     @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
     def test_buscar_guarda_en_bd(self, mock_iam, mock_scrape, client, auth_headers_admin, db_session):
         """Verifica que la búsqueda persiste un registro en tabla Busqueda. Espera: count no disminuye."""
@@ -329,11 +329,11 @@ class TestBuscarPrecios:
         assert count_despues >= count_antes  # al menos no falló
 
     @pytest.mark.integration
-    @patch("app.routers.precios._scrape_platform")
+    @patch("app.routers.precios.scrape_platform")
     @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
     def test_buscar_incluye_inventario(self, mock_iam, mock_scrape, client, auth_headers_admin, piezas_desguace):
         """Busca precios con piezas en stock coincidentes. Espera: 200 y campo inventario con en_stock >= 0."""
-        mock_scrape.side_effect = lambda pid, ref, cant: {
+        mock_scrape.side_effect = lambda pid, ref, cant, usar_cache=True: {
             "plataforma_id": pid,
             "plataforma_nombre": pid.capitalize(),
             "precios": [100.0, 150.0, 200.0],
@@ -352,7 +352,7 @@ class TestBuscarPrecios:
             assert data["inventario"]["en_stock"] >= 0
 
     @pytest.mark.integration
-    @patch("app.routers.precios._scrape_platform")
+    @patch("app.routers.precios.scrape_platform")
     @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
     def test_buscar_resultados_por_plataforma(self, mock_iam, mock_scrape, client, auth_headers_admin):
         """Verifica desglose de resultados por plataforma. Espera: clave resultados_por_plataforma con plataforma_id y cantidad_precios."""
@@ -371,7 +371,7 @@ class TestBuscarPrecios:
             assert "cantidad_precios" in plat
 
     @pytest.mark.integration
-    @patch("app.routers.precios._scrape_platform", return_value={
+    @patch("app.routers.precios.scrape_platform", return_value={
         "plataforma_id": "ecooparts",
         "plataforma_nombre": "Ecooparts",
         "precios": [],
@@ -419,6 +419,106 @@ class TestBuscarPrecios:
         assert resp.status_code == 400
 
 
+def _eventos_sse(cuerpo):
+    """Convierte un cuerpo text/event-stream en [(evento, datos)]"""
+    import json
+    eventos = []
+    for bloque in cuerpo.strip().split("\n\n"):
+        lineas = dict(linea.split(": ", 1) for linea in bloque.split("\n") if ": " in linea)
+        eventos.append((lineas["event"], json.loads(lineas["data"])))
+    return eventos
+
+
+class TestBuscarPreciosStream:
+    """Tests de /api/v1/precios/buscar/stream (resultados parciales por SSE)"""
+
+    def _scrape(self, platform_id, referencia, cantidad, usar_cache=True):
+        import time
+        if platform_id == "ecooparts":
+            time.sleep(0.3)  # La plataforma lenta llega la última
+        return {
+            "plataforma_id": platform_id,
+            "plataforma_nombre": platform_id.capitalize(),
+            "precios": [100.0, 150.0, 200.0],
+            "imagenes": [],
+            "tipo_pieza": "MOTOR ARRANQUE" if platform_id == "ecooparts" else None,
+            "error": None,
+        }
+
+    def _stream(self, client, headers, **json):
+        with client.stream("POST", "/api/v1/precios/buscar/stream", json=json, headers=headers) as resp:
+            assert resp.status_code == 200
+            return _eventos_sse("".join(resp.iter_text()))
+
+    @pytest.mark.integration
+    @patch("app.routers.precios.buscar_oem_relevantes", return_value=[{"referencia": "OEM-X", "total_en_venta": 4}])
+    @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=["IAM1", "IAM2"])
+    @patch("app.routers.precios.scrape_platform")
+    def test_eventos_parciales_y_resumen_igual_que_buscar(
+        self, mock_scrape, mock_iam, mock_oem, client, auth_headers_admin, piezas_desguace, db_session
+    ):
+        """Cada plataforma llega como evento en cuanto termina y el resumen final coincide con /buscar."""
+        from app.models.busqueda import Busqueda
+        from core.scraper_factory import ScraperFactory
+
+        mock_scrape.side_effect = self._scrape
+        eventos = self._stream(client, auth_headers_admin, referencia="OEM-001", plataforma="todas")
+        nombres = [e for e, _ in eventos]
+
+        plataformas = [d["plataforma_id"] for e, d in eventos if e == "plataforma"]
+        assert sorted(plataformas) == sorted(ScraperFactory.get_available_platforms())
+        assert plataformas[-1] == "ecooparts"
+        # Inventario, IAM y OEM no esperan a la plataforma lenta
+        ultima_plataforma = len(nombres) - 1 - nombres[::-1].index("plataforma")
+        assert nombres.index("iam") < ultima_plataforma
+        assert nombres.index("inventario") < ultima_plataforma
+        assert dict(eventos)["iam"]["referencias_iam_texto"] == "IAM1/IAM2"
+        assert dict(eventos)["inventario"]["inventario"] is not None
+        assert nombres.index("precios") < nombres.index("sugerencia")
+        assert nombres[-1] == "resumen"
+
+        resumen = dict(eventos)["resumen"]
+        esperado = client.post(
+            "/api/v1/precios/buscar",
+            json={"referencia": "OEM-001", "plataforma": "todas"},
+            headers=auth_headers_admin,
+        ).json()
+        for campo in ("precios", "resumen", "tipo_pieza", "inventario", "referencias_iam_texto",
+                      "oem_equivalentes_texto", "plataformas_consultadas", "plataformas_con_resultados"):
+            assert resumen[campo] == esperado[campo]
+        assert db_session.query(Busqueda).filter_by(referencia="OEM-001").count() == 2
+
+    @pytest.mark.integration
+    @patch("app.routers.precios.buscar_oem_relevantes", return_value=[])
+    @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
+    @patch("app.routers.precios.scrape_platform", return_value={
+        "plataforma_id": "ecooparts",
+        "plataforma_nombre": "Ecooparts",
+        "precios": [],
+        "imagenes": [],
+        "tipo_pieza": None,
+        "error": "timeout",
+    })
+    def test_sin_precios_evento_error(self, mock_scrape, mock_iam, mock_oem, client, auth_headers_admin):
+        """Sin precios en ninguna plataforma el stream termina con un evento de error 404."""
+        eventos = self._stream(client, auth_headers_admin, referencia="NOEXISTE", plataforma="ecooparts")
+        assert eventos[-1] == ("error", {
+            "status_code": 404,
+            "detail": "No se encontraron precios para NOEXISTE en ninguna plataforma",
+        })
+        assert "resumen" not in [e for e, _ in eventos]
+
+    @pytest.mark.integration
+    def test_plataforma_invalida_antes_del_stream(self, client, auth_headers_admin):
+        """Los errores de validación siguen siendo respuestas HTTP normales. Espera: 400."""
+        resp = client.post(
+            "/api/v1/precios/buscar/stream",
+            json={"referencia": "TEST", "plataforma": "inventada_xyz"},
+            headers=auth_headers_admin,
+        )
+        assert resp.status_code == 400
+
+
 # ============================================================
 # SECCIÓN 6: Tests de endpoint /api/v1/stock/verificar (legacy)
 # ============================================================
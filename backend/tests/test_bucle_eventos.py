@@ -0,0 +1,110 @@
+"""
+Tests para el trabajo bloqueante fuera del event loop (utils/monitor_bucle.py)
+"""
+import pytest
+import os
+import sys
+import ast
+import time
+import asyncio
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUTERS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "routers")
+
+# Llamadas que bloquean el event loop si se hacen directamente en un handler async
+BLOQUEANTES = {("db", None), ("requests", None), ("time", "sleep"), ("subprocess", None)}
+
+
+def _llamadas_bloqueantes(funcion: ast.AsyncFunctionDef):
+    """Llamadas bloqueantes directas (no pasadas a run_in_threadpool) dentro de la función"""
+    encontradas = []
+    for nodo in ast.walk(funcion):
+        if not isinstance(nodo, ast.Call) or not isinstance(nodo.func, ast.Attribute):
+            continue
+        objeto = nodo.func.value
+        if isinstance(objeto, ast.Name) and ((objeto.id, None) in BLOQUEANTES or (objeto.id, nodo.func.attr) in BLOQUEANTES):
+            encontradas.append(f"{objeto.id}.{nodo.func.attr} (línea {nodo.lineno})")
+    return encontradas
+
+
+class TestMonitorBucle:
+    """Tests del monitor de retraso del event loop"""
+
+    @pytest.mark.unit
+    def test_detecta_bloqueo_y_su_origen(self):
+        from utils.monitor_bucle import MonitorBucle
+
+        monitor = MonitorBucle(intervalo=0.05, umbral_ms=100)
+
+        async def escenario():
+            monitor.iniciar()
+            await asyncio.sleep(0.1)
+            time.sleep(0.3)  # bloquea el bucle
+            await asyncio.sleep(0.1)
+            await monitor.detener()
+
+        asyncio.run(escenario())
+
+        assert monitor.bloqueos == 1
+        assert monitor.max_retraso_ms >= 200
+        assert "test_bucle_eventos.py" in monitor.ultimos_bloqueos[0]["origen"]
+
+    @pytest.mark.integration
+    def test_health_expone_el_monitor(self, client):
+        r = client.get("/api/v1/health")
+
+        assert r.status_code == 200
+        assert r.json()["event_loop"]["activo"] is True
+
+
+class TestHandlersNoBloquean:
+    """Regresión: ningún handler debe bloquear el event loop"""
+
+    @pytest.mark.unit
+    def test_handlers_async_sin_llamadas_bloqueantes(self):
+        errores = []
+        for archivo in sorted(os.listdir(ROUTERS_DIR)):
+            if not archivo.endswith(".py"):
+                continue
+            with open(os.path.join(ROUTERS_DIR, archivo), encoding="utf-8-sig") as f:
+                arbol = ast.parse(f.read())
+            for nodo in ast.walk(arbol):
+                if isinstance(nodo, ast.AsyncFunctionDef):
+                    for llamada in _llamadas_bloqueantes(nodo):
+                        errores.append(f"{archivo}:{nodo.name} -> {llamada}")
+
+        assert errores == [], "Usar def o run_in_threadpool:\n" + "\n".join(errores)
+
+    @pytest.mark.integration
+    @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
+    @patch("app.routers.precios.scrape_platform")
+    def test_busqueda_lenta_no_congela_el_bucle(self, mock_scrape, mock_iam, client, auth_headers_admin, monkeypatch):
+        from utils.monitor_bucle import get_monitor_bucle
+
+        def scrape_lento(platform_id, referencia, cantidad, usar_cache=True):
+            time.sleep(0.5)
+            return {
+                "plataforma_id": platform_id,
+                "plataforma_nombre": platform_id,
+                "precios": [100.0, 150.0],
+                "imagenes": [],
+                "tipo_pieza": None,
+                "error": None,
+            }
+
+        mock_scrape.side_effect = scrape_lento
+        monitor = get_monitor_bucle()
+        # monkeypatch restaura los valores del monitor (es del proceso) al terminar
+        monkeypatch.setattr(monitor, "intervalo", 0.05)
+        monkeypatch.setattr(monitor, "umbral_ms", 150)
+
+        r = client.post(
+            "/api/v1/precios/buscar",
+            json={"referencia": "TEST123", "plataforma": "ecooparts"},
+            headers=auth_headers_admin,
+        )
+
+        assert r.status_code == 200
+        assert monitor.bloqueos == 0, monitor.ultimos_bloqueos
@@ -0,0 +1,302 @@
+"""
+Tests para la búsqueda completa por fases (app/services/busqueda_completa.py)
+y su modo streaming en /precios/busqueda-completa
+"""
+import pytest
+import os
+import sys
+import json
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Desguace:
+    """Desguace competidor simulado que tarda `espera` segundos por referencia"""
+
+    def __init__(self, id, espera=0.0):
+        self.id = id
+        self.nombre = id.capitalize()
+        self.espera = espera
+
+    def _pieza(self, referencia):
+        return {"id": f"{self.id}-{referencia}", "oem": referencia, "desguace": self.nombre, "desguace_id": self.id}
+
+    def buscar(self, referencia):
+        time.sleep(self.espera)
+        return [self._pieza(referencia)]
+
+    async def buscar_async(self, referencia):
+        import asyncio
+        await asyncio.sleep(self.espera)
+        return [self._pieza(referencia)]
+
+
+@pytest.fixture
+def fuentes(monkeypatch):
+    """OEM, IAM y desguaces simulados: 'lento' e IAM tardan, 'rapido' no"""
+    from app.services import busqueda_completa as bc
+
+    liberar_iam = threading.Event()
+
+    def iam(referencias):
+        liberar_iam.wait(2)
+        return [{"iam_ref": f"IAM-{r}"} for r in referencias]
+
+    monkeypatch.setattr(bc, "buscar_oem_equivalentes", lambda ref: ["OEM-002"])
+    monkeypatch.setattr(bc, "_buscar_iam_todas_refs", iam)
+    monkeypatch.setattr(
+        bc.DesguaceFactory, "crear_todos", staticmethod(lambda: [_Desguace("lento", 0.3), _Desguace("rapido")])
+    )
+    return liberar_iam
+
+
+class TestBusquedaCompleta:
+    """Tests del orquestador"""
+
+    @pytest.mark.unit
+    def test_eventos_en_orden_de_llegada(self, fuentes, db_session, piezas_desguace):
+        from app.services.busqueda_completa import busqueda_completa
+
+        eventos = []
+
+        def al_progresar(evento, datos):
+            eventos.append((evento, datos))
+            if evento == "desguaces":
+                fuentes.set()  # IAM termina el último
+
+        res = busqueda_completa("OEM-001", db_session, piezas_desguace[0].base_desguace.entorno_trabajo_id, al_progresar)
+        nombres = [e for e, _ in eventos]
+
+        assert nombres[:3] == ["fase", "oem_equivalentes", "fase"]
+        assert nombres[-1] == "iam"
+        # El desguace rápido llega antes que el lento y antes que el total de desguaces
+        desguaces = [d["desguace_id"] for e, d in eventos if e == "desguace"]
+        assert desguaces == ["rapido", "lento"]
+        assert nombres.index("stock_propio") < nombres.index("desguaces")
+        assert dict(eventos)["desguaces"]["total"] == 4
+        assert dict(eventos)["iam"]["duracion_ms"] >= 300
+        assert set(res.tiempos_ms) == {"oem_equivalentes", "stock_propio", "otros_entornos", "iam", "desguaces", "total"}
+        assert res.total_iam == 2 and res.total_desguaces == 4
+
+    @pytest.mark.unit
+    def test_cancelar_no_espera_a_las_fuentes_lentas(self, fuentes, db_session, usuario_admin):
+        from app.services.busqueda_completa import busqueda_completa
+
+        cancelar = threading.Event()
+
+        def al_progresar(evento, datos):
+            if evento == "desguaces":
+                cancelar.set()
+
+        inicio = time.monotonic()
+        res = busqueda_completa("OEM-001", db_session, usuario_admin.entorno_trabajo_id, al_progresar, cancelar)
+
+        assert time.monotonic() - inicio < 1.5
+        assert res.total_desguaces == 4
+        assert res.piezas_nuevas_iam == []
+        fuentes.set()
+
+
+class TestBusquedaCompletaStream:
+    """Tests de /precios/busqueda-completa?formato=sse|ndjson"""
+
+    @pytest.mark.integration
+    def test_ndjson_y_json_dan_el_mismo_resultado(self, fuentes, client, auth_headers_admin):
+        fuentes.set()
+        with client.stream(
+            "POST", "/api/v1/precios/busqueda-completa?formato=ndjson",
+            json={"referencia": "OEM-001"}, headers=auth_headers_admin,
+        ) as r:
+            assert r.headers["content-type"].startswith("application/x-ndjson")
+            mensajes = [json.loads(linea) for linea in r.iter_lines() if linea]
+
+        eventos = [m["evento"] for m in mensajes]
+        assert eventos[0] == "fase" and eventos[-1] == "fin"
+        assert {"oem_equivalentes", "stock_propio", "otros_entornos", "iam", "desguace", "desguaces", "vendidas"} <= set(eventos)
+        fin = mensajes[-1]["datos"]
+        assert "vendidas" in fin["tiempos_ms"]
+
+        esperado = client.post(
+            "/api/v1/precios/busqueda-completa", json={"referencia": "OEM-001"}, headers=auth_headers_admin
+        ).json()
+        for campo in ("oem_equivalentes", "total_stock", "total_iam", "total_desguaces", "piezas_vendidas", "errores"):
+            assert fin[campo] == esperado[campo]
+
+    @pytest.mark.integration
+    def test_sse_y_formato_invalido(self, fuentes, client, auth_headers_admin):
+        fuentes.set()
+        with client.stream(
+            "POST", "/api/v1/precios/busqueda-completa?formato=sse",
+            json={"referencia": "OEM-001"}, headers=auth_headers_admin,
+        ) as r:
+            cuerpo = "".join(r.iter_text())
+        assert "event: desguace\n" in cuerpo
+        assert cuerpo.rstrip().split("\n\n")[-1].startswith("event: fin")
+
+        r = client.post(
+            "/api/v1/precios/busqueda-completa?formato=xml", json={"referencia": "X"}, headers=auth_headers_admin
+        )
+        assert r.status_code == 422
+
+
+@pytest.fixture
+def bd_fichero(tmp_path):
+    """BD SQLite en fichero (como en producción) con 4 entornos y piezas indexadas"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base
+    from app.models.busqueda import EntornoTrabajo, BaseDesguace, PiezaDesguace
+    from services.referencias_index import reindexar_base
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'busqueda.db'}", connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    Base.metadata.create_all(bind=engine)
+    nueva_sesion = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    with nueva_sesion() as db:
+        for n in range(4):
+            entorno = EntornoTrabajo(nombre=f"Desguace {n}", activo=True)
+            db.add(entorno)
+            db.flush()
+            base = BaseDesguace(entorno_trabajo_id=entorno.id, nombre_archivo="stock.csv", total_piezas=20)
+            db.add(base)
+            db.flush()
+            db.add_all([
+                PiezaDesguace(base_desguace_id=base.id, refid=f"{n}-{i}", oem="OEM-001" if i < 5 else f"OTRO-{i}")
+                for i in range(20)
+            ])
+            db.flush()
+            reindexar_base(db, base.id, entorno.id)
+        db.commit()
+    yield nueva_sesion
+    engine.dispose()
+
+
+class TestSesionesPorRama:
+    """La Fase 2 no comparte la Session del request entre hilos"""
+
+    @pytest.mark.unit
+    def test_cada_rama_de_bd_usa_su_propia_sesion(self, fuentes, db_session, monkeypatch):
+        from app.services import busqueda_completa as bc
+
+        usadas = []
+
+        def registrar(sesion, entorno_trabajo_id, referencias):
+            usadas.append((sesion, threading.get_ident()))
+            return []
+
+        monkeypatch.setattr(bc, "_buscar_stock_propio", registrar)
+        monkeypatch.setattr(bc, "_buscar_stock_otros_entornos", registrar)
+        fuentes.set()
+        bc.busqueda_completa("OEM-001", db_session, 1)
+
+        assert len(usadas) == 2
+        (s1, hilo1), (s2, hilo2) = usadas
+        assert s1 is not s2 and db_session not in (s1, s2)
+        assert threading.get_ident() not in (hilo1, hilo2)
+
+    @pytest.mark.unit
+    def test_busquedas_simultaneas_sobre_sqlite(self, fuentes, bd_fichero):
+        """Varias búsquedas completas a la vez: stock de otros entornos junto a los scrapers"""
+        from app.services.busqueda_completa import busqueda_completa
+
+        fuentes.set()
+        resultados, fallos = [], []
+
+        def buscar(entorno_id):
+            try:
+                with bd_fichero() as db:
+                    for _ in range(3):
+                        resultados.append((entorno_id, busqueda_completa("OEM-001", db, entorno_id)))
+            except Exception as e:
+                fallos.append(e)
+
+        hilos = [threading.Thread(target=buscar, args=(1 + i % 4,)) for i in range(8)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join(30)
+
+        assert fallos == []
+        assert len(resultados) == 24
+        for entorno_id, res in resultados:
+            assert res.errores == {}
+            assert res.total_stock == 5
+            assert res.total_otros_entornos == 15
+            assert {p["fuente"] for p in res.stock_otros_entornos} == {
+                f"entorno_{e}" for e in range(1, 5) if e != entorno_id
+            }
+
+
+def _entorno_con_stock(db, nombre, oems, **campos):
+    from app.models.busqueda import EntornoTrabajo, BaseDesguace, PiezaDesguace
+    from services.referencias_index import reindexar_base
+
+    entorno = EntornoTrabajo(nombre=nombre, activo=campos.pop("activo", True), **campos)
+    db.add(entorno)
+    db.flush()
+    base = BaseDesguace(entorno_trabajo_id=entorno.id, nombre_archivo="stock.csv", total_piezas=len(oems))
+    db.add(base)
+    db.flush()
+    db.add_all([PiezaDesguace(base_desguace_id=base.id, refid=f"{nombre}-{i}", oem=oem) for i, oem in enumerate(oems)])
+    db.flush()
+    reindexar_base(db, base.id, entorno.id)
+    db.commit()
+    return entorno
+
+
+class TestStockCompartido:
+    """Búsqueda cruzada en el stock de otros entornos"""
+
+    @pytest.mark.unit
+    def test_agrupa_por_entorno_y_respeta_flags(self, db_session):
+        from app.services.busqueda_completa import buscar_stock_compartido
+
+        oems = ["1K0-615.301", "1K0615301AA", "OTRA"]
+        propio = _entorno_con_stock(db_session, "Propio", oems)
+        _entorno_con_stock(db_session, "Beta", oems)
+        _entorno_con_stock(db_session, "Alfa", oems)
+        _entorno_con_stock(db_session, "Cerrado", oems, activo=False)
+        _entorno_con_stock(db_session, "Sin inventario", oems, modulo_inventario_piezas=False)
+        _entorno_con_stock(db_session, "Admin", oems)
+
+        grupos = buscar_stock_compartido(db_session, propio.id, ["1k0615301", "1K0 615 301 AA"])
+
+        assert [(g["entorno_nombre"], g["total"]) for g in grupos] == [("Alfa", 2), ("Beta", 2)]
+        pieza = grupos[0]["piezas"][0]
+        assert pieza["oem"] == "1K0-615.301"
+        assert pieza["fuente"] == f"entorno_{grupos[0]['entorno_id']}"
+        assert pieza["fuente_nombre"] == "Alfa"
+
+    @pytest.mark.unit
+    def test_una_consulta_para_todos_los_entornos(self, db_session, monkeypatch):
+        from sqlalchemy import event
+        from app.services import busqueda_completa as bc
+
+        propio_id = _entorno_con_stock(db_session, "Propio", ["X1"]).id
+        consultas = []
+
+        def contar(conn, cursor, sentencia, *args):
+            consultas.append(sentencia)
+
+        engine = db_session.get_bind()
+        creados = 0
+        for total in (2, 10):
+            while creados < total:
+                _entorno_con_stock(db_session, f"Entorno {creados}", ["X1", "X1", "Y2"])
+                creados += 1
+            consultas.clear()
+            event.listen(engine, "before_cursor_execute", contar)
+            try:
+                piezas = bc._buscar_stock_otros_entornos(db_session, propio_id, ["X1"])
+            finally:
+                event.remove(engine, "before_cursor_execute", contar)
+            # Una consulta, con 2 entornos o con 10
+            assert len(consultas) == 1
+            assert len(piezas) == 2 * total
+
+        monkeypatch.setattr(bc, "LIMITE_PIEZAS_POR_ENTORNO", 1)
+        grupos = bc.buscar_stock_compartido(db_session, propio_id, ["X1"])
+        assert len(grupos) == 10 and all(g["total"] == 1 for g in grupos)
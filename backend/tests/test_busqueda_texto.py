@@ -0,0 +1,106 @@
+"""
+Tests para el índice de texto de stock y ventas (services/busqueda_texto.py)
+"""
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _buscar(db_session, modelo, texto):
+    from services.busqueda_texto import aplicar_busqueda_texto
+    query, orden = aplicar_busqueda_texto(db_session, db_session.query(modelo), modelo, texto)
+    return [p.refid for p in query.order_by(*orden).all()]
+
+
+class TestIndiceTexto:
+    """Tests de sincronización del índice FTS con la tabla"""
+
+    @pytest.mark.unit
+    def test_terminos_busqueda(self):
+        from services.busqueda_texto import terminos_busqueda
+        assert terminos_busqueda(" 1K0-615 Faro_izq ") == ["1k0", "615", "faro", "izq"]
+        assert terminos_busqueda('"*') == []
+
+    @pytest.mark.integration
+    def test_insercion_actualizacion_y_borrado(self, db_session, piezas_desguace, base_desguace_ejemplo):
+        from app.models.busqueda import PiezaDesguace
+        assert _buscar(db_session, PiezaDesguace, "oem 003") == ["REF-003"]
+        assert len(_buscar(db_session, PiezaDesguace, "pieza tes")) == 5
+
+        # Sentencias en bloque (como los importadores) también actualizan el índice
+        db_session.bulk_insert_mappings(PiezaDesguace, [
+            {"base_desguace_id": base_desguace_ejemplo.id, "refid": "NUEVA-1", "articulo": "Alternador Bosch"},
+        ])
+        db_session.query(PiezaDesguace).filter_by(refid="REF-001").update({"articulo": "Motor de arranque"})
+        db_session.query(PiezaDesguace).filter_by(refid="REF-002").delete()
+        db_session.commit()
+
+        assert _buscar(db_session, PiezaDesguace, "bosch") == ["NUEVA-1"]
+        assert _buscar(db_session, PiezaDesguace, "arranq") == ["REF-001"]
+        assert _buscar(db_session, PiezaDesguace, "oem-002") == []
+        assert len(_buscar(db_session, PiezaDesguace, "pieza")) == 3
+
+    @pytest.mark.integration
+    def test_instalar_en_bd_existente(self, tmp_path):
+        """instalar_indices_texto crea y rellena el índice en una BD sin él"""
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        from app.database import Base
+        from app.models.busqueda import PiezaVendida
+        from services.busqueda_texto import instalar_indices_texto
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'antigua.db'}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            # Simular una BD anterior al índice: sin tabla FTS ni triggers
+            for sufijo in ("_ai", "_ad", "_au"):
+                conn.execute(text(f"DROP TRIGGER piezas_vendidas_fts{sufijo}"))
+            conn.execute(text("DROP TABLE piezas_vendidas_fts"))
+            conn.execute(text("INSERT INTO piezas_vendidas (refid, articulo) VALUES ('V1', 'Faro xenon')"))
+
+        creados = instalar_indices_texto(engine)
+        assert creados["piezas_vendidas"] is True
+        assert instalar_indices_texto(engine)["piezas_vendidas"] is False
+
+        db = sessionmaker(bind=engine)()
+        try:
+            assert _buscar(db, PiezaVendida, "xen") == ["V1"]
+        finally:
+            db.close()
+            engine.dispose()
+
+
+class TestListadosConIndice:
+    """Tests de /desguace/stock y /desguace/ventas con búsqueda"""
+
+    @pytest.mark.api
+    def test_stock_busqueda_y_usuario_fichaje(self, client, db_session, piezas_desguace, usuario_admin, auth_headers_admin):
+        from app.models.busqueda import PiezaDesguace
+        pieza = db_session.query(PiezaDesguace).filter_by(refid="REF-004").one()
+        pieza.usuario_fichaje_id = usuario_admin.id
+        db_session.commit()
+
+        r = client.get("/api/v1/desguace/stock?busqueda=OEM-002", headers=auth_headers_admin)
+        assert r.status_code == 200
+        assert [p["refid"] for p in r.json()["piezas"]] == ["REF-002"]
+        assert r.json()["total"] == 1
+
+        r = client.get("/api/v1/desguace/stock?busqueda=Admin Test", headers=auth_headers_admin)
+        assert [p["refid"] for p in r.json()["piezas"]] == ["REF-004"]
+
+    @pytest.mark.api
+    def test_ventas_busqueda(self, client, db_session, entorno_trabajo, auth_headers_admin):
+        from app.models.busqueda import PiezaVendida
+        db_session.add_all([
+            PiezaVendida(entorno_trabajo_id=entorno_trabajo.id, refid="V1", articulo="Faro delantero", precio=10),
+            PiezaVendida(entorno_trabajo_id=entorno_trabajo.id, refid="V2", articulo="Piloto trasero", precio=20),
+            PiezaVendida(entorno_trabajo_id=entorno_trabajo.id + 1, refid="V3", articulo="Faro", precio=30),
+        ])
+        db_session.commit()
+
+        r = client.get("/api/v1/desguace/ventas?busqueda=faro", headers=auth_headers_admin)
+        assert r.status_code == 200
+        assert [v["refid"] for v in r.json()["ventas"]] == ["V1"]
+        assert r.json()["valor_total"] == 10
@@ -0,0 +1,105 @@
+"""
+Tests para la caché de resultados de scraping (core/cache_precios.py)
+"""
+import pytest
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _resultado(plataforma, precios=(100.0, 120.0), error=None):
+    return {
+        "plataforma_id": plataforma,
+        "plataforma_nombre": plataforma.capitalize(),
+        "precios": list(precios),
+        "imagenes": [],
+        "tipo_pieza": "FARO",
+        "error": error,
+    }
+
+
+class TestCacheMemoria:
+    """Tests del backend LRU en memoria"""
+
+    @pytest.mark.unit
+    def test_clave_normalizada(self):
+        from core.cache_precios import clave_cache
+        assert clave_cache("ebay", " 1k0-615.301 ", 20) == clave_cache("ebay", "1K0615301", 20)
+        assert clave_cache("ebay", "1K0615301", 20) != clave_cache("ebay", "1K0615301", 5)
+
+    @pytest.mark.unit
+    def test_lru_y_caducidad(self, monkeypatch):
+        from core import cache_precios
+        cache = cache_precios.CacheMemoria(max_entradas=2)
+        cache.guardar("a", {"v": 1}, ttl=60)
+        cache.guardar("b", {"v": 2}, ttl=60)
+        assert cache.obtener("a") == {"v": 1}  # "a" pasa a ser la más reciente
+        cache.guardar("c", {"v": 3}, ttl=60)
+        assert cache.obtener("b") is None
+        assert cache.tamano() == 2
+
+        ahora = cache_precios.time.monotonic()
+        monkeypatch.setattr(cache_precios.time, "monotonic", lambda: ahora + 61)
+        assert cache.obtener("a") is None
+
+    @pytest.mark.unit
+    def test_estadisticas_y_errores_no_cacheados(self):
+        from core.cache_precios import CachePrecios, CacheMemoria
+        cache = CachePrecios(CacheMemoria(), ttl=60)
+        assert cache.obtener("ebay", "REF", 20) is None
+        cache.guardar("ebay", "REF", 20, _resultado("ebay"))
+        cache.guardar("opisto", "REF", 20, _resultado("opisto", precios=(), error="timeout"))
+        assert cache.obtener("ebay", "ref", 20)["precios"] == [100.0, 120.0]
+        assert cache.obtener("opisto", "REF", 20) is None
+
+        stats = cache.estadisticas()
+        assert (stats["aciertos"], stats["fallos"], stats["guardados"]) == (1, 2, 1)
+        assert stats["entradas"] == 1
+
+    @pytest.mark.unit
+    def test_redis_caido_no_rompe_busqueda(self):
+        from core.cache_precios import CachePrecios, CacheRedis
+        cache = CachePrecios(CacheRedis("redis://127.0.0.1:1/0"), ttl=60)
+        assert cache.obtener("ebay", "REF", 20) is None
+        cache.guardar("ebay", "REF", 20, _resultado("ebay"))
+        assert cache.estadisticas()["errores"] == 2
+
+
+class TestBuscarConCache:
+    """Tests de /precios/buscar con la caché"""
+
+    @pytest.mark.integration
+    @patch("app.routers.precios.obtener_primera_referencia_por_proveedor", return_value=[])
+    def test_segunda_busqueda_desde_cache(self, mock_iam, client, auth_headers_admin, monkeypatch):
+        from core.cache_precios import CachePrecios, CacheMemoria
+        from app.routers import precios
+        from app.services import precios_plataformas
+        cache = CachePrecios(CacheMemoria(), ttl=60)
+        monkeypatch.setattr(precios_plataformas, "get_cache_precios", lambda: cache)
+        monkeypatch.setattr(precios, "get_cache_precios", lambda: cache)
+        llamadas = []
+
+        def scraper_falso(platform_id, referencia, cantidad):
+            llamadas.append(platform_id)
+            return _resultado(platform_id)
+        monkeypatch.setattr(precios_plataformas, "_scrape_platform_sin_cache", scraper_falso)
+
+        cuerpo = {"referencia": "1K0-615-301", "plataforma": "ecooparts", "cantidad": 5}
+        r = client.post("/api/v1/precios/buscar", json=cuerpo, headers=auth_headers_admin)
+        assert r.status_code == 200
+        assert r.json()["resultados_por_plataforma"][0]["desde_cache"] is False
+
+        cuerpo["referencia"] = "1k0615301"
+        r = client.post("/api/v1/precios/buscar", json=cuerpo, headers=auth_headers_admin)
+        assert r.json()["resultados_por_plataforma"][0]["desde_cache"] is True
+        assert llamadas == ["ecooparts"]
+
+        r = client.post("/api/v1/precios/buscar", json={**cuerpo, "sin_cache": True}, headers=auth_headers_admin)
+        assert r.json()["resultados_por_plataforma"][0]["desde_cache"] is False
+        assert llamadas == ["ecooparts", "ecooparts"]
+
+        r = client.get("/api/v1/precios/cache", headers=auth_headers_admin)
+        assert r.status_code == 200
+        assert r.json()["aciertos"] == 1
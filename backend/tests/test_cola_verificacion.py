@@ -0,0 +1,162 @@
+"""
+Tests para la cola persistente de verificaciones masivas (services/cola_verificacion.py)
+"""
+import pytest
+import os
+import sys
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _request(n):
+    from app.schemas.stock import CheckStockMasivoRequest
+    return CheckStockMasivoRequest(items=[
+        {"ref_id": str(i), "ref_oem": f"OEM{i}", "tipo_pieza": "FARO", "precio": 100.0 + i}
+        for i in range(n)
+    ])
+
+
+@pytest.fixture
+def cola(db_session, monkeypatch):
+    """Cola sobre la BD de tests con Ecooparts simulado"""
+    from sqlalchemy.orm import sessionmaker
+    from app.schemas.stock import CheckMasivoResultItem
+    from services import cola_verificacion
+
+    consultados = []
+
+    def procesar_item(item, scraper, umbral, piezas_minimas=3, snapshot_precios=None, **kwargs):
+        consultados.append(item.ref_oem)
+        if item.ref_oem == "OEM1":
+            return None  # Sin precios suficientes
+        return CheckMasivoResultItem(
+            ref_id=item.ref_id, ref_oem=item.ref_oem, tipo_pieza=item.tipo_pieza,
+            precio_actual=item.precio, precio_mercado=50.0, diferencia_porcentaje=100.0,
+            precios_encontrados=5, es_outlier=True,
+        )
+
+    monkeypatch.setattr(cola_verificacion, "get_ecooparts_scraper", lambda: object())
+    monkeypatch.setattr(cola_verificacion, "procesar_item", procesar_item)
+    instancia = cola_verificacion.ColaVerificacion(sessionmaker(bind=db_session.get_bind()), workers=1)
+    instancia.consultados = consultados
+    return instancia
+
+
+class TestColaVerificacion:
+    """Tests del procesamiento de trabajos"""
+
+    @pytest.mark.unit
+    def test_procesa_trabajo_y_guarda_resultados(self, cola, db_session, usuario_admin):
+        from services.cola_verificacion import crear_trabajo, leer_progreso, COMPLETADO
+
+        trabajo = crear_trabajo(db_session, usuario_admin, _request(3))
+        assert cola.procesar_pendientes() == 1
+
+        db_session.refresh(trabajo)
+        assert trabajo.estado == COMPLETADO
+        assert (trabajo.items_procesados, trabajo.items_con_resultado, trabajo.items_con_outliers) == (3, 2, 2)
+
+        progreso = leer_progreso(db_session, trabajo)
+        assert [r.ref_oem for r in progreso.resultados] == ["OEM0", "OEM2"]
+        assert progreso.siguiente_posicion == 3
+        assert leer_progreso(db_session, trabajo, desde=1).resultados[0].ref_oem == "OEM2"
+
+    @pytest.mark.unit
+    def test_host_caido_aparca_el_trabajo_sin_perder_items(self, cola, db_session, usuario_admin, monkeypatch):
+        from core.proteccion_hosts import CircuitoAbierto
+        from services import cola_verificacion
+        from services.cola_verificacion import crear_trabajo, PENDIENTE, ITEM_PENDIENTE
+
+        procesar = cola_verificacion.procesar_item
+
+        def caido_en_el_segundo(item, *args, **kwargs):
+            if item.ref_oem == "OEM1":
+                raise CircuitoAbierto("www.ecooparts.com", 60)
+            return procesar(item, *args, **kwargs)
+
+        monkeypatch.setattr(cola_verificacion, "procesar_item", caido_en_el_segundo)
+        trabajo = crear_trabajo(db_session, usuario_admin, _request(3))
+        cola.procesar_pendientes()
+
+        db_session.refresh(trabajo)
+        assert trabajo.estado == PENDIENTE
+        assert trabajo.disponible_desde is not None
+        assert trabajo.items_procesados == 1
+        assert [i.estado for i in sorted(trabajo.items, key=lambda i: i.posicion)][1:] == [ITEM_PENDIENTE] * 2
+        # Aparcado: no se vuelve a reclamar hasta que pase la espera
+        assert cola.reclamar_siguiente() is None
+
+    @pytest.mark.unit
+    def test_reanuda_trabajo_abandonado(self, cola, db_session, usuario_admin):
+        from app.models.busqueda import ItemTrabajoVerificacion
+        from services.cola_verificacion import crear_trabajo, COMPLETADO, EN_CURSO, ITEM_SIN_DATOS
+        from utils.timezone import now_spain_naive
+
+        trabajo = crear_trabajo(db_session, usuario_admin, _request(3))
+        # Un proceso que murió tras procesar el primer item
+        primero = db_session.query(ItemTrabajoVerificacion).filter_by(trabajo_id=trabajo.id, posicion=0).one()
+        primero.estado = ITEM_SIN_DATOS
+        trabajo.items_procesados = 1
+        trabajo.estado = EN_CURSO
+        trabajo.propietario = "otro-proceso"
+        trabajo.latido = now_spain_naive() - timedelta(hours=1)
+        db_session.commit()
+
+        assert cola.procesar_pendientes() == 1
+
+        db_session.refresh(trabajo)
+        assert trabajo.estado == COMPLETADO
+        assert trabajo.items_procesados == 3
+        assert cola.consultados == ["OEM1", "OEM2"]
+
+
+class TestTrabajosEndpoints:
+    """Tests de los endpoints /stock/trabajos"""
+
+    @pytest.mark.integration
+    def test_encolar_consultar_y_eventos(self, client, cola, auth_headers_admin):
+        r = client.post("/api/v1/stock/trabajos", json=_request(2).model_dump(), headers=auth_headers_admin)
+        assert r.status_code == 202
+        trabajo_id = r.json()["id"]
+        assert r.json()["estado"] == "pendiente"
+
+        cola.procesar_pendientes()
+
+        r = client.get(f"/api/v1/stock/trabajos/{trabajo_id}", headers=auth_headers_admin)
+        assert r.status_code == 200
+        assert r.json()["estado"] == "completado"
+        assert [x["ref_oem"] for x in r.json()["resultados"]] == ["OEM0"]
+
+        with client.stream("GET", f"/api/v1/stock/trabajos/{trabajo_id}/eventos", headers=auth_headers_admin) as r:
+            cuerpo = "".join(r.iter_text())
+        assert "event: progreso" in cuerpo
+        assert "event: fin" in cuerpo
+
+    @pytest.mark.integration
+    def test_cancelar_y_requiere_admin(self, client, auth_headers_admin, auth_headers_user):
+        r = client.post("/api/v1/stock/trabajos", json=_request(2).model_dump(), headers=auth_headers_admin)
+        trabajo_id = r.json()["id"]
+
+        r = client.post(f"/api/v1/stock/trabajos/{trabajo_id}/cancelar", headers=auth_headers_admin)
+        assert r.status_code == 200
+        assert r.json()["estado"] == "cancelado"
+        # Ya terminado: no se puede cancelar otra vez
+        r = client.post(f"/api/v1/stock/trabajos/{trabajo_id}/cancelar", headers=auth_headers_admin)
+        assert r.status_code == 400
+        # Un usuario sin rol admin no accede
+        r = client.get(f"/api/v1/stock/trabajos/{trabajo_id}", headers=auth_headers_user)
+        assert r.status_code == 403
+
+    @pytest.mark.integration
+    def test_verificar_masivo_limita_items(self, client, auth_headers_admin, monkeypatch):
+        """Las listas grandes se rechazan en /verificar-masivo y se encolan en /trabajos"""
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "verificar_masivo_max_items", 2)
+        r = client.post("/api/v1/stock/verificar-masivo", json=_request(3).model_dump(), headers=auth_headers_admin)
+        assert r.status_code == 400
+        assert "/stock/trabajos" in r.json()["detail"]
+
+        r = client.post("/api/v1/stock/trabajos", json=_request(3).model_dump(), headers=auth_headers_admin)
+        assert r.status_code == 202
@@ -0,0 +1,346 @@
+"""
+Tests para la importación automática de CSV de stock (services/csv_auto_import.py)
+"""
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker
+
+
+MAPEO = {"refid": "id", "oem": "oem", "precio": "precio", "articulo": "articulo"}
+
+
+def _escribir_csv(ruta, filas, delimitador=";"):
+    """Escribe un CSV de stock con cabecera id;oem;precio;articulo"""
+    lineas = [delimitador.join(["id", "oem", "precio", "articulo"])]
+    for refid, oem, precio, articulo in filas:
+        lineas.append(delimitador.join([refid, oem, precio, articulo]))
+    ruta.write_text("\n".join(lineas) + "\n", encoding="utf-8")
+    return str(ruta)
+
+
+@pytest.fixture
+def sesion_importacion(db_session, monkeypatch):
+    """Hace que el servicio de importación use la BD de tests"""
+    from services import csv_auto_import
+    monkeypatch.setattr(
+        csv_auto_import, "SessionLocal",
+        sessionmaker(autocommit=False, autoflush=False, bind=db_session.get_bind()),
+    )
+    return csv_auto_import
+
+
+class TestLecturaPorLotes:
+    """Tests para la lectura en streaming del CSV"""
+
+    @pytest.mark.unit
+    def test_lotes_acotados(self, tmp_path):
+        from services.csv_auto_import import iterar_lotes_csv
+        filas = [(f"R{i}", f"OEM{i}", "10,5", "Faro") for i in range(25)]
+        ruta = _escribir_csv(tmp_path / "stock.csv", filas)
+
+        lotes = list(iterar_lotes_csv(ruta, tamano_lote=10))
+        assert [len(lote) for _, lote in lotes] == [10, 10, 5]
+        assert lotes[0][0] == ["id", "oem", "precio", "articulo"]
+
+    @pytest.mark.unit
+    def test_detecta_delimitador_y_csv_vacio(self, tmp_path):
+        from services.csv_auto_import import iterar_lotes_csv
+        ruta = _escribir_csv(tmp_path / "stock.csv", [], delimitador=",")
+
+        lotes = list(iterar_lotes_csv(ruta))
+        assert lotes == [(["id", "oem", "precio", "articulo"], [])]
+
+    @pytest.mark.unit
+    def test_leer_csv_stock_compatible(self, tmp_path):
+        from services.csv_auto_import import leer_csv_stock
+        ruta = _escribir_csv(tmp_path / "stock.csv", [("R1", "OEM1", "5", "Faro")])
+
+        cabeceras, filas = leer_csv_stock(ruta)
+        assert cabeceras == ["id", "oem", "precio", "articulo"]
+        assert filas == [["R1", "OEM1", "5", "Faro"]]
+
+
+class TestImportacionStreaming:
+    """Tests del motor de importación por lotes con huellas"""
+
+    @pytest.mark.integration
+    def test_importacion_inicial_y_diferencial(self, tmp_path, db_session, entorno_trabajo, sesion_importacion):
+        from app.models.busqueda import PiezaDesguace, PiezaVendida
+        filas = [(f"R{i}", f"OEM{i}", "10,5", "Faro") for i in range(20)]
+        ruta = _escribir_csv(tmp_path / "stock.csv", filas)
+
+        resultado = sesion_importacion.importar_csv_con_configuracion(entorno_trabajo.id, ruta, MAPEO)
+        assert resultado["success"] is True
+        assert resultado["piezas_importadas"] == 20
+        assert resultado["total_piezas"] == 20
+
+        # Segunda pasada: R0 cambia de precio, R19 se vende y entra R20
+        filas[0] = ("R0", "OEM0", "99", "Faro")
+        filas[19] = ("R20", "OEM20", "1", "Piloto")
+        _escribir_csv(tmp_path / "stock.csv", filas)
+
+        resultado = sesion_importacion.importar_csv_con_configuracion(entorno_trabajo.id, ruta, MAPEO)
+        assert resultado["success"] is True
+        assert resultado["piezas_importadas"] == 1
+        assert resultado["piezas_actualizadas"] == 19
+        assert resultado["piezas_sin_cambios"] == 18
+        assert resultado["piezas_vendidas"] == 1
+
+        db_session.expire_all()
+        assert db_session.query(PiezaDesguace).filter(PiezaDesguace.refid == "R0").one().precio == 99.0
+        assert db_session.query(PiezaDesguace).filter(PiezaDesguace.refid == "R19").count() == 0
+        assert db_session.query(PiezaVendida).filter(PiezaVendida.refid == "R19").count() == 1
+
+    @pytest.mark.integration
+    def test_campo_vacio_conserva_valor_sin_reescribir(self, tmp_path, db_session, entorno_trabajo, sesion_importacion):
+        """Un campo vacío en el CSV conserva lo guardado y no cuenta como cambio en cada importación"""
+        from app.models.busqueda import PiezaDesguace
+        ruta = _escribir_csv(tmp_path / "stock.csv", [("R1", "OEM1", "10", "Faro"), ("R2", "OEM2", "10", "Faro")])
+        sesion_importacion.importar_csv_con_configuracion(entorno_trabajo.id, ruta, MAPEO)
+
+        # R1 pierde el artículo en el CSV; R2 además cambia de precio
+        _escribir_csv(tmp_path / "stock.csv", [("R1", "OEM1", "10", ""), ("R2", "OEM2", "20", "")])
+        resultado = sesion_importacion.importar_csv_con_configuracion(entorno_trabajo.id, ruta, MAPEO)
+        assert resultado["piezas_sin_cambios"] == 1
+
+        resultado = sesion_importacion.importar_csv_con_configuracion(entorno_trabajo.id, ruta, MAPEO)
+        assert resultado["piezas_sin_cambios"] == 2
+
+        db_session.expire_all()
+        piezas = {p.refid: p for p in db_session.query(PiezaDesguace).all()}
+        assert (piezas["R1"].articulo, piezas["R1"].precio) == ("Faro", 10.0)
+        assert (piezas["R2"].articulo, piezas["R2"].precio) == ("Faro", 20.0)
+
+    @pytest.mark.integration
+    def test_importacion_por_varios_lotes(self, tmp_path, db_session, entorno_trabajo, sesion_importacion, monkeypatch):
+        from app.models.busqueda import PiezaDesguace
+        monkeypatch.setattr(sesion_importacion, "TAMANO_LOTE_IMPORTACION", 7)
+        filas = [(f"R{i}", f"OEM{i}", "3", "Faro") for i in range(30)]
+        filas.append(("R5", "OEM-DUP", "3", "Faro"))  # Duplicado: se ignora
+        ruta = _escribir_csv(tmp_path / "stock.csv", filas)
+
+        resultado = sesion_importacion.importar_csv_con_configuracion(entorno_trabajo.id, ruta, MAPEO)
+        assert resultado["piezas_importadas"] == 30
+        assert db_session.query(PiezaDesguace).count() == 30
+
+    @pytest.mark.integration
+    def test_restaura_fichajes_y_marca_pedidas(self, tmp_path, db_session, entorno_trabajo, usuario_normal, sesion_importacion):
+        from app.models.busqueda import PiezaDesguace, FichadaPieza, PiezaPedida
+        db_session.add(FichadaPieza(usuario_id=usuario_normal.id, entorno_trabajo_id=entorno_trabajo.id, id_pieza="r1"))
+        db_session.add(PiezaPedida(entorno_trabajo_id=entorno_trabajo.id, usuario_id=usuario_normal.id, referencia="oem2"))
+        db_session.commit()
+
+        ruta = _escribir_csv(tmp_path / "stock.csv", [("R1", "OEM1", "5", "Faro"), ("R2", "OEM2", "5", "Faro")])
+        resultado = sesion_importacion.importar_csv_con_configuracion(entorno_trabajo.id, ruta, MAPEO)
+        assert resultado["piezas_recibidas"] == 1
+
+        db_session.expire_all()
+        pieza = db_session.query(PiezaDesguace).filter(PiezaDesguace.refid == "R1").one()
+        assert pieza.usuario_fichaje_id == usuario_normal.id
+        assert db_session.query(PiezaPedida).one().recibida is True
+
+    @pytest.mark.unit
+    def test_archivo_inexistente(self, sesion_importacion):
+        resultado = sesion_importacion.importar_csv_con_configuracion(1, "/no/existe.csv", MAPEO)
+        assert resultado["success"] is False
+        assert "no encontrado" in resultado["error"]
+
+
+class TestDeteccionVendidas:
+    """Tests para detectar_piezas_vendidas (diferencia de conjuntos + bulk insert)"""
+
+    def _crear_stock(self, db_session, base, total):
+        from app.models.busqueda import PiezaDesguace
+        db_session.bulk_insert_mappings(PiezaDesguace, [
+            {"base_desguace_id": base.id, "refid": f"R{i}", "oem": f"OEM{i}", "precio": 10.0, "operario_desmontaje": "Juan"}
+            for i in range(total)
+        ])
+        db_session.commit()
+        return {f"R{i}" for i in range(total)}
+
+    @pytest.mark.integration
+    def test_copia_datos_y_omite_ya_vendidas(self, db_session, entorno_trabajo, base_desguace_ejemplo):
+        from app.models.busqueda import PiezaVendida
+        from services.csv_auto_import import detectar_piezas_vendidas
+        refids = self._crear_stock(db_session, base_desguace_ejemplo, 20)
+        db_session.add(PiezaVendida(entorno_trabajo_id=entorno_trabajo.id, refid="R0"))
+        db_session.commit()
+
+        vendidas = detectar_piezas_vendidas(
+            db_session, base_desguace_ejemplo.id, entorno_trabajo.id, refids - {"R0", "R1", "R2"}
+        )
+        db_session.commit()
+
+        assert vendidas == 2
+        r1 = db_session.query(PiezaVendida).filter(PiezaVendida.refid == "R1").one()
+        assert r1.oem == "OEM1"
+        assert r1.operario_desmontaje == "Juan"
+        assert r1.fecha_venta is not None
+        assert db_session.query(PiezaVendida).filter(PiezaVendida.refid == "R0").count() == 1
+
+    @pytest.mark.integration
+    def test_proteccion_porcentaje(self, db_session, entorno_trabajo, base_desguace_ejemplo):
+        from app.models.busqueda import PiezaVendida
+        from services.csv_auto_import import detectar_piezas_vendidas
+        refids = self._crear_stock(db_session, base_desguace_ejemplo, 10)
+
+        # 3 de 10 = 30% > 20%
+        nuevos = refids - {"R0", "R1", "R2"}
+        assert detectar_piezas_vendidas(db_session, base_desguace_ejemplo.id, entorno_trabajo.id, nuevos) == 0
+        assert db_session.query(PiezaVendida).count() == 0
+
+    @pytest.mark.integration
+    def test_proteccion_csv_incompleto(self, db_session, entorno_trabajo, base_desguace_ejemplo):
+        from services.csv_auto_import import detectar_piezas_vendidas
+        refids = self._crear_stock(db_session, base_desguace_ejemplo, 1200)
+
+        # Con más de 1000 piezas, un CSV con menos del 50% no procesa ventas
+        # aunque el umbral de porcentaje lo permitiera
+        nuevos = set(list(refids)[:500])
+        assert detectar_piezas_vendidas(
+            db_session, base_desguace_ejemplo.id, entorno_trabajo.id, nuevos, max_porcentaje_vendidas=100.0
+        ) == 0
+
+
+class TestOmitirSinCambios:
+    """Tests para omitir importaciones programadas de CSV sin cambios"""
+
+    def _crear_config(self, db_session, entorno, ruta):
+        import json
+        from app.models.busqueda import ConfiguracionStockeo
+        config = ConfiguracionStockeo(
+            entorno_trabajo_id=entorno.id, ruta_csv=ruta,
+            mapeo_columnas=json.dumps(MAPEO), activo=True,
+        )
+        db_session.add(config)
+        db_session.commit()
+        return config
+
+    @pytest.mark.unit
+    def test_firma_reutiliza_hash_si_no_cambia_mtime(self, tmp_path):
+        from services.csv_auto_import import calcular_firma_archivo, archivo_sin_cambios
+        ruta = _escribir_csv(tmp_path / "stock.csv", [("R1", "OEM1", "5", "Faro")])
+
+        firma = calcular_firma_archivo(ruta)
+        assert len(firma["hash"]) == 64
+        falsa = dict(firma, hash="x" * 64)
+        assert calcular_firma_archivo(ruta, falsa)["hash"] == "x" * 64
+
+        _escribir_csv(tmp_path / "stock.csv", [("R1", "OEM1", "6", "Faro")])
+        os.utime(ruta, (0, 0))
+        assert not archivo_sin_cambios(calcular_firma_archivo(ruta, firma), firma)
+
+    @pytest.mark.integration
+    def test_stockeo_omite_archivo_sin_cambios(self, tmp_path, db_session, entorno_trabajo, sesion_importacion):
+        from app.models.busqueda import ConfiguracionStockeo
+        from services.scheduler import obtener_estado_scheduler
+        ruta = _escribir_csv(tmp_path / "stock.csv", [("R1", "OEM1", "5", "Faro")])
+        self._crear_config(db_session, entorno_trabajo, ruta)
+
+        primera = sesion_importacion.ejecutar_stockeo_automatico()
+        assert primera[0]["piezas_importadas"] == 1
+        assert not primera[0].get("omitida")
+
+        segunda = sesion_importacion.ejecutar_stockeo_automatico()
+        assert segunda[0]["omitida"] is True
+        db_session.expire_all()
+        config = db_session.query(ConfiguracionStockeo).one()
+        assert config.ultimo_resultado.startswith("SIN CAMBIOS")
+        assert config.ultimo_archivo_hash is not None
+
+        estado = obtener_estado_scheduler()["importaciones"][f"entorno_{entorno_trabajo.id}"]
+        assert estado["omitida"] is True
+
+        forzada = sesion_importacion.ejecutar_stockeo_automatico(forzar=True)
+        assert not forzada[0].get("omitida")
+        assert forzada[0]["piezas_actualizadas"] == 1
+
+
+class TestStockeoParalelo:
+    """Tests del pool de hilos del stockeo automático"""
+
+    @pytest.fixture
+    def bd_archivo(self, tmp_path, monkeypatch):
+        """BD SQLite en archivo: cada hilo del pool abre su propia conexión"""
+        from sqlalchemy import create_engine
+        from app.database import Base
+        from app.models.busqueda import EntornoTrabajo
+        from services import csv_auto_import
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'stockeo.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        Sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        monkeypatch.setattr(csv_auto_import, "SessionLocal", Sesion)
+
+        db = Sesion()
+        entornos = [EntornoTrabajo(nombre=f"Empresa {i}", activo=True) for i in range(4)]
+        db.add_all(entornos)
+        db.commit()
+        ids = [e.id for e in entornos]
+        db.close()
+        yield Sesion, ids
+        engine.dispose()
+
+    def _configurar(self, Sesion, ids, rutas):
+        import json
+        from app.models.busqueda import ConfiguracionStockeo
+        db = Sesion()
+        for entorno_id, ruta in zip(ids, rutas):
+            db.add(ConfiguracionStockeo(
+                entorno_trabajo_id=entorno_id, ruta_csv=ruta,
+                mapeo_columnas=json.dumps(MAPEO), activo=True,
+            ))
+        db.commit()
+        db.close()
+
+    @pytest.mark.integration
+    def test_entornos_en_paralelo(self, tmp_path, bd_archivo, monkeypatch):
+        import time
+        from services import csv_auto_import
+        Sesion, ids = bd_archivo
+        rutas = [_escribir_csv(tmp_path / f"s{i}.csv", [(f"R{i}", "OEM", "1", "Faro")]) for i in range(4)]
+        self._configurar(Sesion, ids, rutas)
+
+        def importacion_lenta(**kwargs):
+            time.sleep(0.4)
+            return {"success": True, "archivo": kwargs["csv_path"], "piezas_importadas": 1,
+                    "piezas_actualizadas": 0, "piezas_vendidas": 0, "error": None}
+        monkeypatch.setattr(csv_auto_import, "importar_csv_con_configuracion", importacion_lenta)
+
+        inicio = time.perf_counter()
+        resultados = csv_auto_import.ejecutar_stockeo_automatico(max_concurrencia=4)
+        duracion = time.perf_counter() - inicio
+
+        assert len(resultados) == 4
+        assert duracion < 1.2  # En serie serían 1.6s
+        assert all(r["duracion_segundos"] >= 0.4 for r in resultados)
+        resumen = csv_auto_import.obtener_resumen_stockeo()
+        assert resumen["concurrencia"] == 4
+        assert resumen["entornos"] == 4
+
+    @pytest.mark.integration
+    def test_fallo_aislado_por_entorno(self, tmp_path, bd_archivo):
+        from app.models.busqueda import ConfiguracionStockeo, PiezaDesguace
+        from services import csv_auto_import
+        Sesion, ids = bd_archivo
+        rutas = [
+            _escribir_csv(tmp_path / "ok.csv", [("R1", "OEM1", "5", "Faro")]),
+            str(tmp_path / "no_existe.csv"),
+        ]
+        self._configurar(Sesion, ids[:2], rutas)
+
+        resultados = csv_auto_import.ejecutar_stockeo_automatico(forzar=True, max_concurrencia=2)
+        por_entorno = {r["entorno"]: r for r in resultados}
+
+        assert por_entorno["Empresa 0"]["success"] is True
+        assert por_entorno["Empresa 1"]["success"] is False
+        db = Sesion()
+        assert db.query(PiezaDesguace).count() == 1
+        configs = {c.entorno_trabajo_id: c for c in db.query(ConfiguracionStockeo).all()}
+        assert configs[ids[0]].ultimo_resultado.startswith("OK")
+        assert configs[ids[1]].ultimo_resultado.startswith("ERROR")
+        db.close()
@@ -174,6 +174,101 @@ class TestDesguaceEndpoints:
         assert response.status_code in [401, 403]
 
 
+class TestSubidaCSVStreaming:
+    """Tests de la subida del CSV de desguace por lotes"""
+    
+    MAPEO = '{"refid": "refid", "oem": "oem", "precio": "precio", "articulo": "articulo"}'
+    
+    def _subir(self, client, headers, contenido: bytes):
+        return client.post(
+            "/api/v1/desguace/upload",
+            headers=headers,
+            files={"file": ("stock.csv", io.BytesIO(contenido), "text/csv")},
+            data={"mapeo": self.MAPEO},
+        )
+    
+    @pytest.mark.api
+    def test_subida_inserta_actualiza_y_detecta_vendidas(
+        self, client, db_session, auth_headers_admin, fichada_ejemplo
+    ):
+        """Segunda subida: actualiza lo cambiado, deja igual lo demás y mueve a vendidas lo que falta"""
+        from app.models.busqueda import PiezaDesguace, PiezaVendida, VerificacionFichada
+        
+        r = self._subir(client, auth_headers_admin, (
+            "refid;oem;precio;articulo\n"
+            "REF-001;OEM-1;100;Motor\n"
+            "REF-002;OEM-2;50,5 €;Faro\n"
+            "REF-003;OEM-3;20;Piloto\n"
+        ).encode("utf-8"))
+        assert r.status_code == 200
+        datos = r.json()
+        assert datos["piezas_insertadas"] == 3
+        assert datos["filas_procesadas"] == 3
+        assert datos["encoding"] == "utf-8"
+        assert datos["fichadas_encontradas"] == 1
+        
+        r = self._subir(client, auth_headers_admin, (
+            "refid;oem;precio;articulo\n"
+            "ref-001;OEM-1;100;Motor\n"
+            "REF-002;OEM-2;60;Faro\n"
+            "REF-004;OEM-4;10;Retrovisor\n"
+        ).encode("utf-8"))
+        assert r.status_code == 200
+        datos = r.json()
+        assert datos["piezas_insertadas"] == 1
+        assert datos["piezas_actualizadas"] == 1
+        assert datos["piezas_sin_cambios"] == 1
+        assert datos["piezas_vendidas"] == 1
+        
+        db_session.expire_all()
+        assert {p.refid for p in db_session.query(PiezaDesguace).all()} == {"REF-001", "REF-002", "REF-004"}
+        assert db_session.query(PiezaDesguace).filter_by(refid="REF-002").one().precio == 60
+        vendida = db_session.query(PiezaVendida).one()
+        assert vendida.refid == "REF-003"
+        assert vendida.archivo_origen == "stock.csv"
+        # La fichada se copia como fichaje de la pieza y se verifica en cada subida
+        assert db_session.query(PiezaDesguace).filter_by(refid="REF-001").one().fecha_fichaje is not None
+        assert db_session.query(VerificacionFichada).count() == 2
+    
+    @pytest.mark.api
+    def test_subida_sin_refid_no_duplica(self, client, db_session, auth_headers_admin):
+        """Las piezas sin refid se emparejan por OEM + artículo en vez de duplicarse"""
+        from app.models.busqueda import PiezaDesguace
+        
+        contenido = "refid;oem;precio;articulo\n;OEM-9;15;Motor\n".encode("utf-8")
+        assert self._subir(client, auth_headers_admin, contenido).status_code == 200
+        r = self._subir(client, auth_headers_admin, contenido)
+        assert r.status_code == 200
+        assert r.json()["piezas_insertadas"] == 0
+        assert r.json()["piezas_vendidas"] == 0
+        assert db_session.query(PiezaDesguace).count() == 1
+    
+    @pytest.mark.api
+    def test_subida_latin1_y_vacia(self, client, auth_headers_admin):
+        """Detecta latin-1 y rechaza un CSV sin filas"""
+        r = self._subir(client, auth_headers_admin, "refid;oem;precio;articulo\nR1;O1;5;Cigüeñal\n".encode("latin-1"))
+        assert r.status_code == 200
+        assert r.json()["encoding"] == "latin-1"
+        
+        r = self._subir(client, auth_headers_admin, b"refid;oem;precio;articulo\n")
+        assert r.status_code == 400
+    
+    @pytest.mark.api
+    def test_subida_latin1_con_acento_tras_el_primer_bloque(self, client, db_session, auth_headers_admin):
+        """Un acento latin-1 pasado el primer bloque no se sustituye por U+FFFD"""
+        from app.models.busqueda import PiezaDesguace
+        from services.desguace_upload import TAMANO_BLOQUE_ENCODING
+        
+        filas = "".join(f"R{i};O{i};5;Motor\n" for i in range(TAMANO_BLOQUE_ENCODING // 10))
+        contenido = f"refid;oem;precio;articulo\n{filas}RX;OX;5;Cigüeñal\n".encode("latin-1")
+        assert len(contenido) > TAMANO_BLOQUE_ENCODING
+        
+        r = self._subir(client, auth_headers_admin, contenido)
+        assert r.status_code == 200
+        assert r.json()["encoding"] == "latin-1"
+        assert db_session.query(PiezaDesguace).filter_by(refid="RX").one().articulo == "Cigüeñal"
+
+
 class TestCSVProcessing:
     """Tests para procesamiento de CSV"""
     
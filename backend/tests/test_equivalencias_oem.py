@@ -0,0 +1,194 @@
+"""
+Tests para el almacén de OEM equivalentes (app/services/almacen_oem.py)
+"""
+import pytest
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Fuentes:
+    """Consulta de equivalencias simulada que cuenta las llamadas"""
+
+    def __init__(self, respuestas):
+        self.respuestas = respuestas
+        self.llamadas = []
+
+    def __call__(self, referencia):
+        self.llamadas.append(referencia)
+        respuesta = self.respuestas[referencia]
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        return respuesta
+
+
+@pytest.fixture
+def nuevo_almacen(db_session):
+    """Almacenes sobre la BD de tests (cada uno con su memoria vacía)"""
+    from sqlalchemy.orm import sessionmaker
+    from app.services.almacen_oem import AlmacenEquivalencias
+
+    fabrica = sessionmaker(bind=db_session.get_bind())
+    creados = []
+
+    def crear():
+        creados.append(AlmacenEquivalencias(fabrica))
+        return creados[-1]
+
+    yield crear
+    for almacen in creados:
+        almacen.cerrar()
+
+
+def _envejecer(db_session, clave, dias):
+    from app.models.busqueda import EquivalenciaOEM
+    fila = db_session.query(EquivalenciaOEM).filter_by(clave=clave).one()
+    fila.fecha_actualizacion -= timedelta(days=dias)
+    db_session.commit()
+
+
+def _esperar_revalidacion(almacen, segundos=5):
+    limite = time.monotonic() + segundos
+    while almacen.estadisticas()["revalidando"] and time.monotonic() < limite:
+        time.sleep(0.01)
+
+
+class TestAlmacenEquivalencias:
+    """Tests del almacén"""
+
+    @pytest.mark.unit
+    def test_se_consulta_una_vez_y_persiste(self, nuevo_almacen, db_session):
+        from app.models.busqueda import EquivalenciaOEM
+
+        fuentes = _Fuentes({"1k0-615.301": (["5Q0615301", "1K0615301A"], True)})
+        almacen = nuevo_almacen()
+        assert almacen.obtener("1k0-615.301", fuentes) == ["1K0615301A", "5Q0615301"]
+        assert almacen.obtener("1K0 615 301", fuentes) == ["1K0615301A", "5Q0615301"]
+        assert db_session.query(EquivalenciaOEM).filter_by(clave="1K0615301").one().completa
+
+        # Otro proceso (memoria vacía) lo lee de la BD sin consultar
+        otro = nuevo_almacen()
+        assert otro.obtener("1K0615301", fuentes) == ["1K0615301A", "5Q0615301"]
+        assert len(fuentes.llamadas) == 1
+        assert otro.estadisticas()["bd"] == 1
+
+    @pytest.mark.unit
+    def test_cache_negativa_y_revalidacion(self, nuevo_almacen, db_session):
+        from app.config import settings
+
+        fuentes = _Fuentes({"SINEQUIV1": ([], True)})
+        almacen = nuevo_almacen()
+        assert almacen.obtener("SINEQUIV1", fuentes) == []
+        assert nuevo_almacen().obtener("SINEQUIV1", fuentes) == []
+        assert len(fuentes.llamadas) == 1
+
+        # Caducada: se devuelve lo guardado al momento y se revalida en segundo plano
+        _envejecer(db_session, "SINEQUIV1", settings.oem_equiv_ttl_negativo_dias)
+        fuentes.respuestas["SINEQUIV1"] = (["NUEVA123"], True)
+        otro = nuevo_almacen()
+        assert otro.obtener("SINEQUIV1", fuentes) == []
+        _esperar_revalidacion(otro)
+        assert otro.obtener("SINEQUIV1", fuentes) == ["NUEVA123"]
+        assert len(fuentes.llamadas) == 2
+
+    @pytest.mark.unit
+    def test_fuentes_caidas_no_se_guardan(self, nuevo_almacen, db_session):
+        from app.models.busqueda import EquivalenciaOEM
+        from app.services.almacen_oem import FuentesNoDisponibles
+
+        fuentes = _Fuentes({"ABC12345": FuentesNoDisponibles("caídas")})
+        almacen = nuevo_almacen()
+        assert almacen.obtener("ABC12345", fuentes) == []
+        assert almacen.obtener("ABC12345", fuentes) == []
+        assert len(fuentes.llamadas) == 2
+        assert db_session.query(EquivalenciaOEM).count() == 0
+
+        # Una fuente caída al refrescar no borra las equivalencias que ya había
+        fuentes.respuestas["ABC12345"] = (["X11111"], True)
+        almacen.refrescar("ABC12345", fuentes)
+        fuentes.respuestas["ABC12345"] = (["Y22222"], False)
+        entrada = almacen.refrescar("ABC12345", fuentes)
+        assert entrada.equivalentes == ["X11111", "Y22222"]
+        assert not entrada.completa
+
+    @pytest.mark.unit
+    def test_lista_larga_cabe_en_la_columna(self, nuevo_almacen, db_session):
+        import json
+        from app.models.busqueda import EquivalenciaOEM
+
+        muchas = [f"REF{i:012d}" for i in range(1000)]
+        entrada = nuevo_almacen().refrescar("LARGA123", _Fuentes({"LARGA123": (muchas, True)}))
+
+        guardada = db_session.query(EquivalenciaOEM).filter_by(clave="LARGA123").one().equivalentes
+        assert len(guardada) <= EquivalenciaOEM.equivalentes.type.length
+        assert json.loads(guardada) == entrada.equivalentes == muchas[:len(entrada.equivalentes)]
+
+    @pytest.mark.unit
+    def test_precalentar_salta_las_frescas(self, nuevo_almacen):
+        from app.services.almacen_oem import FuentesNoDisponibles
+
+        fuentes = _Fuentes({
+            "AAA111": (["B1"], True),
+            "CCC333": ([], True),
+            "DDD444": FuentesNoDisponibles("caídas"),
+        })
+        almacen = nuevo_almacen()
+        almacen.obtener("AAA111", fuentes)
+
+        resumen = nuevo_almacen().precalentar(["AAA111", "aaa-111", "CCC333", "DDD444", ""], fuentes, hilos=2)
+
+        assert resumen == {"frescas": 1, "con_equivalencias": 0, "sin_equivalencias": 1, "errores": 1}
+        assert sorted(fuentes.llamadas) == ["AAA111", "CCC333", "DDD444"]
+
+
+class TestBuscarOemEquivalentes:
+    """buscar_oem_equivalentes sobre el almacén"""
+
+    @pytest.mark.unit
+    def test_segunda_busqueda_sin_red(self, nuevo_almacen, monkeypatch):
+        from app.services import almacen_oem, oem_equivalentes
+
+        llamadas = []
+
+        def tarostrade(ref):
+            llamadas.append(ref)
+            return ["5q0615301", ref.upper()], True
+
+        def distriauto(ref):
+            raise ConnectionError("distri-auto caído")
+
+        monkeypatch.setattr(almacen_oem, "_almacen", nuevo_almacen())
+        monkeypatch.setattr(oem_equivalentes, "buscar_tarostrade", tarostrade)
+        monkeypatch.setattr(oem_equivalentes, "buscar_distriauto", distriauto)
+
+        assert oem_equivalentes.buscar_oem_equivalentes("1K0615301") == ["5Q0615301"]
+        assert oem_equivalentes.buscar_oem_equivalentes("1K0615301") == ["5Q0615301"]
+        assert llamadas == ["1K0615301"]
+        # Con una fuente caída la entrada caduca antes
+        assert not almacen_oem.get_almacen_equivalencias()._leer("1K0615301").completa
+
+    @pytest.mark.unit
+    def test_paginas_de_producto_caidas_no_son_sin_equivalencias(self, monkeypatch):
+        """Buscador bien pero páginas de producto caídas: fuente caída o parcial, nunca completa"""
+        from app.services import oem_equivalentes
+        from app.services.almacen_oem import FuentesNoDisponibles
+
+        def timeout(*args):
+            raise TimeoutError("timeout")
+
+        monkeypatch.setattr(oem_equivalentes, "_taros_buscar_urls", lambda ref: ["https://t/1", "https://t/2"])
+        monkeypatch.setattr(oem_equivalentes, "_distri_buscar_urls", lambda ref: ["https://d/1"])
+        monkeypatch.setattr(oem_equivalentes, "_taros_refs_producto", timeout)
+        monkeypatch.setattr(oem_equivalentes, "_distri_refs_producto", timeout)
+        with pytest.raises(FuentesNoDisponibles):
+            oem_equivalentes._consultar_fuentes("1K0615301")
+
+        # Una página de tarostrade responde: hay equivalencias, pero la consulta no es completa
+        monkeypatch.setattr(
+            oem_equivalentes, "_taros_refs_producto",
+            lambda url, ref: {"5Q0615301"} if url.endswith("1") else timeout(),
+        )
+        assert oem_equivalentes._consultar_fuentes("1K0615301") == (["5Q0615301"], False)
@@ -0,0 +1,143 @@
+"""
+Tests para la búsqueda de precios del estudio de coches en segundo plano (services/estudio_precios.py)
+"""
+import pytest
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CLAVE = (1, "SEAT", "IBIZA", None)
+
+
+def _piezas(*oems):
+    return [{"id": i, "oem": oem, "precio_mercado": None} for i, oem in enumerate(oems)]
+
+
+def _esperar(trabajo, segundos=5):
+    limite = time.monotonic() + segundos
+    while trabajo.terminado is None and time.monotonic() < limite:
+        time.sleep(0.01)
+    return trabajo
+
+
+class _Consulta:
+    """Precio de mercado simulado que cuenta las búsquedas y las simultáneas"""
+
+    def __init__(self, precios):
+        self.precios = precios
+        self.llamadas = []
+        self.en_curso = 0
+        self.maximo = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, oem):
+        with self._lock:
+            self.llamadas.append(oem)
+            self.en_curso += 1
+            self.maximo = max(self.maximo, self.en_curso)
+        time.sleep(0.02)
+        with self._lock:
+            self.en_curso -= 1
+        precio = self.precios.get(oem)
+        if isinstance(precio, Exception):
+            raise precio
+        return precio
+
+
+class TestGestorEstudios:
+    """Tests del trabajo de precios del estudio"""
+
+    @pytest.mark.unit
+    def test_busca_cada_oem_una_vez_en_paralelo(self, monkeypatch):
+        from app.config import settings
+        from services.estudio_precios import GestorEstudios, COMPLETADO
+
+        monkeypatch.setattr(settings, "estudio_busquedas_simultaneas", 3)
+        consulta = _Consulta({f"OEM{i}": 10.0 * (i + 1) for i in range(6)})
+        piezas = _piezas(*[f"OEM{i}" for i in range(6)], "oem0 ", None)
+
+        trabajo = _esperar(GestorEstudios().iniciar(CLAVE, piezas, {"total_piezas": 8}, consulta))
+        resultado = trabajo.resultado()
+
+        assert resultado["estado"] == COMPLETADO
+        assert sorted(consulta.llamadas) == [f"OEM{i}" for i in range(6)]
+        assert 1 < consulta.maximo <= 3
+        # Las dos piezas con el mismo OEM (normalizado) reciben el precio
+        assert resultado["piezas"][6]["precio_mercado"] == 10.0
+        assert resultado["piezas_actualizadas"] == 7
+        assert resultado["resumen"]["valor_mercado"] == 220.0
+
+    @pytest.mark.unit
+    def test_repetir_estudio_reutiliza_precios(self):
+        from services.estudio_precios import GestorEstudios, COMPLETADO
+
+        gestor = GestorEstudios()
+        consulta = _Consulta({"A": 50.0, "B": None, "C": RuntimeError("HTTP 503")})
+        primero = _esperar(gestor.iniciar(CLAVE, _piezas("A", "B", "C"), {}, consulta))
+        assert len(consulta.llamadas) == 3
+
+        segundo = gestor.iniciar(CLAVE, _piezas("A", "B", "C"), {}, consulta)
+        _esperar(segundo)
+
+        assert segundo.id != primero.id
+        assert segundo.resultado()["piezas"][0]["precio_mercado"] == 50.0
+        # Solo se reintenta el OEM que falló; "sin precios" también se reutiliza
+        assert consulta.llamadas[3:] == ["C"]
+        assert segundo.estado == COMPLETADO
+
+        _esperar(gestor.iniciar(CLAVE, _piezas("A", "B", "C"), {}, consulta, forzar=True))
+        assert len(consulta.llamadas) == 7
+
+    @pytest.mark.unit
+    def test_estudio_en_curso_se_comparte(self):
+        from services.estudio_precios import GestorEstudios
+
+        gestor = GestorEstudios()
+        consulta = _Consulta({"A": 1.0})
+        trabajo = gestor.iniciar(CLAVE, _piezas("A"), {}, consulta)
+        otro = gestor.iniciar(CLAVE, _piezas("A"), {}, consulta)
+        _esperar(trabajo)
+
+        assert otro is trabajo
+        assert consulta.llamadas == ["A"]
+
+
+class TestEstudioEndpoints:
+    """Tests de /desguace/estudio-coches/buscar-precios"""
+
+    @pytest.mark.integration
+    def test_buscar_precios_en_segundo_plano(self, client, auth_headers_admin, piezas_desguace, db_session, monkeypatch):
+        from services import estudio_precios
+        from app.routers import desguace
+
+        for p in piezas_desguace:
+            p.marca, p.modelo = "SEAT", "IBIZA"
+        db_session.commit()
+        monkeypatch.setattr(estudio_precios, "_gestor", estudio_precios.GestorEstudios())
+        monkeypatch.setattr(desguace, "_precio_mercado_oem", _Consulta({"OEM-001": 80.0, "OEM-002": 120.0}))
+
+        r = client.post(
+            "/api/v1/desguace/estudio-coches/buscar-precios",
+            params={"marca": "SEAT", "modelo": "IBIZA"},
+            headers=auth_headers_admin,
+        )
+        assert r.status_code == 200
+        trabajo_id = r.json()["trabajo_id"]
+        assert r.json()["resumen"]["total_piezas"] == 5
+
+        with client.stream(
+            "GET", f"/api/v1/desguace/estudio-coches/trabajos/{trabajo_id}/eventos", headers=auth_headers_admin
+        ) as r:
+            cuerpo = "".join(r.iter_text())
+        assert "event: fin" in cuerpo
+
+        r = client.get(f"/api/v1/desguace/estudio-coches/trabajos/{trabajo_id}", headers=auth_headers_admin)
+        assert r.json()["estado"] == "completado"
+        assert r.json()["piezas_actualizadas"] == 2
+        assert r.json()["resumen"]["valor_mercado"] == 200.0
+
+        r = client.get("/api/v1/desguace/estudio-coches/trabajos/no-existe", headers=auth_headers_admin)
+        assert r.status_code == 404
@@ -0,0 +1,110 @@
+"""
+Tests para el cliente HTTP asíncrono compartido (core/http_async.py)
+y las variantes async de los scrapers
+"""
+import pytest
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+HTML_AZOR = (
+    '<div class="product"><img alt="FARO DELANTERO IZQUIERDO" '
+    'src="https://desguacesazor.com/123-home_default/faro.jpg">'
+    '<a href="https://desguacesazor.com/faros/4567-faro-1k6941005.html">ver</a>'
+    'SEAT IBIZA 1.4 <span>85,50 € Con IVA</span></div>'
+)
+
+
+class TestClienteCompartido:
+    """Tests del pool de conexiones y el límite por host"""
+
+    @pytest.mark.unit
+    def test_limite_peticiones_simultaneas_por_host(self, monkeypatch):
+        """Nunca hay más de http_max_por_host peticiones en curso contra un mismo host"""
+        import httpx
+        from app.config import settings
+        from core import http_async
+
+        monkeypatch.setattr(settings, "http_max_por_host", 2)
+        en_curso = {"a.test": 0, "b.test": 0}
+        maximo = {"a.test": 0, "b.test": 0}
+
+        async def handler(request):
+            host = request.url.host
+            en_curso[host] += 1
+            maximo[host] = max(maximo[host], en_curso[host])
+            await asyncio.sleep(0.01)
+            en_curso[host] -= 1
+            return httpx.Response(200, text="ok")
+
+        async def escenario():
+            cliente = http_async._cliente_del_bucle()
+            await cliente.cliente.aclose()
+            cliente.cliente = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            urls = [f"https://a.test/{i}" for i in range(8)] + [f"https://b.test/{i}" for i in range(8)]
+            respuestas = await asyncio.gather(*(http_async.get(u) for u in urls))
+            await http_async.cerrar_cliente_http()
+            return respuestas
+
+        respuestas = asyncio.run(escenario())
+
+        assert all(r.status_code == 200 for r in respuestas)
+        assert maximo == {"a.test": 2, "b.test": 2}
+
+    @pytest.mark.unit
+    def test_sin_bucle_de_la_app_fuera_del_threadpool(self):
+        """Fuera de un worker de FastAPI no hay bucle al que delegar"""
+        from core.http_async import bucle_de_la_app
+
+        assert bucle_de_la_app() is None
+
+
+class TestVariantesAsync:
+    """Tests de las variantes async de los scrapers"""
+
+    @pytest.mark.unit
+    def test_desguace_async_parsea_igual_que_sync(self, monkeypatch):
+        """buscar_async de Azor produce las mismas piezas que el parseo síncrono"""
+        import httpx
+        from core import http_async
+        from app.services.desguaces.azor import AzorScraper
+
+        paginas_pedidas = []
+
+        async def falso_post(url, **kwargs):
+            paginas_pedidas.append(url)
+            return httpx.Response(200, text=HTML_AZOR, request=httpx.Request("POST", url))
+
+        monkeypatch.setattr(http_async, "post", falso_post)
+        scraper = AzorScraper()
+
+        piezas = asyncio.run(scraper.buscar_async("1K6941005"))
+
+        assert len(paginas_pedidas) == 3
+        assert piezas == scraper._procesar_paginas({1: HTML_AZOR}, "1K6941005")
+        assert piezas[0]["precio"] == 85.5
+
+    @pytest.mark.unit
+    def test_fallback_en_hilo_para_scrapers_sync(self):
+        """Un desguace sin variante async ejecuta buscar() en el threadpool"""
+        import threading
+        from app.services.desguaces.base import DesguaceScraper
+
+        class DesguaceSync(DesguaceScraper):
+            id = "sync"
+            nombre = "Sync"
+            url_base = "https://sync.test"
+
+            def buscar(self, referencia):
+                return [{"id": referencia, "hilo": threading.get_ident()}]
+
+        async def escenario():
+            return threading.get_ident(), await DesguaceSync().buscar_async("ABC123")
+
+        hilo_bucle, piezas = asyncio.run(escenario())
+
+        assert piezas[0]["id"] == "ABC123"
+        assert piezas[0]["hilo"] != hilo_bucle
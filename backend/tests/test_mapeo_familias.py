@@ -0,0 +1,123 @@
+"""
+Tests del mapeo pieza -> familia compilado (services/mapeo_familias.py)
+"""
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MAPEO = {
+    "FARO": "FAROS",
+    "FARO DELANTERO IZQUIERDO": "FAROS DELANTEROS",
+    "FARO DELANTERO DERECHO": "FAROS DELANTEROS DCHA",
+    "PILOTO TRASERO": "PILOTOS",
+    "ELEVALUNAS DELANTERO IZQUIERDO": "ELEVALUNAS",
+    "MOTOR ARRANQUE": "MOTORES ARRANQUE",
+    "ARRANQUE/ALTERNADOR SOPORTE": "SOPORTES",
+}
+
+
+class TestMapeoFamilias:
+    """La búsqueda compilada devuelve lo mismo que las reglas por recorrido"""
+
+    @pytest.mark.unit
+    def test_reglas_de_busqueda(self):
+        from services.mapeo_familias import MapeoFamilias
+        mapeo = MapeoFamilias(MAPEO)
+        # Exacta
+        assert mapeo.buscar(" faro ") == "FAROS"
+        # La pieza más larga que contiene el texto (a igualdad de largo, la primera)
+        assert mapeo.buscar("DELANTERO") == "ELEVALUNAS"
+        assert mapeo.buscar("FARO DELANTERO") == "FAROS DELANTEROS"
+        # Pieza contenida en el texto
+        assert mapeo.buscar("PILOTO TRASERO LED") == "PILOTOS"
+        # Todas las palabras en la pieza / 2+ palabras en común
+        assert mapeo.buscar("IZQUIERDO ELEVALUNAS") == "ELEVALUNAS"
+        assert mapeo.buscar("SOPORTE ALTERNADOR BMW") == "SOPORTES"
+        # Fallback por primera palabra significativa (prefijo y luego contenida)
+        assert mapeo.buscar("DE PILOTO VARIOS") == "PILOTOS"
+        assert mapeo.buscar("ALTERNADOR BOSCH") == "SOPORTES"
+        assert mapeo.buscar("RETROVISOR") is None
+
+    @pytest.mark.unit
+    def test_buscar_primera(self):
+        from services.mapeo_familias import MapeoFamilias
+        mapeo = MapeoFamilias(MAPEO)
+        assert mapeo.buscar_primera("DELANTERO") == "FAROS DELANTEROS"
+        assert mapeo.buscar_primera("MOTOR ARRANQUE 12V") == "MOTORES ARRANQUE"
+        assert mapeo.buscar_primera("RETROVISOR") is None
+
+    @pytest.mark.unit
+    def test_mapeo_vacio(self):
+        from services.precio_sugerido import buscar_familia_en_mapeo
+        assert buscar_familia_en_mapeo("FARO", {}) is None
+        assert buscar_familia_en_mapeo("", MAPEO) == "ELEVALUNAS"
+
+
+class TestMapeoFamiliasEntorno:
+    """El mapeo compilado del desguace se invalida al editar la configuración"""
+
+    @pytest.mark.integration
+    def test_crear_pieza_familia_invalida_mapeo(self, client, db_session, auth_headers_admin, config_precios_ejemplo):
+        from services.precio_sugerido import buscar_familia_db
+        from app.models.busqueda import PiezaFamiliaDesguace, FamiliaPreciosDesguace
+        db_session.add(PiezaFamiliaDesguace(configuracion_id=config_precios_ejemplo.id, pieza="FARO", familia="FAROS"))
+        db_session.add(FamiliaPreciosDesguace(configuracion_id=config_precios_ejemplo.id, familia="FAROS", precios="20,40"))
+        config_precios_ejemplo.pieza_familia_registros = 1
+        config_precios_ejemplo.familia_precios_registros = 1
+        db_session.commit()
+        entorno_id = config_precios_ejemplo.entorno_trabajo_id
+
+        assert buscar_familia_db(db_session, entorno_id, "ALTERNADOR") is None
+
+        response = client.post(
+            "/api/v1/precios-config/pieza-familia/nuevo",
+            params={"pieza": "alternador", "familia": "alternadores"},
+            headers=auth_headers_admin,
+        )
+        assert response.status_code == 200
+        db_session.expire_all()
+        assert buscar_familia_db(db_session, entorno_id, "ALTERNADOR") == "ALTERNADORES"
+
+
+class TestSnapshotPrecios:
+    """Snapshot de la configuración de precios por desguace"""
+
+    def _configurar(self, db_session, config):
+        from app.models.busqueda import PiezaFamiliaDesguace, FamiliaPreciosDesguace
+        db_session.add(PiezaFamiliaDesguace(configuracion_id=config.id, pieza="FARO", familia="FAROS"))
+        db_session.add(FamiliaPreciosDesguace(configuracion_id=config.id, familia="FAROS", precios="40,20,100"))
+        config.pieza_familia_registros = 1
+        config.familia_precios_registros = 1
+        db_session.commit()
+        return config.entorno_trabajo_id
+
+    @pytest.mark.unit
+    def test_tramos_y_lote(self, db_session, config_precios_ejemplo):
+        from services.precio_sugerido import sugerir_precios_db, sugerir_precio_db
+        entorno_id = self._configurar(db_session, config_precios_ejemplo)
+        items = [("FARO", 10 * 1.21), ("FARO", 30 * 1.21), ("FARO", 35 * 1.21), ("FARO", 500.0), ("RETROVISOR", 121.0)]
+        resultados = sugerir_precios_db(db_session, entorno_id, items)
+        assert [r["precio_sugerido"] for r in resultados] == [20.0, 20.0, 40.0, 100.0, 60.0]
+        assert resultados[0]["precios_familia"] == [20.0, 40.0, 100.0]
+        assert resultados[4]["metodo"] == "fallback_porcentaje"
+        assert resultados == [sugerir_precio_db(db_session, entorno_id, r, p) for r, p in items]
+        assert sugerir_precios_db(db_session, 9999, items) == [None] * len(items)
+
+    @pytest.mark.unit
+    def test_snapshot_reutilizado_hasta_cambiar_sello(self, db_session, config_precios_ejemplo):
+        from services.precio_sugerido import get_snapshot_precios, marcar_configuracion_precios
+        from app.models.busqueda import FamiliaPreciosDesguace
+        entorno_id = self._configurar(db_session, config_precios_ejemplo)
+        snapshot = get_snapshot_precios(db_session, entorno_id)
+        assert get_snapshot_precios(db_session, entorno_id) is snapshot
+
+        familia = db_session.query(FamiliaPreciosDesguace).first()
+        familia.precios = "50,60"
+        marcar_configuracion_precios(config_precios_ejemplo)
+        db_session.commit()
+        nuevo = get_snapshot_precios(db_session, entorno_id)
+        assert nuevo is not snapshot
+        assert nuevo.precios["FAROS"] == (50.0, 60.0)
+        assert snapshot.precios["FAROS"] == (20.0, 40.0, 100.0)
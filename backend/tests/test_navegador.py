@@ -0,0 +1,147 @@
+"""
+Tests para el pool de navegador compartido (core/navegador.py)
+
+Usan un Playwright falso: no hace falta Chromium instalado.
+"""
+import pytest
+import os
+import sys
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Pagina:
+    def __init__(self, contexto):
+        self.contexto = contexto
+
+    async def close(self):
+        pass
+
+
+class _Contexto:
+    def __init__(self, navegador, opciones):
+        self.navegador = navegador
+        self.opciones = opciones
+
+    async def new_page(self):
+        return _Pagina(self)
+
+    async def close(self):
+        pass
+
+
+class _Navegador:
+    def __init__(self):
+        self.conectado = True
+        self.contextos = []
+
+    def is_connected(self):
+        return self.conectado
+
+    async def new_context(self, **opciones):
+        contexto = _Contexto(self, opciones)
+        self.contextos.append(contexto)
+        return contexto
+
+    async def close(self):
+        self.conectado = False
+
+
+class _PlaywrightFalso:
+    def __init__(self):
+        self.navegadores = []
+        self.chromium = self
+
+    def __call__(self):
+        return self
+
+    async def start(self):
+        return self
+
+    async def launch(self, **kwargs):
+        navegador = _Navegador()
+        self.navegadores.append(navegador)
+        return navegador
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    from core import navegador
+
+    falso = _PlaywrightFalso()
+    monkeypatch.setattr(navegador, "async_playwright", falso)
+    monkeypatch.setattr(navegador, "PLAYWRIGHT_AVAILABLE", True)
+    pool = navegador.PoolNavegador()
+    pool.falso = falso
+    yield pool
+    pool.cerrar()
+
+
+class TestPoolNavegador:
+    """Tests del pool de páginas"""
+
+    @pytest.mark.unit
+    def test_reutiliza_navegador_y_contexto_por_perfil(self, pool):
+        from core.navegador import PERFIL_ESCRITORIO
+
+        async def contexto_de(page):
+            return page.contexto
+
+        c1 = pool.usar_pagina(contexto_de, perfil=PERFIL_ESCRITORIO)
+        c2 = pool.usar_pagina(contexto_de, perfil=PERFIL_ESCRITORIO)
+        c3 = pool.usar_pagina(contexto_de)
+
+        assert len(pool.falso.navegadores) == 1
+        assert c1 is c2
+        assert c3 is not c1
+        assert c1.opciones["locale"] == "es-ES"
+        assert pool.estado()["usos"] == 3
+
+    @pytest.mark.unit
+    def test_limita_paginas_simultaneas(self, pool, monkeypatch):
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "navegador_max_paginas", 2)
+        en_curso = {"actual": 0, "maximo": 0}
+
+        async def trabajo(page):
+            en_curso["actual"] += 1
+            en_curso["maximo"] = max(en_curso["maximo"], en_curso["actual"])
+            await asyncio.sleep(0.02)
+            en_curso["actual"] -= 1
+            return threading.current_thread().name
+
+        with ThreadPoolExecutor(max_workers=6) as ex:
+            hilos = list(ex.map(lambda _: pool.usar_pagina(trabajo), range(6)))
+
+        assert en_curso["maximo"] == 2
+        # Todas las páginas se usan desde el hilo del pool, no desde los workers
+        assert set(hilos) == {"pool-navegador"}
+
+    @pytest.mark.unit
+    def test_relanza_si_chromium_se_cae(self, pool):
+        async def nada(page):
+            return None
+
+        pool.usar_pagina(nada)
+        pool.falso.navegadores[0].conectado = False
+        pool.usar_pagina(nada)
+
+        assert len(pool.falso.navegadores) == 2
+        assert pool.estado()["lanzamientos"] == 2
+
+    @pytest.mark.unit
+    def test_error_en_la_pagina_se_propaga(self, pool):
+        async def falla(page):
+            raise RuntimeError("timeout navegando")
+
+        with pytest.raises(RuntimeError):
+            pool.usar_pagina(falla)
+
+        assert pool.estado()["paginas_en_uso"] == 0
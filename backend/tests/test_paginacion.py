@@ -0,0 +1,136 @@
+"""
+Tests para la paginación por cursor (services/paginacion.py)
+"""
+import pytest
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestCursor:
+    """Tests de codificación de cursores"""
+
+    @pytest.mark.unit
+    def test_ida_y_vuelta(self):
+        from services.paginacion import codificar_cursor, decodificar_cursor
+        fecha = datetime(2025, 3, 1, 10, 30)
+        cursor = codificar_cursor({"k": [fecha, 7], "h": "abc", "t": 20})
+        datos = decodificar_cursor(cursor, "abc")
+        assert datos["k"] == [fecha, 7]
+        assert datos["t"] == 20
+
+    @pytest.mark.unit
+    def test_cursor_invalido(self):
+        from services.paginacion import codificar_cursor, decodificar_cursor, CursorInvalido
+        with pytest.raises(CursorInvalido):
+            decodificar_cursor("no-es-un-cursor")
+        with pytest.raises(CursorInvalido):
+            decodificar_cursor(codificar_cursor({"k": [1], "h": "otros"}), "abc")
+
+
+class TestPaginarKeyset:
+    """Tests de paginar() sobre la BD"""
+
+    @pytest.mark.integration
+    def test_recorrido_con_fechas_repetidas_y_nulas(self, db_session, entorno_trabajo):
+        """Recorrer por cursor da las mismas filas, en el mismo orden, que por offset"""
+        from app.models.busqueda import PiezaVendida
+        from services.paginacion import paginar
+        base = datetime(2025, 1, 1)
+        for i in range(11):
+            fecha = None if i in (3, 8) else base + timedelta(days=i % 4)
+            db_session.add(PiezaVendida(entorno_trabajo_id=entorno_trabajo.id, refid=f"V{i}", fecha_venta=fecha))
+        db_session.commit()
+        # fecha_venta tiene default; forzar los NULL
+        db_session.query(PiezaVendida).filter(PiezaVendida.refid.in_(["V3", "V8"])).update({"fecha_venta": None})
+        db_session.commit()
+
+        query = db_session.query(PiezaVendida).filter(PiezaVendida.entorno_trabajo_id == entorno_trabajo.id)
+        claves = [PiezaVendida.fecha_venta, PiezaVendida.id]
+        esperado = [v.refid for v in paginar(query, claves, 100).filas]
+        assert esperado[-2:] == ["V8", "V3"]
+
+        vistos, cursor, paginas = [], None, 0
+        while True:
+            pagina = paginar(query, claves, 3, cursor=cursor)
+            vistos += [v.refid for v in pagina.filas]
+            paginas += 1
+            assert pagina.total == 11
+            cursor = pagina.siguiente_cursor
+            if not cursor:
+                break
+        assert vistos == esperado
+        assert paginas == 4
+
+    @pytest.mark.integration
+    def test_total_estimado(self, db_session, piezas_desguace, monkeypatch):
+        from app.models.busqueda import PiezaDesguace
+        from services import paginacion
+        monkeypatch.setattr(paginacion, "LIMITE_TOTAL_ESTIMADO", 3)
+        pagina = paginacion.paginar(db_session.query(PiezaDesguace), [PiezaDesguace.id], 2, modo_total="estimado")
+        assert (pagina.total, pagina.total_estimado) == (3, True)
+        pagina = paginacion.paginar(db_session.query(PiezaDesguace), [PiezaDesguace.id], 2, modo_total="ninguno")
+        assert pagina.total is None
+        assert len(pagina.filas) == 2
+
+
+class TestListadosPorCursor:
+    """Tests de /desguace/stock y /admin/api-logs con cursor"""
+
+    @pytest.mark.api
+    def test_stock_cursor_y_offset(self, client, piezas_desguace, auth_headers_admin):
+        r = client.get("/api/v1/desguace/stock?limit=2", headers=auth_headers_admin)
+        assert r.status_code == 200
+        data = r.json()
+        refids = [p["refid"] for p in data["piezas"]]
+        assert data["total"] == 5
+        while data["siguiente_cursor"]:
+            r = client.get(f"/api/v1/desguace/stock?limit=2&cursor={data['siguiente_cursor']}", headers=auth_headers_admin)
+            data = r.json()
+            refids += [p["refid"] for p in data["piezas"]]
+            assert data["total"] == 5
+        assert refids == ["REF-005", "REF-004", "REF-003", "REF-002", "REF-001"]
+
+        # Offset de siempre
+        r = client.get("/api/v1/desguace/stock?limit=2&offset=2", headers=auth_headers_admin)
+        assert [p["refid"] for p in r.json()["piezas"]] == ["REF-003", "REF-002"]
+
+    @pytest.mark.api
+    def test_cursor_de_otros_filtros(self, client, piezas_desguace, auth_headers_admin):
+        r = client.get("/api/v1/desguace/stock?limit=2", headers=auth_headers_admin)
+        cursor = r.json()["siguiente_cursor"]
+        r = client.get(f"/api/v1/desguace/stock?limit=2&busqueda=pieza&cursor={cursor}", headers=auth_headers_admin)
+        assert r.status_code == 400
+        r = client.get("/api/v1/desguace/stock?cursor=xyz", headers=auth_headers_admin)
+        assert r.status_code == 400
+
+    @pytest.mark.api
+    def test_limit_y_offset_validados(self, client, auth_headers_admin):
+        for listado in ("stock", "ventas"):
+            for parametros in ("limit=0", "limit=-1", "offset=-1"):
+                r = client.get(f"/api/v1/desguace/{listado}?{parametros}", headers=auth_headers_admin)
+                assert r.status_code == 422, (listado, parametros)
+
+    @pytest.mark.api
+    def test_api_logs_cursor(self, client, db_session, entorno_trabajo, usuario_sysowner, auth_headers_sysowner):
+        from app.models.busqueda import APIRequestLog
+        base = datetime(2025, 1, 1)
+        for i in range(25):
+            db_session.add(APIRequestLog(
+                metodo="GET", ruta=f"/r{i}", status_code=200, duracion_ms=1.0,
+                entorno_trabajo_id=entorno_trabajo.id, fecha=base + timedelta(minutes=i // 2),
+            ))
+        db_session.commit()
+
+        url = f"/api/v1/admin/api-logs?por_pagina=10&entorno_id={entorno_trabajo.id}&ruta=/r"
+        r = client.get(url, headers=auth_headers_sysowner)
+        data = r.json()
+        rutas = [log["ruta"] for log in data["logs"]]
+        while data["siguiente_cursor"]:
+            data = client.get(f"{url}&cursor={data['siguiente_cursor']}", headers=auth_headers_sysowner).json()
+            rutas += [log["ruta"] for log in data["logs"]]
+        assert len(rutas) == 25
+        assert set(rutas) == {f"/r{i}" for i in range(25)}
+        assert rutas[0] == "/r24"
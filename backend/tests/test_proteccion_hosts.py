@@ -0,0 +1,140 @@
+"""
+Tests para la limitación de ritmo y el circuit breaker por host (core/proteccion_hosts.py)
+"""
+import pytest
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestCircuito:
+    """Tests de los estados del circuit breaker"""
+
+    @pytest.mark.unit
+    def test_abre_tras_fallos_y_se_cierra_con_prueba_correcta(self):
+        from core.proteccion_hosts import Circuito, CircuitoAbierto, ABIERTO, CERRADO, SEMIABIERTO
+
+        circuito = Circuito("host.test", fallos_para_abrir=3, segundos_abierto=0.05)
+        for _ in range(3):
+            circuito.antes_de_llamar()
+            circuito.registrar_fallo("HTTP 503")
+        assert circuito.estado == ABIERTO
+
+        with pytest.raises(CircuitoAbierto):
+            circuito.antes_de_llamar()
+
+        time.sleep(0.06)
+        circuito.antes_de_llamar()
+        assert circuito.estado == SEMIABIERTO
+        # Solo una prueba a la vez mientras está semiabierto
+        with pytest.raises(CircuitoAbierto):
+            circuito.antes_de_llamar()
+
+        circuito.registrar_exito()
+        assert circuito.estado == CERRADO
+        assert circuito.fallos_seguidos == 0
+
+    @pytest.mark.unit
+    def test_prueba_fallida_vuelve_a_abrir(self):
+        from core.proteccion_hosts import Circuito, ABIERTO
+
+        circuito = Circuito("host.test", fallos_para_abrir=1, segundos_abierto=0.01)
+        circuito.registrar_fallo("timeout")
+        time.sleep(0.02)
+        circuito.antes_de_llamar()
+        circuito.registrar_fallo("timeout")
+
+        assert circuito.estado == ABIERTO
+        assert circuito.veces_abierto == 2
+
+
+class TestCuboTokens:
+    """Tests del token bucket"""
+
+    @pytest.mark.unit
+    def test_rafaga_y_espera_maxima(self):
+        from core.proteccion_hosts import CuboTokens
+
+        cubo = CuboTokens(por_segundo=10, capacidad=2)
+        assert cubo.reservar(1.0) == 0
+        assert cubo.reservar(1.0) == 0
+        # Sin tokens: hay que esperar ~0.1s por el siguiente
+        espera = cubo.reservar(1.0)
+        assert 0.05 < espera <= 0.1
+        # Si la espera supera el máximo no se reserva
+        assert cubo.reservar(0.01) is None
+
+
+class TestScrapersProtegidos:
+    """Tests de la protección automática de los scrapers"""
+
+    @pytest.mark.unit
+    def test_desguace_con_fallos_notificados_abre_su_circuito(self, monkeypatch):
+        from app.config import settings
+        from app.services.desguaces.base import DesguaceScraper
+        from core.proteccion_hosts import CircuitoAbierto, estado_hosts, notificar_fallo
+
+        monkeypatch.setattr(settings, "circuito_fallos_para_abrir", 2)
+        llamadas = []
+
+        class DesguaceCaido(DesguaceScraper):
+            id = "caido"
+            nombre = "Caído"
+            url_base = "https://caido.test"
+
+            def buscar(self, referencia):
+                llamadas.append(referencia)
+                notificar_fallo("HTTP 503")
+                return []
+
+        scraper = DesguaceCaido()
+        assert scraper.buscar("A") == []
+        assert scraper.buscar("B") == []
+        with pytest.raises(CircuitoAbierto):
+            scraper.buscar("C")
+
+        assert llamadas == ["A", "B"]
+        assert estado_hosts()["caido.test"]["estado"] == "abierto"
+
+    @pytest.mark.unit
+    def test_llamadas_anidadas_cuentan_una_vez(self):
+        from core.base_scraper import PlatformScraper
+        from core.proteccion_hosts import proteccion_host
+
+        class Plataforma(PlatformScraper):
+            def __init__(self):
+                super().__init__("Test", "https://plataforma.test/")
+
+            def setup_session(self, reference):
+                return True
+
+            def fetch_prices(self, reference, limit=30):
+                precios, _ = self.fetch_prices_with_images(reference, limit)
+                return precios
+
+            def fetch_prices_with_images(self, reference, limit=30):
+                return [10.0], []
+
+            def is_available(self):
+                return True
+
+        proteccion = proteccion_host("plataforma.test")
+        antes = proteccion.cubo.disponibles()
+
+        assert Plataforma().fetch_prices("X") == [10.0]
+        assert proteccion.cubo.disponibles() == pytest.approx(antes - 1, abs=0.1)
+
+    @pytest.mark.integration
+    def test_health_expone_circuitos(self, client):
+        from core.proteccion_hosts import proteccion_host
+
+        circuito = proteccion_host("caido.test").circuito
+        for _ in range(circuito.fallos_para_abrir):
+            circuito.registrar_fallo("timeout")
+
+        r = client.get("/api/v1/health")
+
+        assert r.status_code == 200
+        assert "caido.test" in r.json()["scrapers"]["circuitos_abiertos"]
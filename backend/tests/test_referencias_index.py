@@ -0,0 +1,109 @@
+"""
+Tests para el índice de referencias normalizadas (services/referencias_index.py)
+"""
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _ids_por_referencia(db_session, referencia, entorno_id, prefijo=False):
+    from app.models.busqueda import PiezaDesguace
+    from services.referencias_index import select_piezas_por_referencia
+    return {
+        p.refid for p in db_session.query(PiezaDesguace).filter(
+            PiezaDesguace.id.in_(select_piezas_por_referencia(referencia, entorno_id, prefijo=prefijo))
+        )
+    }
+
+
+class TestNormalizacion:
+    """Tests de normalización y separación de referencias"""
+
+    @pytest.mark.unit
+    def test_normalizar_referencia(self):
+        from services.referencias_index import normalizar_referencia
+        assert normalizar_referencia(" 1k0-615.301 a ") == "1K0615301A"
+        assert normalizar_referencia(None) == ""
+
+    @pytest.mark.unit
+    def test_tokens_separadores(self):
+        from services.referencias_index import tokens_referencia
+        assert tokens_referencia("1K0 615 301 / 7L6.615.301, ABC-1;;x|") == {"1K0615301", "7L6615301", "ABC1", "X"}
+        assert tokens_referencia("") == set()
+
+
+class TestIndiceReferencias:
+    """Tests de indexación y búsqueda por igualdad/prefijo"""
+
+    @pytest.mark.integration
+    def test_igualdad_prefijo_y_aislamiento(self, db_session, piezas_desguace, base_desguace_ejemplo):
+        from services.referencias_index import reindexar_base
+        reindexar_base(db_session, base_desguace_ejemplo.id, base_desguace_ejemplo.entorno_trabajo_id)
+        db_session.commit()
+        entorno_id = base_desguace_ejemplo.entorno_trabajo_id
+
+        assert _ids_por_referencia(db_session, "oem 001", entorno_id) == {"REF-001"}
+        assert _ids_por_referencia(db_session, "REF", entorno_id) == set()
+        assert len(_ids_por_referencia(db_session, "ref", entorno_id, prefijo=True)) == 5
+        assert _ids_por_referencia(db_session, "OEM-001", entorno_id + 1) == set()
+
+    @pytest.mark.integration
+    def test_importacion_mantiene_indice(self, db_session, entorno_trabajo, tmp_path, monkeypatch):
+        """Altas, cambios de referencia y ventas se reflejan en el índice"""
+        from sqlalchemy.orm import sessionmaker
+        from app.models.busqueda import ReferenciaPieza
+        from services import csv_auto_import
+        monkeypatch.setattr(
+            csv_auto_import, "SessionLocal",
+            sessionmaker(autocommit=False, autoflush=False, bind=db_session.get_bind()),
+        )
+        mapeo = {"refid": "id", "oem": "oem", "articulo": "articulo"}
+        ruta = tmp_path / "stock.csv"
+
+        resto = "".join(f"R{i};OEM-{i};Pieza\n" for i in range(3, 8))
+        ruta.write_text("id;oem;articulo\nR1;AAA-1;Faro\nR2;BBB-2;Piloto\n" + resto, encoding="utf-8")
+        csv_auto_import.importar_csv_con_configuracion(entorno_trabajo.id, str(ruta), mapeo)
+        assert _ids_por_referencia(db_session, "AAA1", entorno_trabajo.id) == {"R1"}
+
+        ruta.write_text("id;oem;articulo\nR1;CCC-3;Faro\nR9;DDD-4;Motor\n" + resto, encoding="utf-8")
+        csv_auto_import.importar_csv_con_configuracion(entorno_trabajo.id, str(ruta), mapeo)
+        db_session.expire_all()
+        assert _ids_por_referencia(db_session, "AAA1", entorno_trabajo.id) == set()
+        assert _ids_por_referencia(db_session, "CCC3", entorno_trabajo.id) == {"R1"}
+        assert _ids_por_referencia(db_session, "DDD4", entorno_trabajo.id) == {"R9"}
+        # R2 vendida: sin tokens huérfanos
+        assert _ids_por_referencia(db_session, "R2", entorno_trabajo.id) == set()
+        assert _ids_por_referencia(db_session, "oem7", entorno_trabajo.id) == {"R7"}
+        assert db_session.query(ReferenciaPieza).count() == 2 * 7
+
+    @pytest.mark.integration
+    def test_arranque_indexa_entornos_sin_referencias(self, db_session, piezas_desguace, base_desguace_ejemplo):
+        """BD anterior al índice: al arrancar se indexan los entornos sin tokens, una sola vez"""
+        from services.referencias_index import indexar_entornos_sin_referencias
+        entorno_id = base_desguace_ejemplo.entorno_trabajo_id
+        assert _ids_por_referencia(db_session, "OEM-001", entorno_id) == set()
+
+        assert indexar_entornos_sin_referencias(db_session.get_bind()) == {entorno_id: 10}
+        assert _ids_por_referencia(db_session, "OEM-001", entorno_id) == {"REF-001"}
+        assert indexar_entornos_sin_referencias(db_session.get_bind()) == {}
+
+    @pytest.mark.api
+    def test_buscar_desguace_usa_indice(self, client, auth_headers_admin):
+        """/desguace/buscar encuentra piezas subidas por referencia normalizada o prefijo"""
+        import io
+        contenido = "refid;oem;iam;articulo\nR-10;1K0-615-301;IAM 1, IAM 2;Disco\n".encode("utf-8")
+        r = client.post(
+            "/api/v1/desguace/upload",
+            headers=auth_headers_admin,
+            files={"file": ("stock.csv", io.BytesIO(contenido), "text/csv")},
+            data={"mapeo": '{"refid": "refid", "oem": "oem", "iam": "iam", "articulo": "articulo"}'},
+        )
+        assert r.status_code == 200
+
+        for consulta in ("1k0615301", "1K0 615", "iam2"):
+            r = client.get(f"/api/v1/desguace/buscar?referencia={consulta}", headers=auth_headers_admin)
+            assert r.status_code == 200
+            assert r.json()["encontrado"] is True, consulta
+            assert r.json()["resultados"][0]["refid"] == "R-10"
@@ -222,6 +222,37 @@ class TestScrapersCSVLocales:
             assert "source" in item
             assert "iam_ref" in item
 
+    @pytest.mark.unit
+    def test_triclo_indice_exacto_y_aproximado(self, tmp_path):
+        """Triclo indexado: exacto, contenido/continente (6+ caracteres) y orden del archivo"""
+        from app.scrapers.referencias.triclo import search_triclo
+        csv_path = tmp_path / "triclo.csv"
+        csv_path.write_text(
+            "Triclo_Ref,Marca,Modelo,OEM,Info,Categoria\n"
+            "100.0,TRICLO,Golf,1K0-615-301AA / 123,Del.,Disco\n"
+            "200,,Polo,1K0615301;ABC,,Disco\n"
+            "300,TRICLO,Ibiza,615301,,Disco\n"
+            "400,TRICLO,Leon,nan,,Disco\n",
+            encoding="utf-8",
+        )
+        assert [r["iam_ref"] for r in search_triclo("1k0 615.301", str(csv_path))] == ["100", "200", "300"]
+        assert [r["iam_ref"] for r in search_triclo("123", str(csv_path))] == ["100"]
+        assert search_triclo("615", str(csv_path)) == []
+        assert search_triclo("1K0615301AA", str(csv_path))[0]["description"] == "Golf Del."
+
+    @pytest.mark.unit
+    def test_vauner_indice_exacto_y_recarga(self, tmp_path):
+        """Vauner indexado: solo coincidencia exacta; se recarga al cambiar el CSV"""
+        from app.scrapers.referencias.vauner import buscar_iam_por_oem
+        csv_path = tmp_path / "vauner.csv"
+        csv_path.write_text("Codigo,OEM\n4010.123,1K0615301 / 5Q0615301\n", encoding="utf-8")
+        assert buscar_iam_por_oem("5q0-615-301", str(csv_path)) == [("4010.123", "4010123")]
+        assert buscar_iam_por_oem("1K0615", str(csv_path)) == []
+
+        csv_path.write_text("Codigo,OEM\n4010.123,1K0615301 / 5Q0615301\n4020-9,1K0615\n", encoding="utf-8")
+        os.utime(csv_path, ns=(0, 10**18))
+        assert buscar_iam_por_oem("1K0615", str(csv_path)) == [("4020-9", "40209")]
+
 
 # ============================================================
 # SECCIÓN 4: Validación de Prasco (filtro 2 letras)
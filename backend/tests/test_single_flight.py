@@ -0,0 +1,88 @@
+"""
+Tests para la coalescencia de búsquedas simultáneas (utils/single_flight.py)
+"""
+import pytest
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _lanzar_a_la_vez(n, funcion):
+    """Ejecuta funcion() en n hilos que arrancan a la vez"""
+    barrera = threading.Barrier(n)
+
+    def tarea():
+        barrera.wait()
+        return funcion()
+
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        futuros = [ex.submit(tarea) for _ in range(n)]
+        return [f.exception() or f.result() for f in futuros]
+
+
+class TestSingleFlight:
+    """Tests del grupo de coalescencia"""
+
+    @pytest.mark.unit
+    def test_llamadas_simultaneas_comparten_resultado(self):
+        from utils.single_flight import SingleFlight
+        vuelos = SingleFlight("test")
+        llamadas = []
+
+        def lenta(ref):
+            llamadas.append(ref)
+            time.sleep(0.2)
+            return {"precios": [1, 2, 3]}
+
+        resultados = _lanzar_a_la_vez(5, lambda: vuelos.hacer("1K0615301", lenta, "1K0-615-301"))
+        assert llamadas == ["1K0-615-301"]
+        assert all(r is resultados[0] for r in resultados)
+        assert vuelos.estadisticas() == {"ejecutadas": 1, "compartidas": 4, "en_curso": 0}
+
+        # Terminada la llamada, la siguiente vuelve a ejecutar (no es caché)
+        vuelos.hacer("1K0615301", lenta, "otra")
+        assert len(llamadas) == 2
+
+    @pytest.mark.unit
+    def test_error_se_propaga_a_todos(self):
+        from utils.single_flight import SingleFlight
+        vuelos = SingleFlight("test")
+
+        def falla():
+            time.sleep(0.1)
+            raise RuntimeError("timeout")
+
+        resultados = _lanzar_a_la_vez(3, lambda: vuelos.hacer("X", falla))
+        assert all(isinstance(r, RuntimeError) for r in resultados)
+        assert vuelos.estadisticas()["ejecutadas"] == 1
+
+    @pytest.mark.unit
+    def test_clave_referencia(self):
+        from utils.single_flight import clave_referencia
+        assert clave_referencia(" 1k0-615.301 ") == "1K0615301"
+
+
+class TestCoalescenciaPlataformas:
+    """scrape_platform coalesce scrapings simultáneos de la misma referencia"""
+
+    @pytest.mark.integration
+    def test_scrape_platform_simultaneo(self, monkeypatch):
+        from core.cache_precios import CachePrecios, CacheMemoria
+        from app.services import precios_plataformas
+        monkeypatch.setattr(precios_plataformas, "get_cache_precios", lambda: CachePrecios(CacheMemoria(), ttl=0))
+        llamadas = []
+
+        def scraper_falso(platform_id, referencia, cantidad):
+            llamadas.append(referencia)
+            time.sleep(0.2)
+            return {"plataforma_id": platform_id, "plataforma_nombre": "X", "precios": [50.0],
+                    "imagenes": [], "tipo_pieza": None, "error": None}
+        monkeypatch.setattr(precios_plataformas, "_scrape_platform_sin_cache", scraper_falso)
+
+        resultados = _lanzar_a_la_vez(4, lambda: precios_plataformas.scrape_platform("ebay", "1k0 615 301", 20))
+        assert len(llamadas) == 1
+        assert [r["precios"] for r in resultados] == [[50.0]] * 4
@@ -0,0 +1,123 @@
+"""
+Tests para el gestor del token TOEN de Ecooparts (core/toen.py)
+"""
+import pytest
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def generador(monkeypatch):
+    """Sustituye Playwright por un generador de tokens contado"""
+    from core import toen
+
+    llamadas = []
+
+    def nuevo_toen(reference="1K0959653C"):
+        llamadas.append(reference)
+        return f"TOKEN-{len(llamadas)}"
+
+    monkeypatch.setattr(toen, "get_new_toen", nuevo_toen)
+    return llamadas
+
+
+def _envejecer(ruta, segundos):
+    antiguo = time.time() - segundos
+    os.utime(ruta, (antiguo, antiguo))
+
+
+class TestGestorToen:
+    """Tests de la renovación del token"""
+
+    @pytest.mark.unit
+    def test_arranque_en_frio_genera_y_guarda(self, tmp_path, generador):
+        from core.toen import GestorToen, load_toen
+
+        cache = str(tmp_path / "toen_cache.txt")
+        gestor = GestorToen(cache)
+
+        assert gestor.obtener() == "TOKEN-1"
+        assert load_toen(cache) == "TOKEN-1"
+        # Con token en caché ya no se vuelve a generar
+        assert gestor.obtener() == "TOKEN-1"
+        assert len(generador) == 1
+
+    @pytest.mark.unit
+    def test_token_viejo_se_renueva_sin_bloquear(self, tmp_path, generador, monkeypatch):
+        from app.config import settings
+        from core.toen import GestorToen, save_toen
+
+        monkeypatch.setattr(settings, "toen_refresco_segundos", 60)
+        cache = str(tmp_path / "toen_cache.txt")
+        save_toen("VIEJO", cache)
+        _envejecer(cache, 120)
+        gestor = GestorToen(cache)
+
+        # Devuelve el token que hay y renueva en segundo plano
+        assert gestor.obtener() == "VIEJO"
+        for _ in range(100):
+            if gestor.actual() == "TOKEN-1":
+                break
+            time.sleep(0.01)
+
+        assert gestor.actual() == "TOKEN-1"
+        assert len(generador) == 1
+
+    @pytest.mark.unit
+    def test_solo_un_worker_renueva_a_la_vez(self, tmp_path, generador):
+        from core.toen import GestorToen, _bloqueo_entre_workers
+
+        cache = str(tmp_path / "toen_cache.txt")
+        gestor = GestorToen(cache)
+
+        # Otro worker tiene el bloqueo mientras genera el token
+        with _bloqueo_entre_workers(gestor.lock_file) as conseguido:
+            assert conseguido
+            resultado = []
+            hilo = threading.Thread(target=lambda: resultado.append(gestor.refrescar()))
+            hilo.start()
+            hilo.join()
+
+        assert resultado == [False]
+        assert generador == []
+
+    @pytest.mark.unit
+    def test_fallo_en_frio_no_espera_ni_reintenta(self, tmp_path, monkeypatch):
+        """Si generar el token falla se devuelve None al momento, con un solo intento"""
+        from app.config import settings
+        from core import toen
+
+        llamadas = []
+        monkeypatch.setattr(toen, "get_new_toen", lambda reference="1K0959653C": llamadas.append(reference))
+        monkeypatch.setattr(settings, "toen_espera_arranque_segundos", 5)
+        gestor = toen.GestorToen(str(tmp_path / "toen_cache.txt"))
+
+        inicio = time.monotonic()
+        assert gestor.obtener() is None
+        assert gestor.obtener() is None
+        assert time.monotonic() - inicio < 1
+        # El segundo obtener cae dentro de la espera tras el fallo: no relanza Playwright
+        assert len(llamadas) == 1
+        assert gestor.estado()["ultimo_error"]
+
+    @pytest.mark.unit
+    def test_lee_el_token_renovado_por_otro_worker(self, tmp_path, generador):
+        from core.toen import GestorToen, save_toen
+
+        cache = str(tmp_path / "toen_cache.txt")
+        save_toen("A", cache)
+        gestor = GestorToen(cache)
+        assert gestor.actual() == "A"
+
+        # Otro worker escribe un token nuevo
+        otro = GestorToen(cache)
+        _envejecer(cache, 10)
+        save_toen("B-RENOVADO", cache)
+
+        assert gestor.actual() == "B-RENOVADO"
+        assert otro.actual() == "B-RENOVADO"
+        assert generador == []
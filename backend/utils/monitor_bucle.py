@@ -0,0 +1,151 @@
+"""
+Monitor de retraso del event loop
+
+Un handler `async def` que hace trabajo bloqueante (consultas SQLAlchemy,
+scraping con requests, time.sleep) congela el event loop y con él todas las
+demás peticiones del worker. El monitor lo detecta:
+
+- Una tarea del propio bucle duerme settings.bucle_intervalo_monitor_segundos
+  y mide cuánto tarda de más en despertar: ese retraso es el tiempo que el
+  bucle estuvo ocupado sin ceder el control.
+- Un hilo vigilante comprueba el latido de esa tarea; si se retrasa más de
+  settings.bucle_umbral_bloqueo_ms guarda dónde está parado el bucle (su pila)
+  para saber qué código lo bloquea.
+
+Los bloqueos se registran en el log y se exponen en /api/v1/health.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_RAIZ_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _origen(frame) -> Optional[str]:
+    """Frame más interno del backend (no de librerías) en la pila del bucle"""
+    for resumen in reversed(traceback.extract_stack(frame)):
+        ruta = os.path.abspath(resumen.filename)
+        if ruta.startswith(_RAIZ_BACKEND) and "site-packages" not in ruta and ruta != os.path.abspath(__file__):
+            return f"{os.path.relpath(ruta, _RAIZ_BACKEND)}:{resumen.lineno} en {resumen.name}"
+    return None
+
+
+class MonitorBucle:
+    """Mide el retraso del event loop y registra los bloqueos"""
+
+    def __init__(self, intervalo: float, umbral_ms: float):
+        self.intervalo = intervalo
+        self.umbral_ms = umbral_ms
+        self.ultimo_retraso_ms = 0.0
+        self.max_retraso_ms = 0.0
+        self.bloqueos = 0
+        self.ultimos_bloqueos: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self._latido = time.monotonic()
+        self._hilo_bucle: Optional[int] = None
+        self._origen_pendiente: Optional[str] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._parar = threading.Event()
+        self._vigilante: Optional[threading.Thread] = None
+
+    # ---------- Medición desde el bucle ----------
+
+    async def _medir(self):
+        self._hilo_bucle = threading.get_ident()
+        while True:
+            intervalo = self.intervalo
+            self._latido = time.monotonic()
+            await asyncio.sleep(intervalo)
+            retraso_ms = max(0.0, (time.monotonic() - self._latido - intervalo) * 1000)
+            self.registrar(retraso_ms)
+
+    def registrar(self, retraso_ms: float):
+        self.ultimo_retraso_ms = retraso_ms
+        self.max_retraso_ms = max(self.max_retraso_ms, retraso_ms)
+        origen, self._origen_pendiente = self._origen_pendiente, None
+        if retraso_ms < self.umbral_ms:
+            return
+        self.bloqueos += 1
+        self.ultimos_bloqueos.append({
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "retraso_ms": round(retraso_ms),
+            "origen": origen,
+        })
+        logger.warning(
+            f"[Bucle] Event loop bloqueado {retraso_ms:.0f} ms"
+            + (f" en {origen}" if origen else "")
+        )
+
+    # ---------- Hilo vigilante ----------
+
+    def _vigilar(self):
+        """Mientras el bucle está parado, anota en qué línea del backend está"""
+        while not self._parar.wait(self.intervalo / 2):
+            atraso_ms = (time.monotonic() - self._latido - self.intervalo) * 1000
+            if atraso_ms < self.umbral_ms or self._origen_pendiente or self._hilo_bucle is None:
+                continue
+            frame = sys._current_frames().get(self._hilo_bucle)
+            if frame is not None:
+                self._origen_pendiente = _origen(frame)
+
+    # ---------- Ciclo de vida ----------
+
+    def iniciar(self):
+        """Arranca la medición (llamar desde el event loop)"""
+        self._parar.clear()
+        self._tarea = asyncio.get_running_loop().create_task(self._medir())
+        self._vigilante = threading.Thread(target=self._vigilar, name="monitor-bucle", daemon=True)
+        self._vigilante.start()
+
+    async def detener(self):
+        self._parar.set()
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "activo": self._tarea is not None,
+            "ultimo_retraso_ms": round(self.ultimo_retraso_ms, 1),
+            "max_retraso_ms": round(self.max_retraso_ms, 1),
+            "umbral_ms": self.umbral_ms,
+            "bloqueos": self.bloqueos,
+            "ultimos_bloqueos": list(self.ultimos_bloqueos),
+        }
+
+
+_monitor: Optional[MonitorBucle] = None
+
+
+def get_monitor_bucle() -> MonitorBucle:
+    global _monitor
+    if _monitor is None:
+        _monitor = MonitorBucle(settings.bucle_intervalo_monitor_segundos, settings.bucle_umbral_bloqueo_ms)
+    return _monitor
+
+
+def iniciar_monitor_bucle() -> MonitorBucle:
+    """Crea un monitor nuevo para el bucle actual (arranque de la app)"""
+    global _monitor
+    _monitor = MonitorBucle(settings.bucle_intervalo_monitor_segundos, settings.bucle_umbral_bloqueo_ms)
+    _monitor.iniciar()
+    return _monitor
+
+
+async def detener_monitor_bucle():
+    if _monitor is not None:
+        await _monitor.detener()
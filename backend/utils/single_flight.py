@@ -0,0 +1,95 @@
+"""
+Coalescencia de llamadas concurrentes idénticas ("single flight")
+
+Si varios hilos piden lo mismo a la vez (p. ej. cinco operarios buscando la
+misma OEM), solo el primero ejecuta la función; el resto espera y recibe el
+mismo resultado (o la misma excepción). En cuanto termina, la siguiente
+petición vuelve a ejecutar: esto no es una caché.
+
+El resultado se comparte entre todos los que esperaban: tratarlo como de solo
+lectura.
+"""
+import re
+import threading
+from typing import Any, Callable, Dict
+
+_IGNORAR_EN_CLAVE = re.compile(r"[\s\-.]+")
+
+
+def clave_referencia(referencia: str) -> str:
+    """' 1k0-615.301 ' -> '1K0615301' (misma normalización para todas las capas)"""
+    return _IGNORAR_EN_CLAVE.sub("", referencia or "").upper()
+
+
+class _Llamada:
+    __slots__ = ("evento", "resultado", "error")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class SingleFlight:
+    """Grupo de llamadas coalescidas por clave"""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self._en_curso: Dict[Any, _Llamada] = {}
+        self.ejecutadas = 0
+        self.compartidas = 0
+
+    def hacer(self, clave, funcion: Callable, *args, **kwargs):
+        """Ejecuta funcion(*args, **kwargs) salvo que ya haya una en curso con la misma clave"""
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_curso[clave] = _Llamada()
+                self.ejecutadas += 1
+            else:
+                self.compartidas += 1
+
+        if not lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return llamada.resultado
+
+        try:
+            llamada.resultado = funcion(*args, **kwargs)
+            return llamada.resultado
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            llamada.evento.set()
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "ejecutadas": self.ejecutadas,
+                "compartidas": self.compartidas,
+                "en_curso": len(self._en_curso),
+            }
+
+
+_grupos: Dict[str, SingleFlight] = {}
+_grupos_lock = threading.Lock()
+
+
+def grupo(nombre: str) -> SingleFlight:
+    """Grupo de coalescencia con nombre (uno por capa: plataformas, iam, oem...)"""
+    with _grupos_lock:
+        if nombre not in _grupos:
+            _grupos[nombre] = SingleFlight(nombre)
+        return _grupos[nombre]
+
+
+def estadisticas_coalescencia() -> Dict[str, Dict[str, int]]:
+    with _grupos_lock:
+        grupos = list(_grupos.values())
+    return {g.nombre: g.estadisticas() for g in grupos}
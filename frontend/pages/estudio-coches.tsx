@@ -226,17 +226,35 @@ export default function EstudioCochesPage() {
       }
       url += getEntornoParam();
       
-      const response = await axios.post(url, {}, { withCredentials: true });
+      let { data } = await axios.post(url, {}, { withCredentials: true });
+      
+      // La búsqueda corre en segundo plano: consultar el progreso hasta que termine
+      while (data.trabajo_id && (data.estado === 'pendiente' || data.estado === 'en_curso')) {
+        if (data.piezas) setPiezas(data.piezas);
+        toast.loading(
+          `Buscando precios en el mercado... ${data.busquedas_hechas || 0}/${data.total_busquedas || 0}`,
+          { id: 'buscando-precios' }
+        );
+        await new Promise(r => setTimeout(r, 1500));
+        ({ data } = await axios.get(
+          `${process.env.NEXT_PUBLIC_API_URL}/api/v1/desguace/estudio-coches/trabajos/${data.trabajo_id}`,
+          { withCredentials: true }
+        ));
+      }
       
       // Actualizar piezas con precios de mercado
-      if (response.data.piezas) {
-        setPiezas(response.data.piezas);
+      if (data.piezas) {
+        setPiezas(data.piezas);
       }
-      if (response.data.resumen) {
-        setResumen(response.data.resumen);
+      if (data.resumen) {
+        setResumen(data.resumen);
       }
       
-      toast.success(`Precios actualizados para ${response.data.piezas_actualizadas || 0} piezas`, { id: 'buscando-precios' });
+      if (data.estado === 'error') {
+        toast.error(`Búsqueda interrumpida: ${data.error || 'error desconocido'}`, { id: 'buscando-precios' });
+      } else {
+        toast.success(`Precios actualizados para ${data.piezas_actualizadas || 0} piezas`, { id: 'buscando-precios' });
+      }
     } catch (error: any) {
       console.error('Error buscando precios:', error);
       toast.error('Error al buscar precios en el mercado', { id: 'buscando-precios' });
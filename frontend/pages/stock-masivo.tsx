@@ -470,10 +470,6 @@ function StockMasivoContent() {
       return;
     }
     
-    // Configuración fija (sin controles de usuario)
-    const delay = 0; // Sin delay entre peticiones
-    const numWorkers = 1; // Procesamiento secuencial
-    
     setStatus('processing');
     setIsProcessing(true);
     setShouldStop(false);
@@ -538,105 +534,67 @@ function StockMasivoContent() {
       addLog(`Total items a procesar: ${items.length}`, 'info');
       setProgress({ current: 0, total: items.length });
       
-      // Procesamiento paralelo con workers - 1 item por petición
+      // La verificación corre en segundo plano en el servidor (cola de trabajos):
+      // se encola la lista entera y se consulta el progreso hasta que termine
       const allResults: CheckResult[] = [];
       let itemsConOutliers = 0;
-      let processed = 0;
       const startTime = Date.now();
+      const api = `${process.env.NEXT_PUBLIC_API_URL}/api/v1/stock/trabajos`;
       
-      // Función para procesar UN item
-      const processItem = async (item: typeof items[0]): Promise<CheckResult | null> => {
-        try {
-          const response = await axios.post(
-            `${process.env.NEXT_PUBLIC_API_URL}/api/v1/stock/verificar-masivo`,
-            {
-              items: [item], // Solo 1 item por petición
-              umbral_diferencia: umbral,
-              piezas_minimas: piezasMinimas,
-              workers: 1,
-              delay: 0,
-            },
-            {
-              withCredentials: true,
-              timeout: 30000, // 30 segundos para 1 item
-              signal: abortControllerRef.current?.signal,
-            }
-          );
-          
-          return response.data.resultados?.[0] || null;
-        } catch (error: any) {
-          if (error.name === 'CanceledError' || error.code === 'ERR_CANCELED') {
-            throw error;
-          }
-          console.error('Error procesando item:', error);
-          return null;
-        }
-      };
-      
-      // Cola de items para procesar
-      const itemQueue = [...items];
+      let { data } = await axios.post(
+        api,
+        {
+          items,
+          umbral_diferencia: umbral,
+          piezas_minimas: piezasMinimas,
+        },
+        { withCredentials: true }
+      );
+      const trabajoId = data.id;
+      addLog(`Procesando ${items.length} items (trabajo #${trabajoId})...`, 'info');
       
-      // Worker que procesa items de la cola
-      const worker = async () => {
-        while (itemQueue.length > 0 && !shouldStop && !abortControllerRef.current?.signal.aborted) {
-          const item = itemQueue.shift();
-          if (!item) break;
+      let posicion = 0;
+      let cancelado = false;
+      while (true) {
+        for (const result of (data.resultados || []) as CheckResult[]) {
+          // Filtrar si es más barata y está activo el filtro
+          if (ignorarBaratas && result.diferencia_porcentaje < 0) {
+            addLog(
+              `${result.ref_oem} | ${result.tipo_pieza} | IGNORADA (más barata)`,
+              'info'
+            );
+            continue;
+          }
+          allResults.push(result);
+          if (result.es_outlier) itemsConOutliers++;
           
-          try {
-            // Pequeño delay entre peticiones
-            if (delay > 0) {
-              await new Promise(r => setTimeout(r, delay));
-            }
-            
-            const result = await processItem(item);
-            
-            processed++;
-            setProgress({ current: processed, total: items.length });
-            
-            if (result) {
-              // Filtrar si es más barata y está activo el filtro
-              if (ignorarBaratas && result.diferencia_porcentaje < 0) {
-                addLog(
-                  `${result.ref_oem} | ${result.tipo_pieza} | IGNORADA (más barata)`,
-                  'info'
-                );
-              } else {
-                allResults.push(result);
-                if (result.es_outlier) itemsConOutliers++;
-                
-                const diffSign = result.diferencia_porcentaje > 0 ? '+' : '';
-                const status = result.es_outlier ? 'OUTLIER' : 'OK';
-                addLog(
-                  `${result.ref_oem} | ${result.tipo_pieza} | ${result.precio_actual.toFixed(2)}€ → ${result.precio_mercado.toFixed(2)}€ | ${diffSign}${result.diferencia_porcentaje.toFixed(1)}% | ${status}`,
-                  result.es_outlier ? 'warning' : 'success'
-                );
-              }
-            } else {
-              addLog(`${item.ref_oem} | Sin datos de mercado`, 'info');
-            }
-            
-          } catch (error: any) {
-            if (error.name === 'CanceledError' || error.code === 'ERR_CANCELED') {
-              break;
-            }
-            processed++;
-            setProgress({ current: processed, total: items.length });
-            addLog(`${item.ref_oem} | Error: ${error.message}`, 'error');
+          const diffSign = result.diferencia_porcentaje > 0 ? '+' : '';
+          const status = result.es_outlier ? 'OUTLIER' : 'OK';
+          addLog(
+            `${result.ref_oem} | ${result.tipo_pieza} | ${result.precio_actual.toFixed(2)}€ → ${result.precio_mercado.toFixed(2)}€ | ${diffSign}${result.diferencia_porcentaje.toFixed(1)}% | ${status}`,
+            result.es_outlier ? 'warning' : 'success'
+          );
+        }
+        posicion = data.siguiente_posicion ?? posicion;
+        setProgress({ current: data.items_procesados || 0, total: items.length });
+        
+        if (['completado', 'cancelado', 'error'].includes(data.estado)) {
+          if (data.estado === 'error') {
+            addLog(`Error en el servidor: ${data.mensaje_error || 'error desconocido'}`, 'error');
           }
+          break;
         }
-      };
-      
-      // Iniciar workers (secuencial con numWorkers=1)
-      addLog(`Procesando ${items.length} items...`, 'info');
-      
-      const activePromises: Promise<void>[] = [];
-      for (let i = 0; i < numWorkers; i++) {
-        activePromises.push(worker());
+        
+        // Detener: se cancela el trabajo y se siguen leyendo los resultados ya obtenidos
+        if (!cancelado && abortControllerRef.current?.signal.aborted) {
+          cancelado = true;
+          await axios.post(`${api}/${trabajoId}/cancelar`, {}, { withCredentials: true }).catch(() => undefined);
+        } else {
+          await new Promise(r => setTimeout(r, 1500));
+        }
+        ({ data } = await axios.get(`${api}/${trabajoId}?desde=${posicion}`, { withCredentials: true }));
       }
       
-      // Esperar a que terminen todos los workers
-      await Promise.all(activePromises);
-      
       const elapsedTime = (Date.now() - startTime) / 1000;
       const wasStopped = shouldStop || abortControllerRef.current?.signal.aborted;
       
@@ -676,7 +634,7 @@ function StockMasivoContent() {
     if (abortControllerRef.current) {
       abortControllerRef.current.abort();
     }
-    addLog('Deteniendo proceso... espera a que terminen las peticiones activas', 'warning');
+    addLog('Deteniendo proceso... se conservan los resultados ya obtenidos', 'warning');
     toast.loading('Deteniendo...', { duration: 2000 });
   };
 